@@ -121,6 +121,7 @@ def test_transaction(private_key, my_address):
 
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
+    utils.configure_logging()
     print("--------------------------------------------")
     print('What do you want to do?')
     print('1) Generate keypair')
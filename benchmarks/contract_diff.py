@@ -0,0 +1,180 @@
+# differential check of two approval programs: every method scenario of the TEAL profiler is mutated
+# (sender, state, round, capacity, payment, group, arguments, ...) and both programs must accept or reject
+# each case alike and write the same state. Fails with the differing cases, tests/test_contract_diff.py runs it
+# in the test suite.
+# usage: python -m benchmarks.contract_diff --candidate smart_contracts.contract_logistic_manager_optimized:OptimizedLogisticManagerContract
+import argparse
+import itertools
+import json
+import sys
+
+from benchmarks import teal_profiler
+from benchmarks.teal_profiler import (APP_ID, ARRIVAL_ROUND, BOOKED, CREATOR, DEPARTURE_ROUND, ESCROW,
+                                      MAX_CAPACITY, USER, itob, payment)
+
+OPTIMIZED_CONTRACT = "smart_contracts.contract_logistic_manager_optimized:OptimizedLogisticManagerContract"
+
+ROUNDS = [1, DEPARTURE_ROUND - 1, DEPARTURE_ROUND, DEPARTURE_ROUND + 1, ARRIVAL_ROUND, ARRIVAL_ROUND + 1]
+CAPACITIES = [0, BOOKED - 1, BOOKED, MAX_CAPACITY - BOOKED, MAX_CAPACITY]
+ADDRESSES = [CREATOR, USER, ESCROW]
+
+
+def _copy(scenario):
+    global_state, local_states, group, current_round = scenario
+    return (dict(global_state), {key: dict(value) for key, value in local_states.items()},
+            [dict(txn, apaa=list(txn.get("apaa", []))) for txn in group], current_round)
+
+
+def mutations(scenario):
+    """
+    Variants of a scenario, most of them rejected by the contract
+    :param scenario: (global_state, local_states, group, current_round)
+    :return: list of (label, scenario)
+    """
+    variants = []
+
+    def variant(label, change):
+        mutated = _copy(scenario)
+        if change(*mutated) is not False:
+            variants.append((label, mutated))
+
+    def set_global(key, value):
+        def change(global_state, local_states, group, current_round):
+            if not global_state:
+                return False
+            global_state[key] = value
+        return change
+
+    def set_sender(address):
+        def change(global_state, local_states, group, current_round):
+            group[0]["snd"] = address
+            for key in list(local_states):
+                local_states[(address, APP_ID)] = local_states.pop(key)
+        return change
+
+    for address in ADDRESSES:
+        variant("sender={}".format(address[0]), set_sender(address))
+    for state in range(5):
+        variant("state={}".format(state), set_global(b"delivery_state", state))
+    for capacity in CAPACITIES:
+        variant("capacity={}".format(capacity), set_global(b"delivery_capacity", capacity))
+    variant("max_capacity=0", set_global(b"max_capacity", 0))
+    variant("no_escrow", lambda g, l, group, r: False if not g else g.pop(b"escrow_address", None))
+    for current_round in ROUNDS:
+        variants.append(("round={}".format(current_round), scenario[:3] + (current_round,)))
+    for state, current_round in itertools.product(range(5), ROUNDS):
+        mutated = _copy(scenario)
+        if mutated[0]:
+            mutated[0][b"delivery_state"] = state
+            variants.append(("state={},round={}".format(state, current_round), mutated[:3] + (current_round,)))
+
+    # local state of the sender
+    variant("not_opted_in", lambda g, local_states, group, r: local_states.clear())
+    variant("local_empty", lambda g, local_states, group, r: local_states.update(
+        {(group[0]["snd"], APP_ID): {}}))
+    for booked in (0, 1, BOOKED, MAX_CAPACITY + 1):
+        variant("booked={}".format(booked), lambda g, local_states, group, r, booked=booked: local_states.update(
+            {(group[0]["snd"], APP_ID): {b"book_capacity": booked}}))
+
+    # payment of the group
+    def set_payment(field, value):
+        def change(global_state, local_states, group, current_round):
+            if len(group) < 2:
+                return False
+            group[1][field] = value
+        return change
+
+    for delta in (-1, 1):
+        variant("amount{:+d}".format(delta), lambda g, l, group, r, delta=delta: False if len(group) < 2
+                else group[1].update(amt=group[1]["amt"] + delta))
+    for address in ADDRESSES:
+        variant("receiver={}".format(address[0]), set_payment("rcv", address))
+        variant("payer={}".format(address[0]), set_payment("snd", address))
+        variant("close={}".format(address[0]), set_payment("close", address))
+    variant("no_close", lambda g, l, group, r: False if len(group) < 2 else group[1].pop("close", None))
+    variant("payment_as_appl", set_payment("type", "appl"))
+    variant("no_payment", lambda g, l, group, r: False if len(group) < 2 else group.pop())
+    variant("extra_payment", lambda g, l, group, r: group.append(payment(USER, ESCROW, 1)))
+    variant("extra_call", lambda g, l, group, r: group.append(dict(group[0])))
+
+    # arguments and on-completion of the call
+    variant("no_args", lambda g, l, group, r: group[0].update(apaa=[]))
+    variant("unknown_method", lambda g, l, group, r: False if not group[0]["apaa"]
+            else group[0]["apaa"].__setitem__(0, b"unknownMethod"))
+    variant("method_prefix", lambda g, l, group, r: False if not group[0]["apaa"]
+            else group[0]["apaa"].__setitem__(0, group[0]["apaa"][0][:-1]))
+    variant("extra_arg", lambda g, l, group, r: group[0]["apaa"].append(itob(1)))
+    variant("missing_arg", lambda g, l, group, r: False if not group[0]["apaa"] else group[0]["apaa"].pop())
+    for book_capacity in (0, BOOKED + 1, MAX_CAPACITY - BOOKED, MAX_CAPACITY - BOOKED + 1):
+        variant("book={}".format(book_capacity), lambda g, l, group, r, book_capacity=book_capacity:
+                False if group[0]["apaa"][:1] != [b"participateDelivery"]
+                else group[0]["apaa"].__setitem__(1, itob(book_capacity)))
+    for on_complete in range(6):
+        variant("on_complete={}".format(on_complete), lambda g, l, group, r, on_complete=on_complete:
+                group[0].update(apan=on_complete))
+    return variants
+
+
+def outcome(source, scenario):
+    result, ledger = teal_profiler.run_scenario(source, scenario)
+    if not result.passed:
+        return False, None, result.cost
+    return True, (ledger.globals[APP_ID], ledger.locals), result.cost
+
+
+def compare(reference: str, candidate: str, methods: [str] = None):
+    """
+    Run every case of the method scenarios on both programs
+    :param reference: approval program TEAL
+    :param candidate: approval program TEAL
+    :param methods: scenario names, all of them by default
+    :return: report dict, "mismatches" lists the cases the programs disagree on
+    """
+    report = {"cases": 0, "accepted": 0, "mismatches": [], "methods": {}}
+    for name, scenario in teal_profiler.scenarios().items():
+        if methods is not None and name not in methods:
+            continue
+        method = report["methods"][name] = {"cases": 0, "accepted": 0, "reference_cost": 0, "candidate_cost": 0}
+        for label, case in [("base", scenario)] + mutations(scenario):
+            expected_passed, expected_state, expected_cost = outcome(reference, case)
+            passed, state, cost = outcome(candidate, case)
+            method["cases"] += 1
+            if expected_passed != passed or expected_state != state:
+                report["mismatches"].append({"method": name, "case": label, "reference": expected_passed,
+                                             "candidate": passed})
+            elif passed:
+                method["accepted"] += 1
+                method["reference_cost"] += expected_cost
+                method["candidate_cost"] += cost
+        report["cases"] += method["cases"]
+        report["accepted"] += method["accepted"]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Differential check of two delivery approval programs")
+    parser.add_argument("--reference", default=teal_profiler.DEFAULT_CONTRACT, help="contract class, module:Class")
+    parser.add_argument("--candidate", default=OPTIMIZED_CONTRACT, help="contract class, module:Class")
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = compare(teal_profiler.approval_source(args.reference), teal_profiler.approval_source(args.candidate))
+    report = dict({"reference": args.reference, "candidate": args.candidate}, **report)
+
+    print("{:<22}{:>8}{:>10}{:>16}{:>16}".format("method", "cases", "accepted", "reference cost", "candidate cost"))
+    for name, method in report["methods"].items():
+        print("{:<22}{:>8}{:>10}{:>16}{:>16}".format(name, method["cases"], method["accepted"],
+                                                     method["reference_cost"], method["candidate_cost"]))
+    print("{} cases, {} accepted, {} mismatches".format(report["cases"], report["accepted"],
+                                                       len(report["mismatches"])))
+    for mismatch in report["mismatches"][:20]:
+        print("MISMATCH {method} [{case}]: reference={reference} candidate={candidate}".format(**mismatch))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 1 if report["mismatches"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# scaling benchmark of the multi-process fleet runner against the local stand-in node
+# usage: python -m benchmarks.fleet --workers 1 2 4 --deliveries 16 --participants 8 --latency 0.005
+import argparse
+import datetime
+import json
+import sys
+import time
+
+from algosdk import account
+from pyteal import Mode, compileTeal
+
+from constants import Constants
+from models.DeliveryFleet import DeliveryFleet
+from smart_contracts.contract_logistic_manager import LogisticManagerContract
+from utilities import stats
+from utilities.local_node import LocalNode
+
+
+def expected_program_hashes(node: LocalNode):
+    client = node.algod_client()
+    contract = LogisticManagerContract()
+    return [client.compile(compileTeal(program, mode=Mode.Application, version=5))["result"]
+            for program in (contract.approval_program(), contract.clear_program())]
+
+
+def run_fleet(node: LocalNode, workers: int, deliveries: int, participants: int, threads: int):
+    """
+    Create the deliveries, then book every participant, through a fleet of the given size
+    :return: report of the run
+    """
+    departure = datetime.datetime.now() + datetime.timedelta(days=1)
+    departure_date = departure.strftime('%Y-%m-%d %H:%M')
+    arrival_date = (departure + datetime.timedelta(days=1)).strftime('%Y-%m-%d %H:%M')
+    creators = [account.generate_account()[0] for _ in range(deliveries)]
+    users = [account.generate_account()[0] for _ in range(deliveries * participants)]
+
+    with DeliveryFleet(workers, node.algod_address, Constants.algod_token, threads,
+                       *expected_program_hashes(node)) as fleet:
+        start = time.perf_counter()
+        created = fleet.run([("create", creator_pk, "Benchmark", "Chennai", "Mumbai", departure_date, arrival_date,
+                              10, 10 * participants) for creator_pk in creators])
+        app_ids = [result.result for result in created if result.ok]
+        booked = fleet.run([("participate", app_ids[i % len(app_ids)], user_pk, "user", 10)
+                            for i, user_pk in enumerate(users)]) if app_ids else []
+        wall_time = time.perf_counter() - start
+        registry, locks = fleet.metrics()
+
+    results = created + booked
+    return {
+        "workers": workers,
+        "operations": len(results),
+        "failures": sum(1 for result in results if not result.ok),
+        "wall_time_s": round(wall_time, 3),
+        "ops_per_sec": round(len(results) / wall_time, 2),
+        "create": stats.summarize([result.latency for result in created]),
+        "participate": stats.summarize([result.latency for result in booked]),
+        "rpc_calls": sum(endpoint["calls"] for endpoint in registry.snapshot()["endpoints"].values()),
+        "locks": {key: value for key, value in locks.items() if key != "most_contended"},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fleet runner scaling benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="fleet sizes to compare")
+    parser.add_argument("--deliveries", type=int, default=16)
+    parser.add_argument("--participants", type=int, default=8, help="participants per delivery")
+    parser.add_argument("--threads", type=int, default=8, help="operations in flight per worker")
+    parser.add_argument("--latency", type=float, default=0.005, help="latency injected by the stand-in node (s)")
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for workers in args.workers:
+        with LocalNode(latency=args.latency) as node:
+            reports.append(run_fleet(node, workers, args.deliveries, args.participants, args.threads))
+    base = reports[0]["ops_per_sec"]
+    print("{:>8}{:>8}{:>10}{:>10}{:>10}{:>14}{:>10}".format("workers", "ops", "wall s", "ops/s", "speedup",
+                                                           "part p50 ms", "failed"))
+    for report in reports:
+        print("{:>8}{:>8}{:>10}{:>10}{:>10}{:>14}{:>10}".format(
+            report["workers"], report["operations"], report["wall_time_s"], report["ops_per_sec"],
+            "x{:.2f}".format(report["ops_per_sec"] / base) if base else "-", report["participate"]["p50_ms"],
+            report["failures"]))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"benchmark": "fleet", "runs": reports}, output_file, indent=2)
+    return 1 if any(report["failures"] for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
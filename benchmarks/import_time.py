@@ -0,0 +1,72 @@
+# import-time benchmark of the CLI entry points, with an enforceable budget
+# usage: python -m benchmarks.import_time --budget-ms 250 --runs 5 --output import_time.json
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from utilities import stats
+
+MODULES = ["main", "account", "test"]
+# heavy dependencies that must only be imported when a command needs them
+FORBIDDEN = ["numpy", "pyteal", "csv", "http.server"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, runs: int, forbidden):
+    """
+    Import a module in fresh interpreters and time it
+    :param module:
+    :param runs:
+    :param forbidden: modules reported if they got imported
+    :return: list of import times in seconds, forbidden modules loaded
+    """
+    times = []
+    loaded = set()
+    probe = _PROBE.format(module=module, forbidden=list(forbidden))
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True,
+                                cwd=os.getcwd()).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        loaded.update(result["loaded"])
+    return times, sorted(loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time of the CLI entry points")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if the median import time exceeds it")
+    parser.add_argument("--forbid", nargs="*", default=FORBIDDEN, help="fail if any of these modules is imported")
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = {"benchmark": "import_time", "budget_ms": args.budget_ms, "modules": {}}
+    failed = False
+    print("{:<12}{:>10}{:>10}{:>10}   {}".format("module", "p50 ms", "max ms", "budget", "forbidden imports"))
+    for module in args.modules:
+        times, loaded = measure(module, args.runs, args.forbid)
+        summary = stats.summarize(times)
+        over_budget = args.budget_ms is not None and summary["p50_ms"] > args.budget_ms
+        failed = failed or over_budget or bool(loaded)
+        report["modules"][module] = dict(summary, forbidden_loaded=loaded, over_budget=over_budget)
+        print("{:<12}{:>10}{:>10}{:>10}   {}".format(module, summary["p50_ms"], summary["max_ms"],
+                                                   "over" if over_budget else "ok", ", ".join(loaded) or "-"))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
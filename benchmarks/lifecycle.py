@@ -0,0 +1,261 @@
+# end-to-end throughput benchmark of the delivery lifecycle, driven through Delivery against the local stand-in node
+# usage: python -m benchmarks.lifecycle --deliveries 20 --participants 10 --cancels 2 --workers 4 --output results.json
+#        python -m benchmarks.lifecycle --multi   (deliveries hosted by one multi-delivery application)
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk import account
+from algosdk.v2client import algod
+from pyteal import Mode, compileTeal
+
+from constants import Constants
+from helpers import algo_helper
+from models.Delivery import Delivery
+from models.MultiDelivery import MultiDelivery
+from smart_contracts.contract_multi_delivery import MultiDeliveryContract
+from utilities import rpc_metrics, stats, utils
+from utilities.local_node import LocalNode
+
+STEPS = ["create", "initialize_escrow", "fund_escrow", "participate", "cancel_participation",
+         "start_delivery", "finish_delivery", "close_delivery"]
+
+
+class _CountingClient(algod.AlgodClient):
+    """
+    Algod client counting the requests it performs
+    """
+
+    def __init__(self, algod_token, algod_address):
+        super().__init__(algod_token, algod_address)
+        self.calls = 0
+
+    def algod_request(self, *args, **kwargs):
+        self.calls += 1
+        return super().algod_request(*args, **kwargs)
+
+
+class LifecycleBenchmark:
+    def __init__(self, node: LocalNode, deliveries: int, participants: int, cancels: int, workers: int,
+                 multi: bool = False):
+        self.node = node
+        self.multi = multi
+        self.host_app_id = None
+        self.manager_pk = None
+        self.deliveries = deliveries
+        self.participants = participants
+        self.cancels = min(cancels, participants)
+        self.workers = workers
+        self.latencies = defaultdict(list)
+        self.calls = defaultdict(int)
+        self.failures = defaultdict(int)
+        self.expected_hashes = self._expected_program_hashes()
+
+    def _expected_program_hashes(self):
+        """
+        Programs as compiled by the node, so check_program_hash stays in the measured path
+        :return:
+        """
+        client = self.node.algod_client()
+        # the contract Delivery deploys, as selected by the env
+        contract = (MultiDelivery if self.multi else Delivery)(algod_client=client).app_contract
+        hashes = []
+        for program in (contract.approval_program(), contract.clear_program()):
+            teal = compileTeal(program, mode=Mode.Application, version=5)
+            hashes.append(client.compile(teal)["result"])
+        return hashes
+
+    def _step(self, name, client, fn, *args):
+        calls_before = client.calls
+        start = time.perf_counter()
+        result = fn(*args)
+        self.latencies[name].append(time.perf_counter() - start)
+        self.calls[name] += client.calls - calls_before
+        if result is False:
+            self.failures[name] += 1
+        return result
+
+    def _new_delivery(self):
+        client = _CountingClient(Constants.algod_token, self.node.algod_address)
+        if self.multi:
+            delivery = MultiDelivery(algod_client=client, app_id=self.host_app_id)
+        else:
+            delivery = Delivery(algod_client=client)
+        delivery.approval_program_hash, delivery.clear_state_program_hash = self.expected_hashes
+        return delivery, client
+
+    def _book(self, departure: str, arrival: str, index: int):
+        delivery, client = self._new_delivery()
+        # only the manager creates the deliveries of a host application
+        creator_pk = self.manager_pk if self.multi else account.generate_account()[0]
+        app_id = self._step("create", client, delivery.create_app, creator_pk, "Benchmark {}".format(index),
+                            "Chennai", "Mumbai", departure, arrival, 10, 10 * self.participants + 10)
+        if not app_id:
+            return None
+        self._step("initialize_escrow", client, delivery.initialize_escrow, creator_pk)
+        self._step("fund_escrow", client, delivery.fund_escrow, creator_pk)
+        users = [account.generate_account()[0] for _ in range(self.participants)]
+        for user_pk in users:
+            self._step("participate", client, delivery.participate, user_pk, "user", 10)
+        for user_pk in users[:self.cancels]:
+            self._step("cancel_participation", client, delivery.cancel_participation, user_pk, "user")
+        return delivery, client, creator_pk
+
+    def _complete(self, booked):
+        delivery, client, creator_pk = booked
+        self._step("start_delivery", client, delivery.start_delivery, creator_pk)
+        self._step("finish_delivery", client, delivery.finish_delivery, creator_pk)
+        self._step("close_delivery", client, delivery.close_delivery, creator_pk, [])
+
+    def _dates(self):
+        # every submitted group produces a block on an instant node: leave enough rounds before departure
+        groups = self.deliveries * (4 + 2 * self.participants + self.cancels)
+        minutes = int(groups * Constants.block_speed / 60) + 3
+        now = datetime.datetime.now()
+        departure = now + datetime.timedelta(minutes=minutes)
+        arrival = departure + datetime.timedelta(minutes=minutes + 60)
+        return departure.strftime('%Y-%m-%d %H:%M'), arrival.strftime('%Y-%m-%d %H:%M')
+
+    def run(self):
+        departure, arrival = self._dates()
+        if self.multi:
+            # the host application is deployed once, before the measured deliveries
+            host = MultiDelivery(algod_client=self.node.algod_client())
+            self.manager_pk = account.generate_account()[0]
+            self.host_app_id = host.deploy(self.manager_pk)
+        self.node.reset_counts()
+        rpc_metrics.metrics.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            booked = [b for b in pool.map(lambda index: self._book(departure, arrival, index), range(self.deliveries))
+                      if b]
+
+        booking_time = time.perf_counter() - start
+
+        # move the chain past the departure round of every delivery before starting them (not measured)
+        ledger = self.node.ledger
+        departure_round = max((_global_uint(b[0], "departure_date_round") for b in booked), default=0)
+        ledger.advance(max(0, departure_round - ledger.last_round))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self._complete, booked))
+        wall_time = booking_time + time.perf_counter() - start
+        return wall_time
+
+
+def _global_uint(delivery, key):
+    if isinstance(delivery, MultiDelivery):
+        return delivery.read_delivery()[key]
+    state, _, _, _ = algo_helper.read_global_state(delivery.algod_client, delivery.app_id, False, False)
+    return state.get(key)
+
+
+def build_report(bench: LifecycleBenchmark, wall_time: float, peak_memory_kb, args):
+    steps = {}
+    total_ops = 0
+    total_calls = 0
+    for name in STEPS:
+        latencies = bench.latencies.get(name, [])
+        if not latencies:
+            continue
+        summary = stats.summarize(latencies)
+        summary["failures"] = bench.failures.get(name, 0)
+        summary["algod_calls_per_op"] = round(bench.calls[name] / len(latencies), 2)
+        steps[name] = summary
+        total_ops += len(latencies)
+        total_calls += bench.calls[name]
+
+    return {
+        "benchmark": "lifecycle",
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "config": {
+            "deliveries": args.deliveries,
+            "participants": args.participants,
+            "cancels": args.cancels,
+            "workers": args.workers,
+            "block_time": args.block_time,
+            "latency": args.latency,
+            "multi": args.multi,
+        },
+        "wall_time_s": round(wall_time, 3),
+        "operations": total_ops,
+        "ops_per_sec": round(total_ops / wall_time, 2) if wall_time else 0.0,
+        "algod_calls_per_op": round(total_calls / total_ops, 2) if total_ops else 0.0,
+        "peak_memory_kb": peak_memory_kb,
+        "steps": steps,
+        "rpc_per_operation": {name: op["rpc"] for name, op in rpc_metrics.metrics.snapshot()["operations"].items()},
+    }
+
+
+def print_report(report, baseline=None):
+    print("lifecycle: {} ops in {}s -> {} ops/s, {} algod calls/op, peak memory {} KB".format(
+        report["operations"], report["wall_time_s"], report["ops_per_sec"], report["algod_calls_per_op"],
+        report["peak_memory_kb"]))
+    print("{:<22}{:>8}{:>10}{:>10}{:>10}{:>12}{:>10}".format("step", "count", "p50 ms", "p99 ms", "mean ms",
+                                                          "calls/op", "failed"))
+    for name, step in report["steps"].items():
+        line = "{:<22}{:>8}{:>10}{:>10}{:>10}{:>12}{:>10}".format(
+            name, step["count"], step["p50_ms"], step["p99_ms"], step["mean_ms"], step["algod_calls_per_op"],
+            step["failures"])
+        if baseline and name in baseline.get("steps", {}) and baseline["steps"][name]["p50_ms"]:
+            line += "   p50 x{:.2f}".format(step["p50_ms"] / baseline["steps"][name]["p50_ms"])
+        print(line)
+    if baseline and baseline.get("ops_per_sec"):
+        print("throughput vs baseline: x{:.2f}".format(report["ops_per_sec"] / baseline["ops_per_sec"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delivery lifecycle throughput benchmark")
+    parser.add_argument("--deliveries", type=int, default=10)
+    parser.add_argument("--participants", type=int, default=5, help="participants per delivery")
+    parser.add_argument("--cancels", type=int, default=1, help="cancelled participations per delivery")
+    parser.add_argument("--workers", type=int, default=4, help="deliveries driven concurrently")
+    parser.add_argument("--block-time", type=float, default=0)
+    parser.add_argument("--latency", type=float, default=0, help="latency injected by the stand-in node (s)")
+    parser.add_argument("--multi", action="store_true",
+                        help="host the deliveries in one multi-delivery application (at most {})".format(
+                            MultiDeliveryContract.Constants.max_deliveries))
+    parser.add_argument("--trace-memory", action="store_true", help="measure peak memory with tracemalloc")
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    parser.add_argument("--baseline", default=None, help="JSON report of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    utils.configure_logging(quiet=True)
+    if args.trace_memory:
+        tracemalloc.start()
+    with LocalNode(block_time=args.block_time, latency=args.latency) as node:
+        bench = LifecycleBenchmark(node, args.deliveries, args.participants, args.cancels, args.workers, args.multi)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            wall_time = bench.run()
+
+    if args.trace_memory:
+        peak_memory_kb = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    else:
+        peak_memory_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    report = build_report(bench, wall_time, peak_memory_kb, args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 1 if any(step["failures"] for step in report["steps"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# client-side cost of a recorded session: a Delivery/IndexerHelper session is recorded once against the local
+# stand-in node, then replayed offline in fresh interpreters to compare CPU time and memory between versions
+# usage: python -m benchmarks.replay record --output session.rec --deliveries 3 --participants 5 --cancels 1
+#        python -m benchmarks.replay run session.rec --repeat 5 --output replay.json
+#        python -m benchmarks.replay run session.rec --baseline replay.json   (after a change)
+import argparse
+import base64
+import datetime
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from algosdk import account
+from algosdk.v2client import algod
+from nacl.signing import SigningKey
+
+from constants import Constants
+from helpers import algo_helper
+from models.Delivery import Delivery
+from models.IndexerManager import IndexerHelper
+from utilities import stats, utils
+from utilities.recorder import Recorder, Replayer
+
+# addresses of the clients, the replayed requests never reach them
+ALGOD_ADDRESS = "http://localhost:4001"
+INDEXER_ADDRESS = "http://localhost:8980"
+
+
+def seeded_key(name: str):
+    """
+    Private key derived from a name, so a replayed session signs the recorded transactions
+    :param name:
+    :return:
+    """
+    signing_key = SigningKey(hashlib.sha256(name.encode()).digest())
+    return base64.b64encode(bytes(signing_key) + bytes(signing_key.verify_key)).decode()
+
+
+def run_session(algod_address, indexer_address, deliveries, participants, cancels, advance=None):
+    """
+    Lifecycle of the deliveries then their discovery through the indexer
+    :param algod_address:
+    :param indexer_address:
+    :param deliveries:
+    :param participants: participants per delivery
+    :param cancels: cancelled participations per delivery
+    :param advance: called with the departure round before starting the deliveries, when recording
+    :return: number of failed operations
+    """
+    algod_client = algod.AlgodClient(Constants.algod_token, algod_address)
+    now = datetime.datetime.now()
+    departure = (now + datetime.timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M')
+    arrival = (now + datetime.timedelta(minutes=120)).strftime('%Y-%m-%d %H:%M')
+    failures = 0
+    booked = []
+    for index in range(deliveries):
+        creator_pk = seeded_key("creator-{}".format(index))
+        delivery = Delivery(algod_client=algod_client)
+        delivery.approval_program_hash = delivery.clear_state_program_hash = None
+        if not delivery.create_app(creator_pk, "Replay", "Chennai", "Mumbai", departure, arrival, 10,
+                                   10 * participants + 10):
+            failures += 1
+            continue
+        results = [delivery.initialize_escrow(creator_pk), delivery.fund_escrow(creator_pk)]
+        users = [seeded_key("user-{}-{}".format(index, position)) for position in range(participants)]
+        results += [delivery.participate(user_pk, "user", 10) for user_pk in users]
+        results += [delivery.cancel_participation(user_pk, "user") for user_pk in users[:cancels]]
+        failures += results.count(False)
+        booked.append((delivery, creator_pk))
+
+    if booked:
+        state, _, _, _ = algo_helper.read_global_state(algod_client, booked[-1][0].app_id, False, False)
+        if advance is not None:
+            advance(state["departure_date_round"])
+    for delivery, creator_pk in booked:
+        results = [delivery.start_delivery(creator_pk), delivery.finish_delivery(creator_pk),
+                   delivery.close_delivery(creator_pk, [])]
+        failures += results.count(False)
+
+    helper = IndexerHelper(indexer_address)
+    app_ids = helper.get_app_ids_from_transactions_note(Constants.transaction_note)
+    if app_ids:
+        helper.get_application_from_id(app_ids[-1])
+    return failures
+
+
+def record(args):
+    from utilities.local_node import LocalNode
+
+    metadata = {"deliveries": args.deliveries, "participants": args.participants, "cancels": args.cancels}
+    with LocalNode(latency=args.latency) as node:
+        for name in ["creator-{}".format(i) for i in range(args.deliveries)] + \
+                    ["user-{}-{}".format(i, p) for i in range(args.deliveries) for p in range(args.participants)]:
+            node.ledger.fund(account.address_from_private_key(seeded_key(name)), 10 ** 9)
+
+        def advance(departure_round):
+            node.ledger.advance(max(0, departure_round - node.ledger.last_round))
+
+        with Recorder(args.output, metadata) as recorder:
+            failures = run_session(node.algod_address, node.indexer_address, args.deliveries, args.participants,
+                                   args.cancels, advance)
+    print("recorded {} requests to {} ({} KB), {} failed operations".format(
+        recorder.entries, args.output, os.path.getsize(args.output) // 1024, failures))
+    return 1 if failures else 0
+
+
+def replay_once(args):
+    """
+    One replay in this interpreter, prints its measures as JSON
+    """
+    replayer = Replayer(args.recording, latency_scale=args.latency_scale)
+    metadata = replayer.metadata
+    if args.trace_memory:
+        tracemalloc.start()
+    with replayer:
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        failures = run_session(ALGOD_ADDRESS, INDEXER_ADDRESS, metadata["deliveries"], metadata["participants"],
+                               metadata["cancels"])
+        cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    result = dict(replayer.stats(), cpu_s=cpu, wall_s=wall, failures=failures)
+    if args.trace_memory:
+        result["peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    print(json.dumps(result))
+    return 0
+
+
+def _replay_process(recording, latency_scale, trace_memory=False):
+    command = [sys.executable, "-m", "benchmarks.replay", "once", recording, "--latency-scale", str(latency_scale)]
+    if trace_memory:
+        command.append("--trace-memory")
+    output = subprocess.run(command, check=True, capture_output=True, text=True, cwd=os.getcwd()).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(args):
+    latency_scale = 1.0 if args.original_latency else 0.0
+    runs = [_replay_process(args.recording, latency_scale) for _ in range(args.repeat)]
+    # allocations are traced in a separate run, tracing slows the measured ones down
+    memory = _replay_process(args.recording, latency_scale, trace_memory=True)
+    report = {
+        "benchmark": "replay",
+        "recording": os.path.basename(args.recording),
+        "latency": "original" if args.original_latency else "zero",
+        "cpu": stats.summarize([r["cpu_s"] for r in runs]),
+        "wall": stats.summarize([r["wall_s"] for r in runs]),
+        "peak_kb": memory["peak_kb"],
+        "requests": {key: runs[0][key] for key in ("recorded", "served", "endpoint_matches", "remaining")},
+        "failures": max(r["failures"] for r in runs),
+    }
+    print("replayed {served}/{recorded} requests ({endpoint_matches} matched by endpoint), {remaining} left".format(
+        **report["requests"]))
+    print("{:<10}{:>10}{:>10}{:>10}".format("", "p50 ms", "mean ms", "max ms"))
+    for name in ("cpu", "wall"):
+        print("{:<10}{:>10}{:>10}{:>10}".format(name, report[name]["p50_ms"], report[name]["mean_ms"],
+                                                report[name]["max_ms"]))
+    print("peak memory {} KB, {} failed operations".format(report["peak_kb"], report["failures"]))
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print("vs baseline: cpu x{:.2f}, peak memory x{:.2f}".format(
+            report["cpu"]["p50_ms"] / baseline["cpu"]["p50_ms"], report["peak_kb"] / baseline["peak_kb"]))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 1 if report["failures"] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record a session, then replay it offline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="record a session against the local stand-in node")
+    record_parser.add_argument("--output", default="session.rec")
+    record_parser.add_argument("--deliveries", type=int, default=3)
+    record_parser.add_argument("--participants", type=int, default=5, help="participants per delivery")
+    record_parser.add_argument("--cancels", type=int, default=1, help="cancelled participations per delivery")
+    record_parser.add_argument("--latency", type=float, default=0.002, help="latency injected by the node (s)")
+
+    run_parser = commands.add_parser("run", help="replay a recording in fresh interpreters")
+    run_parser.add_argument("recording")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--original-latency", action="store_true", help="wait the recorded latency")
+    run_parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    run_parser.add_argument("--baseline", default=None, help="JSON report of a previous run to compare with")
+
+    once_parser = commands.add_parser("once", help=argparse.SUPPRESS)
+    once_parser.add_argument("recording")
+    once_parser.add_argument("--latency-scale", type=float, default=0.0)
+    once_parser.add_argument("--trace-memory", action="store_true")
+
+    args = parser.parse_args(argv)
+    utils.configure_logging(quiet=True)
+    return {"record": record, "run": run, "once": replay_once}[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# throughput of the bulk signing pipeline: inline signing vs the process pool
+# usage: python -m benchmarks.signing --transactions 5000 --processes 4 --chunk-size 128
+import argparse
+import os
+import sys
+import time
+
+from algosdk import account
+from algosdk.future import transaction
+
+from models.SigningPool import SigningPool
+
+
+def build_groups(count: int):
+    """
+    Participation-like groups: an app call and a payment signed by the same account
+    :param count: number of transactions (two per group)
+    :return:
+    """
+    params = transaction.SuggestedParams(fee=1000, first=1000, last=2000, flat_fee=True, gen="sandnet-v1",
+                                         gh="SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=")
+    groups = []
+    for _ in range(count // 2):
+        private_key, address = account.generate_account()
+        call_txn = transaction.ApplicationNoOpTxn(address, params, 1,
+                                                  [b"participateDelivery", (10).to_bytes(8, "big")])
+        payment_txn = transaction.PaymentTxn(address, params, address, 100)
+        signer = SigningPool.key(private_key)
+        groups.append([(call_txn, signer), (payment_txn, signer)])
+    return groups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk signing throughput")
+    parser.add_argument("--transactions", type=int, default=4000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=128, help="groups per worker task")
+    args = parser.parse_args(argv)
+
+    groups = build_groups(args.transactions)
+    txns = 2 * len(groups)
+
+    start = time.perf_counter()
+    inline = SigningPool(processes=1).sign_groups(groups)
+    inline_time = time.perf_counter() - start
+
+    with SigningPool(processes=args.processes, chunk_size=args.chunk_size) as pool:
+        start = time.perf_counter()
+        pooled = pool.sign_groups(groups)
+        pool_time = time.perf_counter() - start
+
+    if pooled != inline:
+        print("signed bytes differ between inline and pooled signing")
+        return 1
+    print("inline: {} txns in {:.3f}s -> {:.0f} txns/s".format(txns, inline_time, txns / inline_time))
+    print("pool ({} processes): {} txns in {:.3f}s -> {:.0f} txns/s (x{:.2f})".format(
+        args.processes, txns, pool_time, txns / pool_time, inline_time / pool_time))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# opcode cost, program size and hottest lines of each method of the delivery approval program,
+# evaluated with the local TEAL evaluator, with a saved baseline to compare contract changes
+# usage: python -m benchmarks.teal_profiler --save-baseline teal_baseline.json
+#        python -m benchmarks.teal_profiler --baseline teal_baseline.json --max-regression 0
+import argparse
+import importlib
+import json
+import sys
+
+from pyteal import compileTeal, Mode
+
+from helpers import teal_emulator
+
+APP_ID = 1
+CREATOR = b"\x01" * 32
+USER = b"\x02" * 32
+ESCROW = b"\x03" * 32
+
+DEPARTURE_ROUND = 2000
+ARRIVAL_ROUND = 3000
+UNIT_COST = 10
+MAX_CAPACITY = 100
+BOOKED = 20
+
+DEFAULT_CONTRACT = "smart_contracts.contract_logistic_manager:LogisticManagerContract"
+
+
+class ScenarioLedger:
+    """
+    State of one delivery app, as the evaluator reads it
+    """
+
+    def __init__(self, global_state, local_states=None, balances=None):
+        self.globals = {APP_ID: global_state}
+        self.locals = local_states or {}
+        self.balances = balances or {}
+
+    def global_state(self, app_id):
+        return self.globals.get(app_id)
+
+    def local_state(self, address, app_id):
+        return self.locals.get((address, app_id))
+
+    def balance(self, address):
+        return self.balances.get(address, 0)
+
+    def app_creator(self, app_id):
+        return CREATOR
+
+
+def delivery_state(state: int, capacity: int = MAX_CAPACITY - BOOKED, escrow: bool = True):
+    """
+    Global state of a delivery, keyed by bytes like the AVM sees it
+    """
+    global_state = {
+        b"creator": CREATOR,
+        b"creator_name": b"Creator",
+        b"departure_address": b"Chennai",
+        b"arrival_address": b"Mumbai",
+        b"departure_date": b"2022-05-01 10:00",
+        b"departure_date_round": DEPARTURE_ROUND,
+        b"arrival_date": b"2022-05-02 10:00",
+        b"arrival_date_round": ARRIVAL_ROUND,
+        b"delivery_unit_cost": UNIT_COST,
+        b"max_capacity": MAX_CAPACITY,
+        b"delivery_capacity": capacity,
+        b"delivery_state": state,
+    }
+    if escrow:
+        global_state[b"escrow_address"] = ESCROW
+    return global_state
+
+
+def app_call(sender, args, on_complete=0, app_id=APP_ID, accounts=None):
+    txn = {"type": "appl", "snd": sender, "apid": app_id, "apaa": list(args), "fee": 1000, "fv": 1, "lv": 1001}
+    if on_complete:
+        txn["apan"] = on_complete
+    if accounts:
+        txn["apat"] = list(accounts)
+    return txn
+
+
+def payment(sender, receiver, amount, close=None):
+    txn = {"type": "pay", "snd": sender, "rcv": receiver, "amt": amount, "fee": 1000, "fv": 1, "lv": 1001}
+    if close:
+        txn["close"] = close
+    return txn
+
+
+def itob(value):
+    return value.to_bytes(8, "big")
+
+
+def scenarios():
+    """
+    One accepted call of every branch of the approval program
+    :return: {name: (global_state, local_states, group, current_round)}
+    """
+    booked_user = {(USER, APP_ID): {b"book_capacity": BOOKED}}
+    opted_in_user = {(USER, APP_ID): {}}
+    create_args = [b"Creator", b"Chennai", b"Mumbai", b"2022-05-01 10:00", itob(DEPARTURE_ROUND),
+                   b"2022-05-02 10:00", itob(ARRIVAL_ROUND), itob(UNIT_COST), itob(MAX_CAPACITY)]
+    return {
+        "create": ({}, {}, [app_call(CREATOR, create_args, app_id=0)], 1500),
+        "initializeEscrow": (delivery_state(0, MAX_CAPACITY, escrow=False), {},
+                             [app_call(CREATOR, [b"initializeEscrow", ESCROW])], 1500),
+        "fundEscrow": (delivery_state(1, MAX_CAPACITY), {},
+                       [app_call(CREATOR, [b"fundEscrow"]), payment(CREATOR, ESCROW, 1000000)], 1500),
+        "updateDelivery": (delivery_state(2, MAX_CAPACITY), {},
+                           [app_call(CREATOR, [b"updateDelivery"] + create_args)], 1500),
+        "optIn": (delivery_state(2), {}, [app_call(USER, [], on_complete=1)], 1500),
+        "participateDelivery": (delivery_state(2), opted_in_user,
+                                [app_call(USER, [b"participateDelivery", itob(BOOKED)]),
+                                 payment(USER, ESCROW, UNIT_COST * BOOKED)], 1500),
+        "cancelParticipation": (delivery_state(2), booked_user,
+                                [app_call(USER, [b"cancelParticipation"]),
+                                 payment(ESCROW, USER, UNIT_COST * BOOKED)], 1500),
+        "startDelivery": (delivery_state(2), {}, [app_call(CREATOR, [b"startDelivery"])], DEPARTURE_ROUND),
+        "finishDelivery": (delivery_state(3), {},
+                           [app_call(CREATOR, [b"finishDelivery"]),
+                            payment(ESCROW, CREATOR, UNIT_COST * BOOKED, close=CREATOR)],
+                           2500),
+        "cancelDelivery": (delivery_state(2), {}, [app_call(CREATOR, [b"cancelDelivery"])], 1500),
+        "refundParticipant": (delivery_state(5), booked_user,
+                              [app_call(CREATOR, [b"refundParticipant"], accounts=[USER]),
+                               payment(ESCROW, USER, UNIT_COST * BOOKED)], 1500),
+        "reclaimEscrow": (delivery_state(5, MAX_CAPACITY), {},
+                          [app_call(CREATOR, [b"reclaimEscrow"]), payment(ESCROW, CREATOR, 0, close=CREATOR)], 1500),
+        "updateApplication": (delivery_state(2, MAX_CAPACITY), {}, [app_call(CREATOR, [], on_complete=4)], 1500),
+        "deleteApplication": (delivery_state(4), {}, [app_call(CREATOR, [], on_complete=5)], 2500),
+    }
+
+
+def run_scenario(source, scenario, profile=False):
+    """
+    Evaluate the app call of a scenario on a copy of its state
+    :param source: approval program TEAL
+    :param scenario: (global_state, local_states, group, current_round)
+    :param profile:
+    :return: EvalResult, ledger after the evaluation
+    """
+    global_state, local_states, group, current_round = scenario
+    ledger = ScenarioLedger(dict(global_state), {key: dict(value) for key, value in local_states.items()})
+    context = teal_emulator.EvalContext(group, 0, ledger, current_round, app_id=APP_ID)
+    return teal_emulator.evaluate(source, context, profile=profile, max_cost=20000), ledger
+
+
+def approval_source(contract_spec: str = DEFAULT_CONTRACT, version: int = 5):
+    """
+    Compile the approval program of a contract class
+    :param contract_spec: module:Class
+    :param version: TEAL version
+    :return:
+    """
+    module_name, class_name = contract_spec.split(":")
+    contract = getattr(importlib.import_module(module_name), class_name)()
+    return compileTeal(contract.approval_program(), mode=Mode.Application, version=version)
+
+
+def profile(source: str, top: int = 5):
+    """
+    Cost, instructions executed and hottest lines of every scenario
+    :param source:
+    :param top: hottest lines reported per method
+    :return:
+    """
+    lines = teal_emulator.parse_program(source).lines
+    methods = {}
+    for name, scenario in scenarios().items():
+        result, _ = run_scenario(source, scenario, profile=True)
+        # straight-line code runs each line once: the same instruction repeated on many lines is what costs
+        hot_lines = {}
+        for line, hits in result.line_hits.items():
+            hot_line = hot_lines.setdefault(lines[line].strip(), {"source": lines[line].strip(), "hits": 0,
+                                                                  "lines": []})
+            hot_line["hits"] += hits
+            hot_line["lines"].append(line)
+        methods[name] = {
+            "passed": result.passed,
+            "error": result.error,
+            "cost": result.cost,
+            "instructions": sum(result.line_hits.values()),
+            "hot_lines": sorted(hot_lines.values(), key=lambda hot_line: -hot_line["hits"])[:top],
+        }
+    return {"size": teal_emulator.program_size(source), "lines": len(lines), "methods": methods}
+
+
+def compare(report, baseline):
+    """
+    Cost and size changes against a baseline, in percent
+    :param report:
+    :param baseline:
+    :return:
+    """
+    def change(new, old):
+        return round((new - old) * 100.0 / old, 2) if old else 0.0
+
+    return {
+        "size": change(report["size"], baseline["size"]),
+        "methods": {name: change(method["cost"], baseline["methods"][name]["cost"])
+                    for name, method in report["methods"].items() if name in baseline["methods"]},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Opcode cost and size profile of the delivery approval program")
+    parser.add_argument("--contract", default=DEFAULT_CONTRACT, help="contract class, module:Class")
+    parser.add_argument("--top", type=int, default=5, help="hottest lines reported per method")
+    parser.add_argument("--save-baseline", default=None, help="write the profile to this file")
+    parser.add_argument("--baseline", default=None, help="compare with a saved profile")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="fail if the cost of a method or the size grows by more than this percentage")
+    parser.add_argument("--output", default=None, help="write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    source = approval_source(args.contract)
+    report = dict(profile(source, args.top), contract=args.contract)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        report["changes"] = compare(report, baseline)
+
+    print("{}: {} bytes (estimated), {} lines".format(args.contract, report["size"], report["lines"]))
+    print("{:<22}{:>8}{:>8}{:>14}   {}".format("method", "passed", "cost", "vs baseline", "hottest lines"))
+    for name, method in report["methods"].items():
+        delta = "{:+.2f}%".format(report["changes"]["methods"][name]) \
+            if baseline and name in report["changes"]["methods"] else "-"
+        hottest = ", ".join("{} x{}".format(hot["source"], hot["hits"]) for hot in method["hot_lines"][:3])
+        print("{:<22}{:>8}{:>8}{:>14}   {}".format(name, str(method["passed"]), method["cost"], delta, hottest))
+    if baseline:
+        print("size vs baseline: {:+.2f}%".format(report["changes"]["size"]))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    failed = not all(method["passed"] for method in report["methods"].values())
+    if baseline and args.max_regression is not None:
+        changes = list(report["changes"]["methods"].values()) + [report["changes"]["size"]]
+        failed = failed or any(change > args.max_regression for change in changes)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
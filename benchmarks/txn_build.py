@@ -0,0 +1,101 @@
+# build time and allocations per transaction of refund-like groups (app call + payment):
+# ApplicationManager helpers vs the algosdk constructors vs TransactionTemplates
+# usage: python -m benchmarks.txn_build --transactions 20000 --repeat 5
+import argparse
+import sys
+import time
+import tracemalloc
+
+from algosdk import account, encoding
+from algosdk.future import transaction
+
+from models.ApplicationManager import ApplicationManager
+from models.TransactionTemplates import TransactionTemplates
+from utilities import utils
+
+APP_ID = 1
+METHOD = "refundParticipant"
+
+
+def suggested_params():
+    return transaction.SuggestedParams(fee=1000, first=1000, last=2000, flat_fee=True, gen="sandnet-v1",
+                                       gh="SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=")
+
+
+def build_application_manager(sender, escrow, participants, params):
+    txns = []
+    for participant in participants:
+        txns.append(ApplicationManager.call_app(None, sender, APP_ID, [METHOD], accounts=[participant], sp=params))
+        txns.append(ApplicationManager.payment(None, escrow, participant, 70, sp=params))
+    return txns
+
+
+def build_constructors(sender, escrow, participants, params):
+    txns = []
+    for participant in participants:
+        txns.append(transaction.ApplicationNoOpTxn(sender, params, APP_ID, [METHOD], accounts=[participant]))
+        txns.append(transaction.PaymentTxn(escrow, params, participant, 70))
+    return txns
+
+
+def build_templates(sender, escrow, participants, params):
+    templates = TransactionTemplates(APP_ID, params)
+    txns = []
+    for participant in participants:
+        txns.append(templates.call_app(sender, METHOD, accounts=[participant]))
+        txns.append(templates.payment(escrow, participant, 70))
+    return txns
+
+
+BUILDERS = (("application_manager", build_application_manager),
+            ("constructors", build_constructors),
+            ("templates", build_templates))
+
+
+def measure(build, args, repeat):
+    """
+    :return: best time per transaction (us), allocated bytes per transaction
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        txns = build(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    txns = build(*args)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return best / len(txns) * 1e6, allocated / len(txns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transaction build time per transaction")
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    utils.configure_logging(quiet=True)
+    sender = account.generate_account()[1]
+    escrow = account.generate_account()[1]
+    participants = [account.generate_account()[1] for _ in range(max(1, args.transactions // 2))]
+    params = suggested_params()
+    build_args = (sender, escrow, participants, params)
+
+    reference = [encoding.msgpack_encode(txn) for txn in build_constructors(sender, escrow, participants[:8], params)]
+    for name, build in BUILDERS:
+        if [encoding.msgpack_encode(txn) for txn in build(sender, escrow, participants[:8], params)] != reference:
+            print("{} builds different transactions".format(name))
+            return 1
+
+    baseline = None
+    print("{:<22}{:>12}{:>16}{:>10}".format("builder", "us/txn", "bytes/txn", "speedup"))
+    for name, build in BUILDERS:
+        per_txn, allocated = measure(build, build_args, args.repeat)
+        baseline = baseline or per_txn
+        print("{:<22}{:>12.2f}{:>16.0f}{:>10.2f}".format(name, per_txn, allocated, baseline / per_txn))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
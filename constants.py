@@ -1,7 +1,5 @@
 import os
 
-from dotenv import load_dotenv
-
 
 # constants file
 def read_test_users(filename):
@@ -22,17 +20,44 @@ def read_test_users(filename):
     return accounts
 
 
+_dotenv_loaded = False
+
+
 def get_env(key):
-    load_dotenv()
+    """
+    Read a variable from the environment, the .env file is loaded on the first lookup only
+    :param key:
+    :return:
+    """
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
     return os.getenv(key)
 
 
+class LazyAccounts:
+    """
+    Descriptor reading an accounts file on first access, so importing constants does not parse CSV files
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.accounts = None
+
+    def __get__(self, instance, owner):
+        if self.accounts is None:
+            self.accounts = read_test_users(self.filename)
+        return self.accounts
+
+
 class Constants:
     # Generated accounts for testing on sandbox
     # sandbox testnet accounts
-    testnet_accounts = read_test_users("assets/testnet_accounts.csv")
+    testnet_accounts = LazyAccounts("assets/testnet_accounts.csv")
     # sandbox dev accounts
-    # dev_accounts = read_test_users("assets/accounts.csv")
+    # dev_accounts = LazyAccounts("assets/accounts.csv")
 
     # set which accounts to use and creator account
     accounts = testnet_accounts
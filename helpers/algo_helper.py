@@ -1,11 +1,12 @@
 # helpers for algorand-related actions
 import base64
-from datetime import datetime
 
 from algosdk import mnemonic, account, encoding
 
-from constants import Constants
 from utilities import utils
+from utilities.tracing import annotate, traced
+
+log = utils.get_logger(__name__)
 
 
 def intToBytes(value):
@@ -36,6 +37,7 @@ def BytesToAddress(value: bytes):
     return encoding.encode_address(decoded_address)
 
 
+@traced()
 def compile_program(client, source_code):
     """
     helper function to compile program source
@@ -79,60 +81,154 @@ def get_address_from_private_key(private_key):
 
 def format_state(state):
     """
-    helper function that formats global state for printing
+    helper function that formats global state for printing.
+    Packed delivery states are expanded to the keys of LogisticManagerContract
     :param state:
     :return:
     """
     formatted = {}
-    for item in state:
-        key = item['key']
-        value = item['value']
-        formatted_key = base64.b64decode(key).decode('utf-8')
-        if value['type'] == 1:
+    for key, value in unpack_delivery_state(decode_raw_state(state)).items():
+        formatted_key = key.decode('utf-8')
+        if isinstance(value, bytes):
             # byte string
             try:
-                formatted_value = BytesToString(value['bytes'])
-            except Exception:
-                formatted_value = value['bytes']
-            formatted[formatted_key] = formatted_value
+                formatted[formatted_key] = value.decode('utf-8')
+            except UnicodeDecodeError:
+                formatted[formatted_key] = base64.b64encode(value).decode()
         else:
             # integer
-            formatted[formatted_key] = value['uint']
+            formatted[formatted_key] = value
     return formatted
 
 
-def read_local_state(client, addr, app_id=None, show=True):
+def decode_raw_state(state):
+    """
+    helper function that decodes a state without assuming readable keys
+    :param state: key-value list as returned by algod
+    :return: {bytes key: int or bytes}
+    """
+    output = {}
+    for item in state:
+        value = item['value']
+        output[base64.b64decode(item['key'])] = value['uint'] if value['type'] == 2 \
+            else base64.b64decode(value['bytes'])
+    return output
+
+
+# fixed-width record of a delivery (packed single delivery and multi-delivery apps): (name, offset, size),
+# uints are 8 bytes big-endian
+DELIVERY_RECORD_LAYOUT = (
+    ("creator", 0, 32),
+    ("departure_date_round", 32, 8),
+    ("arrival_date_round", 40, 8),
+    ("delivery_unit_cost", 48, 8),
+    ("max_capacity", 56, 8),
+    ("delivery_state", 64, 8),
+    ("delivery_capacity", 72, 8),
+)
+DELIVERY_RECORD_SIZE = 80
+# separator of the text fields of a delivery (creator name, addresses, dates)
+DELIVERY_INFO_SEPARATOR = b"\x1f"
+DELIVERY_INFO_FIELDS = ("creator_name", "departure_address", "arrival_address", "departure_date", "arrival_date")
+
+# keys of the packed single delivery layout (PackedLogisticManagerContract), dates are stored as rounds only
+PACKED_RECORD_KEY = b"r"
+PACKED_ESCROW_KEY = b"e"
+PACKED_INFO_KEY = b"i"
+PACKED_BOOK_CAPACITY_KEY = b"b"
+PACKED_INFO_FIELDS = ("creator_name", "departure_address", "arrival_address")
+
+
+def unpack_delivery_record(record: bytes):
+    """
+    helper function that splits a delivery record into its fields
+    :param record: DELIVERY_RECORD_LAYOUT bytes
+    :return: {name: int, creator: bytes}
+    """
+    output = {}
+    for name, offset, size in DELIVERY_RECORD_LAYOUT:
+        value = record[offset:offset + size]
+        output[name] = value if name == "creator" else int.from_bytes(value, "big")
+    return output
+
+
+def _info_fields(info: bytes, names):
+    return zip(names, (field.decode('utf-8', 'replace') for field in info.split(DELIVERY_INFO_SEPARATOR)))
+
+
+def decode_delivery_record(record: bytes, info: bytes = None):
+    """
+    helper function that decodes a delivery record of a multi-delivery app
+    :param record: DELIVERY_RECORD_LAYOUT bytes
+    :param info: text fields joined by DELIVERY_INFO_SEPARATOR
+    :return: dict with the keys of the single delivery global state
+    """
+    output = unpack_delivery_record(record)
+    output['creator'] = encoding.encode_address(output['creator'])
+    if info is not None:
+        output.update(_info_fields(info, DELIVERY_INFO_FIELDS))
+    return output
+
+
+def unpack_delivery_state(state):
+    """
+    helper function that expands a packed delivery state (global or local) to the keys of LogisticManagerContract,
+    other states are returned as they are
+    :param state: {bytes key: int or bytes}
+    :return: {bytes key: int or bytes}
+    """
+    if PACKED_RECORD_KEY not in state and PACKED_BOOK_CAPACITY_KEY not in state:
+        return state
+    output = {}
+    for key, value in state.items():
+        if key == PACKED_RECORD_KEY:
+            output.update((name.encode(), field) for name, field in unpack_delivery_record(value).items())
+        elif key == PACKED_INFO_KEY:
+            output.update((name.encode(), field.encode()) for name, field in _info_fields(value, PACKED_INFO_FIELDS))
+        elif key == PACKED_ESCROW_KEY:
+            output[b"escrow_address"] = value
+        elif key == PACKED_BOOK_CAPACITY_KEY:
+            output[b"book_capacity"] = value
+        else:
+            output[key] = value
+    return output
+
+
+@traced()
+def read_local_state(client, addr, app_id=None, show=True, account_info=None):
     """
     helper function to read local state of application from user account
     :param client:
     :param addr:
     :param app_id:
     :param show:
+    :param account_info: account_info response already read, fetched otherwise
     :return:
     """
-    results = client.account_info(addr)
+    results = account_info if account_info is not None else client.account_info(addr)
     for local_state in results["apps-local-state"]:
         if local_state["id"] == app_id:
             if "key-value" not in local_state:
                 return None
             output = format_state(local_state["key-value"])
             if show:
-                utils.console_log("Local State:", 'blue')
-                print(output)
+                log.info("Local State of %s: %s", addr, output, extra={"app_id": app_id})
             return output
     return None
 
 
-def read_global_state(client, app_id, to_array=True, show=True):
+@traced()
+def read_global_state(client, app_id, to_array=True, show=True, app_info=None):
     """
     helper function to read app global state
     :param client:
     :param app_id:
     :param show:
     :param to_array:
+    :param app_info: application_info response already read, fetched otherwise
     :return:
     """
-    results = client.application_info(app_id)
+    results = app_info if app_info is not None else client.application_info(app_id)
     global_state = results['params']['global-state'] if "global-state" in results['params'] else []
     creator = results['params']['creator'] if "creator" in results['params'] else None
     approval_program = results['params']['approval-program'] if "approval-program" in results['params'] else None
@@ -143,11 +239,11 @@ def read_global_state(client, app_id, to_array=True, show=True):
         output = utils.toArray(output)
 
     if show:
-        utils.console_log("Global State:", 'blue')
-        print(output)
+        log.info("Global State: %s", output, extra={"app_id": app_id})
     return output, creator, approval_program, clear_state_program
 
 
+@traced()
 def wait_for_confirmation(client, txid):
     """
     helper function that waits for a given txid to be confirmed by the network
@@ -158,35 +254,36 @@ def wait_for_confirmation(client, txid):
     last_round = client.status().get("last-round")
     txinfo = client.pending_transaction_info(txid)
     while not (txinfo.get("confirmed-round") and txinfo.get("confirmed-round") > 0):
-        print("Waiting for confirmation...")
+        log.debug("Waiting for confirmation of %s (round %s)", txid, last_round)
         last_round += 1
         client.status_after_block(last_round)
         txinfo = client.pending_transaction_info(txid)
-    print(
-        "Transaction {} confirmed in round {}.".format(
-            txid, txinfo.get("confirmed-round")
-        )
-    )
+    log.info("Transaction %s confirmed in round %s.", txid, txinfo.get("confirmed-round"),
+             extra={"txid": txid, "round": txinfo.get("confirmed-round")})
     return txinfo
 
 
+@traced()
 def datetime_to_rounds(algod_client, given_date):
     """
-    Get the first valid round from a datetime
+    Get the first valid round from a datetime, estimated from the block time of recent blocks
     :param algod_client:
     :param given_date:
+    :return: 0 for a date in the past
+    """
+    from models.RoundClock import RoundClock
+    return RoundClock.for_client(algod_client).to_round(given_date)
+
+
+def datetimes_to_rounds(algod_client, given_dates):
+    """
+    Get the first valid rounds of a batch of datetimes
+    :param algod_client:
+    :param given_dates:
     :return:
     """
-    status = algod_client.status()
-    now = datetime.now()
-    current_time = datetime.strptime(now.strftime('%Y-%m-%d %H:%M'), '%Y-%m-%d %H:%M')
-    given_date = datetime.strptime(given_date, '%Y-%m-%d %H:%M')
-    difference_seconds = given_date.timestamp() - current_time.timestamp()
-    if difference_seconds < 0:
-        return 0
-    n_blocks_produced = difference_seconds / Constants.block_speed
-    first_valid_round = status["last-round"] + n_blocks_produced
-    return round(first_valid_round)
+    from models.RoundClock import RoundClock
+    return [estimate.value for estimate in RoundClock.for_client(algod_client).to_rounds(given_dates)]
 
 
 def get_transaction_id(txn, is_signed: bool = True, show: bool = True):
@@ -202,7 +299,8 @@ def get_transaction_id(txn, is_signed: bool = True, show: bool = True):
     else:
         tx_id = txn.get_txid()
 
+    annotate(txid=tx_id)
     if show:
-        print("TXID: ", tx_id)
+        log.info("TXID: %s", tx_id, extra={"txid": tx_id})
 
     return tx_id
\ No newline at end of file
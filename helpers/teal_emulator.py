@@ -0,0 +1,820 @@
+# local evaluator for the TEAL programs generated by PyTeal
+# it runs the assembly source directly, so any contract compiled with compileTeal can be executed
+# without an algod node (used by the local stand-in node, pre-flight checks and profiling)
+import base64
+import hashlib
+import json
+import os
+from collections import Counter
+
+from algosdk import constants as algo_constants
+from algosdk import encoding
+
+MAX_UINT64 = 2 ** 64 - 1
+ZERO_ADDRESS = bytes(32)
+
+TYPE_ENUMS = {"pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6}
+
+NAMED_INTS = dict(TYPE_ENUMS, **{
+    "unknown": 0,
+    "NoOp": 0,
+    "OptIn": 1,
+    "CloseOut": 2,
+    "ClearState": 3,
+    "UpdateApplication": 4,
+    "DeleteApplication": 5,
+})
+
+# transaction field name -> msgpack key of the encoded transaction
+TXN_FIELDS = {
+    "Sender": "snd",
+    "Fee": "fee",
+    "FirstValid": "fv",
+    "LastValid": "lv",
+    "Note": "note",
+    "Lease": "lx",
+    "Receiver": "rcv",
+    "Amount": "amt",
+    "CloseRemainderTo": "close",
+    "ApplicationID": "apid",
+    "OnCompletion": "apan",
+    "ApprovalProgram": "apap",
+    "ClearStateProgram": "apsu",
+    "RekeyTo": "rekey",
+}
+
+ADDRESS_FIELDS = {"Sender", "Receiver", "CloseRemainderTo", "RekeyTo"}
+BYTES_FIELDS = ADDRESS_FIELDS | {"Note", "Lease", "ApprovalProgram", "ClearStateProgram"}
+
+
+class TealError(Exception):
+    """
+    Raised when a program fails or rejects
+    """
+
+
+def _strip_comment(line: str) -> str:
+    """
+    Drop a trailing // comment, ignoring the ones inside string literals
+    :param line:
+    :return:
+    """
+    in_string = escaped = False
+    for position, char in enumerate(line):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif line.startswith("//", position):
+            return line[:position]
+    return line
+
+
+class TealProgram:
+    """
+    Parsed TEAL assembly: a list of (op, immediates, line number) and a label table
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.version = 1
+        self.instructions = []
+        self.labels = {}
+        self._parse()
+
+    def _parse(self):
+        for line_no, raw_line in enumerate(self.source.splitlines(), start=1):
+            line = (raw_line.split("//", 1)[0] if '"' not in raw_line else _strip_comment(raw_line)).strip()
+            if not line:
+                continue
+            if line.startswith("#pragma version"):
+                self.version = int(line.split()[-1])
+                continue
+            if line.endswith(":") and " " not in line:
+                self.labels[line[:-1]] = len(self.instructions)
+                continue
+            op, _, rest = line.partition(" ")
+            self.instructions.append((op, rest.strip(), line_no))
+
+    @property
+    def lines(self):
+        """
+        Source lines indexed by line number
+        :return:
+        """
+        return dict(enumerate(self.source.splitlines(), start=1))
+
+
+_program_cache = {}
+_opcode_costs = None
+_opcode_sizes = None
+
+
+def parse_program(source: str) -> TealProgram:
+    """
+    Parse a TEAL source once and cache it
+    :param source:
+    :return:
+    """
+    program = _program_cache.get(source)
+    if program is None:
+        program = TealProgram(source)
+        _program_cache[source] = program
+    return program
+
+
+def _load_langspec():
+    global _opcode_costs, _opcode_sizes
+    langspec = os.path.join(os.path.dirname(algo_constants.__file__), "data", "langspec.json")
+    with open(langspec) as spec_file:
+        ops = json.load(spec_file)["Ops"]
+    _opcode_costs = {op["Name"]: op["Cost"] for op in ops}
+    _opcode_sizes = {op["Name"]: op["Size"] for op in ops}
+
+
+def opcode_costs():
+    """
+    Opcode costs as published in the SDK language spec
+    :return:
+    """
+    if _opcode_costs is None:
+        _load_langspec()
+    return _opcode_costs
+
+
+def opcode_sizes():
+    """
+    Encoded opcode sizes (with immediates) as published in the SDK language spec, 0 for variable sizes
+    :return:
+    """
+    if _opcode_sizes is None:
+        _load_langspec()
+    return _opcode_sizes
+
+
+def _varuint_size(value: int) -> int:
+    size = 1
+    while value >= 0x80:
+        value >>= 7
+        size += 1
+    return size
+
+
+def program_size(source: str) -> int:
+    """
+    Size of the assembled program, estimated the way goal assembles it: int and byte constants are
+    stored once in intcblock/bytecblock (most used first) and referenced by index
+    :param source:
+    :return: bytes
+    """
+    program = parse_program(source)
+    sizes = opcode_sizes()
+    ints = Counter()
+    byte_constants = Counter()
+    size = 1  # version
+    for op, imm, _ in program.instructions:
+        if op == "int":
+            ints[parse_int_literal(imm)] += 1
+        elif op == "byte":
+            byte_constants[parse_bytes_literal(imm)] += 1
+        elif op == "addr":
+            byte_constants[encoding.decode_address(imm)] += 1
+        elif op == "pushint":
+            size += 1 + _varuint_size(parse_int_literal(imm))
+        elif op == "pushbytes":
+            value = parse_bytes_literal(imm)
+            size += 1 + _varuint_size(len(value)) + len(value)
+        else:
+            size += sizes.get(op) or 1
+    for constants, encoded_size in ((ints, _varuint_size),
+                                    (byte_constants, lambda value: _varuint_size(len(value)) + len(value))):
+        if not constants:
+            continue
+        size += 1 + _varuint_size(len(constants)) + sum(encoded_size(value) for value in constants)
+        # intc_0..intc_3 / bytec_0..bytec_3 take one byte, the other references two
+        for index, (_, count) in enumerate(constants.most_common()):
+            size += count * (1 if index < 4 else 2)
+    return size
+
+
+def parse_bytes_literal(literal: str) -> bytes:
+    """
+    Decode a TEAL byte constant: "string", 0xHEX, base64 X, b64(X), base32 X
+    :param literal:
+    :return:
+    """
+    literal = literal.strip()
+    if literal.startswith('"'):
+        return literal[1:-1].encode("utf-8").decode("unicode_escape").encode("latin-1")
+    if literal.startswith("0x"):
+        return bytes.fromhex(literal[2:])
+    if literal.startswith(("base64 ", "b64 ")):
+        return base64.b64decode(literal.split(" ", 1)[1])
+    if literal.startswith(("base64(", "b64(")):
+        return base64.b64decode(literal[literal.index("(") + 1:-1])
+    if literal.startswith(("base32 ", "b32 ")):
+        value = literal.split(" ", 1)[1]
+        return base64.b32decode(value + "=" * (-len(value) % 8))
+    raise TealError("unsupported byte constant: {}".format(literal))
+
+
+def parse_int_literal(literal: str) -> int:
+    """
+    Decode a TEAL int constant, including named constants (OptIn, pay, ...)
+    :param literal:
+    :return:
+    """
+    if literal in NAMED_INTS:
+        return NAMED_INTS[literal]
+    return int(literal, 0)
+
+
+def program_address(program: bytes) -> str:
+    """
+    Address of a LogicSig program
+    :param program:
+    :return:
+    """
+    return encoding.encode_address(encoding.checksum(b"Program" + program))
+
+
+class EvalContext:
+    """
+    Everything a program can observe while it runs.
+    group: list of transaction dicts (msgpack form), index: position of the evaluated transaction.
+    ledger: object exposing global_state(app_id), local_state(address, app_id), balance(address) and
+    min_balance(address), states are mutable dicts (None when absent).
+    """
+
+    def __init__(self, group, index, ledger, current_round, latest_timestamp=0, app_id=0, args=None):
+        self.group = group
+        self.index = index
+        self.ledger = ledger
+        self.current_round = current_round
+        self.latest_timestamp = latest_timestamp
+        self.app_id = app_id
+        self.args = args or []
+
+    @property
+    def txn(self):
+        return self.group[self.index]
+
+
+class EvalResult:
+    """
+    Outcome of a program evaluation
+    """
+
+    def __init__(self, passed, error=None, cost=0, line_hits=None, logs=None):
+        self.passed = passed
+        self.error = error
+        self.cost = cost
+        self.line_hits = line_hits
+        self.logs = logs or []
+
+    def __repr__(self):
+        return "EvalResult(passed={}, error={!r}, cost={})".format(self.passed, self.error, self.cost)
+
+
+def txn_field(group, index, field, array_index=None, app_id=0):
+    """
+    Read a transaction field the way the AVM exposes it
+    :param group:
+    :param index:
+    :param field:
+    :param array_index:
+    :param app_id: the running application (used for Applications[0])
+    :return:
+    """
+    if index >= len(group):
+        raise TealError("group index {} out of range".format(index))
+    txn = group[index]
+    if field in TXN_FIELDS:
+        value = txn.get(TXN_FIELDS[field])
+        if value is None:
+            return ZERO_ADDRESS if field in ADDRESS_FIELDS else (b"" if field in BYTES_FIELDS else 0)
+        return value
+    if field == "TypeEnum":
+        return TYPE_ENUMS.get(txn.get("type"), 0)
+    if field == "Type":
+        return txn.get("type", "").encode()
+    if field == "GroupIndex":
+        return index
+    if field == "TxID":
+        return txn_id(txn).encode()
+    if field == "ApplicationArgs":
+        args = txn.get("apaa", [])
+        if array_index >= len(args):
+            raise TealError("invalid ApplicationArgs index {}".format(array_index))
+        return args[array_index]
+    if field == "NumAppArgs":
+        return len(txn.get("apaa", []))
+    if field == "Accounts":
+        accounts = [txn.get("snd")] + list(txn.get("apat", []))
+        if array_index >= len(accounts):
+            raise TealError("invalid Accounts index {}".format(array_index))
+        return accounts[array_index]
+    if field == "NumAccounts":
+        return len(txn.get("apat", []))
+    if field == "Applications":
+        apps = [app_id] + list(txn.get("apfa", []))
+        if array_index >= len(apps):
+            raise TealError("invalid Applications index {}".format(array_index))
+        return apps[array_index]
+    if field == "NumApplications":
+        return len(txn.get("apfa", []))
+    if field in ("GlobalNumUint", "GlobalNumByteSlice", "LocalNumUint", "LocalNumByteSlice"):
+        schema = txn.get("apgs" if field.startswith("Global") else "apls", {})
+        return schema.get("nui" if field.endswith("Uint") else "nbs", 0)
+    raise TealError("unsupported transaction field {}".format(field))
+
+
+def txn_id(txn: dict) -> str:
+    """
+    Compute the id of a msgpack-form transaction
+    :param txn:
+    :return:
+    """
+    import msgpack
+    to_hash = algo_constants.txid_prefix + msgpack.packb(txn, use_bin_type=True)
+    return base64.b32encode(encoding.checksum(to_hash)).decode().strip("=")
+
+
+def evaluate(source: str, context: EvalContext, profile: bool = False, max_cost: int = 700) -> EvalResult:
+    """
+    Run a TEAL program against the given context
+    :param source: TEAL assembly as returned by compileTeal
+    :param context:
+    :param profile: collect per-line hit counts
+    :param max_cost: cost budget of the program
+    :return:
+    """
+    program = parse_program(source)
+    vm = _Machine(program, context, profile)
+    try:
+        passed = vm.run(max_cost)
+        return EvalResult(passed, None if passed else "rejected", vm.cost, vm.line_hits, vm.logs)
+    except TealError as e:
+        return EvalResult(False, str(e), vm.cost, vm.line_hits)
+
+
+class _Machine:
+    def __init__(self, program, context, profile):
+        self.program = program
+        self.context = context
+        self.stack = []
+        self.scratch = [0] * 256
+        self.call_stack = []
+        self.logs = []
+        self.cost = 0
+        self.line_hits = Counter() if profile else None
+        self.costs = opcode_costs()
+
+    # ---- stack helpers ----
+    def pop_int(self):
+        value = self.stack.pop()
+        if not isinstance(value, int):
+            raise TealError("expected uint64, got bytes")
+        return value
+
+    def pop_bytes(self):
+        value = self.stack.pop()
+        if not isinstance(value, bytes):
+            raise TealError("expected bytes, got uint64")
+        return value
+
+    def push_int(self, value):
+        if value < 0 or value > MAX_UINT64:
+            raise TealError("uint64 overflow")
+        self.stack.append(value)
+
+    # ---- state helpers ----
+    def app_ref(self, ref):
+        if isinstance(ref, int) and ref == 0:
+            return self.context.app_id
+        apps = [self.context.app_id] + list(self.context.txn.get("apfa", []))
+        if isinstance(ref, int) and ref < len(apps):
+            return apps[ref]
+        return ref
+
+    def account_ref(self, ref):
+        if isinstance(ref, bytes):
+            return ref
+        return txn_field(self.context.group, self.context.index, "Accounts", ref)
+
+    def global_state(self, app_id):
+        state = self.context.ledger.global_state(app_id)
+        if state is None:
+            raise TealError("application {} does not exist".format(app_id))
+        return state
+
+    def local_state(self, address, app_id, required=True):
+        state = self.context.ledger.local_state(address, app_id)
+        if state is None and required:
+            raise TealError("account {} is not opted in to app {}".format(encoding.encode_address(address), app_id))
+        return state
+
+    def run(self, max_cost):
+        instructions = self.program.instructions
+        labels = self.program.labels
+        pc = 0
+        while pc < len(instructions):
+            op, imm, line_no = instructions[pc]
+            pc += 1
+            self.cost += self.costs.get(op, 1)
+            if self.cost > max_cost:
+                raise TealError("dynamic cost budget exceeded")
+            if self.line_hits is not None:
+                self.line_hits[line_no] += 1
+
+            if op == "return":
+                return self._truthy(self.stack.pop())
+            if op == "err":
+                raise TealError("err opcode executed (line {})".format(line_no))
+            if op in ("bnz", "bz", "b"):
+                if op == "b" or (op == "bnz") == self._truthy(self.stack.pop()):
+                    pc = labels[imm]
+                continue
+            if op == "callsub":
+                self.call_stack.append(pc)
+                pc = labels[imm]
+                continue
+            if op == "retsub":
+                pc = self.call_stack.pop()
+                continue
+            handler = getattr(self, "op_" + _OP_NAMES.get(op, op), None)
+            if handler is None:
+                raise TealError("unsupported opcode {} (line {})".format(op, line_no))
+            handler(imm)
+
+        if len(self.stack) != 1:
+            raise TealError("stack must contain exactly one value at the end")
+        return self._truthy(self.stack.pop())
+
+    @staticmethod
+    def _truthy(value):
+        if not isinstance(value, int):
+            raise TealError("program must end with a uint64")
+        return value != 0
+
+    # ---- constants ----
+    def op_int(self, imm):
+        self.stack.append(parse_int_literal(imm))
+
+    op_pushint = op_int
+
+    def op_byte(self, imm):
+        self.stack.append(parse_bytes_literal(imm))
+
+    op_pushbytes = op_byte
+
+    def op_addr(self, imm):
+        self.stack.append(encoding.decode_address(imm))
+
+    # ---- transaction / global fields ----
+    def op_txn(self, imm):
+        parts = imm.split()
+        ctx = self.context
+        self.stack.append(txn_field(ctx.group, ctx.index, parts[0],
+                                    int(parts[1]) if len(parts) > 1 else None, ctx.app_id))
+
+    op_txna = op_txn
+
+    def op_txnas(self, imm):
+        ctx = self.context
+        self.stack.append(txn_field(ctx.group, ctx.index, imm, self.pop_int(), ctx.app_id))
+
+    def op_gtxn(self, imm):
+        parts = imm.split()
+        ctx = self.context
+        self.stack.append(txn_field(ctx.group, int(parts[0]), parts[1],
+                                    int(parts[2]) if len(parts) > 2 else None, ctx.app_id))
+
+    op_gtxna = op_gtxn
+
+    def op_gtxns(self, imm):
+        parts = imm.split()
+        ctx = self.context
+        self.stack.append(txn_field(ctx.group, self.pop_int(), parts[0],
+                                    int(parts[1]) if len(parts) > 1 else None, ctx.app_id))
+
+    op_gtxnsa = op_gtxns
+
+    def op_global(self, imm):
+        ctx = self.context
+        values = {
+            "MinTxnFee": 1000,
+            "MinBalance": 100000,
+            "MaxTxnLife": 1000,
+            "ZeroAddress": ZERO_ADDRESS,
+            "GroupSize": len(ctx.group),
+            "LogicSigVersion": 5,
+            "Round": ctx.current_round,
+            "LatestTimestamp": ctx.latest_timestamp,
+            "CurrentApplicationID": ctx.app_id,
+        }
+        if imm == "CreatorAddress":
+            self.stack.append(ctx.ledger.app_creator(ctx.app_id))
+            return
+        if imm not in values:
+            raise TealError("unsupported global field {}".format(imm))
+        self.stack.append(values[imm])
+
+    def op_arg(self, imm):
+        index = int(imm)
+        if index >= len(self.context.args):
+            raise TealError("invalid arg index {}".format(index))
+        self.stack.append(self.context.args[index])
+
+    # ---- scratch space ----
+    def op_store(self, imm):
+        self.scratch[int(imm)] = self.stack.pop()
+
+    def op_load(self, imm):
+        self.stack.append(self.scratch[int(imm)])
+
+    def op_stores(self, imm):
+        value = self.stack.pop()
+        self.scratch[self.pop_int()] = value
+
+    def op_loads(self, imm):
+        self.stack.append(self.scratch[self.pop_int()])
+
+    # ---- stack manipulation ----
+    def op_pop(self, imm):
+        self.stack.pop()
+
+    def op_dup(self, imm):
+        self.stack.append(self.stack[-1])
+
+    def op_dup2(self, imm):
+        self.stack.extend(self.stack[-2:])
+
+    def op_dig(self, imm):
+        self.stack.append(self.stack[-1 - int(imm)])
+
+    def op_swap(self, imm):
+        self.stack[-1], self.stack[-2] = self.stack[-2], self.stack[-1]
+
+    def op_select(self, imm):
+        condition = self.pop_int()
+        b = self.stack.pop()
+        a = self.stack.pop()
+        self.stack.append(b if condition else a)
+
+    def op_cover(self, imm):
+        self.stack.insert(-1 - int(imm), self.stack.pop())
+
+    def op_uncover(self, imm):
+        self.stack.append(self.stack.pop(-1 - int(imm)))
+
+    def op_assert(self, imm):
+        if not self.pop_int():
+            raise TealError("assert failed")
+
+    # ---- arithmetic / logic ----
+    def _binary_int(self, fn):
+        b = self.pop_int()
+        a = self.pop_int()
+        self.push_int(int(fn(a, b)))
+
+    def op_add(self, imm):
+        self._binary_int(lambda a, b: a + b)
+
+    def op_sub(self, imm):
+        self._binary_int(lambda a, b: a - b)
+
+    def op_mul(self, imm):
+        self._binary_int(lambda a, b: a * b)
+
+    def op_div(self, imm):
+        b = self.pop_int()
+        a = self.pop_int()
+        if b == 0:
+            raise TealError("division by zero")
+        self.push_int(a // b)
+
+    def op_mod(self, imm):
+        b = self.pop_int()
+        a = self.pop_int()
+        if b == 0:
+            raise TealError("modulo by zero")
+        self.push_int(a % b)
+
+    def op_lt(self, imm):
+        self._binary_int(lambda a, b: a < b)
+
+    def op_gt(self, imm):
+        self._binary_int(lambda a, b: a > b)
+
+    def op_le(self, imm):
+        self._binary_int(lambda a, b: a <= b)
+
+    def op_ge(self, imm):
+        self._binary_int(lambda a, b: a >= b)
+
+    def op_and(self, imm):
+        self._binary_int(lambda a, b: a != 0 and b != 0)
+
+    def op_or(self, imm):
+        self._binary_int(lambda a, b: a != 0 or b != 0)
+
+    def op_bitand(self, imm):
+        self._binary_int(lambda a, b: a & b)
+
+    def op_bitor(self, imm):
+        self._binary_int(lambda a, b: a | b)
+
+    def op_bitxor(self, imm):
+        self._binary_int(lambda a, b: a ^ b)
+
+    def op_shl(self, imm):
+        self._binary_int(lambda a, b: (a << b) & MAX_UINT64)
+
+    def op_shr(self, imm):
+        self._binary_int(lambda a, b: a >> b)
+
+    def op_eq(self, imm):
+        b = self.stack.pop()
+        a = self.stack.pop()
+        if type(a) is not type(b):
+            raise TealError("cannot compare uint64 to bytes")
+        self.stack.append(int(a == b))
+
+    def op_neq(self, imm):
+        self.op_eq(imm)
+        self.stack.append(int(not self.stack.pop()))
+
+    def op_not(self, imm):
+        self.stack.append(int(self.pop_int() == 0))
+
+    def op_len(self, imm):
+        self.stack.append(len(self.pop_bytes()))
+
+    def op_itob(self, imm):
+        self.stack.append(self.pop_int().to_bytes(8, "big"))
+
+    def op_btoi(self, imm):
+        value = self.pop_bytes()
+        if len(value) > 8:
+            raise TealError("btoi arg too long")
+        self.stack.append(int.from_bytes(value, "big") if value else 0)
+
+    # ---- byte manipulation ----
+    def op_concat(self, imm):
+        b = self.pop_bytes()
+        a = self.pop_bytes()
+        if len(a) + len(b) > 4096:
+            raise TealError("concat produced a too big byte array")
+        self.stack.append(a + b)
+
+    def _substring(self, value, start, end):
+        if start > end or end > len(value):
+            raise TealError("substring range out of bounds")
+        return value[start:end]
+
+    def op_substring(self, imm):
+        start, end = (int(x) for x in imm.split())
+        self.stack.append(self._substring(self.pop_bytes(), start, end))
+
+    def op_substring3(self, imm):
+        end = self.pop_int()
+        start = self.pop_int()
+        self.stack.append(self._substring(self.pop_bytes(), start, end))
+
+    def op_extract(self, imm):
+        start, length = (int(x) for x in imm.split())
+        value = self.pop_bytes()
+        end = len(value) if length == 0 else start + length
+        self.stack.append(self._substring(value, start, end))
+
+    def op_extract3(self, imm):
+        length = self.pop_int()
+        start = self.pop_int()
+        value = self.pop_bytes()
+        self.stack.append(self._substring(value, start, start + length))
+
+    def _extract_uint(self, size):
+        start = self.pop_int()
+        value = self.pop_bytes()
+        self.stack.append(int.from_bytes(self._substring(value, start, start + size), "big"))
+
+    def op_extract_uint16(self, imm):
+        self._extract_uint(2)
+
+    def op_extract_uint32(self, imm):
+        self._extract_uint(4)
+
+    def op_extract_uint64(self, imm):
+        self._extract_uint(8)
+
+    def op_getbyte(self, imm):
+        index = self.pop_int()
+        value = self.pop_bytes()
+        if index >= len(value):
+            raise TealError("getbyte index out of bounds")
+        self.stack.append(value[index])
+
+    def op_setbyte(self, imm):
+        byte_value = self.pop_int()
+        index = self.pop_int()
+        value = bytearray(self.pop_bytes())
+        if index >= len(value) or byte_value > 255:
+            raise TealError("setbyte out of bounds")
+        value[index] = byte_value
+        self.stack.append(bytes(value))
+
+    def op_bzero(self, imm):
+        self.stack.append(bytes(self.pop_int()))
+
+    # ---- state access ----
+    def op_balance(self, imm):
+        address = self.account_ref(self.stack.pop())
+        self.stack.append(self.context.ledger.balance(address))
+
+    def op_min_balance(self, imm):
+        address = self.account_ref(self.stack.pop())
+        self.stack.append(self.context.ledger.min_balance(address))
+
+    def op_app_opted_in(self, imm):
+        app_id = self.app_ref(self.stack.pop())
+        address = self.account_ref(self.stack.pop())
+        self.stack.append(int(self.local_state(address, app_id, required=False) is not None))
+
+    def op_app_global_get(self, imm):
+        key = self.pop_bytes()
+        self.stack.append(self.global_state(self.context.app_id).get(key, 0))
+
+    def op_app_global_get_ex(self, imm):
+        key = self.pop_bytes()
+        app_id = self.app_ref(self.stack.pop())
+        state = self.context.ledger.global_state(app_id) or {}
+        self.stack.append(state.get(key, 0))
+        self.stack.append(int(key in state))
+
+    @staticmethod
+    def _check_state_entry(key, value):
+        if len(key) > 64 or (isinstance(value, bytes) and len(key) + len(value) > 128):
+            raise TealError("key or value too long ({} + {} bytes)".format(
+                len(key), len(value) if isinstance(value, bytes) else 8))
+
+    def op_app_global_put(self, imm):
+        value = self.stack.pop()
+        key = self.pop_bytes()
+        self._check_state_entry(key, value)
+        self.global_state(self.context.app_id)[key] = value
+
+    def op_app_global_del(self, imm):
+        self.global_state(self.context.app_id).pop(self.pop_bytes(), None)
+
+    def op_app_local_get(self, imm):
+        key = self.pop_bytes()
+        address = self.account_ref(self.stack.pop())
+        state = self.local_state(address, self.context.app_id, required=False) or {}
+        self.stack.append(state.get(key, 0))
+
+    def op_app_local_get_ex(self, imm):
+        key = self.pop_bytes()
+        app_id = self.app_ref(self.stack.pop())
+        address = self.account_ref(self.stack.pop())
+        state = self.local_state(address, app_id, required=False) or {}
+        self.stack.append(state.get(key, 0))
+        self.stack.append(int(key in state))
+
+    def op_app_local_put(self, imm):
+        value = self.stack.pop()
+        key = self.pop_bytes()
+        address = self.account_ref(self.stack.pop())
+        self._check_state_entry(key, value)
+        self.local_state(address, self.context.app_id)[key] = value
+
+    def op_app_local_del(self, imm):
+        key = self.pop_bytes()
+        address = self.account_ref(self.stack.pop())
+        self.local_state(address, self.context.app_id).pop(key, None)
+
+    def op_log(self, imm):
+        value = self.pop_bytes()
+        if len(self.logs) == 32 or sum(len(entry) for entry in self.logs) + len(value) > 1024:
+            raise TealError("too many log calls or log data too long")
+        self.logs.append(value)
+
+    # ---- crypto ----
+    def op_sha256(self, imm):
+        self.stack.append(hashlib.sha256(self.pop_bytes()).digest())
+
+    def op_sha512_256(self, imm):
+        self.stack.append(encoding.checksum(self.pop_bytes()))
+
+
+_OP_NAMES = {
+    "+": "add", "-": "sub", "*": "mul", "/": "div", "%": "mod",
+    "<": "lt", ">": "gt", "<=": "le", ">=": "ge",
+    "&&": "and", "||": "or", "==": "eq", "!=": "neq", "!": "not",
+    "&": "bitand", "|": "bitor", "^": "bitxor",
+}
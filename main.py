@@ -1,13 +1,28 @@
+import argparse
+import json
 import random
+import sys
 
-from algosdk import account
+from algosdk import account, encoding
 from algosdk.v2client import algod
-from numpy.core.defchararray import strip
 
 from constants import Constants, get_env
 from helpers import algo_helper
 from models.Delivery import Delivery
-from utilities import utils
+from models.DeliveryManager import DeliveryManager
+from models.Keyring import Keyring
+from utilities import rpc_metrics, tracing, utils, workload
+
+log = utils.get_logger(__name__)
+
+
+def print_state(state):
+    """
+    Print a formatted state one key per line
+    :param state:
+    """
+    for key, value in state.items():
+        print("{}: {}".format(key, value))
 
 
 def read_state(algod_client, app_id, user_private_key=None, show_debug=False):
@@ -28,7 +43,7 @@ def read_state(algod_client, app_id, user_private_key=None, show_debug=False):
         # read local state of application
         local_state = algo_helper.read_local_state(algod_client,
                                                    account.address_from_private_key(user_private_key),
-                                                   app_id),
+                                                   app_id, show=False)
 
     # read global state of application
     global_state, creator, approval_program, clear_state_program = algo_helper.read_global_state(client=algod_client,
@@ -39,10 +54,10 @@ def read_state(algod_client, app_id, user_private_key=None, show_debug=False):
 
     utils.console_log("App id: {}".format(app_id), 'blue')
     utils.console_log("Global State:", 'blue')
-    print(utils.toArray(global_state))
+    print_state(global_state)
     if local_state is not None:
         utils.console_log("Local State:", 'blue')
-        print(utils.toArray(local_state))
+        print_state(local_state)
     utils.console_log("Approval Program:", 'blue')
     print(approval_program)
     utils.console_log("Clear State Program:", 'blue')
@@ -69,8 +84,8 @@ def get_test_user(user_list, ask_selection=True):
     if ask_selection:
         print('With which user?')
         for i in range(0, len(user_list)):
-            print('{}) {}'.format(i, user_list[i].get('name')))
-        y = int(strip(input()))
+            print('{}) {}'.format(i, user_list[i].name))
+        y = int(input().strip())
         if y <= 0 or y > len(user_list):
             y = 0
     else:
@@ -79,10 +94,264 @@ def get_test_user(user_list, ask_selection=True):
     return user_list[y]
 
 
-def main():
-    algod_client = algod.AlgodClient(Constants.algod_token, Constants.algod_address)
+def get_account(name: str = None, mnemonic: str = None):
+    """
+    Private key of a test account, selected by name or given by mnemonic, derived once per process
+    :param name: name in the accounts file
+    :param mnemonic:
+    :return:
+    """
+    keyring = Keyring.default()
+    if mnemonic:
+        return keyring.from_mnemonic(mnemonic).private_key
+    test_account = keyring.get(name)
+    if test_account is None:
+        raise ValueError("Unknown account: {}".format(name))
+    return test_account.private_key
+
+
+def execute_command(manager: DeliveryManager, item: dict):
+    """
+    Execute one CLI command, given as a dict of its arguments
+    :param manager: serializes the commands targeting the same app
+    :param item: {"command": "participate", "app_id": 12, "account": "user", "capacity": 20, ...}
+    :return: the command result, False on failure
+    """
+    options = dict(COMMAND_DEFAULTS, **item)
+    command = options["command"]
+    if command not in COMMANDS:
+        raise ValueError("Unknown command: {}".format(command))
+    app_id = options["app_id"]
+    if app_id is None and command != "create":
+        raise ValueError("{}: an app_id is required".format(command))
+    private_key = None
+    if options["account"] or options["mnemonic"]:
+        private_key = get_account(options["account"], options["mnemonic"])
+    elif command != "state":
+        raise ValueError("{}: an account is required".format(command))
+    name = options["name"] or options["account"] or ""
+
+    if command == "create":
+        if not options["departure"] or not options["arrival"]:
+            raise ValueError("create: departure and arrival dates are required")
+        return manager.create(creator_private_key=private_key,
+                              delivery_creator_name=name,
+                              delivery_start_address=options["from_address"],
+                              delivery_end_address=options["to_address"],
+                              delivery_start_date=options["departure"],
+                              delivery_end_date=options["arrival"],
+                              delivery_unit_cost=int(options["unit_cost"]),
+                              delivery_capacity=int(options["capacity"]))
+    app_id = int(app_id)
+    if command == "participate":
+        return manager.participate(app_id, private_key, name, int(options["capacity"]))
+    if command == "cancel":
+        return manager.cancel_participation(app_id, private_key, name)
+    if command == "start":
+        return manager.start_delivery(app_id, private_key)
+    if command == "finish":
+        return manager.finish_delivery(app_id, private_key)
+    if command == "cancel-delivery":
+        keyring = Keyring.default()
+        participants = [participant if encoding.is_valid_address(participant) else keyring[participant].address
+                        for participant in options["participants"]]
+        return manager.cancel_delivery(app_id, private_key, participants, batch_size=int(options["batch_size"]),
+                                       pipeline=int(options["pipeline"]))
+    if command == "close":
+        keyring = Keyring.default()
+        participants = [keyring.get(participant) for participant in options["participants"]]
+        participants = [participant for participant in participants if participant is not None]
+        return manager.close_delivery(app_id, private_key, participants)
+    return read_state(manager.algod_client, app_id, private_key, options["debug"])
+
+
+COMMANDS = ["create", "participate", "cancel", "start", "finish", "cancel-delivery", "close", "state"]
+COMMAND_DEFAULTS = {
+    "app_id": None,
+    "account": None,
+    "mnemonic": None,
+    "name": None,
+    "from_address": "Chennai",
+    "to_address": "Mumbai",
+    "departure": None,
+    "arrival": None,
+    "unit_cost": 10,
+    "capacity": 1000,
+    "participants": [],
+    "batch_size": 16,
+    "pipeline": 4,
+    "debug": False,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Algo Cargo delivery manager, interactive when no command is given")
+    parser.add_argument("--algod-address", default=Constants.algod_address)
+    parser.add_argument("--algod-token", default=Constants.algod_token)
+    parser.add_argument("--log-level", default=None, help="defaults to LOG_LEVEL or INFO")
+    parser.add_argument("--quiet", action="store_true", help="only log errors")
+    parser.add_argument("--preflight", choices=["local", "dryrun"], default=None,
+                        help="check groups before submitting them, rejected commands fail with the reason")
+    commands = parser.add_subparsers(dest="command")
+
+    def add_command(command, help_text, account=True):
+        command_parser = commands.add_parser(command, help=help_text)
+        command_parser.add_argument("--app-id", type=int, default=None, help="defaults to APP_ID")
+        if account:
+            command_parser.add_argument("--account", help="account name in the accounts file")
+            command_parser.add_argument("--mnemonic", help="account mnemonic, instead of --account")
+        return command_parser
+
+    create = add_command("create", "create, initialize and fund a delivery")
+    create.add_argument("--name", help="creator name, defaults to the account name")
+    create.add_argument("--from", dest="from_address", default=COMMAND_DEFAULTS["from_address"])
+    create.add_argument("--to", dest="to_address", default=COMMAND_DEFAULTS["to_address"])
+    create.add_argument("--departure", required=True, help="yyyy-mm-dd hh:mm")
+    create.add_argument("--arrival", required=True, help="yyyy-mm-dd hh:mm")
+    create.add_argument("--unit-cost", type=int, default=COMMAND_DEFAULTS["unit_cost"], help="cost per kg")
+    create.add_argument("--capacity", type=int, default=COMMAND_DEFAULTS["capacity"], help="total capacity in kg")
+    participate = add_command("participate", "book capacity on a delivery")
+    participate.add_argument("--name", help="user name, defaults to the account name")
+    participate.add_argument("--capacity", type=int, default=20, help="booked capacity in kg")
+    cancel = add_command("cancel", "cancel a participation")
+    cancel.add_argument("--name", help="user name, defaults to the account name")
+    add_command("start", "start a delivery")
+    add_command("finish", "finish a delivery and pay the creator")
+    cancel_delivery = add_command("cancel-delivery", "cancel a delivery and refund its participants")
+    cancel_delivery.add_argument("--participants", nargs="*", default=[],
+                                 help="account names or addresses, run it again to retry failed refunds")
+    cancel_delivery.add_argument("--batch-size", type=int, default=COMMAND_DEFAULTS["batch_size"],
+                                 help="transactions per refund group, at most 16")
+    cancel_delivery.add_argument("--pipeline", type=int, default=COMMAND_DEFAULTS["pipeline"],
+                                 help="refund groups waiting for confirmation")
+    close = add_command("close", "delete a delivery")
+    close.add_argument("--participants", nargs="*", default=[], help="account names to clear the app from")
+    state = add_command("state", "print the delivery state, with the local state of --account if given")
+    state.add_argument("--debug", action="store_true", help="print the full application info")
+
+    reconcile = commands.add_parser("reconcile", help="check that every escrow holds what its bookings imply")
+    reconcile.add_argument("--app-ids", type=int, nargs="*", default=None,
+                           help="defaults to the deliveries of INDEX_FILE, or of the indexer")
+    reconcile.add_argument("--budget", type=float, default=60, help="seconds, apps not read in time are unchecked")
+    reconcile.add_argument("--workers", type=int, default=16, help="concurrent reads")
+    reconcile.add_argument("--batch-size", type=int, default=50, help="apps read by a worker task")
+    reconcile.add_argument("--tolerance", type=int, default=0, help="micro ALGOs of difference accepted")
+    reconcile.add_argument("--output", default=None, help="write the JSON report to this file")
+
+    run = commands.add_parser("run", help="run a JSONL workload file, one command per line")
+    run.add_argument("workload", help='lines like {"command": "participate", "app_id": 12, "account": "user"}')
+    run.add_argument("--workers", type=int, default=4, help="items executed concurrently")
+    run.add_argument("--output", default=None, help="write the JSON summary to this file")
+    return parser
+
+
+def run_items(algod_client, items, workers: int, output: str = None, preflight: str = None):
+    """
+    Execute workload items concurrently and print the summary
+    :param algod_client:
+    :param items:
+    :param workers:
+    :param output: optional JSON summary file
+    :param preflight: Preflight mode, None submits without checking
+    :return: process exit code
+    """
+    app_id = get_env('APP_ID')
+    for item in items:
+        if item.get("app_id") is None and app_id:
+            item["app_id"] = int(app_id)
+
+    def report(result):
+        if result.ok and result.command == "create":
+            print("app-id: {}".format(result.result))
+        elif result.ok and result.command == "cancel-delivery":
+            print("refunds: {}".format(json.dumps(result.result.to_dict())))
+        elif not result.ok:
+            log.error("#%s %s failed: %s", result.index, result.command, result.error or "")
+
+    manager = DeliveryManager(algod_client, preflight=preflight)
+    results, wall_time = workload.run_workload(items, lambda item: execute_command(manager, item), workers,
+                                               on_result=report)
+    summary = workload.summarize(results, wall_time)
+    summary["locks"] = manager.lock_metrics()
+    workload.print_summary(summary)
+    print("app locks: {} acquisitions, {} contended, {} ms waited".format(
+        summary["locks"]["acquisitions"], summary["locks"]["contended"], summary["locks"]["wait_total_ms"]))
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(summary, output_file, indent=2)
+    return 1 if summary["failures"] else 0
+
+
+def reconcile_escrows(algod_client, args):
+    """
+    Print the escrows whose balance differs from their bookings
+    :param algod_client:
+    :param args: reconcile command arguments
+    :return: process exit code, 1 when there are discrepancies or unchecked apps
+    """
+    from models.EscrowReconciler import EscrowReconciler
+
+    index = None
+    app_ids = args.app_ids
+    if get_env('INDEX_FILE'):
+        from models.DeliveryIndex import DeliveryIndex
+        index = DeliveryIndex.from_env(algod_client)
+        index.sync()
+        index.save()
+        app_ids = app_ids or index.app_ids()
+    indexer_client = None
+    if index is None:
+        # the refunds paid by the escrows are counted from the app calls
+        from models.IndexerManager import IndexerHelper
+        indexer_helper = IndexerHelper()
+        indexer_client = indexer_helper.indexerObj
+        if app_ids is None:
+            app_ids = indexer_helper.get_app_ids_from_transactions_note(Constants.transaction_note)
+
+    if not app_ids:
+        log.warning("No delivery to reconcile")
+    reconciler = EscrowReconciler(algod_client, index, args.workers, args.batch_size, args.tolerance, indexer_client)
+    report = reconciler.reconcile(app_ids, args.budget)
+    for discrepancy in report.discrepancies:
+        print("app {app_id}: {kind} of {difference} (balance {balance}, expected {expected}, state "
+              "{delivery_state})".format(**discrepancy))
+    print("{} escrows checked in {:.2f}s: {} discrepancies, {} errors, {} unchecked".format(
+        report.checked, report.elapsed, len(report.discrepancies), len(report.errors), len(report.unchecked)))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report.to_dict(), output_file, indent=2)
+    return 1 if report.discrepancies or report.errors or report.unchecked else 0
+
+
+def setup_observability():
+    if get_env('METRICS_PORT'):
+        rpc_metrics.serve(int(get_env('METRICS_PORT')))
+    if get_env('TRACE_FILE'):
+        tracing.configure(get_env('TRACE_FILE'), float(get_env('TRACE_SAMPLE_RATE') or 0.01))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    utils.configure_logging(args.log_level or get_env('LOG_LEVEL') or 'INFO',
+                            json_format=get_env('LOG_FORMAT') == 'json', quiet=args.quiet)
+    algod_client = algod.AlgodClient(args.algod_token, args.algod_address)
+    setup_observability()
+
+    if args.command is None:
+        return interactive(algod_client)
+    if args.command == "reconcile":
+        return reconcile_escrows(algod_client, args)
+    if args.command == "run":
+        return run_items(algod_client, workload.load_workload(args.workload), args.workers, args.output,
+                         args.preflight)
+    item = {key: value for key, value in vars(args).items() if key in COMMAND_DEFAULTS}
+    item["command"] = args.command
+    return run_items(algod_client, [item], 1, preflight=args.preflight)
+
+
+def interactive(algod_client):
     app_id = int(get_env('APP_ID'))
-    accounts = Constants.accounts
+    accounts = list(Keyring.default())
 
     logistic_manager = Delivery(algod_client=algod_client, app_id=app_id)
     color = 'blue'
@@ -99,12 +368,12 @@ def main():
         utils.console_log('7) Finish Delivery', color)
         utils.console_log('8) Get Delivery State', color)
         utils.console_log("--------------------------------------------", color)
-        x = int(strip(input()))
+        x = int(input().strip())
         if x == 1:
             # ------- delivery info ---------
             creator = get_test_user(accounts, True)
-            creator_private_key = algo_helper.get_private_key_from_mnemonic(creator.get('mnemonic'))
-            delivery_creator_name = creator.get('name')
+            creator_private_key = creator.private_key
+            delivery_creator_name = creator.name
             #delivery_start_add = input("Enter Dispatch Point: ")
             delivery_start_add = "Chennai"
             #delivery_end_add = input("Enter Destination: ")
@@ -131,24 +400,24 @@ def main():
                 utils.console_log("Invalid app_id")
                 continue
             book_user = get_test_user(accounts, True)
-            book_user_pk = algo_helper.get_private_key_from_mnemonic(book_user.get('mnemonic'))
+            book_user_pk = book_user.private_key
             #book_capacity = int(input("Enter Needed Capacity in kg: "))
             book_capacity = 20
-            logistic_manager.participate(book_user_pk, book_user.get('name'), book_capacity)
+            logistic_manager.participate(book_user_pk, book_user.name, book_capacity)
         elif x == 3:
             if logistic_manager.app_id is None:
                 utils.console_log("Invalid app_id")
                 continue
             book_user = get_test_user(accounts, True)
-            book_user_pk = algo_helper.get_private_key_from_mnemonic(book_user.get('mnemonic'))
-            logistic_manager.cancel_participation(book_user_pk, book_user.get('name'))
+            book_user_pk = book_user.private_key
+            logistic_manager.cancel_participation(book_user_pk, book_user.name)
         elif x == 4:
             if logistic_manager.app_id is None:
                 utils.console_log("Invalid app_id")
                 continue
             creator = get_test_user(accounts, True)
-            creator_private_key = algo_helper.get_private_key_from_mnemonic(creator.get('mnemonic'))
-            delivery_creator_name = creator.get('name')
+            creator_private_key = creator.private_key
+            delivery_creator_name = creator.name
             logistic_manager.start_delivery(creator_private_key)
         elif x == 5:
             if logistic_manager.app_id is None:
@@ -156,8 +425,8 @@ def main():
                 continue
             # ------- delivery info ---------
             creator = get_test_user(accounts, True)
-            creator_private_key = algo_helper.get_private_key_from_mnemonic(creator.get('mnemonic'))
-            delivery_creator_name = creator.get('name')
+            creator_private_key = creator.private_key
+            delivery_creator_name = creator.name
             update_option = int(input("What would you like to update?\n\
                     1) Dispatch Details\n\
                     2) Destination Details\n\
@@ -183,29 +452,29 @@ def main():
                                              delivery_capacity=delivery_capacity)
         elif x == 6:
             utils.console_log("Are you sure?", 'red')
-            y = strip(input())
+            y = input().strip()
             if y != "y" and y != "yes":
                 continue
             if logistic_manager.app_id is None:
                 utils.console_log("Invalid app_id")
             creator = get_test_user(accounts, True)
-            creator_private_key = algo_helper.get_private_key_from_mnemonic(creator.get('mnemonic'))
-            delivery_creator_name = creator.get('name')
+            creator_private_key = creator.private_key
+            delivery_creator_name = creator.name
             logistic_manager.close_delivery(creator_private_key, accounts)
         elif x == 7:
             if logistic_manager.app_id is None:
                 utils.console_log("Invalid app_id")
                 continue
             creator = get_test_user(accounts, True)
-            creator_private_key = algo_helper.get_private_key_from_mnemonic(creator.get('mnemonic'))
-            delivery_creator_name = creator.get('name')
+            creator_private_key = creator.private_key
+            delivery_creator_name = creator.name
             logistic_manager.finish_delivery(creator_private_key)
         elif x == 8:
             read_state(algod_client, logistic_manager.app_id, show_debug=False)
         else:
             print("Exiting..")
-            break
+            return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,4 +1,3 @@
-import json
 from typing import Optional
 
 from algosdk import account
@@ -9,6 +8,9 @@ from algosdk.v2client import algod
 from constants import Constants
 from helpers import algo_helper
 from utilities import utils
+from utilities.tracing import span, traced
+
+log = utils.get_logger(__name__)
 
 
 # class for manage application transactions on Algorand Blockchain
@@ -21,6 +23,7 @@ class ApplicationManager:
         transaction_note = Constants.transaction_note
 
     @classmethod
+    @traced()
     def create_app(cls,
                    algod_client: algod.AlgodClient,
                    address: str,
@@ -43,7 +46,7 @@ class ApplicationManager:
         :param sign_transaction:
         :return:
         """
-        utils.console_log("Deploying Application......", "green")
+        log.info("Deploying Application......")
 
         # declare on_complete as NoOp
         on_complete = transaction.OnComplete.NoOpOC.real
@@ -69,12 +72,15 @@ class ApplicationManager:
         return txn
 
     @classmethod
+    @traced()
     def call_app(cls,
                  algod_client: algod.AlgodClient,
                  address: str,
                  app_id: int,
                  app_args,
-                 sign_transaction: str = None):
+                 sign_transaction: str = None,
+                 accounts: [str] = None,
+                 sp: transaction.SuggestedParams = None):
         """
         Perform a NoOp transaction:
         Generic application calls to execute the ApprovalProgram.
@@ -83,13 +89,15 @@ class ApplicationManager:
         :param app_id:
         :param app_args:
         :param sign_transaction:
+        :param accounts: accounts whose local state the call reads or writes
+        :param sp: suggested parameters, read from the node when not given
         :return:
         """
-        utils.console_log("Calling Application......", "green")
+        log.info("Calling Application......")
         # declare sender
 
         # get node suggested parameters
-        params = algod_client.suggested_params()
+        params = sp or algod_client.suggested_params()
         params.flat_fee = True
         params.fee = cls.Variables.fees
 
@@ -97,7 +105,8 @@ class ApplicationManager:
         txn = transaction.ApplicationNoOpTxn(sender=address,
                                              sp=params,
                                              index=app_id,
-                                             app_args=app_args)
+                                             app_args=app_args,
+                                             accounts=accounts)
         # sign transaction
         signed = False
         if sign_transaction is not None:
@@ -109,6 +118,7 @@ class ApplicationManager:
         return txn
 
     @classmethod
+    @traced()
     def update_app(cls,
                    algod_client: algod.AlgodClient,
                    address: str,
@@ -129,7 +139,7 @@ class ApplicationManager:
         :param sign_transaction:
         :return:
         """
-        utils.console_log("Deploying Application......", "green")
+        log.info("Deploying Application......")
 
         # get node suggested parameters
         params = algod_client.suggested_params()
@@ -154,6 +164,7 @@ class ApplicationManager:
         return txn
 
     @classmethod
+    @traced()
     def opt_in_app(cls,
                    algod_client: algod.AlgodClient,
                    address: str,
@@ -168,7 +179,7 @@ class ApplicationManager:
         :param app_id:
         :param sign_transaction:
         """
-        utils.console_log("OptIn from account: {}".format(address), "green")
+        log.info("OptIn from account: %s", address)
 
         # get node suggested parameters
         params = algod_client.suggested_params()
@@ -189,6 +200,7 @@ class ApplicationManager:
         return txn
 
     @classmethod
+    @traced()
     def delete_app(cls,
                    algod_client: algod.AlgodClient,
                    address: str,
@@ -202,7 +214,7 @@ class ApplicationManager:
         :param app_id:
         :param sign_transaction:
         """
-        utils.console_log("Deleting Application......", "green")
+        log.info("Deleting Application......")
 
         # get node suggested parameters
         params = algod_client.suggested_params()
@@ -223,6 +235,7 @@ class ApplicationManager:
         return txn
 
     @classmethod
+    @traced()
     def clear_app(cls,
                   algod_client: algod.AlgodClient,
                   address: str,
@@ -237,7 +250,7 @@ class ApplicationManager:
         :param app_id:
         :param sign_transaction:
         """
-        utils.console_log("Clearing Application from account {}".format(address), "green")
+        log.info("Clearing Application from account %s", address)
 
         # get node suggested parameters
         params = algod_client.suggested_params()
@@ -258,6 +271,7 @@ class ApplicationManager:
         return txn
 
     @classmethod
+    @traced()
     def close_out_app(cls,
                       algod_client: algod.AlgodClient,
                       address: str,
@@ -272,7 +286,7 @@ class ApplicationManager:
         :param app_id:
         :param sign_transaction:
         """
-        utils.console_log("Clearing Application from account {}".format(address), "green")
+        log.info("Clearing Application from account %s", address)
 
         # get node suggested parameters
         params = algod_client.suggested_params()
@@ -293,13 +307,15 @@ class ApplicationManager:
         return txn
 
     @classmethod
+    @traced()
     def payment(cls,
                 algod_client: algod.AlgodClient,
                 sender_address: str,
                 receiver_address: str,
                 amount: int,
                 sign_transaction: str = None,
-                close_remainder_to: str = None):
+                close_remainder_to: str = None,
+                sp: transaction.SuggestedParams = None):
         """
         Creates a payment transaction in ALGOs.
         :param algod_client:
@@ -309,11 +325,11 @@ class ApplicationManager:
         :param sign_transaction:
         :param close_remainder_to: When set, it indicates that the transaction is requesting that the Sender account
         should be closed, and all remaining funds, after the fee and amount are paid, be transferred to this address.
+        :param sp: suggested parameters, read from the node when not given
         :return:
         """
-        utils.console_log("Performing a payment from account {} to account {}".format(sender_address, receiver_address),
-                          "green")
-        params = algod_client.suggested_params()
+        log.info("Performing a payment from account %s to account %s", sender_address, receiver_address)
+        params = sp or algod_client.suggested_params()
         params.flat_fee = True
         params.fee = cls.Variables.fees
 
@@ -333,6 +349,7 @@ class ApplicationManager:
         return txn
 
     @classmethod
+    @traced()
     def send_transaction(cls,
                          algod_client: algod.AlgodClient,
                          txn: SignedTransaction,
@@ -343,17 +360,21 @@ class ApplicationManager:
         :param txn_debug:
         """
         # submit transaction
-        tx_id = algod_client.send_transaction(txn)
+        with span("submit") as submit_span:
+            tx_id = algod_client.send_transaction(txn)
+            submit_span.set(txid=tx_id)
 
         # wait for confirmation
-        confirmed_txn = transaction.wait_for_confirmation(algod_client, tx_id)
-        print("Transaction with id {} completed".format(tx_id))
+        with span("confirm", txid=tx_id):
+            confirmed_txn = transaction.wait_for_confirmation(algod_client, tx_id)
+        log.info("Transaction with id %s completed", tx_id, extra={"txid": tx_id})
         if txn_debug:
-            print("Transaction information: {}".format(json.dumps(confirmed_txn, indent=4)))
+            log.info("Transaction information: %s", utils.lazy_json(confirmed_txn))
 
         return algod_client.pending_transaction_info(tx_id)
 
     @classmethod
+    @traced()
     def send_group_transactions(cls,
                                 algod_client: algod.AlgodClient,
                                 txns: [SignedTransaction],
@@ -363,13 +384,41 @@ class ApplicationManager:
         :param txns:
         :param txn_debug:
         """
+        tx_id = cls.submit_group_transactions(algod_client, txns)
+        return cls.confirm_transaction(algod_client, tx_id, txn_debug)
+
+    @classmethod
+    def submit_group_transactions(cls,
+                                  algod_client: algod.AlgodClient,
+                                  txns: [SignedTransaction]):
+        """
+        Submit a group without waiting for its confirmation
+        :param algod_client:
+        :param txns:
+        :return: id of the first transaction
+        """
         # Atomic transfer
-        tx_id = algod_client.send_transactions(txns)
+        with span("submit", group_size=len(txns)) as submit_span:
+            tx_id = algod_client.send_transactions(txns)
+            submit_span.set(txid=tx_id)
+        return tx_id
 
-        # wait for confirmation
-        confirmed_txn = transaction.wait_for_confirmation(algod_client, tx_id)
-        print("Transactions with id {} completed".format(tx_id))
+    @classmethod
+    def confirm_transaction(cls,
+                            algod_client: algod.AlgodClient,
+                            tx_id: str,
+                            txn_debug: bool = False):
+        """
+        Wait for the confirmation of a submitted transaction or group
+        :param algod_client:
+        :param tx_id:
+        :param txn_debug:
+        :return: pending transaction info
+        """
+        with span("confirm", txid=tx_id):
+            confirmed_txn = transaction.wait_for_confirmation(algod_client, tx_id)
+        log.info("Transactions with id %s completed", tx_id, extra={"txid": tx_id})
         if txn_debug:
-            print("Transactions information: {}".format(json.dumps(confirmed_txn, indent=4)))
+            log.info("Transactions information: %s", utils.lazy_json(confirmed_txn))
 
         return algod_client.pending_transaction_info(tx_id)
@@ -1,26 +1,93 @@
+import collections
+
 from algosdk import account, transaction
 from algosdk import logic as algo_logic
 from algosdk.encoding import decode_address
 from algosdk.v2client import algod
-from pyteal import compileTeal, Mode
 
 from constants import get_env
 from helpers import algo_helper
 from models.ApplicationManager import ApplicationManager
-from smart_contracts.contract_logistic_manager import LogisticManagerContract
-from smart_contracts.contract_escrow import contract_escrow
+from models.Keyring import Keyring
 from utilities import utils
+from utilities.rpc_metrics import instrument, track_operation
+from utilities.tracing import annotate, span, traced
+
+log = utils.get_logger(__name__)
+
+# transactions per group accepted by the node, a refund takes two
+MAX_GROUP_SIZE = 16
+
+
+class CancellationProgress:
+    """
+    Progress of the refunds of a cancelled delivery, reported after every confirmed group
+    """
+
+    def __init__(self, app_id: int, total: int, skipped: int = 0):
+        self.app_id = app_id
+        self.total = total
+        self.skipped = skipped
+        self.refunded = 0
+        self.refunded_amount = 0
+        self.failed = {}
+        self.groups_submitted = 0
+        self.groups_confirmed = 0
+        self.rounds = set()
+        self.booked_capacity = None
+        self.escrow_reclaimed = False
+
+    @property
+    def pending(self):
+        return self.total - self.refunded - len(self.failed)
+
+    @property
+    def done(self):
+        return self.pending == 0 and not self.failed
+
+    def confirmed(self, refunds, confirmed_round):
+        self.groups_confirmed += 1
+        self.refunded += len(refunds)
+        self.refunded_amount += sum(amount for _, amount in refunds)
+        self.rounds.add(confirmed_round)
+
+    def fail(self, refunds, error):
+        for participant, _ in refunds:
+            self.failed[participant] = str(error)
+
+    def to_dict(self):
+        return {
+            "app_id": self.app_id,
+            "total": self.total,
+            "skipped": self.skipped,
+            "refunded": self.refunded,
+            "refunded_amount": self.refunded_amount,
+            "pending": self.pending,
+            "failed": dict(self.failed),
+            "groups_submitted": self.groups_submitted,
+            "groups_confirmed": self.groups_confirmed,
+            "rounds": len(self.rounds),
+            "booked_capacity": self.booked_capacity,
+            "escrow_reclaimed": self.escrow_reclaimed,
+        }
+
+    def __repr__(self):
+        return "CancellationProgress(app_id={}, refunded={}/{}, failed={})".format(self.app_id, self.refunded,
+                                                                                 self.total, len(self.failed))
 
 
 class Delivery:
     def __init__(self,
                  algod_client: algod.AlgodClient,
                  app_id: int = None):
-        self.algod_client = algod_client
+        self.algod_client = instrument(algod_client)
         self.teal_version_stateful = 5
         self.teal_version_stateless = 4
-        self.app_contract = LogisticManagerContract()
+        self._app_contract = None
         self.app_id = app_id
+        # optional Preflight checking groups before submission, last_preflight holds the last result
+        self.preflight = None
+        self.last_preflight = None
 
         self.approval_program_hash = None
         self.clear_state_program_hash = None
@@ -30,22 +97,82 @@ class Delivery:
         if get_env('CLEAR_STATE_PROGRAM') is not None:
             self.clear_state_program_hash = get_env('CLEAR_STATE_PROGRAM')
 
+    @property
+    def app_contract(self):
+        """
+        Application contract, PyTeal is imported on first use only.
+        OPTIMIZED_CONTRACT=1 in the env deploys the optimized approval program, same rules at a lower cost,
+        PACKED_STATE=1 the compact global state layout
+        :return:
+        """
+        if self._app_contract is None:
+            if get_env('PACKED_STATE') in ("1", "true"):
+                from smart_contracts.contract_logistic_manager_packed import PackedLogisticManagerContract
+                self._app_contract = PackedLogisticManagerContract()
+            elif get_env('OPTIMIZED_CONTRACT') in ("1", "true"):
+                from smart_contracts.contract_logistic_manager_optimized import OptimizedLogisticManagerContract
+                self._app_contract = OptimizedLogisticManagerContract()
+            else:
+                from smart_contracts.contract_logistic_manager import LogisticManagerContract
+                self._app_contract = LogisticManagerContract()
+        return self._app_contract
+
+    def enable_preflight(self, mode: str = "local"):
+        """
+        Check the participate, cancel, start and finish groups before submitting them
+        :param mode: Preflight.LOCAL or Preflight.DRYRUN, None disables the check
+        """
+        from models.Preflight import Preflight
+        self.preflight = Preflight(self.algod_client, mode) if mode else None
+
+    def _preflight_check(self, group, app_info: dict = None, account_info: dict = None):
+        """
+        Run the pre-flight check of a group when enabled
+        :param group:
+        :param app_info: application_info response read to build the group, reused by the check
+        :param account_info: account_info response of the sender read to build the group, reused by the check
+        :return: False if the contract would reject the group
+        """
+        if self.preflight is None:
+            return True
+        self.last_preflight = self.preflight.check(self.app_id, group, app_info=app_info, account_info=account_info)
+        return self.last_preflight.ok
+
     @property
     def escrow_bytes(self):
         """
         Get escrow contract compiled program
         :return:
         """
+        return self._compile_escrow(batched=True)
+
+    def _compile_escrow(self, batched: bool):
         if self.app_id is None:
             raise ValueError("App not deployed")
 
-        escrow_fund_program_compiled = compileTeal(
-            contract_escrow(app_id=self.app_id),
-            mode=Mode.Signature,
-            version=self.teal_version_stateless,
-        )
+        from pyteal import compileTeal, Mode
+        from smart_contracts.contract_escrow import contract_escrow
+
+        with span("compile_escrow", app_id=self.app_id):
+            escrow_fund_program_compiled = compileTeal(
+                contract_escrow(app_id=self.app_id, batched=batched),
+                mode=Mode.Signature,
+                version=self.teal_version_stateless,
+            )
 
-        return algo_helper.compile_program(self.algod_client, escrow_fund_program_compiled)
+            return algo_helper.compile_program(self.algod_client, escrow_fund_program_compiled)
+
+    def escrow_bytes_for(self, escrow_address: str):
+        """
+        Compiled program of the escrow initialized for this app, the escrow of applications initialized before
+        batched refunds only accepts two-transaction groups
+        :param escrow_address: escrow address from the global state
+        :return:
+        """
+        escrow_bytes = self.escrow_bytes
+        if algo_logic.address(escrow_bytes) != escrow_address:
+            escrow_bytes = self._compile_escrow(batched=False)
+        return escrow_bytes
 
     @property
     def escrow_address(self):
@@ -55,6 +182,8 @@ class Delivery:
         """
         return algo_logic.address(self.escrow_bytes)
 
+    @traced()
+    @track_operation()
     def create_app(self,
                    creator_private_key: str,
                    delivery_creator_name: str,
@@ -76,6 +205,8 @@ class Delivery:
         :param delivery_capacity:
         :return:
         """
+        from pyteal import compileTeal, Mode
+
         # compile program to TEAL assembly
         approval_program_compiled = compileTeal(
             self.app_contract.approval_program(),
@@ -93,8 +224,8 @@ class Delivery:
         approval_program_compiled = algo_helper.compile_program(self.algod_client, approval_program_compiled)
         clear_state_program_compiled = algo_helper.compile_program(self.algod_client, clear_program_compiled)
 
-        delivery_start_date_round = algo_helper.datetime_to_rounds(self.algod_client, delivery_start_date)
-        delivery_end_date_round = algo_helper.datetime_to_rounds(self.algod_client, delivery_end_date)
+        delivery_start_date_round, delivery_end_date_round = algo_helper.datetimes_to_rounds(
+            self.algod_client, [delivery_start_date, delivery_end_date])
 
         app_args = [
             delivery_creator_name,
@@ -121,19 +252,24 @@ class Delivery:
 
             txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
             self.app_id = txn_response['application-index']
-            utils.console_log("Application Created. New app-id: {}".format(self.app_id), "green")
+            annotate(app_id=self.app_id)
+            log.info("Application Created. New app-id: %s", self.app_id)
         except Exception as e:
-            utils.console_log("Error during create_app call: {}".format(e))
+            log.error("Error during create_app call: %s", e)
             return False
 
         return self.app_id
 
+    @traced()
+    @track_operation()
     def update_app(self, creator_private_key: str):
         """
         Create the Smart Contract dApp and start the delivery
         :param creator_private_key:
         :return:
         """
+        from pyteal import compileTeal, Mode
+
         # compile program to TEAL assembly
         approval_program_compiled = compileTeal(
             self.app_contract.approval_program(),
@@ -162,13 +298,17 @@ class Delivery:
                                                 sign_transaction=creator_private_key)
 
             txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
-            utils.console_log("Updated Application with app-id: {}".format(self.app_id), "green")
+            log.info("Updated Application with app-id: %s", self.app_id)
+            if self.program_verifier is not None:
+                self.program_verifier.invalidate(self.app_id)
         except Exception as e:
-            utils.console_log("Error during create_app call: {}".format(e))
+            log.error("Error during create_app call: %s", e)
             return False
 
         return self.app_id
 
+    @traced()
+    @track_operation()
     def update_delivery_info(self,
                          creator_private_key: str,
                          delivery_creator_name: str,
@@ -190,8 +330,8 @@ class Delivery:
         :param delivery_capacity:
         :return:
         """
-        delivery_start_date_round = algo_helper.datetime_to_rounds(self.algod_client, delivery_start_date)
-        delivery_end_date_round = algo_helper.datetime_to_rounds(self.algod_client, delivery_end_date)
+        delivery_start_date_round, delivery_end_date_round = algo_helper.datetimes_to_rounds(
+            self.algod_client, [delivery_start_date, delivery_end_date])
 
         app_args = [
             self.app_contract.AppMethods.update_delivery,
@@ -215,13 +355,15 @@ class Delivery:
                                               sign_transaction=creator_private_key)
 
             txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
-            utils.console_log("Updated Info for Application with app-id: {}".format(self.app_id), "green")
+            log.info("Updated Info for Application with app-id: %s", self.app_id)
         except Exception as e:
-            utils.console_log("Error during update_delivery_info call: {}".format(e))
+            log.error("Error during update_delivery_info call: %s", e)
             return False
 
         return self.app_id
 
+    @traced()
+    @track_operation()
     def initialize_escrow(self, creator_private_key: str):
         """
         Init an escrow contract
@@ -242,12 +384,14 @@ class Delivery:
                                               sign_transaction=creator_private_key)
 
             txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
-            utils.console_log("Escrow initialized for Application with app-id {} with address: {}"
-                              .format(self.app_id, self.escrow_address), "green")
+            log.info("Escrow initialized for Application with app-id %s with address: %s",
+                     self.app_id, self.escrow_address)
         except Exception as e:
-            utils.console_log("Error during initialize_escrow call: {}".format(e))
+            log.error("Error during initialize_escrow call: %s", e)
             return False
 
+    @traced()
+    @track_operation()
     def fund_escrow(self, creator_private_key: str):
         """
         Fund the escrow contract
@@ -274,19 +418,23 @@ class Delivery:
                                                      receiver_address=escrow_address,
                                                      amount=ApplicationManager.Variables.escrow_min_balance)
             # Atomic transfer
-            gid = transaction.calculate_group_id([call_txn, payment_txn])
-            call_txn.group = gid
-            payment_txn.group = gid
+            with span("build_group"):
+                gid = transaction.calculate_group_id([call_txn, payment_txn])
+                call_txn.group = gid
+                payment_txn.group = gid
 
-            call_txn = call_txn.sign(creator_private_key)
-            payment_txn = payment_txn.sign(creator_private_key)
+            with span("sign_group"):
+                call_txn = call_txn.sign(creator_private_key)
+                payment_txn = payment_txn.sign(creator_private_key)
 
             txn_response = ApplicationManager.send_group_transactions(self.algod_client, [call_txn, payment_txn])
-            utils.console_log("Escrow funded with address: {}".format(escrow_address), "green")
+            log.info("Escrow funded with address: %s", escrow_address)
         except Exception as e:
-            utils.console_log("Error during fund_escrow: {}".format(e))
+            log.error("Error during fund_escrow: %s", e)
             return False
 
+    @traced()
+    @track_operation()
     def participate(self, user_private_key: str, user_name: str, book_capacity: int):
         """
         Add a user to the delivery
@@ -298,8 +446,11 @@ class Delivery:
         """
 
         address = account.address_from_private_key(user_private_key)
-        local_state = algo_helper.read_local_state(self.algod_client, address, self.app_id)
+        account_info = self.algod_client.account_info(address)
+        local_state = algo_helper.read_local_state(self.algod_client, address, self.app_id, account_info=account_info)
         if local_state is None:
+            # the opt-in changes the account, the pre-flight check reads it again
+            account_info = None
             try:
                 # opt in to write local state
                 call_txn = ApplicationManager.opt_in_app(algod_client=self.algod_client,
@@ -307,23 +458,24 @@ class Delivery:
                                                          app_id=self.app_id,
                                                          sign_transaction=user_private_key)
                 txn_response = ApplicationManager.send_transaction(self.algod_client, call_txn)
-                utils.console_log("OptIn to Application with app-id: {}"
-                                  .format(self.app_id), "green")
+                log.info("OptIn to Application with app-id: %s", self.app_id)
             except Exception as e:
-                utils.console_log("Error during optin call: {}".format(e))
+                log.error("Error during optin call: %s", e)
 
         app_args = [
             self.app_contract.AppMethods.participate_delivery,
             algo_helper.intToBytes(book_capacity)
         ]
         try:
+            app_info = self.algod_client.application_info(self.app_id)
             global_state, \
             creator_address, \
             approval_program, \
             clear_state_program = algo_helper.read_global_state(client=self.algod_client,
                                                                 app_id=self.app_id,
                                                                 to_array=False,
-                                                                show=False)
+                                                                show=False,
+                                                                app_info=app_info)
 
             self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
             delivery_unit_cost = global_state.get("delivery_unit_cost")
@@ -339,20 +491,25 @@ class Delivery:
                                                      receiver_address=escrow_address,
                                                      amount=delivery_unit_cost*book_capacity)
             # Atomic transfer
-            gid = transaction.calculate_group_id([call_txn, payment_txn])
-            call_txn.group = gid
-            payment_txn.group = gid
+            with span("build_group"):
+                gid = transaction.calculate_group_id([call_txn, payment_txn])
+                call_txn.group = gid
+                payment_txn.group = gid
 
-            call_txn = call_txn.sign(user_private_key)
-            payment_txn = payment_txn.sign(user_private_key)
+            with span("sign_group"):
+                call_txn = call_txn.sign(user_private_key)
+                payment_txn = payment_txn.sign(user_private_key)
 
+            if not self._preflight_check([call_txn, payment_txn], app_info, account_info):
+                return False
             txn_response = ApplicationManager.send_group_transactions(self.algod_client, [call_txn, payment_txn])
-            utils.console_log("Participated to Application with app-id: {}"
-                              .format(self.app_id), "green")
+            log.info("Participated to Application with app-id: %s", self.app_id)
         except Exception as e:
-            utils.console_log("Error during participation call: {}".format(e))
+            log.error("Error during participation call: %s", e)
             return False
 
+    @traced()
+    @track_operation()
     def cancel_participation(self,
                              user_private_key: str,
                              user_name: str):
@@ -365,8 +522,11 @@ class Delivery:
         """
 
         address = account.address_from_private_key(user_private_key)
-        local_state = algo_helper.read_local_state(self.algod_client, address, self.app_id)
+        account_info = self.algod_client.account_info(address)
+        local_state = algo_helper.read_local_state(self.algod_client, address, self.app_id, account_info=account_info)
         if local_state is None:
+            # the opt-in changes the account, the pre-flight check reads it again
+            account_info = None
             try:
                 # opt in to write local state
                 txn = ApplicationManager.opt_in_app(algod_client=self.algod_client,
@@ -374,23 +534,24 @@ class Delivery:
                                                     app_id=self.app_id,
                                                     sign_transaction=user_private_key)
                 txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
-                utils.console_log("OptIn to Application with app-id: {}"
-                                  .format(self.app_id), "green")
+                log.info("OptIn to Application with app-id: %s", self.app_id)
             except Exception as e:
-                utils.console_log("Error during optin call: {}".format(e))
+                log.error("Error during optin call: %s", e)
 
         app_args = [
             bytes(self.app_contract.AppMethods.cancel_delivery_participation, encoding="raw_unicode_escape")
         ]
 
         try:
+            app_info = self.algod_client.application_info(self.app_id)
             global_state, \
             creator_address, \
             approval_program, \
             clear_state_program = algo_helper.read_global_state(client=self.algod_client,
                                                                 app_id=self.app_id,
                                                                 to_array=False,
-                                                                show=False)
+                                                                show=False,
+                                                                app_info=app_info)
 
             self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
 
@@ -408,21 +569,26 @@ class Delivery:
                                                      receiver_address=address,
                                                      amount=delivery_unit_cost*book_capacity)
             # Atomic transfer
-            gid = transaction.calculate_group_id([call_txn, payment_txn])
-            call_txn.group = gid
-            payment_txn.group = gid
-
-            call_txn = call_txn.sign(user_private_key)
-            escrow_logic_signature = transaction.LogicSig(self.escrow_bytes)
-            payment_txn = transaction.LogicSigTransaction(payment_txn, escrow_logic_signature)
-
+            with span("build_group"):
+                gid = transaction.calculate_group_id([call_txn, payment_txn])
+                call_txn.group = gid
+                payment_txn.group = gid
+
+            with span("sign_group"):
+                call_txn = call_txn.sign(user_private_key)
+                escrow_logic_signature = transaction.LogicSig(self.escrow_bytes_for(escrow_address))
+                payment_txn = transaction.LogicSigTransaction(payment_txn, escrow_logic_signature)
+
+            if not self._preflight_check([call_txn, payment_txn], app_info, account_info):
+                return False
             txn_response = ApplicationManager.send_group_transactions(self.algod_client, [call_txn, payment_txn])
-            utils.console_log("Participation canceled to Application with app-id: {}"
-                              .format(self.app_id), "green")
+            log.info("Participation canceled to Application with app-id: %s", self.app_id)
         except Exception as e:
-            utils.console_log("Error during participation cancel call: {}".format(e))
+            log.error("Error during participation cancel call: %s", e)
             return False
 
+    @traced()
+    @track_operation()
     def start_delivery(self, creator_private_key: str):
         """
         Start a delivery and transfer founding to the creator
@@ -438,15 +604,7 @@ class Delivery:
         ]
 
         try:
-            global_state, \
-            creator_address, \
-            approval_program, \
-            clear_state_program = algo_helper.read_global_state(client=self.algod_client,
-                                                                app_id=self.app_id,
-                                                                to_array=False,
-                                                                show=False)
-
-            self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
+            self.verify_program()
 
             address = algo_helper.get_address_from_private_key(creator_private_key)
             txn = ApplicationManager.call_app(algod_client=self.algod_client,
@@ -454,15 +612,19 @@ class Delivery:
                                               app_id=self.app_id,
                                               app_args=app_args,
                                               sign_transaction=creator_private_key)
+            if not self._preflight_check([txn]):
+                return False
 
             txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
-            utils.console_log("Escrow initialized for Application with app-id {} with address: {}"
-                              .format(self.app_id, self.escrow_address), "green")
+            log.info("Escrow initialized for Application with app-id %s with address: %s",
+                     self.app_id, self.escrow_address)
 
         except Exception as e:
-            utils.console_log("Error during start_delivery call: {}".format(e))
+            log.error("Error during start_delivery call: %s", e)
             return False
 
+    @traced()
+    @track_operation()
     def finish_delivery(self, creator_private_key: str):
         """
         Start a delivery and transfer founding to the creator
@@ -478,13 +640,15 @@ class Delivery:
         ]
 
         try:
+            app_info = self.algod_client.application_info(self.app_id)
             global_state, \
             creator_address, \
             approval_program, \
             clear_state_program = algo_helper.read_global_state(client=self.algod_client,
                                                                 app_id=self.app_id,
                                                                 to_array=False,
-                                                                show=False)
+                                                                show=False,
+                                                                app_info=app_info)
 
             self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
 
@@ -503,24 +667,216 @@ class Delivery:
                                                      amount=delivery_unit_cost*delivered_capacity,
                                                      close_remainder_to=address)
             # Atomic transfer
-            gid = transaction.calculate_group_id([call_txn, payment_txn])
-            call_txn.group = gid
-            payment_txn.group = gid
+            with span("build_group"):
+                gid = transaction.calculate_group_id([call_txn, payment_txn])
+                call_txn.group = gid
+                payment_txn.group = gid
+
+            with span("sign_group"):
+                call_txn = call_txn.sign(creator_private_key)
+                escrow_logic_signature = transaction.LogicSig(self.escrow_bytes_for(escrow_address))
+                payment_txn = transaction.LogicSigTransaction(payment_txn, escrow_logic_signature)
+
+            if not self._preflight_check([call_txn, payment_txn], app_info):
+                return False
+            ApplicationManager.send_group_transactions(self.algod_client, [call_txn, payment_txn])
+        except Exception as e:
+            log.error("Error during finish_delivery call: %s", e)
+            return False
 
-            call_txn = call_txn.sign(creator_private_key)
-            escrow_logic_signature = transaction.LogicSig(self.escrow_bytes)
-            payment_txn = transaction.LogicSigTransaction(payment_txn, escrow_logic_signature)
 
-            ApplicationManager.send_group_transactions(self.algod_client, [call_txn, payment_txn])
+    @traced()
+    @track_operation()
+    def cancel_delivery(self,
+                        creator_private_key: str,
+                        participants: [str],
+                        batch_size: int = MAX_GROUP_SIZE,
+                        pipeline: int = 4,
+                        progress=None):
+        """
+        Cancel the delivery and refund every participant, then close the escrow to the creator.
+        Each refund is a refundParticipant call followed by the escrow payment, grouped by up to batch_size
+        transactions; up to `pipeline` groups are submitted before waiting for the confirmation of the first one.
+        Refunded participants have no booking left, so calling it again after an interruption refunds the others only
+        :param creator_private_key:
+        :param participants: participant addresses, the ones without booking are skipped
+        :param batch_size: transactions per group, 2 to 16
+        :param pipeline: groups waiting for confirmation
+        :param progress: called with the CancellationProgress after every confirmed group
+        :return: CancellationProgress, False on failure
+        """
+        address = account.address_from_private_key(creator_private_key)
+
+        try:
+            global_state, \
+            creator_address, \
+            approval_program, \
+            clear_state_program = algo_helper.read_global_state(client=self.algod_client,
+                                                                app_id=self.app_id,
+                                                                to_array=False,
+                                                                show=False)
+
+            self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
+
+            if global_state.get("delivery_state") != self.app_contract.AppState.cancelled.value:
+                app_args = [bytes(self.app_contract.AppMethods.cancel_delivery, encoding="raw_unicode_escape")]
+                txn = ApplicationManager.call_app(algod_client=self.algod_client,
+                                                  address=address,
+                                                  app_id=self.app_id,
+                                                  app_args=app_args,
+                                                  sign_transaction=creator_private_key)
+                ApplicationManager.send_transaction(self.algod_client, txn)
+                log.info("Cancelled Application with app-id: %s", self.app_id)
+
+            delivery_unit_cost = global_state.get("delivery_unit_cost")
+            escrow_address = algo_helper.BytesToAddress(global_state.get("escrow_address"))
+            participants = list(dict.fromkeys(participants))
+            refunds = []
+            with span("read_bookings", participants=len(participants)):
+                for participant in participants:
+                    local_state = algo_helper.read_local_state(self.algod_client, participant, self.app_id,
+                                                               show=False)
+                    book_capacity = (local_state or {}).get("book_capacity", 0)
+                    if book_capacity:
+                        refunds.append((participant, delivery_unit_cost*book_capacity))
+
+            report = CancellationProgress(self.app_id, len(refunds), skipped=len(participants) - len(refunds))
+            self._send_refunds(creator_private_key, escrow_address, refunds, batch_size, pipeline, report, progress)
+            log.info("Refunded %s of %s participants of app-id %s in %s groups", report.refunded, report.total,
+                     self.app_id, report.groups_confirmed)
+            if report.done:
+                global_state, _, _, _ = algo_helper.read_global_state(self.algod_client, self.app_id, False, False)
+                report.booked_capacity = global_state.get("max_capacity") - global_state.get("delivery_capacity")
+                if report.booked_capacity:
+                    log.warning("Capacity %s of app-id %s is still booked by participants not given",
+                                report.booked_capacity, self.app_id)
+                else:
+                    report.escrow_reclaimed = bool(self.reclaim_escrow(creator_private_key))
+            return report
         except Exception as e:
-            utils.console_log("Error during finish_delivery call: {}".format(e))
+            log.error("Error during cancel_delivery: %s", e)
             return False
 
+    def _send_refunds(self, creator_private_key, escrow_address, refunds, batch_size, pipeline, report, progress):
+        """
+        Submit the refund groups, keeping up to `pipeline` of them waiting for confirmation
+        """
+        from models.TransactionTemplates import TransactionTemplates
+
+        address = account.address_from_private_key(creator_private_key)
+        method = self.app_contract.AppMethods.refund_participant
+        escrow_logic_signature = transaction.LogicSig(self.escrow_bytes_for(escrow_address))
+        refunds_per_group = max(1, min(batch_size, MAX_GROUP_SIZE) // 2)
+        submitted = collections.deque()
+        templates = None
+
+        for start in range(0, len(refunds), refunds_per_group):
+            batch = refunds[start:start + refunds_per_group]
+            params = self.algod_client.suggested_params()
+            if templates is None:
+                templates = TransactionTemplates(self.app_id, params)
+            else:
+                templates.set_params(params)
+            # Atomic transfer
+            with span("build_group"):
+                txns = []
+                for participant, amount in batch:
+                    txns.append(templates.call_app(address, method, accounts=[participant]))
+                    txns.append(templates.payment(escrow_address, participant, amount))
+                templates.group(txns)
+
+            with span("sign_group"):
+                signed = [txn.sign(creator_private_key) if index % 2 == 0 else
+                          transaction.LogicSigTransaction(txn, escrow_logic_signature)
+                          for index, txn in enumerate(txns)]
 
+            try:
+                tx_id = ApplicationManager.submit_group_transactions(self.algod_client, signed)
+                report.groups_submitted += 1
+                submitted.append((tx_id, batch))
+            except Exception as e:
+                log.error("Error during refund group submission: %s", e)
+                report.fail(batch, e)
+
+            while len(submitted) >= max(1, pipeline):
+                self._confirm_refunds(submitted.popleft(), report, progress)
+        while submitted:
+            self._confirm_refunds(submitted.popleft(), report, progress)
+
+    def _confirm_refunds(self, submitted, report, progress):
+        tx_id, batch = submitted
+        try:
+            info = ApplicationManager.confirm_transaction(self.algod_client, tx_id)
+            report.confirmed(batch, info.get("confirmed-round"))
+        except Exception as e:
+            log.error("Error during refund group confirmation: %s", e)
+            report.fail(batch, e)
+        if progress is not None:
+            progress(report)
+
+    @traced()
+    @track_operation()
+    def reclaim_escrow(self, creator_private_key: str):
+        """
+        Close the escrow of a cancelled delivery to the creator, once every participant is refunded
+        :param creator_private_key:
+        :return: True once the close payment is confirmed, None if the escrow was already closed, False on error
+        """
+
+        address = account.address_from_private_key(creator_private_key)
+
+        app_args = [
+            bytes(self.app_contract.AppMethods.reclaim_escrow, encoding="raw_unicode_escape"),
+        ]
+
+        try:
+            global_state, _, _, _ = algo_helper.read_global_state(client=self.algod_client,
+                                                                  app_id=self.app_id,
+                                                                  to_array=False,
+                                                                  show=False)
+            escrow_address = algo_helper.BytesToAddress(global_state.get("escrow_address"))
+            if not self.algod_client.account_info(escrow_address).get("amount"):
+                log.info("Escrow of Application with app-id %s already closed", self.app_id)
+                return None
+
+            call_txn = ApplicationManager.call_app(algod_client=self.algod_client,
+                                                   address=address,
+                                                   app_id=self.app_id,
+                                                   app_args=app_args)
+
+            payment_txn = ApplicationManager.payment(algod_client=self.algod_client,
+                                                     sender_address=escrow_address,
+                                                     receiver_address=address,
+                                                     amount=0,
+                                                     close_remainder_to=address)
+            # Atomic transfer
+            with span("build_group"):
+                gid = transaction.calculate_group_id([call_txn, payment_txn])
+                call_txn.group = gid
+                payment_txn.group = gid
+
+            with span("sign_group"):
+                call_txn = call_txn.sign(creator_private_key)
+                escrow_logic_signature = transaction.LogicSig(self.escrow_bytes_for(escrow_address))
+                payment_txn = transaction.LogicSigTransaction(payment_txn, escrow_logic_signature)
+
+            ApplicationManager.send_group_transactions(self.algod_client, [call_txn, payment_txn])
+            payment_info = self.algod_client.pending_transaction_info(payment_txn.transaction.get_txid())
+            if not payment_info.get("confirmed-round"):
+                log.error("Close payment of the escrow of app-id %s not confirmed", self.app_id)
+                return False
+            log.info("Escrow of Application with app-id %s closed to the creator", self.app_id)
+            return True
+        except Exception as e:
+            log.error("Error during reclaim_escrow call: %s", e)
+            return False
+
+    @traced()
+    @track_operation()
     def close_delivery(self, creator_private_key: str, participating_users: [dict]):
         """
         Close the delivery and delete the Smart Contract dApp
-        :param participating_users:
+        :param participating_users: KeyringAccount, {'name', 'mnemonic'} dicts or account names
         :param creator_private_key:
         :return:
         """
@@ -533,14 +889,17 @@ class Delivery:
                                                 app_id=self.app_id,
                                                 sign_transaction=creator_private_key)
             txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
-            utils.console_log("Deleted Application with app-id: {}".format(self.app_id), "green")
+            log.info("Deleted Application with app-id: %s", self.app_id)
         except Exception as e:
-            utils.console_log("Error during delete_app call: {}".format(e))
+            log.error("Error during delete_app call: %s", e)
             return False
 
+        keyring = Keyring.default()
         for test_user in participating_users:
-            private_key = algo_helper.get_private_key_from_mnemonic(test_user.get('mnemonic'))
-            address = algo_helper.get_address_from_private_key(private_key)
+            # keys are derived once per process, whatever the number of deliveries closed
+            test_user = keyring.resolve(test_user)
+            private_key = test_user.private_key
+            address = test_user.address
             local_state = algo_helper.read_local_state(self.algod_client, address, self.app_id)
             if local_state is not None:
                 try:
@@ -550,27 +909,38 @@ class Delivery:
                                                        app_id=self.app_id,
                                                        sign_transaction=private_key)
                     txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
-                    utils.console_log("Cleared app-id: {}".format(self.app_id), "green")
+                    log.info("Cleared app-id: %s", self.app_id)
                 except Exception as e:
-                    utils.console_log("Error during clear_app call: {}".format(e))
+                    log.error("Error during clear_app call: %s", e)
                     return False
 
+    @property
+    def program_verifier(self):
+        """
+        Verifier shared by the deliveries expecting the same programs, None when the hashes are not set
+        :return:
+        """
+        if self.approval_program_hash is None or self.clear_state_program_hash is None:
+            return None
+        from models.ProgramVerifier import ProgramVerifier
+        return ProgramVerifier.shared(self.algod_client, self.approval_program_hash, self.clear_state_program_hash)
+
+    @traced()
     def check_program_hash(self, approval_program, clear_state_program):
         """
-        Check the contract programs
+        Check the given contract programs, a mismatch also drops the app from the verified ones
         @param approval_program: given approval program hash
         @param clear_state_program: given clear state program hash
         """
-        if self.approval_program_hash is not None and self.clear_state_program_hash is not None:
-            if approval_program != self.approval_program_hash:
-                print("Given hash:")
-                print(approval_program)
-                print("Expected hash:")
-                print(self.approval_program_hash)
-                raise Exception("Approval program hash is invalid")
-            if clear_state_program != self.clear_state_program_hash:
-                print("Given hash:")
-                print(clear_state_program)
-                print("Expected hash:")
-                print(self.clear_state_program_hash)
-                raise Exception("Clear state program hash is invalid")
+        verifier = self.program_verifier
+        if verifier is not None:
+            verifier.check(self.app_id, approval_program, clear_state_program)
+
+    @traced()
+    def verify_program(self):
+        """
+        Check the contract programs, the application is fetched only when not verified yet
+        """
+        verifier = self.program_verifier
+        if verifier is not None:
+            verifier.verify(self.app_id, self.algod_client)
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+from algosdk.v2client import algod
+
+from models.DeliveryIndex import DeliveryEvent, DeliveryIndex
+from models.RoundFollower import RoundFollower
+from utilities import utils
+
+log = utils.get_logger(__name__)
+
+
+# class to filter the events delivered to a subscriber
+class Subscription:
+    __slots__ = ("callback", "kinds", "app_ids")
+
+    def __init__(self, callback, kinds=None, app_ids=None):
+        """
+        :param callback: called with each matching DeliveryEvent, from the follower thread
+        :param kinds: DeliveryEvent kinds, all of them when None
+        :param app_ids: application ids, all the deliveries when None
+        """
+        self.callback = callback
+        self.kinds = frozenset(kinds) if kinds is not None else None
+        self.app_ids = frozenset(app_ids) if app_ids is not None else None
+
+    def matches(self, event: DeliveryEvent):
+        return (self.kinds is None or event.kind in self.kinds) and \
+               (self.app_ids is None or event.app_id in self.app_ids)
+
+
+# class to push delivery events to subscribers, reading each round once whatever the number of deliveries
+class DeliveryEvents:
+    def __init__(self, algod_client: algod.AlgodClient, index: DeliveryIndex = None, start_round: int = None):
+        """
+        :param algod_client:
+        :param index: index driving the events, an in-memory one is created when not given
+        :param start_round: first round read by the created index, defaults to the next round
+        """
+        self.index = index if index is not None else DeliveryIndex(algod_client, start_round=start_round)
+        self._subscriptions = []
+        self._lock = threading.Lock()
+        self.index.add_listener(self._dispatch)
+
+    def subscribe(self, callback, kinds=None, app_ids=None):
+        """
+        Call callback(DeliveryEvent) for every matching event, in block order
+        :param callback:
+        :param kinds: DeliveryEvent kinds, all of them when None
+        :param app_ids: application ids, all the deliveries when None
+        :return: the subscription, to unsubscribe it
+        """
+        subscription = Subscription(callback, kinds, app_ids)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.remove(subscription)
+
+    def _dispatch(self, event: DeliveryEvent):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                try:
+                    subscription.callback(event)
+                except Exception as e:
+                    log.error("Delivery event subscriber %s failed on %s: %s", subscription.callback, event, e)
+
+    async def stream(self, kinds=None, app_ids=None):
+        """
+        Async iterator over the matching events, e.g. async for event in events.stream(kinds=[...])
+        :param kinds: DeliveryEvent kinds, all of them when None
+        :param app_ids: application ids, all the deliveries when None
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def push(event):
+            # called from the follower thread
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        subscription = self.subscribe(push, kinds, app_ids)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.unsubscribe(subscription)
+
+    def start(self, follower: RoundFollower = None):
+        """
+        :param follower: shared RoundFollower, a new one is started when not given
+        :return: self
+        """
+        self.index.start(follower)
+        return self
+
+    def stop(self):
+        self.index.stop()
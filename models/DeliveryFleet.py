@@ -0,0 +1,235 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from algosdk.v2client import algod
+
+from constants import Constants
+from models.DeliveryManager import DeliveryManager
+from utilities import rpc_metrics, utils
+
+log = utils.get_logger(__name__)
+
+# DeliveryManager operations the fleet can route, all but create take the app_id as first argument
+OPERATIONS = ["create", "update_app", "update_delivery_info", "initialize_escrow", "fund_escrow", "participate",
+              "cancel_participation", "start_delivery", "finish_delivery", "cancel_delivery", "close_delivery"]
+
+
+class WorkerDied(Exception):
+    """
+    The worker process an operation was routed to exited before answering
+    """
+    pass
+
+
+def _worker_main(index, algod_token, algod_address, program_hashes, threads, inbox, outbox):
+    """
+    Worker process: its own algod connection, DeliveryManager (cache of deliveries and per-app locks) and threads
+    waiting for confirmations. Requests are (request_id, operation, args), None stops the worker.
+    """
+    utils.configure_logging(quiet=True)
+    manager = DeliveryManager(algod.AlgodClient(algod_token, algod_address), *program_hashes)
+
+    def execute(request_id, operation, args):
+        start = time.perf_counter()
+        try:
+            result = getattr(manager, operation)(*args)
+            outbox.put((request_id, result is not False, result, None, time.perf_counter() - start))
+        except Exception as e:
+            outbox.put((request_id, False, None, repr(e), time.perf_counter() - start))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        while True:
+            request = inbox.get()
+            if request is None:
+                break
+            request_id, operation, args = request
+            if operation == "metrics":
+                outbox.put((request_id, True, {"rpc": rpc_metrics.metrics.export_state(),
+                                               "locks": manager.lock_metrics(top=10)}, None, 0.0))
+                continue
+            pool.submit(execute, request_id, operation, args)
+    outbox.put((None, index, None, None, 0.0))
+
+
+# class to drive thousands of deliveries from a pool of worker processes, app_ids are sharded across the workers
+class DeliveryFleet:
+    def __init__(self,
+                 workers: int = None,
+                 algod_address: str = Constants.algod_address,
+                 algod_token: str = Constants.algod_token,
+                 threads_per_worker: int = 8,
+                 approval_program_hash: str = None,
+                 clear_state_program_hash: str = None):
+        """
+        :param workers: number of processes, defaults to the number of cores
+        :param algod_address:
+        :param algod_token:
+        :param threads_per_worker: operations in flight per worker (mostly waiting for confirmations)
+        :param approval_program_hash: expected approval program, defaults to APPROVAL_PROGRAM
+        :param clear_state_program_hash: expected clear state program, defaults to CLEAR_STATE_PROGRAM
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.algod_address = algod_address
+        self.algod_token = algod_token
+        self.threads_per_worker = threads_per_worker
+        self.program_hashes = (approval_program_hash, clear_state_program_hash)
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._inboxes = []
+        self._outbox = None
+        self._collector = None
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._create_counter = itertools.count()
+        # apps created by a worker stay on it, so its cached Delivery is reused
+        self._routes = {}
+        # workers that stopped on request, and the ones that died (their operations fail with WorkerDied)
+        self._finished = set()
+        self._dead = set()
+
+    def start(self):
+        self._outbox = self._context.Queue()
+        for index in range(self.workers):
+            inbox = self._context.Queue()
+            process = self._context.Process(target=_worker_main, daemon=True,
+                                            args=(index, self.algod_token, self.algod_address, self.program_hashes,
+                                                  self.threads_per_worker, inbox, self._outbox))
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        return self
+
+    def stop(self):
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join()
+        if self._collector is not None:
+            self._collector.join()
+        self._processes, self._inboxes, self._collector = [], [], None
+        self._finished, self._dead = set(), set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _collect(self):
+        while len(self._finished) + len(self._dead) < self.workers:
+            try:
+                request_id, ok, result, error, latency = self._outbox.get(timeout=0.5)
+            except queue.Empty:
+                # nothing left to read: a worker that is gone without its stop marker died
+                self._check_workers()
+                continue
+            if request_id is None:
+                self._finished.add(ok)
+                continue
+            with self._pending_lock:
+                future, operation = self._pending.pop(request_id)
+            if operation == "create" and ok:
+                self._routes[result] = future.worker
+            future.set_result(FleetResult(operation, ok, result, error, latency))
+
+    def _check_workers(self):
+        for index, process in enumerate(self._processes):
+            if index in self._finished or index in self._dead or process.is_alive():
+                continue
+            with self._pending_lock:
+                self._dead.add(index)
+                lost = [(request_id, future) for request_id, (future, _) in self._pending.items()
+                        if future.worker == index]
+                for request_id, _ in lost:
+                    del self._pending[request_id]
+            log.error("Fleet worker %s died (exit code %s), failing %s pending operations", index,
+                      process.exitcode, len(lost))
+            for _, future in lost:
+                future.set_exception(WorkerDied("Worker {} exited with code {}".format(index, process.exitcode)))
+
+    def shard(self, app_id: int):
+        """
+        Worker index owning an application
+        :param app_id:
+        :return:
+        """
+        worker = self._routes.get(app_id)
+        return worker if worker is not None else app_id % self.workers
+
+    def _send(self, worker, operation, args):
+        request_id = next(self._request_ids)
+        future = Future()
+        future.worker = worker
+        with self._pending_lock:
+            if worker in self._dead:
+                future.set_exception(WorkerDied("Worker {} exited with code {}".format(
+                    worker, self._processes[worker].exitcode)))
+                return future
+            self._pending[request_id] = (future, operation)
+        self._inboxes[worker].put((request_id, operation, args))
+        return future
+
+    def submit(self, operation: str, *args):
+        """
+        Route an operation to the worker owning the app
+        :param operation: DeliveryManager method name
+        :param args: method arguments, app_id first for every operation but create
+        :return: Future resolved with a FleetResult, or failed with WorkerDied if the worker process exited
+        """
+        if operation not in OPERATIONS:
+            raise ValueError("Unknown operation: {}".format(operation))
+        if operation == "create":
+            worker = next(self._create_counter) % self.workers
+        else:
+            worker = self.shard(args[0])
+        return self._send(worker, operation, args)
+
+    def run(self, operations):
+        """
+        Submit (operation, *args) tuples and wait for all of them
+        :param operations:
+        :return: FleetResult list in submission order
+        """
+        futures = [self.submit(*operation) for operation in operations]
+        return [future.result() for future in futures]
+
+    def metrics(self):
+        """
+        RPC metrics and lock contention aggregated over the workers
+        :return: RpcMetrics registry holding the merged counters, merged lock metrics
+        """
+        futures = [self._send(worker, "metrics", ()) for worker in range(self.workers)]
+        registry = rpc_metrics.RpcMetrics()
+        locks = {"apps": 0, "acquisitions": 0, "contended": 0, "wait_total_ms": 0.0, "wait_max_ms": 0.0,
+                 "most_contended": {}}
+        for future in futures:
+            worker_metrics = future.result().result
+            registry.merge_state(worker_metrics["rpc"])
+            worker_locks = worker_metrics["locks"]
+            for key in ("apps", "acquisitions", "contended", "wait_total_ms"):
+                locks[key] += worker_locks[key]
+            locks["wait_max_ms"] = max(locks["wait_max_ms"], worker_locks["wait_max_ms"])
+            locks["most_contended"].update(worker_locks["most_contended"])
+        locks["wait_total_ms"] = round(locks["wait_total_ms"], 3)
+        locks["contention_ratio"] = round(locks["contended"] / locks["acquisitions"], 4) \
+            if locks["acquisitions"] else 0.0
+        return registry, locks
+
+
+class FleetResult:
+    __slots__ = ("operation", "ok", "result", "error", "latency")
+
+    def __init__(self, operation, ok, result, error, latency):
+        self.operation = operation
+        self.ok = ok
+        self.result = result
+        self.error = error
+        self.latency = latency
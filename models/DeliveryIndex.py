@@ -0,0 +1,368 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import msgpack
+from algosdk import encoding
+from algosdk.v2client import algod
+
+from constants import Constants, get_env
+from helpers import algo_helper
+from models.RoundFollower import RoundFollower
+from utilities import utils
+from utilities.rpc_metrics import instrument
+from utilities.tracing import span
+
+log = utils.get_logger(__name__)
+
+# on-completion values of application calls
+NO_OP, OPT_IN, CLOSE_OUT, CLEAR_STATE, UPDATE_APPLICATION, DELETE_APPLICATION = range(6)
+
+# delivery_state values of LogisticManagerContract.AppState
+NOT_INITIALIZED, INITIALIZED, READY, STARTED, FINISHED, CANCELLED = range(6)
+
+# fields of the application args of create (from the first arg) and updateDelivery (from the second one)
+DELIVERY_ARGS = ("creator_name", "departure_address", "arrival_address", "departure_date", "departure_date_round",
+                 "arrival_date", "arrival_date_round", "delivery_unit_cost", "max_capacity")
+INT_ARGS = {"departure_date_round", "arrival_date_round", "delivery_unit_cost", "max_capacity"}
+
+
+class DeliveryEvent:
+    """
+    A confirmed change of a delivery, as read from a block
+    """
+    CREATED = "created"
+    ESCROW_INITIALIZED = "escrow_initialized"
+    FUNDED = "funded"
+    UPDATED = "updated"
+    PARTICIPATED = "participated"
+    CANCELLED = "cancelled"
+    STARTED = "started"
+    FINISHED = "finished"
+    DELIVERY_CANCELLED = "delivery_cancelled"
+    PROGRAM_UPDATED = "program_updated"
+    REFUNDED = "refunded"
+    DELETED = "deleted"
+
+    __slots__ = ("kind", "app_id", "round", "sender", "participant", "book_capacity", "delivery")
+
+    def __init__(self, kind, app_id, round_num, sender, participant=None, book_capacity=None, delivery=None):
+        self.kind = kind
+        self.app_id = app_id
+        self.round = round_num
+        self.sender = sender
+        self.participant = participant
+        self.book_capacity = book_capacity
+        # indexed delivery after the change (before it for deleted)
+        self.delivery = delivery
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        return "DeliveryEvent({}, app_id={}, round={})".format(self.kind, self.app_id, self.round)
+
+
+# class to index deliveries and their participants from the algod blocks, without an indexer:
+# blocks are read from a checkpoint round, the calls of the delivery apps update the index and the checkpoint
+# is saved with the index so a restart resumes where it stopped
+class DeliveryIndex:
+    def __init__(self,
+                 algod_client: algod.AlgodClient,
+                 store_path: str = None,
+                 start_round: int = None,
+                 note: str = Constants.transaction_note,
+                 fetch_workers: int = 8,
+                 checkpoint_every: int = 100):
+        """
+        :param algod_client:
+        :param store_path: JSON file of the index and its checkpoint round, None keeps it in memory only
+        :param start_round: first round read when there is no checkpoint, defaults to the next round
+        :param note: note prefix of the application create transactions of deliveries
+        :param fetch_workers: blocks fetched concurrently while catching up
+        :param checkpoint_every: rounds between two saves of the checkpoint while catching up
+        """
+        self.algod_client = instrument(algod_client)
+        self.store_path = store_path
+        self.note = note.encode()
+        self.fetch_workers = fetch_workers
+        self.checkpoint_every = checkpoint_every
+        self.deliveries = {}
+        self.last_round = None if start_round is None else start_round - 1
+        self._saved_round = self.last_round
+        self.follower = None
+        self._owns_follower = False
+        self._listeners = []
+        self._events = []
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def from_env(cls, algod_client: algod.AlgodClient):
+        """
+        Index stored in INDEX_FILE, read from INDEX_START_ROUND when there is no checkpoint yet: starting at the next
+        round would index nothing on a first run, and nodes that are not archival do not keep the first rounds
+        :param algod_client:
+        :return:
+        """
+        store_path = get_env('INDEX_FILE')
+        start_round = get_env('INDEX_START_ROUND')
+        if not start_round and not os.path.exists(store_path):
+            raise ValueError("INDEX_START_ROUND is required to create the delivery index {}".format(store_path))
+        return cls(algod_client, store_path, int(start_round) if start_round else None)
+
+    # ---- persistence ----
+    def load(self):
+        if self.store_path is None or not os.path.exists(self.store_path):
+            return
+        with open(self.store_path) as store_file:
+            data = json.load(store_file)
+        with self._lock:
+            self.last_round = self._saved_round = data["round"]
+            self.deliveries = {int(app_id): delivery for app_id, delivery in data["deliveries"].items()}
+        log.info("Delivery index loaded at round %s with %s deliveries", self.last_round, len(self.deliveries))
+
+    def save(self):
+        with self._lock:
+            self._saved_round = self.last_round
+            if self.store_path is None:
+                return
+            data = json.dumps({"round": self.last_round, "deliveries": self.deliveries})
+        temp_path = self.store_path + ".tmp"
+        with open(temp_path, "w") as store_file:
+            store_file.write(data)
+        os.replace(temp_path, self.store_path)
+
+    # ---- queries ----
+    def app_ids(self, state: int = None):
+        """
+        Indexed deliveries
+        :param state: only the deliveries in this delivery_state
+        :return: app ids, in creation order
+        """
+        with self._lock:
+            return [app_id for app_id, delivery in self.deliveries.items()
+                    if state is None or delivery.get("delivery_state") == state]
+
+    def get(self, app_id: int):
+        """
+        :param app_id:
+        :return: copy of the indexed delivery, global state names plus creator, created_round and participants
+        """
+        with self._lock:
+            delivery = self.deliveries.get(app_id)
+            if delivery is None:
+                return None
+            return dict(delivery, participants=dict(delivery["participants"]))
+
+    def participants(self, app_id: int, booked: bool = True):
+        """
+        :param app_id:
+        :param booked: only the participants with a booked capacity
+        :return: {address: book_capacity}
+        """
+        with self._lock:
+            delivery = self.deliveries.get(app_id)
+            if delivery is None:
+                return {}
+            return {address: capacity for address, capacity in delivery["participants"].items()
+                    if capacity or not booked}
+
+    def deliveries_of(self, address: str):
+        """
+        Deliveries created by or booked by an account
+        :param address:
+        :return: app ids
+        """
+        with self._lock:
+            return [app_id for app_id, delivery in self.deliveries.items()
+                    if delivery["creator"] == address or delivery["participants"].get(address)]
+
+    def track(self, app_ids):
+        """
+        Add existing deliveries from their current global state, for apps created before the start round.
+        Participants are only known from the calls read afterwards
+        :param app_ids:
+        """
+        for app_id in app_ids:
+            global_state, creator, _, _ = algo_helper.read_global_state(self.algod_client, app_id, False, False)
+            delivery = {key: value for key, value in global_state.items() if key != "creator"}
+            if "escrow_address" in delivery:
+                delivery["escrow_address"] = algo_helper.BytesToAddress(delivery["escrow_address"])
+            delivery.update(app_id=app_id, creator=creator, created_round=None, participants={})
+            with self._lock:
+                self.deliveries.setdefault(app_id, delivery)
+
+    def add_listener(self, listener):
+        """
+        Call listener(DeliveryEvent) for every change applied to the index, in block order
+        :param listener:
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _event(self, kind, app_id, round_num, sender, participant=None, book_capacity=None):
+        if self._listeners:
+            delivery = self.deliveries.get(app_id)
+            delivery = dict(delivery, participants=dict(delivery["participants"])) if delivery else None
+            self._events.append(DeliveryEvent(kind, app_id, round_num, sender, participant, book_capacity, delivery))
+
+    # ---- block processing ----
+    def _block(self, round_num):
+        with span("read_block", round=round_num):
+            return msgpack.unpackb(self.algod_client.block_info(round_num, response_format="msgpack"), raw=False,
+                                   strict_map_key=False)["block"]
+
+    def sync(self, to_round: int = None):
+        """
+        Read the blocks from the checkpoint up to to_round, fetching fetch_workers blocks ahead
+        :param to_round: defaults to the last round of the node
+        :return: last indexed round
+        """
+        with self._sync_lock:
+            if to_round is None:
+                to_round = self.algod_client.status()["last-round"]
+            if self.last_round is None:
+                self.last_round = self._saved_round = to_round
+            if to_round == self.last_round + 1:
+                # following the tip: one block per round, no prefetch
+                self.apply_block(to_round, self._block(to_round))
+            elif to_round > self.last_round:
+                with ThreadPoolExecutor(max_workers=max(1, self.fetch_workers)) as executor:
+                    # map keeps the round order, the next blocks are fetched while one is applied
+                    for start in range(self.last_round + 1, to_round + 1, self.checkpoint_every):
+                        rounds = range(start, min(start + self.checkpoint_every, to_round + 1))
+                        for round_num, block in zip(rounds, executor.map(self._block, rounds)):
+                            self.apply_block(round_num, block)
+                        self.save()
+            if self.last_round - self._saved_round >= self.checkpoint_every:
+                self.save()
+            return self.last_round
+
+    def apply_block(self, round_num, block):
+        """
+        Update the index with the transactions of a block, in block order
+        :param round_num:
+        :param block: decoded msgpack block
+        """
+        with self._lock:
+            for stxn in block.get("txns") or []:
+                txn = stxn["txn"]
+                if txn.get("type") != "appl":
+                    continue
+                app_id = txn.get("apid", 0)
+                if app_id == 0:
+                    if txn.get("note", b"").startswith(self.note) and len(txn.get("apaa", [])) == len(DELIVERY_ARGS):
+                        self._created(round_num, stxn.get("apid"), txn)
+                elif app_id in self.deliveries:
+                    self._called(round_num, app_id, txn)
+            self.last_round = round_num
+            events, self._events = self._events, []
+        # listeners run outside of the lock, they can query the index
+        for event in events:
+            for listener in list(self._listeners):
+                try:
+                    listener(event)
+                except Exception as e:
+                    log.error("Delivery event listener %s failed: %s", listener, e)
+
+    def _created(self, round_num, app_id, txn):
+        delivery = {"app_id": app_id, "creator": encoding.encode_address(txn["snd"]), "created_round": round_num,
+                    "delivery_state": NOT_INITIALIZED, "participants": {}}
+        self._set_fields(delivery, txn["apaa"])
+        self.deliveries[app_id] = delivery
+        self._event(DeliveryEvent.CREATED, app_id, round_num, delivery["creator"])
+
+    @staticmethod
+    def _set_fields(delivery, args):
+        for name, value in zip(DELIVERY_ARGS, args):
+            delivery[name] = int.from_bytes(value, "big") if name in INT_ARGS else value.decode(errors="replace")
+        delivery["delivery_capacity"] = delivery["max_capacity"]
+
+    def _called(self, round_num, app_id, txn):
+        delivery = self.deliveries[app_id]
+        sender = encoding.encode_address(txn["snd"])
+        on_complete = txn.get("apan", NO_OP)
+        args = txn.get("apaa", [])
+        participants = delivery["participants"]
+        delivery["last_round"] = round_num
+
+        if on_complete == DELETE_APPLICATION:
+            self._event(DeliveryEvent.DELETED, app_id, round_num, sender)
+            del self.deliveries[app_id]
+        elif on_complete == UPDATE_APPLICATION:
+            self._event(DeliveryEvent.PROGRAM_UPDATED, app_id, round_num, sender)
+        elif on_complete == OPT_IN:
+            participants.setdefault(sender, 0)
+        elif on_complete in (CLOSE_OUT, CLEAR_STATE):
+            # a booking cleared by the user is lost, the capacity stays booked
+            participants.pop(sender, None)
+        elif on_complete == NO_OP and args:
+            method = args[0]
+            if method == b"participateDelivery":
+                participants[sender] = int.from_bytes(args[1], "big")
+                delivery["delivery_capacity"] -= participants[sender]
+                self._event(DeliveryEvent.PARTICIPATED, app_id, round_num, sender, sender, participants[sender])
+            elif method == b"cancelParticipation":
+                book_capacity = participants.get(sender, 0)
+                delivery["delivery_capacity"] += book_capacity
+                participants[sender] = 0
+                delivery["refunds"] = delivery.get("refunds", 0) + 1
+                self._event(DeliveryEvent.CANCELLED, app_id, round_num, sender, sender, book_capacity)
+            elif method == b"refundParticipant":
+                participant = encoding.encode_address(txn["apat"][0])
+                book_capacity = participants.get(participant, 0)
+                delivery["delivery_capacity"] += book_capacity
+                participants[participant] = 0
+                delivery["refunds"] = delivery.get("refunds", 0) + 1
+                self._event(DeliveryEvent.REFUNDED, app_id, round_num, sender, participant, book_capacity)
+            elif method == b"initializeEscrow":
+                delivery["escrow_address"] = encoding.encode_address(args[1])
+                delivery["delivery_state"] = INITIALIZED
+                self._event(DeliveryEvent.ESCROW_INITIALIZED, app_id, round_num, sender)
+            elif method == b"fundEscrow":
+                delivery["delivery_state"] = READY
+                self._event(DeliveryEvent.FUNDED, app_id, round_num, sender)
+            elif method == b"updateDelivery":
+                self._set_fields(delivery, args[1:])
+                self._event(DeliveryEvent.UPDATED, app_id, round_num, sender)
+            elif method == b"startDelivery":
+                delivery["delivery_state"] = STARTED
+                self._event(DeliveryEvent.STARTED, app_id, round_num, sender)
+            elif method == b"finishDelivery":
+                delivery["delivery_state"] = FINISHED
+                self._event(DeliveryEvent.FINISHED, app_id, round_num, sender)
+            elif method == b"cancelDelivery":
+                delivery["delivery_state"] = CANCELLED
+                self._event(DeliveryEvent.DELIVERY_CANCELLED, app_id, round_num, sender)
+
+    # ---- following ----
+    def start(self, follower: RoundFollower = None):
+        """
+        Catch up with the chain, then index every new round
+        :param follower: shared RoundFollower, a new one is started when not given
+        :return: self
+        """
+        self.sync()
+        self._owns_follower = follower is None
+        self.follower = follower or RoundFollower(self.algod_client, self.last_round + 1)
+        self.follower.subscribe(self._on_round)
+        if self._owns_follower:
+            self.follower.start()
+        return self
+
+    def _on_round(self, round_num):
+        # rounds missed by a shared follower started later than the checkpoint are read first
+        self.sync(round_num)
+
+    def stop(self):
+        if self.follower is not None:
+            self.follower.unsubscribe(self._on_round)
+            if self._owns_follower:
+                self.follower.stop()
+            self.follower = None
+        self.save()
@@ -0,0 +1,228 @@
+import contextlib
+import threading
+import time
+
+from algosdk.v2client import algod
+
+from models.Delivery import Delivery
+from models.Preflight import PreflightRejected
+from utilities import utils
+from utilities.rpc_metrics import instrument
+
+log = utils.get_logger(__name__)
+
+
+class _AppLock:
+    """
+    Lock of one application with its contention statistics
+    """
+    __slots__ = ("lock", "acquisitions", "contended", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquire(self):
+        if self.lock.acquire(blocking=False):
+            wait = 0.0
+        else:
+            start = time.perf_counter()
+            self.lock.acquire()
+            wait = time.perf_counter() - start
+        # statistics are updated while holding the lock
+        self.acquisitions += 1
+        if wait:
+            self.contended += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def release(self):
+        self.lock.release()
+
+
+# class to share deliveries between threads: operations on the same app_id are serialized,
+# operations on different apps run in parallel
+class DeliveryManager:
+    def __init__(self,
+                 algod_client: algod.AlgodClient,
+                 approval_program_hash: str = None,
+                 clear_state_program_hash: str = None,
+                 preflight: str = None):
+        """
+        :param algod_client: shared by every delivery
+        :param approval_program_hash: expected approval program, defaults to APPROVAL_PROGRAM
+        :param clear_state_program_hash: expected clear state program, defaults to CLEAR_STATE_PROGRAM
+        :param preflight: Preflight mode of the deliveries, operations rejected by it raise PreflightRejected
+        """
+        self.algod_client = instrument(algod_client)
+        self.approval_program_hash = approval_program_hash
+        self.clear_state_program_hash = clear_state_program_hash
+        self.preflight = preflight
+        self._registry_lock = threading.Lock()
+        self._locks = {}
+        self._deliveries = {}
+
+    def _new_delivery(self, app_id=None):
+        delivery = Delivery(algod_client=self.algod_client, app_id=app_id)
+        if self.approval_program_hash is not None:
+            delivery.approval_program_hash = self.approval_program_hash
+        if self.clear_state_program_hash is not None:
+            delivery.clear_state_program_hash = self.clear_state_program_hash
+        if self.preflight:
+            delivery.enable_preflight(self.preflight)
+        return delivery
+
+    def _app_lock(self, app_id):
+        with self._registry_lock:
+            app_lock = self._locks.get(app_id)
+            if app_lock is None:
+                app_lock = self._locks[app_id] = _AppLock()
+            return app_lock
+
+    @contextlib.contextmanager
+    def session(self, app_id: int):
+        """
+        Exclusive access to the Delivery of an application, for read-then-write sequences
+        :param app_id:
+        :return: context manager yielding the Delivery
+        """
+        app_lock = self._app_lock(app_id)
+        app_lock.acquire()
+        try:
+            delivery = self._deliveries.get(app_id)
+            if delivery is None:
+                delivery = self._deliveries[app_id] = self._new_delivery(app_id)
+            yield delivery
+        finally:
+            app_lock.release()
+
+    def _call(self, app_id, method, *args, **kwargs):
+        with self.session(app_id) as delivery:
+            delivery.last_preflight = None
+            result = getattr(delivery, method)(*args, **kwargs)
+            if result is False and delivery.last_preflight is not None and not delivery.last_preflight.ok:
+                raise PreflightRejected(delivery.last_preflight)
+            return result
+
+    def create(self,
+               creator_private_key: str,
+               delivery_creator_name: str,
+               delivery_start_address: str,
+               delivery_end_address: str,
+               delivery_start_date: str,
+               delivery_end_date: str,
+               delivery_unit_cost: int,
+               delivery_capacity: int,
+               initialize: bool = True):
+        """
+        Create a delivery, initialize and fund its escrow. The new app is registered before it is visible to others
+        :param creator_private_key:
+        :param delivery_creator_name:
+        :param delivery_start_address:
+        :param delivery_end_address:
+        :param delivery_start_date:
+        :param delivery_end_date:
+        :param delivery_unit_cost:
+        :param delivery_capacity:
+        :param initialize: initialize and fund the escrow
+        :return: app_id, False on failure
+        """
+        delivery = self._new_delivery()
+        app_id = delivery.create_app(creator_private_key, delivery_creator_name, delivery_start_address,
+                                     delivery_end_address, delivery_start_date, delivery_end_date,
+                                     delivery_unit_cost, delivery_capacity)
+        if app_id is False:
+            return False
+        with self._registry_lock:
+            self._deliveries[app_id] = delivery
+        if initialize:
+            with self.session(app_id):
+                if delivery.initialize_escrow(creator_private_key) is False \
+                        or delivery.fund_escrow(creator_private_key) is False:
+                    return False
+        return app_id
+
+    def update_app(self, app_id: int, creator_private_key: str):
+        return self._call(app_id, "update_app", creator_private_key)
+
+    def update_delivery_info(self, app_id: int, *args, **kwargs):
+        return self._call(app_id, "update_delivery_info", *args, **kwargs)
+
+    def initialize_escrow(self, app_id: int, creator_private_key: str):
+        return self._call(app_id, "initialize_escrow", creator_private_key)
+
+    def fund_escrow(self, app_id: int, creator_private_key: str):
+        return self._call(app_id, "fund_escrow", creator_private_key)
+
+    def participate(self, app_id: int, user_private_key: str, user_name: str, book_capacity: int):
+        return self._call(app_id, "participate", user_private_key, user_name, book_capacity)
+
+    def cancel_participation(self, app_id: int, user_private_key: str, user_name: str):
+        return self._call(app_id, "cancel_participation", user_private_key, user_name)
+
+    def start_delivery(self, app_id: int, creator_private_key: str):
+        return self._call(app_id, "start_delivery", creator_private_key)
+
+    def finish_delivery(self, app_id: int, creator_private_key: str):
+        return self._call(app_id, "finish_delivery", creator_private_key)
+
+    def cancel_delivery(self, app_id: int, creator_private_key: str, participants: [str], **kwargs):
+        return self._call(app_id, "cancel_delivery", creator_private_key, participants, **kwargs)
+
+    def close_delivery(self, app_id: int, creator_private_key: str, participating_users: [dict]):
+        """
+        Close the delivery and forget the application
+        :param app_id:
+        :param creator_private_key:
+        :param participating_users:
+        :return:
+        """
+        result = self._call(app_id, "close_delivery", creator_private_key, participating_users)
+        if result is not False:
+            with self._registry_lock:
+                self._deliveries.pop(app_id, None)
+        return result
+
+    def verify_programs(self, app_ids: [int]):
+        """
+        Check the programs of many applications, the ones not verified yet are fetched concurrently
+        :param app_ids:
+        :return: dict app_id -> True when the programs match
+        """
+        verifier = self._new_delivery().program_verifier
+        if verifier is None:
+            raise ValueError("Expected program hashes are not set (APPROVAL_PROGRAM, CLEAR_STATE_PROGRAM)")
+        return verifier.verify_many(app_ids)
+
+    def lock_metrics(self, top: int = 10):
+        """
+        Lock contention statistics, overall and for the most contended apps (wait times in milliseconds)
+        :param top: number of apps reported
+        :return:
+        """
+        with self._registry_lock:
+            locks = list(self._locks.items())
+        acquisitions = sum(app_lock.acquisitions for _, app_lock in locks)
+        contended = sum(app_lock.contended for _, app_lock in locks)
+        wait_total = sum(app_lock.wait_total for _, app_lock in locks)
+        most_contended = sorted(locks, key=lambda item: item[1].wait_total, reverse=True)[:top]
+        return {
+            "apps": len(locks),
+            "acquisitions": acquisitions,
+            "contended": contended,
+            "contention_ratio": round(contended / acquisitions, 4) if acquisitions else 0.0,
+            "wait_total_ms": round(wait_total * 1000, 3),
+            "wait_max_ms": round(max((app_lock.wait_max for _, app_lock in locks), default=0.0) * 1000, 3),
+            "most_contended": {
+                app_id: {
+                    "acquisitions": app_lock.acquisitions,
+                    "contended": app_lock.contended,
+                    "wait_total_ms": round(app_lock.wait_total * 1000, 3),
+                    "wait_max_ms": round(app_lock.wait_max * 1000, 3),
+                }
+                for app_id, app_lock in most_contended if app_lock.contended
+            },
+        }
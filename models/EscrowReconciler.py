@@ -0,0 +1,218 @@
+import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk.v2client import algod, indexer
+
+from helpers import algo_helper
+from models.ApplicationManager import ApplicationManager
+from utilities import utils
+from utilities.rpc_metrics import instrument
+
+log = utils.get_logger(__name__)
+
+# delivery_state values of LogisticManagerContract.AppState
+NOT_INITIALIZED, INITIALIZED, READY, STARTED, FINISHED, CANCELLED = range(6)
+
+# LogisticManagerContract.AppMethods paying a refund from the escrow (the contract module is not imported, it loads
+# PyTeal)
+REFUND_METHODS = (b"cancelParticipation", b"refundParticipant")
+
+
+class ReconciliationReport:
+    """
+    Escrows whose balance differs from what the bookings of their delivery imply
+    """
+
+    def __init__(self, total: int, budget: float):
+        self.total = total
+        self.budget = budget
+        self.checked = 0
+        self.unchecked = []
+        self.errors = {}
+        self.discrepancies = []
+        self.elapsed = 0.0
+
+    @property
+    def within_budget(self):
+        return not self.unchecked and self.elapsed <= self.budget
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "checked": self.checked,
+            "unchecked": len(self.unchecked),
+            "errors": self.errors,
+            "discrepancies": self.discrepancies,
+            "elapsed_s": round(self.elapsed, 3),
+            "budget_s": self.budget,
+            "within_budget": self.within_budget,
+        }
+
+    def __repr__(self):
+        return "ReconciliationReport({} checked, {} discrepancies, {} errors, {} unchecked)".format(
+            self.checked, len(self.discrepancies), len(self.errors), len(self.unchecked))
+
+
+# class to audit the escrows of many deliveries: an escrow holds escrow_min_balance plus the booked capacity at unit
+# cost until the delivery is finished, less the fees of the refunds it paid. Balances (and the delivery states, unless
+# a DeliveryIndex provides them) are read concurrently by batches, the expected balances are computed for all the
+# apps at once with NumPy. Without an index the refunds of the funded apps are counted from their transactions on the
+# indexer
+class EscrowReconciler:
+    def __init__(self,
+                 algod_client: algod.AlgodClient,
+                 index=None,
+                 workers: int = 16,
+                 batch_size: int = 50,
+                 tolerance: int = 0,
+                 indexer_client: indexer.IndexerClient = None):
+        """
+        :param algod_client:
+        :param index: synced DeliveryIndex giving the delivery states and refund counts, the apps are read otherwise
+        :param workers: concurrent reads
+        :param batch_size: apps read by a worker task
+        :param tolerance: micro ALGOs of difference accepted
+        :param indexer_client: counts the refunds of the apps read without an index, they are taken as none otherwise
+        """
+        self.algod_client = instrument(algod_client)
+        self.indexer_client = instrument(indexer_client) if indexer_client is not None else None
+        self.index = index
+        self.workers = workers
+        self.batch_size = batch_size
+        self.tolerance = tolerance
+        self.min_balance = ApplicationManager.Variables.escrow_min_balance
+        self.fee = ApplicationManager.Variables.fees
+        self._lock = threading.Lock()
+
+    def _read(self, app_id):
+        """
+        :return: (app_id, delivery_state, delivery_unit_cost, max_capacity, delivery_capacity, refunds, balance),
+        escrow address
+        """
+        delivery = self.index.get(app_id) if self.index is not None else None
+        if delivery is not None:
+            escrow_address = delivery.get("escrow_address")
+            refunds = delivery.get("refunds", 0)
+        else:
+            delivery, _, _, _ = algo_helper.read_global_state(self.algod_client, app_id, False, False)
+            escrow_address = algo_helper.BytesToAddress(delivery["escrow_address"]) \
+                if delivery.get("escrow_address") else None
+            refunds = None
+        state = delivery.get("delivery_state", NOT_INITIALIZED)
+        if refunds is None:
+            funded = state in (READY, STARTED, CANCELLED)
+            refunds = self._count_refunds(app_id) if funded and self.indexer_client is not None else 0
+        balance = 0
+        if escrow_address is not None and state != NOT_INITIALIZED:
+            balance = self.algod_client.account_info(escrow_address)["amount"]
+        return (app_id, state, delivery.get("delivery_unit_cost", 0), delivery.get("max_capacity", 0),
+                delivery.get("delivery_capacity", 0), refunds, balance), escrow_address
+
+    def _count_refunds(self, app_id):
+        """
+        Refunds paid by the escrow of an application, from its confirmed calls
+        :param app_id:
+        :return:
+        """
+        refunds, next_page = 0, None
+        while True:
+            response = self.indexer_client.search_transactions(application_id=app_id, txn_type="appl",
+                                                               next_page=next_page)
+            for transaction in response.get("transactions", []):
+                call = transaction.get("application-transaction", {})
+                args = call.get("application-args", [])
+                if call.get("on-completion") == "noop" and args and base64.b64decode(args[0]) in REFUND_METHODS:
+                    refunds += 1
+            next_page = response.get("next-token")
+            if not next_page or not response.get("transactions"):
+                return refunds
+
+    def _read_batch(self, app_ids, deadline, rows, report):
+        for position, app_id in enumerate(app_ids):
+            if time.perf_counter() > deadline:
+                with self._lock:
+                    report.unchecked.extend(app_ids[position:])
+                return
+            try:
+                row = self._read(app_id)
+            except Exception as e:
+                with self._lock:
+                    report.errors[app_id] = str(e)
+                continue
+            with self._lock:
+                rows.append(row)
+
+    def _read_all(self, app_ids, deadline, report):
+        rows = []
+        batches = [app_ids[start:start + self.batch_size] for start in range(0, len(app_ids), self.batch_size)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(batches))) as executor:
+                for future in [executor.submit(self._read_batch, batch, deadline, rows, report) for batch in batches]:
+                    future.result()
+        return rows
+
+    def _discrepancies(self, rows):
+        """
+        Expected balances of all the rows at once
+        :return: discrepancy dicts
+        """
+        if not rows:
+            return []
+        import numpy as np
+
+        table = np.array([row for row, _ in rows], dtype=np.int64)
+        app_id, state, unit_cost, max_capacity, capacity, refunds, balance = table.T
+        booked = max_capacity - capacity
+        funded = np.isin(state, (READY, STARTED, CANCELLED))
+        expected = np.where(funded, self.min_balance + unit_cost * booked, 0)
+        # the escrow pays the fee of every refund
+        lower = expected - self.fee * refunds - self.tolerance
+        upper = expected + self.tolerance
+        mismatch = (balance < lower) | (balance > upper)
+        # a cancelled delivery without bookings left may have reclaimed (closed) its escrow
+        mismatch &= ~((state == CANCELLED) & (booked == 0) & (balance == 0))
+
+        discrepancies = []
+        for position in np.flatnonzero(mismatch):
+            difference = int(balance[position] - expected[position])
+            discrepancies.append({
+                "app_id": int(app_id[position]),
+                "escrow_address": rows[position][1],
+                "delivery_state": int(state[position]),
+                "balance": int(balance[position]),
+                "expected": int(expected[position]),
+                "difference": difference,
+                "kind": "shortfall" if difference < 0 else "surplus",
+            })
+        return discrepancies
+
+    def reconcile(self, app_ids: [int], budget: float = 60.0, recheck: bool = True):
+        """
+        Compare the escrow balances of many deliveries with their bookings
+        :param app_ids:
+        :param budget: seconds, the apps not read in time are reported as unchecked
+        :param recheck: read the apps with a discrepancy again, to drop the ones caught between two transactions
+        :return: ReconciliationReport
+        """
+        start = time.perf_counter()
+        deadline = start + budget
+        app_ids = list(app_ids)
+        report = ReconciliationReport(len(app_ids), budget)
+        rows = self._read_all(app_ids, deadline, report)
+        discrepancies = self._discrepancies(rows)
+        if recheck and discrepancies and time.perf_counter() < deadline:
+            flagged = [discrepancy["app_id"] for discrepancy in discrepancies]
+            recheck_report = ReconciliationReport(len(flagged), budget)
+            rechecked = self._read_all(flagged, deadline, recheck_report)
+            if not recheck_report.unchecked and not recheck_report.errors:
+                discrepancies = self._discrepancies(rechecked)
+        report.checked = len(rows)
+        report.discrepancies = sorted(discrepancies, key=lambda discrepancy: discrepancy["app_id"])
+        report.elapsed = time.perf_counter() - start
+        for discrepancy in report.discrepancies:
+            log.warning("Escrow of app %s holds %s, expected %s", discrepancy["app_id"], discrepancy["balance"],
+                        discrepancy["expected"], extra={"app_id": discrepancy["app_id"]})
+        log.info("%s", report)
+        return report
@@ -2,12 +2,17 @@
 
 from algosdk.v2client import indexer
 
+from utilities import utils
+from utilities.rpc_metrics import instrument
+
+log = utils.get_logger(__name__)
+
 
 class IndexerHelper:
     indexerObj = None
 
     def __init__(self, host="http://localhost:8980", token=""):
-        self.indexerObj = indexer.IndexerClient(indexer_token=token, indexer_address=host)
+        self.indexerObj = instrument(indexer.IndexerClient(indexer_token=token, indexer_address=host))
 
     def get_app_ids_from_transactions_note(self, note):
         """
@@ -36,7 +41,7 @@ class IndexerHelper:
         :param transaction:
         :return:
         """
-        print(transaction)
+        log.debug("Indexer transaction: %s", transaction)
         return transaction["created-application-index"] if "created-application-index" in transaction else None
 
     def get_application_from_id(self, appid):
@@ -0,0 +1,196 @@
+import hashlib
+import threading
+
+from algosdk import account, mnemonic
+
+from constants import Constants, LazyAccounts
+
+
+class KeyringAccount:
+    """
+    Account of a keyring, its private key and address are derived from the mnemonic on first use
+    """
+    __slots__ = ("name", "_mnemonic", "_private_key", "_address")
+
+    def __init__(self, name: str, mnemonic_phrase: str = None, private_key: str = None):
+        self.name = name
+        self._mnemonic = mnemonic_phrase
+        self._private_key = private_key
+        self._address = None
+
+    @property
+    def private_key(self):
+        if self._private_key is None:
+            self._private_key = mnemonic.to_private_key(self._mnemonic)
+            # the mnemonic is not needed anymore
+            self._mnemonic = None
+        return self._private_key
+
+    @property
+    def address(self):
+        if self._address is None:
+            self._address = account.address_from_private_key(self.private_key)
+        return self._address
+
+    def __repr__(self):
+        return "KeyringAccount({!r})".format(self.name)
+
+
+def _mnemonic_key(mnemonic_phrase):
+    # mnemonics given directly are cached without keeping them in memory
+    return hashlib.sha256(" ".join(mnemonic_phrase.split()).encode()).digest()
+
+
+def _read_rows(filename):
+    import csv
+    # the file is small: read it at once so it is not left open by a keyring living as long as the process
+    with open(filename, newline='') as csvfile:
+        return [(row['name'], row['mnemonic']) for row in csv.DictReader(csvfile)]
+
+
+# class to derive the keys of accounts once and look them up by name or address.
+# Rows of accounts files are registered one by one, only as far as the lookups need
+class Keyring:
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, filename: str = None, accounts=None):
+        """
+        :param filename: CSV file with name and mnemonic columns
+        :param accounts: list of {'name', 'mnemonic'} dicts
+        """
+        self._rows = iter(_read_rows(filename)) if filename else None
+        self._accounts = []
+        self._by_name = {}
+        self._by_address = {}
+        self._by_mnemonic = {}
+        # accounts before this index are in _by_address
+        self._address_indexed = 0
+        self._lock = threading.RLock()
+        for item in accounts or []:
+            self.add(item['name'], item['mnemonic'])
+
+    @classmethod
+    def default(cls):
+        """
+        Keyring of the accounts set in Constants, shared by the whole process
+        :return:
+        """
+        with cls._default_lock:
+            if cls._default is None:
+                # an accounts file is read lazily, like Constants.accounts does
+                source = Constants.__dict__.get("accounts")
+                if isinstance(source, LazyAccounts):
+                    cls._default = cls(source.filename)
+                else:
+                    cls._default = cls(accounts=Constants.accounts)
+            return cls._default
+
+    def add(self, name: str, mnemonic_phrase: str = None, private_key: str = None):
+        """
+        Register an account, the key is derived on first use
+        :param name:
+        :param mnemonic_phrase:
+        :param private_key: instead of the mnemonic
+        :return: KeyringAccount
+        """
+        keyring_account = KeyringAccount(name, mnemonic_phrase, private_key)
+        with self._lock:
+            self._accounts.append(keyring_account)
+            self._by_name.setdefault(name, keyring_account)
+            if mnemonic_phrase:
+                self._by_mnemonic.setdefault(_mnemonic_key(mnemonic_phrase), keyring_account)
+        return keyring_account
+
+    def _load_next(self):
+        """
+        Read the next row of the accounts file
+        :return: False when the file is exhausted
+        """
+        if self._rows is None:
+            return False
+        row = next(self._rows, None)
+        if row is None:
+            self._rows = None
+            return False
+        self.add(*row)
+        return True
+
+    def get(self, name: str):
+        """
+        Account by name
+        :param name:
+        :return: KeyringAccount, None if unknown
+        """
+        with self._lock:
+            while name not in self._by_name:
+                if not self._load_next():
+                    return None
+            return self._by_name[name]
+
+    def __getitem__(self, name):
+        keyring_account = self.get(name)
+        if keyring_account is None:
+            raise KeyError(name)
+        return keyring_account
+
+    def by_address(self, address: str):
+        """
+        Account by address, addresses are derived in file order until it is found
+        :param address:
+        :return: KeyringAccount, None if unknown
+        """
+        with self._lock:
+            while address not in self._by_address:
+                if self._address_indexed == len(self._accounts) and not self._load_next():
+                    return None
+                keyring_account = self._accounts[self._address_indexed]
+                self._by_address.setdefault(keyring_account.address, keyring_account)
+                self._address_indexed += 1
+            return self._by_address[address]
+
+    def from_mnemonic(self, mnemonic_phrase: str, name: str = None):
+        """
+        Account of a mnemonic, derived once
+        :param mnemonic_phrase:
+        :param name:
+        :return: KeyringAccount
+        """
+        with self._lock:
+            keyring_account = self._by_mnemonic.get(_mnemonic_key(mnemonic_phrase))
+            if keyring_account is None:
+                keyring_account = self.add(name or "", mnemonic_phrase)
+            return keyring_account
+
+    def private_key(self, name: str):
+        return self[name].private_key
+
+    def resolve(self, user):
+        """
+        Account of a KeyringAccount, a {'name', 'mnemonic'} dict or a name
+        :param user:
+        :return: KeyringAccount
+        """
+        if isinstance(user, KeyringAccount):
+            return user
+        if isinstance(user, str):
+            return self[user]
+        if user.get('mnemonic'):
+            return self.from_mnemonic(user['mnemonic'], user.get('name'))
+        return self[user['name']]
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._lock:
+                if index == len(self._accounts) and not self._load_next():
+                    return
+                keyring_account = self._accounts[index]
+            yield keyring_account
+            index += 1
+
+    def __len__(self):
+        with self._lock:
+            while self._load_next():
+                pass
+            return len(self._accounts)
@@ -0,0 +1,461 @@
+import base64
+
+from algosdk import account, encoding, transaction
+from algosdk.v2client import algod
+
+from constants import get_env
+from helpers import algo_helper
+from models.ApplicationManager import ApplicationManager
+from models.Delivery import Delivery
+from models.Keyring import Keyring
+from utilities import utils
+from utilities.rpc_metrics import track_operation
+from utilities.tracing import annotate, span, traced
+
+log = utils.get_logger(__name__)
+
+
+# class to run deliveries hosted by a multi-delivery application, with the methods of Delivery.
+# The application and its escrow are deployed once, a new delivery is then a single app call
+class MultiDelivery(Delivery):
+    def __init__(self,
+                 algod_client: algod.AlgodClient,
+                 app_id: int = None,
+                 delivery_id: int = None):
+        """
+        :param algod_client:
+        :param app_id: host application, deployed by create_app when not given
+        :param delivery_id: delivery of the host application, set by create_app
+        """
+        super().__init__(algod_client=algod_client, app_id=app_id)
+        self.delivery_id = delivery_id
+        # the host application runs its own programs: APPROVAL_PROGRAM is the one of single delivery apps
+        self.approval_program_hash = get_env('MULTI_APPROVAL_PROGRAM') or None
+        self.clear_state_program_hash = get_env('MULTI_CLEAR_STATE_PROGRAM') or None
+
+    @property
+    def app_contract(self):
+        """
+        Application contract, PyTeal is imported on first use only
+        :return:
+        """
+        if self._app_contract is None:
+            from smart_contracts.contract_multi_delivery import MultiDeliveryContract
+            self._app_contract = MultiDeliveryContract()
+        return self._app_contract
+
+    def enable_preflight(self, mode: str = "local"):
+        if mode:
+            raise ValueError("Pre-flight checks are not available for multi-delivery applications")
+
+    def cancel_delivery(self, creator_private_key: str, participants: [str], *args, **kwargs):
+        raise ValueError("Creator cancellation is not available for multi-delivery applications")
+
+    @property
+    def delivery_key(self):
+        if self.delivery_id is None:
+            raise ValueError("No delivery selected")
+        return algo_helper.intToBytes(self.delivery_id)
+
+    def _read_app(self):
+        """
+        Raw global state and programs of the host application
+        :return: state, approval_program, clear_state_program
+        """
+        params = self.algod_client.application_info(self.app_id)['params']
+        return (algo_helper.decode_raw_state(params.get('global-state', [])),
+                params.get('approval-program'), params.get('clear-state-program'))
+
+    def read_delivery(self, state=None):
+        """
+        State of the selected delivery, with the keys of the global state of a single delivery app
+        :param state: raw global state of the host application, read when not given
+        :return: dict, None if the delivery does not exist (anymore)
+        """
+        if state is None:
+            state, _, _ = self._read_app()
+        record = state.get(self.delivery_key)
+        if record is None:
+            return None
+        output = algo_helper.decode_delivery_record(record, state.get(self.delivery_key + b"i"))
+        output['escrow_address'] = encoding.encode_address(state[b"escrow_address"])
+        return output
+
+    def _booked(self, address: str):
+        """
+        Opt in and booking of an account for the selected delivery
+        :param address:
+        :return: opted_in, booked capacity
+        """
+        for local_state in self.algod_client.account_info(address).get('apps-local-state', []):
+            if local_state['id'] == self.app_id:
+                booked = algo_helper.decode_raw_state(local_state.get('key-value', [])).get(self.delivery_key, 0)
+                return True, booked
+        return False, 0
+
+    def _call(self, private_key: str, app_args, payment=None, escrow_payment: bool = False):
+        """
+        Send an app call on the selected delivery, grouped with a payment when given
+        :param private_key: signer of the app call (and of the payment when it is not paid by the escrow)
+        :param app_args: method first, the delivery id is added
+        :param payment: (sender, receiver, amount)
+        :param escrow_payment: the payment is signed by the escrow
+        :return: pending transaction info
+        """
+        address = account.address_from_private_key(private_key)
+        app_args = [app_args[0], self.delivery_key] + list(app_args[1:])
+        if payment is None:
+            txn = ApplicationManager.call_app(algod_client=self.algod_client,
+                                              address=address,
+                                              app_id=self.app_id,
+                                              app_args=app_args,
+                                              sign_transaction=private_key)
+            return ApplicationManager.send_transaction(self.algod_client, txn)
+
+        call_txn = ApplicationManager.call_app(algod_client=self.algod_client,
+                                               address=address,
+                                               app_id=self.app_id,
+                                               app_args=app_args)
+        payment_txn = ApplicationManager.payment(self.algod_client, *payment)
+        # Atomic transfer
+        with span("build_group"):
+            gid = transaction.calculate_group_id([call_txn, payment_txn])
+            call_txn.group = gid
+            payment_txn.group = gid
+
+        with span("sign_group"):
+            call_txn = call_txn.sign(private_key)
+            if escrow_payment:
+                payment_txn = transaction.LogicSigTransaction(payment_txn, transaction.LogicSig(self.escrow_bytes_for(payment[0])))
+            else:
+                payment_txn = payment_txn.sign(private_key)
+        return ApplicationManager.send_group_transactions(self.algod_client, [call_txn, payment_txn])
+
+    @traced()
+    @track_operation()
+    def deploy(self, creator_private_key: str):
+        """
+        Create the host application, initialize and fund its escrow. The creator manages the escrow and the
+        application, and is the only account creating deliveries in it
+        :param creator_private_key:
+        :return: app_id, False on failure
+        """
+        from pyteal import compileTeal, Mode
+
+        approval_program_compiled = algo_helper.compile_program(self.algod_client, compileTeal(
+            self.app_contract.approval_program(), mode=Mode.Application, version=self.teal_version_stateful))
+        clear_state_program_compiled = algo_helper.compile_program(self.algod_client, compileTeal(
+            self.app_contract.clear_program(), mode=Mode.Application, version=self.teal_version_stateful))
+
+        address = algo_helper.get_address_from_private_key(creator_private_key)
+        try:
+            txn = ApplicationManager.create_app(algod_client=self.algod_client,
+                                                address=address,
+                                                approval_program=approval_program_compiled,
+                                                clear_program=clear_state_program_compiled,
+                                                global_schema=self.app_contract.global_schema,
+                                                local_schema=self.app_contract.local_schema,
+                                                app_args=None,
+                                                sign_transaction=creator_private_key)
+            txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
+            self.app_id = txn_response['application-index']
+            annotate(app_id=self.app_id)
+            log.info("Multi-delivery Application Created. New app-id: %s", self.app_id)
+        except Exception as e:
+            log.error("Error during deploy call: %s", e)
+            return False
+
+        if self._initialize_app_escrow(creator_private_key) is False or \
+                self._fund_app_escrow(creator_private_key) is False:
+            return False
+        return self.app_id
+
+    def _initialize_app_escrow(self, creator_private_key: str):
+        try:
+            address = algo_helper.get_address_from_private_key(creator_private_key)
+            txn = ApplicationManager.call_app(algod_client=self.algod_client,
+                                              address=address,
+                                              app_id=self.app_id,
+                                              app_args=[self.app_contract.AppMethods.initialize_escrow,
+                                                        encoding.decode_address(self.escrow_address)],
+                                              sign_transaction=creator_private_key)
+            ApplicationManager.send_transaction(self.algod_client, txn)
+            log.info("Escrow initialized for Application with app-id %s with address: %s",
+                     self.app_id, self.escrow_address)
+        except Exception as e:
+            log.error("Error during initialize_escrow call: %s", e)
+            return False
+
+    def _fund_app_escrow(self, creator_private_key: str):
+        address = account.address_from_private_key(creator_private_key)
+        try:
+            call_txn = ApplicationManager.call_app(algod_client=self.algod_client,
+                                                   address=address,
+                                                   app_id=self.app_id,
+                                                   app_args=[self.app_contract.AppMethods.fund_escrow])
+            payment_txn = ApplicationManager.payment(algod_client=self.algod_client,
+                                                     sender_address=address,
+                                                     receiver_address=self.escrow_address,
+                                                     amount=ApplicationManager.Variables.escrow_min_balance)
+            gid = transaction.calculate_group_id([call_txn, payment_txn])
+            call_txn.group = gid
+            payment_txn.group = gid
+            ApplicationManager.send_group_transactions(self.algod_client, [call_txn.sign(creator_private_key),
+                                                                           payment_txn.sign(creator_private_key)])
+            log.info("Escrow funded with address: %s", self.escrow_address)
+        except Exception as e:
+            log.error("Error during fund_escrow: %s", e)
+            return False
+
+    @traced()
+    @track_operation()
+    def create_app(self,
+                   creator_private_key: str,
+                   delivery_creator_name: str,
+                   delivery_start_address: str,
+                   delivery_end_address: str,
+                   delivery_start_date: str,
+                   delivery_end_date: str,
+                   delivery_unit_cost: int,
+                   delivery_capacity: int):
+        """
+        Create a delivery in the host application, deployed first if needed
+        :param creator_private_key: key of the manager of the host application
+        :param delivery_creator_name:
+        :param delivery_start_address:
+        :param delivery_end_address:
+        :param delivery_start_date:
+        :param delivery_end_date:
+        :param delivery_unit_cost:
+        :param delivery_capacity:
+        :return: delivery id, False on failure
+        """
+        if self.app_id is None and self.deploy(creator_private_key) is False:
+            return False
+
+        delivery_start_date_round, delivery_end_date_round = algo_helper.datetimes_to_rounds(
+            self.algod_client, [delivery_start_date, delivery_end_date])
+
+        app_args = [
+            self.app_contract.AppMethods.create_delivery,
+            delivery_creator_name,
+            delivery_start_address,
+            delivery_end_address,
+            delivery_start_date,
+            algo_helper.intToBytes(delivery_start_date_round),
+            delivery_end_date,
+            algo_helper.intToBytes(delivery_end_date_round),
+            algo_helper.intToBytes(delivery_unit_cost),
+            algo_helper.intToBytes(delivery_capacity),
+        ]
+
+        address = algo_helper.get_address_from_private_key(creator_private_key)
+        try:
+            txn = ApplicationManager.call_app(algod_client=self.algod_client,
+                                              address=address,
+                                              app_id=self.app_id,
+                                              app_args=app_args,
+                                              sign_transaction=creator_private_key)
+            txn_response = ApplicationManager.send_transaction(self.algod_client, txn)
+            # the contract logs the id of the new delivery
+            self.delivery_id = int.from_bytes(base64.b64decode(txn_response['logs'][0]), "big")
+            annotate(app_id=self.app_id, delivery_id=self.delivery_id)
+            log.info("Delivery %s created in app-id: %s", self.delivery_id, self.app_id)
+        except Exception as e:
+            log.error("Error during create_app call: %s", e)
+            return False
+
+        return self.delivery_id
+
+    @traced()
+    @track_operation()
+    def update_delivery_info(self,
+                             creator_private_key: str,
+                             delivery_creator_name: str,
+                             delivery_start_address: str,
+                             delivery_end_address: str,
+                             delivery_start_date: str,
+                             delivery_end_date: str,
+                             delivery_unit_cost: int,
+                             delivery_capacity: int):
+        """
+        Update the selected delivery, allowed while nobody participates
+        :param creator_private_key:
+        :param delivery_creator_name:
+        :param delivery_start_address:
+        :param delivery_end_address:
+        :param delivery_start_date:
+        :param delivery_end_date:
+        :param delivery_unit_cost:
+        :param delivery_capacity:
+        :return:
+        """
+        delivery_start_date_round, delivery_end_date_round = algo_helper.datetimes_to_rounds(
+            self.algod_client, [delivery_start_date, delivery_end_date])
+
+        app_args = [
+            self.app_contract.AppMethods.update_delivery,
+            delivery_creator_name,
+            delivery_start_address,
+            delivery_end_address,
+            delivery_start_date,
+            algo_helper.intToBytes(delivery_start_date_round),
+            delivery_end_date,
+            algo_helper.intToBytes(delivery_end_date_round),
+            algo_helper.intToBytes(delivery_unit_cost),
+            algo_helper.intToBytes(delivery_capacity),
+        ]
+        try:
+            self._call(creator_private_key, app_args)
+            log.info("Updated Info for delivery %s of app-id: %s", self.delivery_id, self.app_id)
+        except Exception as e:
+            log.error("Error during update_delivery_info call: %s", e)
+            return False
+
+        return self.delivery_id
+
+    @traced()
+    @track_operation()
+    def initialize_escrow(self, creator_private_key: str):
+        """
+        The escrow is shared by the deliveries of the application and initialized by deploy
+        :param creator_private_key:
+        :return:
+        """
+        state, _, _ = self._read_app()
+        if b"escrow_address" in state:
+            log.debug("Escrow of app-id %s already initialized", self.app_id)
+            return None
+        return self._initialize_app_escrow(creator_private_key)
+
+    @traced()
+    @track_operation()
+    def fund_escrow(self, creator_private_key: str):
+        """
+        The escrow is shared by the deliveries of the application and funded by deploy
+        :param creator_private_key:
+        :return:
+        """
+        state, _, _ = self._read_app()
+        if state.get(b"app_state") != self.app_contract.AppState.ready.value:
+            return self._fund_app_escrow(creator_private_key)
+        log.debug("Escrow of app-id %s already funded", self.app_id)
+
+    @traced()
+    @track_operation()
+    def participate(self, user_private_key: str, user_name: str, book_capacity: int):
+        """
+        Add a user to the selected delivery, paying the escrow.
+        The user opts in once to the host application for all its deliveries
+        :param user_private_key:
+        :param user_name:
+        :param book_capacity:
+        """
+        address = account.address_from_private_key(user_private_key)
+        try:
+            opted_in, _ = self._booked(address)
+            if not opted_in:
+                txn = ApplicationManager.opt_in_app(algod_client=self.algod_client,
+                                                    address=address,
+                                                    app_id=self.app_id,
+                                                    sign_transaction=user_private_key)
+                ApplicationManager.send_transaction(self.algod_client, txn)
+                log.info("OptIn to Application with app-id: %s", self.app_id)
+
+            state, approval_program, clear_state_program = self._read_app()
+            self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
+            delivery = self.read_delivery(state)
+            self._call(user_private_key,
+                       [self.app_contract.AppMethods.participate_delivery, algo_helper.intToBytes(book_capacity)],
+                       payment=(address, delivery['escrow_address'], delivery['delivery_unit_cost'] * book_capacity))
+            log.info("Participated to delivery %s of app-id: %s", self.delivery_id, self.app_id)
+        except Exception as e:
+            log.error("Error during participation call: %s", e)
+            return False
+
+    @traced()
+    @track_operation()
+    def cancel_participation(self, user_private_key: str, user_name: str):
+        """
+        Cancel user participation to the selected delivery, refunded by the escrow
+        :param user_private_key:
+        :param user_name:
+        """
+        address = account.address_from_private_key(user_private_key)
+        try:
+            _, book_capacity = self._booked(address)
+            state, approval_program, clear_state_program = self._read_app()
+            self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
+            delivery = self.read_delivery(state)
+            self._call(user_private_key, [self.app_contract.AppMethods.cancel_delivery_participation],
+                       payment=(delivery['escrow_address'], address, delivery['delivery_unit_cost'] * book_capacity),
+                       escrow_payment=True)
+            log.info("Participation canceled to delivery %s of app-id: %s", self.delivery_id, self.app_id)
+        except Exception as e:
+            log.error("Error during participation cancel call: %s", e)
+            return False
+
+    @traced()
+    @track_operation()
+    def start_delivery(self, creator_private_key: str):
+        """
+        Start the selected delivery
+        :param creator_private_key:
+        """
+        try:
+            _, approval_program, clear_state_program = self._read_app()
+            self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
+            self._call(creator_private_key, [self.app_contract.AppMethods.start_delivery])
+            log.info("Delivery %s of app-id %s started", self.delivery_id, self.app_id)
+        except Exception as e:
+            log.error("Error during start_delivery call: %s", e)
+            return False
+
+    @traced()
+    @track_operation()
+    def finish_delivery(self, creator_private_key: str):
+        """
+        Finish the selected delivery, the escrow pays the bookings to the creator.
+        The escrow stays open for the other deliveries
+        :param creator_private_key:
+        """
+        address = account.address_from_private_key(creator_private_key)
+        try:
+            state, approval_program, clear_state_program = self._read_app()
+            self.check_program_hash(approval_program=approval_program, clear_state_program=clear_state_program)
+            delivery = self.read_delivery(state)
+            amount = delivery['delivery_unit_cost'] * (delivery['max_capacity'] - delivery['delivery_capacity'])
+            self._call(creator_private_key, [self.app_contract.AppMethods.finish_delivery],
+                       payment=(delivery['escrow_address'], address, amount), escrow_payment=True)
+        except Exception as e:
+            log.error("Error during finish_delivery call: %s", e)
+            return False
+
+    @traced()
+    @track_operation()
+    def close_delivery(self, creator_private_key: str, participating_users: [dict]):
+        """
+        Remove the selected delivery from the application, then free the local slot of its participants.
+        The application itself stays deployed
+        :param creator_private_key:
+        :param participating_users: KeyringAccount, {'name', 'mnemonic'} dicts or account names
+        :return:
+        """
+        try:
+            self._call(creator_private_key, [self.app_contract.AppMethods.close_delivery])
+            log.info("Closed delivery %s of app-id: %s", self.delivery_id, self.app_id)
+        except Exception as e:
+            log.error("Error during close_delivery call: %s", e)
+            return False
+
+        keyring = Keyring.default()
+        for test_user in participating_users:
+            test_user = keyring.resolve(test_user)
+            if not self._booked(test_user.address)[1]:
+                continue
+            try:
+                self._call(test_user.private_key, [self.app_contract.AppMethods.leave_delivery])
+                log.info("Left delivery %s of app-id: %s", self.delivery_id, self.app_id)
+            except Exception as e:
+                log.error("Error during leave_delivery call: %s", e)
+                return False
@@ -0,0 +1,295 @@
+import base64
+
+import msgpack
+from algosdk import encoding
+from algosdk.v2client import algod
+
+from helpers import algo_helper, teal_emulator
+from utilities import utils
+from utilities.rpc_metrics import instrument
+from utilities.tracing import traced
+
+log = utils.get_logger(__name__)
+
+# approval program sources compiled from the PyTeal contracts, shared by every Preflight
+_approval_sources = {}
+
+
+def app_state():
+    """
+    State values of the delivery contract, PyTeal is imported on first use only
+    :return: LogisticManagerContract.AppState
+    """
+    from smart_contracts.contract_logistic_manager import LogisticManagerContract
+    return LogisticManagerContract.AppState
+
+
+def approval_source(packed: bool = False):
+    """
+    TEAL source of the delivery approval program, PyTeal is imported on first use only
+    :param packed: program of the packed global state layout
+    :return:
+    """
+    if packed not in _approval_sources:
+        from pyteal import compileTeal, Mode
+        if packed:
+            from smart_contracts.contract_logistic_manager_packed import PackedLogisticManagerContract as Contract
+        else:
+            from smart_contracts.contract_logistic_manager import LogisticManagerContract as Contract
+        _approval_sources[packed] = compileTeal(Contract().approval_program(), mode=Mode.Application, version=5)
+    return _approval_sources[packed]
+
+
+class PreflightResult:
+    """
+    Outcome of a pre-flight check, reason is None when the group would be accepted
+    """
+    __slots__ = ("reason", "message", "method", "cost")
+
+    def __init__(self, reason=None, message=None, method=None, cost=0):
+        self.reason = reason
+        self.message = message
+        self.method = method
+        self.cost = cost
+
+    @property
+    def ok(self):
+        return self.reason is None
+
+    def __bool__(self):
+        return self.ok
+
+    def to_dict(self):
+        return {"ok": self.ok, "reason": self.reason, "message": self.message, "method": self.method,
+                "cost": self.cost}
+
+    def __repr__(self):
+        return "PreflightResult(reason={!r}, message={!r}, method={!r})".format(self.reason, self.message,
+                                                                               self.method)
+
+
+class PreflightRejected(Exception):
+    """
+    Raised by DeliveryManager when a group is rejected by the pre-flight check
+    """
+
+    def __init__(self, result: PreflightResult):
+        super().__init__("{} rejected: {} ({})".format(result.method, result.reason, result.message))
+        self.result = result
+
+
+class _StateSnapshot:
+    """
+    Copy of the app and account state read from algod, in the form teal_emulator expects
+    """
+
+    def __init__(self, app_id, global_state, local_states, balances):
+        self.app_id = app_id
+        self.globals = {app_id: global_state}
+        self.locals = local_states
+        self.balances = balances
+
+    def global_state(self, app_id):
+        return self.globals.get(app_id)
+
+    def local_state(self, address, app_id):
+        return self.locals.get((address, app_id))
+
+    def balance(self, address):
+        return self.balances.get(address, 0)
+
+
+def _txn_dict(txn):
+    """
+    msgpack form of a transaction, signed or not
+    """
+    decoded = msgpack.unpackb(base64.b64decode(encoding.msgpack_encode(txn)), raw=False)
+    return decoded.get("txn", decoded)
+
+
+# class to check a transaction group against the delivery rules before it is submitted
+class Preflight:
+    LOCAL = "local"
+    DRYRUN = "dryrun"
+
+    # rejection reasons
+    INVALID_GROUP = "invalid_group"
+    WRONG_STATE = "wrong_state"
+    NOT_CREATOR = "not_creator"
+    CREATOR_NOT_ALLOWED = "creator_not_allowed"
+    TOO_EARLY = "too_early"
+    ROUND_WINDOW_PASSED = "round_window_passed"
+    CAPACITY_EXHAUSTED = "capacity_exhausted"
+    ALREADY_PARTICIPATING = "already_participating"
+    NOT_PARTICIPATING = "not_participating"
+    INVALID_PAYMENT = "invalid_payment"
+    PROGRAM_REJECTED = "program_rejected"
+
+    def __init__(self, algod_client: algod.AlgodClient, mode: str = LOCAL):
+        """
+        :param algod_client:
+        :param mode: LOCAL evaluates the contract rules and the approval program locally,
+        DRYRUN sends the group to the dryrun endpoint (EnableDeveloperAPI must be set on the node)
+        """
+        if mode not in (self.LOCAL, self.DRYRUN):
+            raise ValueError("Unknown pre-flight mode: {}".format(mode))
+        self.algod_client = instrument(algod_client)
+        self.mode = mode
+
+    @traced()
+    def check(self, app_id: int, group, current_round: int = None, app_info: dict = None, account_info: dict = None):
+        """
+        Check that a group would be accepted by the delivery contract
+        :param app_id:
+        :param group: the app call first, then the payment if any (signed transactions for DRYRUN)
+        :param current_round: round the group is evaluated in, defaults to the round after the first valid round of
+        the call, i.e. the next round for a group built with the suggested parameters
+        :param app_info: application_info response already read by the caller, fetched otherwise
+        :param account_info: account_info response of the call sender already read by the caller, fetched otherwise
+        :return: PreflightResult
+        """
+        if self.mode == self.DRYRUN:
+            return self._dryrun(group)
+        txns = [_txn_dict(txn) for txn in group]
+        call = txns[0]
+        app_args = call.get("apaa", [])
+        method = app_args[0].decode() if app_args else None
+
+        if app_info is None:
+            app_info = self.algod_client.application_info(app_id)
+        global_state = algo_helper.decode_raw_state(app_info["params"].get("global-state", []))
+        sender = encoding.encode_address(call["snd"])
+        if account_info is None:
+            account_info = self.algod_client.account_info(sender)
+        local_state = None
+        for app_local_state in account_info.get("apps-local-state", []):
+            if app_local_state["id"] == app_id:
+                local_state = algo_helper.decode_raw_state(app_local_state.get("key-value", []))
+        if current_round is None:
+            current_round = call.get("fv", 0) + 1
+
+        # the rules read the keys of LogisticManagerContract, the program runs on the stored layout
+        result = self._check_rules(method, txns, algo_helper.unpack_delivery_state(global_state),
+                                   algo_helper.unpack_delivery_state(local_state) if local_state is not None else None,
+                                   current_round)
+        if result.ok:
+            result = self._evaluate(app_id, txns, global_state, local_state, call["snd"],
+                                    account_info.get("amount", 0), current_round, method)
+        if not result.ok:
+            log.info("Pre-flight rejected %s: %s (%s)", method, result.reason, result.message,
+                     extra={"app_id": app_id, "reason": result.reason})
+        return result
+
+    def _check_rules(self, method, txns, global_state, local_state, current_round):
+        """
+        The conditions of the contract for the participate, cancel, start and finish calls, with their reason
+        """
+        def reject(reason, message):
+            return PreflightResult(reason, message, method)
+
+        ready, started = app_state().ready.value, app_state().started.value
+
+        state = global_state.get(b"delivery_state")
+        creator = global_state.get(b"creator")
+        escrow = global_state.get(b"escrow_address")
+        unit_cost = global_state.get(b"delivery_unit_cost", 0)
+        capacity = global_state.get(b"delivery_capacity", 0)
+        departure_round = global_state.get(b"departure_date_round", 0)
+        arrival_round = global_state.get(b"arrival_date_round", 0)
+        sender = txns[0]["snd"]
+        booked = (local_state or {}).get(b"book_capacity", 0)
+        payment = txns[1] if len(txns) > 1 else {}
+
+        def invalid_payment(receiver, payer, amount):
+            return payment.get("type") != "pay" or payment.get("rcv") != receiver or payment.get("snd") != payer \
+                or payment.get("amt", 0) != amount
+
+        if method == "participateDelivery":
+            book_capacity = int.from_bytes(txns[0]["apaa"][1], "big")
+            if len(txns) != 2:
+                return reject(self.INVALID_GROUP, "expected a group of 2 transactions")
+            if state != ready:
+                return reject(self.WRONG_STATE, "delivery state is {}".format(state))
+            if sender == creator:
+                return reject(self.CREATOR_NOT_ALLOWED, "the creator cannot participate")
+            if current_round > departure_round:
+                return reject(self.ROUND_WINDOW_PASSED, "departure round {} passed".format(departure_round))
+            if book_capacity > capacity:
+                return reject(self.CAPACITY_EXHAUSTED, "{} available, {} requested".format(capacity, book_capacity))
+            if local_state is None:
+                return reject(self.NOT_PARTICIPATING, "the account is not opted in")
+            if booked:
+                return reject(self.ALREADY_PARTICIPATING, "{} already booked".format(booked))
+            if invalid_payment(escrow, sender, unit_cost * book_capacity):
+                return reject(self.INVALID_PAYMENT, "expected a payment of {} to the escrow".format(
+                    unit_cost * book_capacity))
+        elif method == "cancelParticipation":
+            if len(txns) != 2:
+                return reject(self.INVALID_GROUP, "expected a group of 2 transactions")
+            if state != ready:
+                return reject(self.WRONG_STATE, "delivery state is {}".format(state))
+            if sender == creator:
+                return reject(self.CREATOR_NOT_ALLOWED, "the creator cannot cancel a participation")
+            if current_round > departure_round:
+                return reject(self.ROUND_WINDOW_PASSED, "departure round {} passed".format(departure_round))
+            if not booked:
+                return reject(self.NOT_PARTICIPATING, "the account is not participating")
+            if invalid_payment(sender, escrow, unit_cost * booked):
+                return reject(self.INVALID_PAYMENT, "expected a refund of {} from the escrow".format(
+                    unit_cost * booked))
+        elif method == "startDelivery":
+            if len(txns) != 1:
+                return reject(self.INVALID_GROUP, "expected a single transaction")
+            if state != ready:
+                return reject(self.WRONG_STATE, "delivery state is {}".format(state))
+            if sender != creator:
+                return reject(self.NOT_CREATOR, "only the creator can start the delivery")
+            if current_round < departure_round:
+                return reject(self.TOO_EARLY, "departure round {} not reached".format(departure_round))
+        elif method == "finishDelivery":
+            amount = unit_cost * (global_state.get(b"max_capacity", 0) - capacity)
+            if len(txns) != 2:
+                return reject(self.INVALID_GROUP, "expected a group of 2 transactions")
+            if state != started:
+                return reject(self.WRONG_STATE, "delivery state is {}".format(state))
+            if sender != creator:
+                return reject(self.NOT_CREATOR, "only the creator can finish the delivery")
+            if current_round > arrival_round:
+                return reject(self.ROUND_WINDOW_PASSED, "arrival round {} passed".format(arrival_round))
+            if invalid_payment(creator, escrow, amount):
+                return reject(self.INVALID_PAYMENT, "expected a payment of {} to the creator".format(amount))
+        return PreflightResult(method=method)
+
+    def _evaluate(self, app_id, txns, global_state, local_state, sender, balance, current_round, method):
+        """
+        Run the approval program on a copy of the state, catches what the rules above do not cover
+        """
+        local_states = {(sender, app_id): dict(local_state)} if local_state is not None else {}
+        snapshot = _StateSnapshot(app_id, dict(global_state), local_states, {sender: balance})
+        context = teal_emulator.EvalContext(txns, 0, snapshot, current_round, app_id=app_id)
+        packed = algo_helper.PACKED_RECORD_KEY in global_state
+        result = teal_emulator.evaluate(approval_source(packed), context, max_cost=20000)
+        if not result.passed:
+            return PreflightResult(self.PROGRAM_REJECTED, result.error, method, result.cost)
+        return PreflightResult(method=method, cost=result.cost)
+
+    def _dryrun(self, group):
+        from algosdk.future import transaction
+        call = group[0].transaction if hasattr(group[0], "transaction") else group[0]
+        method = call.app_args[0].decode() if getattr(call, "app_args", None) else None
+        try:
+            response = self.algod_client.dryrun(transaction.create_dryrun(self.algod_client, group))
+        except Exception as e:
+            # the check is an optimization: without a dryrun endpoint the group is submitted anyway
+            log.warning("Dryrun unavailable, group not checked: %s", e)
+            return PreflightResult(method=method)
+        for index, txn_result in enumerate(response.get("txns", [])):
+            for messages_key in ("app-call-messages", "logic-sig-messages"):
+                messages = txn_result.get(messages_key) or []
+                if "REJECT" in messages:
+                    return PreflightResult(self.PROGRAM_REJECTED, "transaction {}: {}".format(
+                        index, "; ".join(message for message in messages if message != "REJECT")), method,
+                        txn_result.get("cost") or 0)
+        if response.get("error"):
+            return PreflightResult(self.PROGRAM_REJECTED, response["error"], method)
+        return PreflightResult(method=method)
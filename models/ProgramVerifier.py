@@ -0,0 +1,130 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk.v2client import algod
+
+from utilities import utils
+from utilities.rpc_metrics import instrument
+
+log = utils.get_logger(__name__)
+
+
+# class to verify the programs of applications once: an app is checked against the expected program hashes on first
+# use, then trusted until an update-application transaction of the app is seen. Verifiers are shared per node and
+# expected hashes, so the cache is keyed by (app_id, approval hash, clear hash)
+class ProgramVerifier:
+    _verifiers = {}
+    _verifiers_lock = threading.Lock()
+
+    def __init__(self,
+                 algod_client: algod.AlgodClient,
+                 approval_program: str,
+                 clear_state_program: str,
+                 fetch_workers: int = 8):
+        """
+        :param algod_client:
+        :param approval_program: expected approval program hash, as APPROVAL_PROGRAM
+        :param clear_state_program: expected clear state program hash, as CLEAR_STATE_PROGRAM
+        :param fetch_workers: applications fetched concurrently by verify_many
+        """
+        self.algod_client = instrument(algod_client)
+        self.approval_program = approval_program
+        self.clear_state_program = clear_state_program
+        self.fetch_workers = fetch_workers
+        self._verified = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, algod_client: algod.AlgodClient, approval_program: str, clear_state_program: str):
+        """
+        Verifier shared by every client of the same node expecting the same programs
+        :param algod_client:
+        :param approval_program:
+        :param clear_state_program:
+        :return:
+        """
+        key = (getattr(algod_client, "algod_address", None) or id(algod_client), approval_program, clear_state_program)
+        with cls._verifiers_lock:
+            verifier = cls._verifiers.get(key)
+            if verifier is None:
+                verifier = cls._verifiers[key] = cls(algod_client, approval_program, clear_state_program)
+            return verifier
+
+    def is_verified(self, app_id: int):
+        return app_id in self._verified
+
+    def check(self, app_id: int, approval_program: str, clear_state_program: str):
+        """
+        Check the programs of an application, already fetched by the caller: the given hashes are always compared
+        :param app_id:
+        :param approval_program: given approval program hash
+        :param clear_state_program: given clear state program hash
+        """
+        if approval_program != self.approval_program:
+            log.warning("Given hash: %s, expected hash: %s", approval_program, self.approval_program,
+                        extra={"app_id": app_id})
+            self.invalidate(app_id)
+            raise Exception("Approval program hash is invalid")
+        if clear_state_program != self.clear_state_program:
+            log.warning("Given hash: %s, expected hash: %s", clear_state_program, self.clear_state_program,
+                        extra={"app_id": app_id})
+            self.invalidate(app_id)
+            raise Exception("Clear state program hash is invalid")
+        with self._lock:
+            self._verified.add(app_id)
+
+    def verify(self, app_id: int, algod_client: algod.AlgodClient = None):
+        """
+        Check the programs of an application, fetched only when it is not verified yet
+        :param app_id:
+        :param algod_client: client fetching the application, defaults to the one of the verifier
+        """
+        if app_id in self._verified:
+            return
+        params = (algod_client or self.algod_client).application_info(app_id)["params"]
+        self.check(app_id, params.get("approval-program"), params.get("clear-state-program"))
+
+    def _try_verify(self, app_id):
+        try:
+            self.verify(app_id)
+            return True
+        except Exception as e:
+            log.warning("Application %s not verified: %s", app_id, e)
+            return False
+
+    def verify_many(self, app_ids):
+        """
+        Check the programs of many applications, the ones not verified yet are fetched concurrently
+        :param app_ids:
+        :return: dict app_id -> True when the programs match
+        """
+        results = {app_id: True for app_id in app_ids if app_id in self._verified}
+        pending = [app_id for app_id in app_ids if app_id not in results]
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(pending))) as executor:
+                results.update(zip(pending, executor.map(self._try_verify, pending)))
+        return results
+
+    def invalidate(self, app_id: int):
+        with self._lock:
+            self._verified.discard(app_id)
+
+    def clear(self):
+        with self._lock:
+            self._verified.clear()
+
+    def watch(self, index):
+        """
+        Invalidate the applications updated or deleted in the blocks applied by a DeliveryIndex
+        :param index: DeliveryIndex
+        :return: self
+        """
+        from models.DeliveryIndex import DeliveryEvent
+        invalidating = (DeliveryEvent.PROGRAM_UPDATED, DeliveryEvent.DELETED)
+
+        def on_event(event):
+            if event.kind in invalidating:
+                self.invalidate(event.app_id)
+
+        index.add_listener(on_event)
+        return self
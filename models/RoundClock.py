@@ -0,0 +1,224 @@
+import threading
+import time
+from datetime import datetime
+
+from algosdk.v2client import algod
+
+from constants import Constants
+from utilities import utils
+from utilities.rpc_metrics import instrument
+
+log = utils.get_logger(__name__)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M'
+
+# block timestamps are whole seconds
+TIMESTAMP_RESOLUTION = 1.0
+
+
+class ClockEstimate:
+    """
+    Converted value with its error bounds, value is a round or a datetime
+    """
+    __slots__ = ("value", "low", "high")
+
+    def __init__(self, value, low, high):
+        self.value = value
+        self.low = low
+        self.high = high
+
+    def __repr__(self):
+        return "ClockEstimate({!r}, low={!r}, high={!r})".format(self.value, self.low, self.high)
+
+
+# class to convert between datetimes and rounds from a block time fitted on recent block timestamps
+class RoundClock:
+    # clocks shared by the algod clients of the same node
+    _clocks = {}
+    _clocks_lock = threading.Lock()
+
+    def __init__(self,
+                 algod_client: algod.AlgodClient,
+                 window: int = 1000,
+                 samples: int = 5,
+                 refresh_interval: float = 60,
+                 default_block_time: float = Constants.block_speed,
+                 min_span: float = 10,
+                 confidence: float = 2.0):
+        """
+        :param algod_client:
+        :param window: rounds back from the last round sampled to fit the block time
+        :param samples: blocks read per calibration
+        :param refresh_interval: seconds before the model is anchored again on the last round
+        :param default_block_time: seconds per round used when the sampled timestamps span less than min_span
+        :param min_span: seconds the sampled timestamps must span for the fitted block time to be used
+        :param confidence: width of the error bounds, in standard errors
+        """
+        self.algod_client = instrument(algod_client)
+        self.window = window
+        self.samples = max(samples, 2)
+        self.refresh_interval = refresh_interval
+        self.default_block_time = default_block_time
+        self.min_span = min_span
+        self.confidence = confidence
+
+        self.block_time = None
+        self.block_time_error = 0.0
+        self.residual = 0.0
+        self.anchor_round = None
+        self.anchor_time = None
+        self.calibrated_at = None
+        self.anchored_at = None
+        self.drift = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_client(cls, algod_client: algod.AlgodClient):
+        """
+        Clock shared by every client of the same node
+        :param algod_client:
+        :return:
+        """
+        key = getattr(algod_client, "algod_address", None) or id(algod_client)
+        with cls._clocks_lock:
+            clock = cls._clocks.get(key)
+            if clock is None:
+                clock = cls._clocks[key] = cls(algod_client)
+            return clock
+
+    # ---- model ----
+    def _anchor(self):
+        status = self.algod_client.status()
+        now = time.time()
+        self.anchor_round = status["last-round"]
+        self.anchor_time = now - status.get("time-since-last-round", 0) / 1e9
+        self.anchored_at = now
+
+    def _block_timestamps(self):
+        first_round = max(self.anchor_round - self.window, 1)
+        step = max((self.anchor_round - first_round) // (self.samples - 1), 1)
+        points = []
+        for round_num in sorted(set(range(self.anchor_round, first_round - 1, -step)[:self.samples])):
+            try:
+                block = self.algod_client.block_info(round_num=round_num)
+            except Exception as e:
+                # the node may not keep old blocks
+                log.debug("Block %s not available: %s", round_num, e)
+                continue
+            points.append((round_num, block["block"]["ts"]))
+        return points
+
+    def _fit(self, points):
+        """
+        Least squares fit of the timestamps on the rounds
+        :param points: list of (round, timestamp)
+        :return: seconds per round, its standard error, residual standard deviation in seconds
+        """
+        n = len(points)
+        mean_round = sum(r for r, _ in points) / n
+        mean_time = sum(t for _, t in points) / n
+        sxx = sum((r - mean_round) ** 2 for r, _ in points)
+        sxy = sum((r - mean_round) * (t - mean_time) for r, t in points)
+        slope = sxy / sxx
+        intercept = mean_time - slope * mean_round
+        sse = sum((t - intercept - slope * r) ** 2 for r, t in points)
+        # timestamps are truncated to the second: never claim more precision than that
+        residual = max((sse / (n - 2)) ** 0.5 if n > 2 else 0.0, TIMESTAMP_RESOLUTION)
+        return slope, residual / sxx ** 0.5, residual
+
+    def calibrate(self):
+        """
+        Anchor the model on the last round and fit the block time on the timestamps of recent blocks
+        :return: seconds per round
+        """
+        with self._lock:
+            self._anchor()
+            points = self._block_timestamps()
+            span = points[-1][1] - points[0][1] if len(points) > 1 else 0
+            if span >= self.min_span:
+                self.block_time, self.block_time_error, self.residual = self._fit(points)
+            else:
+                # not enough history, e.g. a new network or one producing blocks on demand
+                self.block_time = self.default_block_time
+                self.block_time_error = self.default_block_time * 0.1
+                self.residual = TIMESTAMP_RESOLUTION
+            self.calibrated_at = self.anchored_at
+            log.debug("Round clock calibrated", extra={"block_time": self.block_time,
+                                                       "block_time_error": self.block_time_error,
+                                                       "samples": len(points), "anchor_round": self.anchor_round})
+            return self.block_time
+
+    def refresh(self, force: bool = False):
+        """
+        Keep the model current: anchor it again on the last round once it is older than refresh_interval and
+        fit the block time again when the predicted round drifted out of its error bounds
+        :param force:
+        """
+        if self.block_time is None or force:
+            self.calibrate()
+            return
+        if time.time() - self.anchored_at < self.refresh_interval:
+            return
+        with self._lock:
+            predicted_round = self.anchor_round + (time.time() - self.anchor_time) / self.block_time
+            self._anchor()
+            self.drift = self.anchor_round - predicted_round
+            recalibrate = abs(self.drift) > self._round_error(self.anchored_at - self.calibrated_at) + 1
+        if recalibrate:
+            log.debug("Round clock drifted by %.1f rounds", self.drift)
+            self.calibrate()
+
+    def _round_error(self, seconds):
+        """
+        Error bound, in rounds, of a conversion this many seconds away from the anchor
+        """
+        block_time = self.block_time
+        rounds = abs(seconds) / block_time
+        return self.confidence * (rounds * self.block_time_error + self.residual) / block_time
+
+    # ---- conversions ----
+    @staticmethod
+    def _timestamp(date):
+        if isinstance(date, str):
+            date = datetime.strptime(date, DATE_FORMAT)
+        return date.timestamp()
+
+    def to_rounds(self, dates):
+        """
+        Rounds expected at the given dates, dates in the past are converted to round 0
+        :param dates: datetimes or '%Y-%m-%d %H:%M' strings
+        :return: list of ClockEstimate holding rounds
+        """
+        self.refresh()
+        estimates = []
+        for date in dates:
+            seconds = self._timestamp(date) - self.anchor_time
+            if seconds < 0:
+                estimates.append(ClockEstimate(0, 0, 0))
+                continue
+            value = self.anchor_round + seconds / self.block_time
+            error = self._round_error(seconds)
+            estimates.append(ClockEstimate(round(value), max(int(value - error), 0), int(value + error) + 1))
+        return estimates
+
+    def to_datetimes(self, rounds):
+        """
+        Dates expected for the given rounds
+        :param rounds:
+        :return: list of ClockEstimate holding datetimes
+        """
+        self.refresh()
+        estimates = []
+        for round_num in rounds:
+            seconds = (round_num - self.anchor_round) * self.block_time
+            error = self._round_error(seconds) * self.block_time
+            timestamp = self.anchor_time + seconds
+            estimates.append(ClockEstimate(datetime.fromtimestamp(timestamp), datetime.fromtimestamp(timestamp - error),
+                                           datetime.fromtimestamp(timestamp + error)))
+        return estimates
+
+    def to_round(self, date):
+        return self.to_rounds([date])[0].value
+
+    def to_datetime(self, round_num: int):
+        return self.to_datetimes([round_num])[0].value
@@ -0,0 +1,82 @@
+import threading
+
+from algosdk.v2client import algod
+
+from utilities import utils
+from utilities.rpc_metrics import instrument
+
+log = utils.get_logger(__name__)
+
+
+# class to follow the chain round by round with a single status_after_block loop shared by its subscribers
+class RoundFollower:
+    def __init__(self, algod_client: algod.AlgodClient, start_round: int = None):
+        """
+        :param algod_client:
+        :param start_round: first round notified, defaults to the round after the current one
+        """
+        self.algod_client = instrument(algod_client)
+        self.next_round = start_round
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """
+        Call callback(round) for every new round, in order, from the follower thread
+        :param callback:
+        :return: the callback, to unsubscribe it
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def _notify(self, round_num):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(round_num)
+            except Exception as e:
+                log.error("Round %s subscriber %s failed: %s", round_num, callback, e)
+
+    def poll(self):
+        """
+        Wait for the next block and notify the rounds produced since the last call
+        :return: last notified round
+        """
+        if self.next_round is None:
+            self.next_round = self.algod_client.status()["last-round"] + 1
+        last_round = self.algod_client.status_after_block(self.next_round - 1)["last-round"]
+        while self.next_round <= last_round and not self._stop.is_set():
+            self._notify(self.next_round)
+            self.next_round += 1
+        return self.next_round - 1
+
+    def run(self):
+        """
+        Follow the chain until stop() is called
+        """
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                log.error("Round follower error: %s", e)
+                self._stop.wait(1)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="round-follower", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
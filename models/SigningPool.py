@@ -0,0 +1,139 @@
+import base64
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from algosdk import encoding
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from utilities.tracing import span
+
+# LogicSig objects built in the current worker process, by program: building one validates the program
+_logic_sigs = {}
+
+
+def _logic_sig(program: bytes, args):
+    key = (program, tuple(args) if args else None)
+    lsig = _logic_sigs.get(key)
+    if lsig is None:
+        lsig = _logic_sigs[key] = transaction.LogicSig(program, args)
+    return lsig
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+def _sign_groups(jobs):
+    """
+    Worker side: sign a chunk of groups
+    :param jobs: list of (encoded unsigned transactions, signers, assign_group_id)
+    :return: list of encoded signed groups (bytes)
+    """
+    signed_groups = []
+    for encoded_txns, signers, assign_group_id in jobs:
+        txns = [encoding.future_msgpack_decode(encoded) for encoded in encoded_txns]
+        if assign_group_id and len(txns) > 1:
+            group_id = transaction.calculate_group_id(txns)
+            for txn in txns:
+                txn.group = group_id
+        encoded_group = []
+        for txn, (kind, secret, args) in zip(txns, signers):
+            if kind == SigningPool.KEY:
+                signed = txn.sign(secret)
+            else:
+                signed = transaction.LogicSigTransaction(txn, _logic_sig(secret, args))
+            encoded_group.append(base64.b64decode(encoding.msgpack_encode(signed)))
+        signed_groups.append(b"".join(encoded_group))
+    return signed_groups
+
+
+# class to sign and encode batches of transactions and groups across a process pool
+class SigningPool:
+    KEY = "key"
+    LOGIC_SIG = "lsig"
+
+    def __init__(self, processes: int = None, chunk_size: int = 64):
+        """
+        :param processes: defaults to the number of cores
+        :param chunk_size: groups sent to a worker at once
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor = None
+
+    @classmethod
+    def key(cls, private_key: str):
+        """
+        Signer using an account private key
+        :param private_key:
+        :return:
+        """
+        return cls.KEY, private_key, None
+
+    @classmethod
+    def logic_sig(cls, program: bytes, args=None):
+        """
+        Signer wrapping the transaction in a LogicSig (e.g. the delivery escrow)
+        :param program: compiled program bytes
+        :param args: LogicSig arguments
+        :return:
+        """
+        return cls.LOGIC_SIG, program, args
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            # spawn the workers now rather than on the first batch
+            list(self._executor.map(_warm_up, range(self.processes)))
+        return self
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def sign_groups(self, groups, assign_group_id: bool = True):
+        """
+        Sign groups of transactions, each group as a list of (transaction, signer)
+        :param groups: e.g. [[(call_txn, SigningPool.key(pk)), (payment_txn, SigningPool.logic_sig(escrow))], ...]
+        :param assign_group_id: compute and set the group id of groups with more than one transaction
+        :return: encoded signed groups, each ready for send_signed
+        """
+        jobs = [([encoding.msgpack_encode(txn) for txn, _ in group], [signer for _, signer in group], assign_group_id)
+                for group in groups]
+        chunks = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+        with span("sign_groups", groups=len(jobs)):
+            if self._executor is None or len(chunks) < 2:
+                # not worth the inter-process round trip
+                return [signed for chunk in chunks for signed in _sign_groups(chunk)]
+            return [signed for result in self._executor.map(_sign_groups, chunks) for signed in result]
+
+    def sign(self, txns, signers):
+        """
+        Sign independent transactions
+        :param txns:
+        :param signers: one signer per transaction, or a single signer for all of them
+        :return: encoded signed transactions
+        """
+        if isinstance(signers, tuple):
+            signers = [signers] * len(txns)
+        return self.sign_groups([[(txn, signer)] for txn, signer in zip(txns, signers)], assign_group_id=False)
+
+    @staticmethod
+    def send_signed(algod_client: algod.AlgodClient, signed_group: bytes):
+        """
+        Submit an encoded signed transaction or group
+        :param algod_client:
+        :param signed_group:
+        :return: id of the first transaction
+        """
+        return algod_client.send_raw_transaction(base64.b64encode(signed_group))
@@ -0,0 +1,108 @@
+from algosdk import encoding
+from algosdk.future import transaction
+
+from models.ApplicationManager import ApplicationManager
+from utilities import utils
+
+log = utils.get_logger(__name__)
+
+# sender and receiver of the templates, replaced on every build
+PLACEHOLDER_ADDRESS = encoding.encode_address(bytes(32))
+
+
+# class to build the repetitive transactions of an application from prebuilt templates: fee, validity rounds, genesis,
+# note and method argument are set once per template, a build copies the template and sets the fields that change
+# (sender, args, accounts). The transactions are the ones ApplicationManager builds, unsigned, without its
+# suggested parameters request, transaction id and log line per transaction.
+class TransactionTemplates:
+    def __init__(self, app_id: int, sp: transaction.SuggestedParams, note: str = None):
+        """
+        :param app_id:
+        :param sp: suggested parameters of the transactions, see set_params
+        :param note: note of every transaction, none by default like ApplicationManager
+        """
+        self.app_id = app_id
+        self.note = note
+        self.sp = None
+        self._templates = {}
+        self.set_params(sp)
+
+    def set_params(self, sp: transaction.SuggestedParams):
+        """
+        Use new suggested parameters (validity rounds) for the next transactions
+        :param sp:
+        """
+        self.sp = transaction.SuggestedParams(fee=ApplicationManager.Variables.fees, first=sp.first, last=sp.last,
+                                              gh=sp.gh, gen=sp.gen, flat_fee=True)
+        for template in self._templates.values():
+            template.fee = self.sp.fee
+            template.first_valid_round = self.sp.first
+            template.last_valid_round = self.sp.last
+            template.genesis_id = self.sp.gen
+            template.genesis_hash = self.sp.gh
+
+    def _template(self, key, factory):
+        template = self._templates.get(key)
+        if template is None:
+            template = self._templates[key] = factory()
+        return template
+
+    @staticmethod
+    def _copy(template):
+        # filling the new instance dict keeps it as compact as a constructed one
+        txn = object.__new__(template.__class__)
+        txn.__dict__.update(template.__dict__)
+        return txn
+
+    def call_app(self, sender: str, method: str, args=None, accounts: [str] = None):
+        """
+        NoOp call of a method of the application
+        :param sender:
+        :param method: first application arg
+        :param args: following application args, bytes, str or int
+        :param accounts: accounts whose local state the call reads or writes
+        :return: unsigned transaction
+        """
+        template = self._template(("call", method), lambda: transaction.ApplicationNoOpTxn(
+            PLACEHOLDER_ADDRESS, self.sp, self.app_id, [method], note=self.note))
+        txn = self._copy(template)
+        txn.sender = sender
+        if args:
+            txn.app_args = template.app_args + transaction.ApplicationCallTxn.bytes_list(args)
+        if accounts:
+            txn.accounts = accounts
+        return txn
+
+    def opt_in_app(self, sender: str):
+        """
+        :param sender:
+        :return: unsigned OptIn transaction
+        """
+        template = self._template("opt_in", lambda: transaction.ApplicationOptInTxn(
+            PLACEHOLDER_ADDRESS, self.sp, self.app_id, note=self.note))
+        txn = self._copy(template)
+        txn.sender = sender
+        return txn
+
+    def payment(self, sender: str, receiver: str, amount: int, close_remainder_to: str = None):
+        """
+        Payments have few fields, constructing them from the flat-fee parameters is cheaper than copying a template
+        :param sender:
+        :param receiver:
+        :param amount: in micro ALGOs
+        :param close_remainder_to:
+        :return: unsigned payment transaction
+        """
+        return transaction.PaymentTxn(sender, self.sp, receiver, amount, close_remainder_to, self.note)
+
+    @staticmethod
+    def group(txns):
+        """
+        Assign the group id of an atomic transfer
+        :param txns:
+        :return: txns
+        """
+        gid = transaction.calculate_group_id(txns)
+        for txn in txns:
+            txn.group = gid
+        return txns
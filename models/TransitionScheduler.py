@@ -0,0 +1,332 @@
+import base64
+import heapq
+import itertools
+import json
+import os
+import threading
+
+from algosdk import account
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from helpers import algo_helper
+from models.ApplicationManager import ApplicationManager
+from models.Delivery import Delivery
+from models.RoundFollower import RoundFollower
+from models.SigningPool import SigningPool
+from utilities import utils
+from utilities.rpc_metrics import instrument
+
+log = utils.get_logger(__name__)
+
+# maximum number of rounds between the first and the last valid round of a transaction
+MAX_VALIDITY = 1000
+
+
+class Transition:
+    """
+    A pre-signed state transition of a delivery, submitted when its first valid round opens
+    """
+    START = "start"
+    FINISH = "finish"
+
+    PENDING = "pending"
+    SUBMITTED = "submitted"
+    CONFIRMED = "confirmed"
+    FAILED = "failed"
+    EXPIRED = "expired"
+
+    __slots__ = ("app_id", "kind", "first_round", "last_round", "signed", "txid", "status", "attempts", "error")
+
+    def __init__(self, app_id, kind, first_round, last_round, signed, txid, status=PENDING, attempts=0, error=None):
+        self.app_id = app_id
+        self.kind = kind
+        self.first_round = first_round
+        self.last_round = last_round
+        self.signed = signed
+        self.txid = txid
+        self.status = status
+        self.attempts = attempts
+        self.error = error
+
+    def to_dict(self):
+        return {
+            "app_id": self.app_id,
+            "kind": self.kind,
+            "first_round": self.first_round,
+            "last_round": self.last_round,
+            "signed": base64.b64encode(self.signed).decode(),
+            "txid": self.txid,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["app_id"], data["kind"], data["first_round"], data["last_round"],
+                   base64.b64decode(data["signed"]), data["txid"], data["status"], data["attempts"], data["error"])
+
+
+# class to pre-sign the start and finish transitions of deliveries and submit each of them when its round opens
+class TransitionScheduler:
+    def __init__(self,
+                 algod_client: algod.AlgodClient,
+                 store_path: str,
+                 finish_margin: int = 10,
+                 max_attempts: int = 3,
+                 signing_pool: SigningPool = None):
+        """
+        :param algod_client:
+        :param store_path: JSON file persisting the signed transitions
+        :param finish_margin: the finish transition opens this many rounds before the arrival round
+        :param max_attempts: submissions of a transition rejected by the node before it is marked as failed
+        :param signing_pool: defaults to inline signing
+        """
+        self.algod_client = instrument(algod_client)
+        self.store_path = store_path
+        self.finish_margin = finish_margin
+        self.max_attempts = max_attempts
+        self.signing_pool = signing_pool or SigningPool()
+        self.transitions = {}
+        # creator keys are kept in memory only, to sign the finish transition once bookings are frozen
+        self._creator_keys = {}
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+        self._params = None
+        self._app_contract = None
+        self.follower = None
+        self.load()
+
+    @property
+    def app_contract(self):
+        """
+        Contract of the scheduled deliveries, for its method names
+        """
+        if self._app_contract is None:
+            self._app_contract = Delivery(algod_client=self.algod_client).app_contract
+        return self._app_contract
+
+    def _method(self, name):
+        return bytes(name, encoding="raw_unicode_escape")
+
+    # ---- persistence ----
+    def load(self):
+        if not os.path.exists(self.store_path):
+            return
+        with open(self.store_path) as store_file:
+            data = json.load(store_file)
+        with self._lock:
+            for item in data["transitions"]:
+                transition = Transition.from_dict(item)
+                self.transitions[(transition.app_id, transition.kind)] = transition
+                if transition.status in (Transition.PENDING, Transition.SUBMITTED):
+                    self._push(transition)
+
+    def save(self):
+        with self._lock:
+            data = {"transitions": [transition.to_dict() for transition in self.transitions.values()]}
+        temp_path = self.store_path + ".tmp"
+        with open(temp_path, "w") as store_file:
+            json.dump(data, store_file)
+        os.replace(temp_path, self.store_path)
+
+    def _push(self, transition, due_round=None):
+        due_round = transition.first_round if due_round is None else due_round
+        heapq.heappush(self._queue, (due_round, next(self._sequence), transition))
+
+    # ---- signing ----
+    def _suggested_params(self, first_round, last_round):
+        if self._params is None:
+            self._params = self.algod_client.suggested_params()
+        params = transaction.SuggestedParams(fee=ApplicationManager.Variables.fees, first=first_round,
+                                             last=last_round, gh=self._params.gh, gen=self._params.gen,
+                                             flat_fee=True)
+        return params
+
+    def _validity(self, target_round, deadline_round=None):
+        last_round = target_round + MAX_VALIDITY - 1
+        if deadline_round is not None:
+            last_round = min(last_round, deadline_round)
+        return target_round, last_round
+
+    def schedule(self, deliveries):
+        """
+        Pre-sign the start transition of deliveries and remember the creator key for the finish transition.
+        Deliveries already scheduled are skipped, so it can be called again after a restart
+        :param deliveries: list of (app_id, creator_private_key)
+        :return: number of start transitions signed
+        """
+        groups = []
+        pending = []
+        resumed = []
+        for app_id, creator_private_key in deliveries:
+            self._creator_keys[app_id] = creator_private_key
+            start = self.transitions.get((app_id, Transition.START))
+            if start is not None:
+                if start.status == Transition.CONFIRMED and (app_id, Transition.FINISH) not in self.transitions:
+                    resumed.append(app_id)
+                continue
+            global_state, _, _, _ = algo_helper.read_global_state(self.algod_client, app_id, False, False)
+            first_round, last_round = self._validity(global_state.get("departure_date_round"),
+                                                     global_state.get("arrival_date_round"))
+            address = account.address_from_private_key(creator_private_key)
+            call_txn = transaction.ApplicationNoOpTxn(address, self._suggested_params(first_round, last_round),
+                                                      app_id,
+                                                      [self._method(self.app_contract.AppMethods.start_delivery)],
+                                                      note=ApplicationManager.Variables.transaction_note.encode())
+            groups.append([(call_txn, SigningPool.key(creator_private_key))])
+            pending.append((app_id, first_round, last_round, call_txn.get_txid()))
+
+        signed_groups = self.signing_pool.sign_groups(groups, assign_group_id=False)
+        with self._lock:
+            for (app_id, first_round, last_round, txid), signed in zip(pending, signed_groups):
+                transition = Transition(app_id, Transition.START, first_round, last_round, signed, txid)
+                self.transitions[(app_id, Transition.START)] = transition
+                self._push(transition)
+        if resumed:
+            self._schedule_finish(resumed, self.algod_client.status()["last-round"])
+        self.save()
+        log.info("Scheduled %s start transitions", len(pending))
+        return len(pending)
+
+    def _sign_finish(self, app_id, current_round):
+        """
+        Sign the finish transition, bookings are frozen once the delivery is started
+        """
+        creator_private_key = self._creator_keys.get(app_id)
+        if creator_private_key is None:
+            log.warning("No creator key for app-id %s, finish transition not signed", app_id)
+            return None
+        delivery = Delivery(algod_client=self.algod_client, app_id=app_id)
+        global_state, _, _, _ = algo_helper.read_global_state(self.algod_client, app_id, False, False)
+        arrival_round = global_state.get("arrival_date_round")
+        first_round, last_round = self._validity(max(current_round + 1, arrival_round - self.finish_margin),
+                                                 arrival_round)
+        params = self._suggested_params(first_round, last_round)
+        address = account.address_from_private_key(creator_private_key)
+        escrow_address = algo_helper.BytesToAddress(global_state.get("escrow_address"))
+        amount = global_state.get("delivery_unit_cost") * \
+            (global_state.get("max_capacity") - global_state.get("delivery_capacity"))
+        note = ApplicationManager.Variables.transaction_note.encode()
+        call_txn = transaction.ApplicationNoOpTxn(address, params, app_id,
+                                                  [self._method(self.app_contract.AppMethods.finish_delivery)], note=note)
+        payment_txn = transaction.PaymentTxn(escrow_address, params, address, amount, close_remainder_to=address,
+                                             note=note)
+        group_id = transaction.calculate_group_id([call_txn, payment_txn])
+        call_txn.group = group_id
+        payment_txn.group = group_id
+        signed = self.signing_pool.sign_groups([[(call_txn, SigningPool.key(creator_private_key)),
+                                                 (payment_txn, SigningPool.logic_sig(delivery.escrow_bytes_for(escrow_address)))]],
+                                               assign_group_id=False)[0]
+        return Transition(app_id, Transition.FINISH, first_round, last_round, signed, call_txn.get_txid())
+
+    # ---- submission ----
+    def _submit(self, transition):
+        transition.attempts += 1
+        try:
+            SigningPool.send_signed(self.algod_client, transition.signed)
+            transition.status = Transition.SUBMITTED
+            transition.error = None
+        except Exception as e:
+            transition.error = str(e)
+            if "already in ledger" in transition.error:
+                transition.status = Transition.SUBMITTED
+            elif transition.attempts >= self.max_attempts:
+                transition.status = Transition.FAILED
+                log.error("%s transition of app-id %s failed: %s", transition.kind, transition.app_id, e)
+
+    def _check_confirmation(self, transition):
+        info = self.algod_client.pending_transaction_info(transition.txid)
+        if info.get("confirmed-round"):
+            transition.status = Transition.CONFIRMED
+            log.info("%s transition of app-id %s confirmed in round %s", transition.kind, transition.app_id,
+                     info.get("confirmed-round"))
+        elif info.get("pool-error"):
+            transition.status = Transition.FAILED
+            transition.error = info.get("pool-error")
+
+    def on_round(self, round_num: int):
+        """
+        Submit the transitions opening in the next round and track the submitted ones
+        :param round_num: last round produced by the chain
+        """
+        changed = False
+        confirmed_starts = []
+        with self._lock:
+            due = []
+            while self._queue and self._queue[0][0] <= round_num + 1:
+                due.append(heapq.heappop(self._queue)[2])
+        try:
+            for transition in due:
+                before = (transition.status, transition.error, transition.attempts)
+                try:
+                    if transition.status == Transition.SUBMITTED:
+                        self._check_confirmation(transition)
+                        if transition.status == Transition.CONFIRMED and transition.kind == Transition.START:
+                            confirmed_starts.append(transition.app_id)
+                    elif transition.status == Transition.PENDING and round_num + 1 <= transition.last_round:
+                        self._submit(transition)
+                except Exception as e:
+                    # a node error must not drop the popped transition, it is tried again on the next round
+                    transition.error = str(e)
+                    log.error("Cannot process the %s transition of app-id %s: %s", transition.kind,
+                              transition.app_id, e)
+                if transition.status in (Transition.PENDING, Transition.SUBMITTED):
+                    if round_num + 1 > transition.last_round:
+                        # past its validity window: a transition not confirmed by now never will be
+                        transition.status = Transition.EXPIRED
+                        log.error("%s transition of app-id %s expired", transition.kind, transition.app_id)
+                    else:
+                        # rejected submissions are retried and confirmations checked on the next round
+                        with self._lock:
+                            self._push(transition, round_num + 1)
+                changed = changed or (transition.status, transition.error, transition.attempts) != before
+
+            self._schedule_finish(confirmed_starts, round_num)
+        finally:
+            if changed:
+                self.save()
+
+    def _schedule_finish(self, app_ids, round_num):
+        for app_id in app_ids:
+            try:
+                finish = self._sign_finish(app_id, round_num)
+            except Exception as e:
+                log.error("Cannot sign the finish transition of app-id %s: %s", app_id, e)
+                finish = None
+            if finish is not None:
+                with self._lock:
+                    self.transitions[(app_id, Transition.FINISH)] = finish
+                    self._push(finish)
+
+    def start(self, follower: RoundFollower = None):
+        """
+        Subscribe to a round follower, a new one is started if none is given
+        :param follower:
+        :return:
+        """
+        if follower is None:
+            follower = RoundFollower(self.algod_client).start()
+        self.follower = follower
+        follower.subscribe(self.on_round)
+        return self
+
+    def stop(self):
+        if self.follower is not None:
+            self.follower.unsubscribe(self.on_round)
+            self.follower = None
+        self.save()
+
+    def summary(self):
+        """
+        Number of transitions by kind and status
+        :return:
+        """
+        counts = {}
+        with self._lock:
+            for transition in self.transitions.values():
+                counts.setdefault(transition.kind, {}).setdefault(transition.status, 0)
+                counts[transition.kind][transition.status] += 1
+        return counts
@@ -1,17 +1,55 @@
 from pyteal import *
 
+from smart_contracts.contract_logistic_manager import LogisticManagerContract
 
-def contract_escrow(app_id: int):
+
+def contract_escrow(app_id: int, batched: bool = True):
     """
     Stateless contract to perform payments for a contract
     :param app_id:
+    :param batched: accept refund groups of up to 16 transactions, each payment following its refundParticipant call.
+    False gives the escrow of applications initialized before batched refunds
     :return:
     """
-    return Seq([
-        Assert(Global.group_size() == Int(2)),  # atomic transfer with two transactions
-        Assert(Gtxn[0].application_id() == Int(app_id)),    # check the application
+    if not batched:
+        return Seq([
+            Assert(Global.group_size() == Int(2)),  # atomic transfer with two transactions
+            Assert(Gtxn[0].application_id() == Int(app_id)),    # check the application
+
+            Assert(Gtxn[1].type_enum() == TxnType.Payment),
+
+            Return(Int(1))
+        ])
 
-        Assert(Gtxn[1].type_enum() == TxnType.Payment),
+    previous = Gtxn[Txn.group_index() - Int(1)]
 
+    # atomic transfer with two transactions: the application method call checks the payment, only the finish and
+    # reclaim methods (checking the close address is the creator) may close the escrow
+    method = Gtxn[0].application_args[0]
+    single_payment = And(
+        Txn.group_index() == Int(1),
+        Gtxn[0].application_id() == Int(app_id),
+        Gtxn[0].on_completion() == OnComplete.NoOp,
+        Or(
+            Txn.close_remainder_to() == Global.zero_address(),
+            method == Bytes(LogisticManagerContract.AppMethods.finish_delivery),
+            method == Bytes(LogisticManagerContract.AppMethods.reclaim_escrow),
+        ),
+    )
+
+    # refund group: every payment follows the refundParticipant call checking it
+    refund_batch = And(
+        Txn.group_index() > Int(0),
+        previous.application_id() == Int(app_id),
+        previous.on_completion() == OnComplete.NoOp,
+        previous.application_args[0] == Bytes(LogisticManagerContract.AppMethods.refund_participant),
+        Txn.close_remainder_to() == Global.zero_address(),
+    )
+
+    return Seq([
+        Assert(Txn.type_enum() == TxnType.Payment),
+        Assert(Txn.rekey_to() == Global.zero_address()),
+        Assert(Txn.fee() <= Global.min_txn_fee()),
+        Assert(If(Global.group_size() == Int(2), single_payment, refund_batch)),
         Return(Int(1))
     ])
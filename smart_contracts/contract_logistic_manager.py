@@ -32,6 +32,9 @@ class LogisticManagerContract:
         start_delivery = "startDelivery"
         finish_delivery = "finishDelivery"
         cancel_delivery_participation = "cancelParticipation"
+        cancel_delivery = "cancelDelivery"
+        refund_participant = "refundParticipant"
+        reclaim_escrow = "reclaimEscrow"
 
     class AppState:
         not_initialized = Int(0)
@@ -39,6 +42,7 @@ class LogisticManagerContract:
         ready = Int(2)
         started = Int(3)
         finished = Int(4)
+        cancelled = Int(5)
 
     class UserState:
         participating = Int(1)
@@ -72,7 +76,16 @@ class LogisticManagerContract:
                  self.start_delivery()],
 
                 [Txn.application_args[0] == Bytes(self.AppMethods.finish_delivery),
-                 self.finish_delivery()]
+                 self.finish_delivery()],
+
+                [Txn.application_args[0] == Bytes(self.AppMethods.cancel_delivery),
+                 self.cancel_delivery()],
+
+                [Txn.application_args[0] == Bytes(self.AppMethods.refund_participant),
+                 self.refund_participant()],
+
+                [Txn.application_args[0] == Bytes(self.AppMethods.reclaim_escrow),
+                 self.reclaim_escrow()]
             )
         )
 
@@ -238,6 +251,7 @@ class LogisticManagerContract:
         delivery_ready = App.globalGet(self.Variables.app_state) == self.AppState.ready
 
         return Seq([
+            Assert(Global.group_size() == Int(1)),
             Assert(delivery_ready),
             Assert(Not(is_creator)),
             Assert(App.globalGet(self.Variables.app_state) == self.AppState.ready),
@@ -327,6 +341,7 @@ class LogisticManagerContract:
             Gtxn[1].receiver() == Gtxn[0].sender(),
             Gtxn[1].amount() == App.globalGet(self.Variables.delivery_unit_cost)*App.localGet(Int(0), self.Variables.book_capacity),
             Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+            Gtxn[1].close_remainder_to() == Global.zero_address(),
         )
 
         update_state = Seq([
@@ -398,6 +413,7 @@ class LogisticManagerContract:
             Gtxn[1].receiver() == App.globalGet(self.Variables.creator_address),
             Gtxn[1].amount() == amount,
             Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+            Gtxn[1].close_remainder_to() == App.globalGet(self.Variables.creator_address),
         )
 
         update_state = Seq([
@@ -412,6 +428,93 @@ class LogisticManagerContract:
             Return(Int(1))
         ])
 
+    def cancel_delivery(self):
+        """
+        NoOpTxn
+        The creator cancel the delivery, before or after its start
+        Participants are then refunded with refundParticipant
+        :return:
+        """
+        is_creator = Txn.sender() == App.globalGet(self.Variables.creator_address)
+        valid_number_of_transactions = Global.group_size() == Int(1)
+        app_state = App.globalGet(self.Variables.app_state)
+
+        can_cancel = And(
+            Or(app_state == self.AppState.ready, app_state == self.AppState.started),
+            is_creator,  # creator only can perform this action
+            valid_number_of_transactions
+        )
+
+        return Seq([
+            Assert(can_cancel),
+            App.globalPut(self.Variables.app_state, self.AppState.cancelled),
+            Return(Int(1))
+        ])
+
+    def refund_participant(self):
+        """
+        NoOpTxn
+        Refund the participant given as Txn.accounts[1] of a cancelled delivery
+        The refund is the next transaction of the group, so a group can hold up to 8 refunds
+        :return:
+        """
+        get_participant_state = App.localGetEx(Int(1), App.id(), self.Variables.book_capacity)
+        delivery_capacity = App.globalGet(self.Variables.delivery_capacity)
+        refund = Gtxn[Txn.group_index() + Int(1)]
+
+        is_participating = And(
+            get_participant_state.hasValue(),
+            get_participant_state.value() != Int(0),
+        )
+
+        valid_refund = And(
+            refund.type_enum() == TxnType.Payment,
+            refund.receiver() == Txn.accounts[1],
+            refund.amount() == App.globalGet(self.Variables.delivery_unit_cost)*get_participant_state.value(),
+            refund.sender() == App.globalGet(self.Variables.escrow_address),
+            refund.close_remainder_to() == Global.zero_address(),
+        )
+
+        return Seq([
+            Assert(App.globalGet(self.Variables.app_state) == self.AppState.cancelled),
+            get_participant_state,
+            Assert(is_participating),
+            Assert(valid_refund),
+            App.globalPut(self.Variables.delivery_capacity, delivery_capacity + get_participant_state.value()),
+            App.localPut(Int(1), self.Variables.book_capacity, Int(0)),  # set user as not participating
+            Return(Int(1))
+        ])
+
+    def reclaim_escrow(self):
+        """
+        NoOpTxn
+        The creator close the escrow of a cancelled delivery once every participant is refunded
+        :return:
+        """
+        is_creator = Txn.sender() == App.globalGet(self.Variables.creator_address)
+        no_participants = App.globalGet(self.Variables.delivery_capacity) == App.globalGet(
+            self.Variables.max_capacity)
+
+        can_reclaim = And(
+            App.globalGet(self.Variables.app_state) == self.AppState.cancelled,
+            is_creator,
+            no_participants,
+            Global.group_size() == Int(2),
+        )
+
+        valid_payment = And(
+            Gtxn[1].type_enum() == TxnType.Payment,
+            Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+            Gtxn[1].receiver() == App.globalGet(self.Variables.creator_address),
+            Gtxn[1].close_remainder_to() == App.globalGet(self.Variables.creator_address),
+        )
+
+        return Seq([
+            Assert(can_reclaim),
+            Assert(valid_payment),
+            Return(Int(1))
+        ])
+
     def approval_program(self):
         """
         approval_program of the contract
@@ -0,0 +1,378 @@
+from pyteal import *
+
+from smart_contracts.contract_logistic_manager import LogisticManagerContract
+
+
+class OptimizedLogisticManagerContract(LogisticManagerContract):
+    """
+    Same rules as LogisticManagerContract with a cheaper code path:
+    values read more than once per call are loaded once into scratch slots, bookings are read with App.localGet and
+    the dispatch reaches the most used methods first
+    """
+
+    def application_start(self):
+        """
+        Start the application, check with transaction to execute
+        :return:
+        """
+        # TEAL 5 has no computed jump: the cheapest dispatch tests zero values first (create, NoOp) and compares
+        # the method name with the most used methods first
+        method = Txn.application_args[0]
+        handle_noop = Cond(
+            [method == Bytes(self.AppMethods.participate_delivery), self.participate_delivery()],
+            [method == Bytes(self.AppMethods.cancel_delivery_participation), self.cancel_participation()],
+            [method == Bytes(self.AppMethods.start_delivery), self.start_delivery()],
+            [method == Bytes(self.AppMethods.finish_delivery), self.finish_delivery()],
+            [method == Bytes(self.AppMethods.fund_escrow), self.fund_escrow()],
+            [method == Bytes(self.AppMethods.initialize_escrow),
+             self.initialize_escrow(escrow_address=Txn.application_args[1])],
+            [method == Bytes(self.AppMethods.update_delivery), self.update_delivery()],
+            [method == Bytes(self.AppMethods.refund_participant), self.refund_participant()],
+            [method == Bytes(self.AppMethods.cancel_delivery), self.cancel_delivery()],
+            [method == Bytes(self.AppMethods.reclaim_escrow), self.reclaim_escrow()],
+        )
+
+        is_creator = Txn.sender() == App.globalGet(self.Variables.creator_address)
+        no_participants = App.globalGet(self.Variables.delivery_capacity) == App.globalGet(
+            self.Variables.max_capacity)
+        app_state = App.globalGet(self.Variables.app_state)
+
+        can_update = And(
+            is_creator,
+            no_participants,
+            app_state != self.AppState.started
+        )
+
+        can_delete = And(
+            is_creator,
+            Or(no_participants, app_state == self.AppState.finished)
+        )
+
+        other_actions = Cond(
+            [Txn.on_completion() == OnComplete.OptIn, self.opt_in()],
+            [Txn.on_completion() == OnComplete.UpdateApplication, Return(can_update)],
+            [Txn.on_completion() == OnComplete.DeleteApplication, Return(can_delete)],
+        )
+
+        return If(Txn.application_id(),
+                  If(Txn.on_completion(), other_actions, handle_noop),
+                  self.app_create())
+
+    def app_create(self):
+        """
+        CreateAppTxn
+        Set the global_state of the app with given params, the checked values are kept in scratch slots
+        :return:
+        """
+        departure_round = ScratchVar(TealType.uint64)
+        arrival_round = ScratchVar(TealType.uint64)
+        capacity = ScratchVar(TealType.uint64)
+
+        return Seq([
+            Assert(Txn.application_args.length() == Int(9)),
+            departure_round.store(Btoi(Txn.application_args[4])),
+            arrival_round.store(Btoi(Txn.application_args[6])),
+            capacity.store(Btoi(Txn.application_args[8])),
+            App.globalPut(self.Variables.creator_address, Txn.sender()),
+            App.globalPut(self.Variables.creator_name, Txn.application_args[0]),
+            App.globalPut(self.Variables.departure_address, Txn.application_args[1]),
+            App.globalPut(self.Variables.arrival_address, Txn.application_args[2]),
+            App.globalPut(self.Variables.departure_date, Txn.application_args[3]),
+            App.globalPut(self.Variables.departure_date_round, departure_round.load()),
+            App.globalPut(self.Variables.arrival_date, Txn.application_args[5]),
+            App.globalPut(self.Variables.arrival_date_round, arrival_round.load()),
+            App.globalPut(self.Variables.delivery_unit_cost, Btoi(Txn.application_args[7])),
+            App.globalPut(self.Variables.max_capacity, capacity.load()),
+            App.globalPut(self.Variables.delivery_capacity, capacity.load()),
+            App.globalPut(self.Variables.app_state, self.AppState.not_initialized),
+            Assert(Global.round() <= departure_round.load()),
+            Assert(departure_round.load() < arrival_round.load()),
+            Assert(capacity.load() > Int(0)),
+            Return(Int(1))
+        ])
+
+    def update_delivery(self):
+        """
+        NoOpTxn
+        Update the global_state of the app with given params
+        :return:
+        """
+        departure_round = ScratchVar(TealType.uint64)
+        arrival_round = ScratchVar(TealType.uint64)
+        capacity = ScratchVar(TealType.uint64)
+
+        can_update = And(
+            Txn.application_args.length() == Int(10),
+            Txn.sender() == App.globalGet(self.Variables.creator_address),
+            App.globalGet(self.Variables.delivery_capacity) == App.globalGet(self.Variables.max_capacity),
+            App.globalGet(self.Variables.app_state) == self.AppState.ready,
+        )
+
+        return Seq([
+            Assert(can_update),
+            departure_round.store(Btoi(Txn.application_args[5])),
+            arrival_round.store(Btoi(Txn.application_args[7])),
+            capacity.store(Btoi(Txn.application_args[9])),
+            App.globalPut(self.Variables.creator_name, Txn.application_args[1]),
+            App.globalPut(self.Variables.departure_address, Txn.application_args[2]),
+            App.globalPut(self.Variables.arrival_address, Txn.application_args[3]),
+            App.globalPut(self.Variables.departure_date, Txn.application_args[4]),
+            App.globalPut(self.Variables.departure_date_round, departure_round.load()),
+            App.globalPut(self.Variables.arrival_date, Txn.application_args[6]),
+            App.globalPut(self.Variables.arrival_date_round, arrival_round.load()),
+            App.globalPut(self.Variables.delivery_unit_cost, Btoi(Txn.application_args[8])),
+            App.globalPut(self.Variables.max_capacity, capacity.load()),
+            App.globalPut(self.Variables.delivery_capacity, capacity.load()),
+            Assert(Global.round() <= departure_round.load()),
+            Assert(departure_round.load() < arrival_round.load()),
+            Assert(capacity.load() > Int(0)),
+            Return(Int(1))
+        ])
+
+    def opt_in(self):
+        """
+        OptInTxn
+        Opt In a user to allow the usage of local_state
+        :return:
+        """
+        return Return(And(
+            Global.group_size() == Int(1),
+            App.globalGet(self.Variables.app_state) == self.AppState.ready,
+            Txn.sender() != App.globalGet(self.Variables.creator_address),
+            Global.round() <= App.globalGet(self.Variables.departure_date_round),
+            App.globalGet(self.Variables.delivery_capacity) > Int(0),
+        ))
+
+    def participate_delivery(self):
+        """
+        NoOpTxn
+        A user want to participate the delivery
+        :return:
+        """
+        book_capacity = ScratchVar(TealType.uint64)
+        delivery_capacity = ScratchVar(TealType.uint64)
+
+        can_participate = And(
+            App.globalGet(self.Variables.app_state) == self.AppState.ready,
+            Txn.sender() != App.globalGet(self.Variables.creator_address),
+            delivery_capacity.load() >= book_capacity.load(),
+            Global.round() <= App.globalGet(self.Variables.departure_date_round),
+            Global.group_size() == Int(2),
+        )
+
+        valid_payment = And(
+            Gtxn[1].type_enum() == TxnType.Payment,
+            Gtxn[1].receiver() == App.globalGet(self.Variables.escrow_address),
+            Gtxn[1].amount() == App.globalGet(self.Variables.delivery_unit_cost) * book_capacity.load(),
+            Gtxn[1].sender() == Gtxn[0].sender(),
+        )
+
+        return Seq([
+            book_capacity.store(Btoi(Txn.application_args[1])),
+            delivery_capacity.store(App.globalGet(self.Variables.delivery_capacity)),
+            Assert(can_participate),
+            Assert(valid_payment),
+            # not participating yet, a missing local value reads as 0
+            Assert(Not(App.localGet(Int(0), self.Variables.book_capacity))),
+            App.globalPut(self.Variables.delivery_capacity, delivery_capacity.load() - book_capacity.load()),
+            App.localPut(Int(0), self.Variables.book_capacity, book_capacity.load()),
+            Return(Int(1))
+        ])
+
+    def cancel_participation(self):
+        """
+        NoOpTxn
+        A user want to cancel delivery participation
+        :return:
+        """
+        book_capacity = ScratchVar(TealType.uint64)
+
+        can_cancel = And(
+            App.globalGet(self.Variables.app_state) == self.AppState.ready,
+            Txn.sender() != App.globalGet(self.Variables.creator_address),
+            Global.round() <= App.globalGet(self.Variables.departure_date_round),
+            Global.group_size() == Int(2),
+        )
+
+        # a missing local value reads as 0, like App.localGet
+        valid_refund = And(
+            Gtxn[1].type_enum() == TxnType.Payment,
+            Gtxn[1].receiver() == Gtxn[0].sender(),
+            Gtxn[1].amount() == App.globalGet(self.Variables.delivery_unit_cost) * book_capacity.load(),
+            Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+            Gtxn[1].close_remainder_to() == Global.zero_address(),
+        )
+
+        return Seq([
+            Assert(can_cancel),
+            book_capacity.store(App.localGet(Int(0), self.Variables.book_capacity)),
+            Assert(valid_refund),
+            Assert(book_capacity.load()),
+            App.globalPut(self.Variables.delivery_capacity,
+                          App.globalGet(self.Variables.delivery_capacity) + book_capacity.load()),
+            App.localPut(Int(0), self.Variables.book_capacity, Int(0)),
+            Return(Int(1))
+        ])
+
+    def start_delivery(self):
+        """
+        NoOpTxn
+        The creator start the delivery
+        :return:
+        """
+        return Seq([
+            Assert(And(
+                App.globalGet(self.Variables.app_state) == self.AppState.ready,
+                Txn.sender() == App.globalGet(self.Variables.creator_address),
+                Global.round() >= App.globalGet(self.Variables.departure_date_round),
+                Global.group_size() == Int(1),
+            )),
+            App.globalPut(self.Variables.app_state, self.AppState.started),
+            Return(Int(1))
+        ])
+
+    def finish_delivery(self):
+        """
+        NoOpTxn
+        The creator finish the delivery
+        :return:
+        """
+        creator = ScratchVar(TealType.bytes)
+        amount = (App.globalGet(self.Variables.max_capacity) - App.globalGet(self.Variables.delivery_capacity)) * \
+            App.globalGet(self.Variables.delivery_unit_cost)
+
+        can_finish = And(
+            App.globalGet(self.Variables.app_state) == self.AppState.started,
+            Txn.sender() == creator.load(),
+            Global.round() <= App.globalGet(self.Variables.arrival_date_round),
+            Global.group_size() == Int(2),
+        )
+
+        valid_payment = And(
+            Gtxn[1].type_enum() == TxnType.Payment,
+            Gtxn[1].receiver() == creator.load(),
+            Gtxn[1].amount() == amount,
+            Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+            Gtxn[1].close_remainder_to() == creator.load(),
+        )
+
+        return Seq([
+            creator.store(App.globalGet(self.Variables.creator_address)),
+            Assert(can_finish),
+            Assert(valid_payment),
+            App.globalPut(self.Variables.app_state, self.AppState.finished),
+            Return(Int(1))
+        ])
+
+    def initialize_escrow(self, escrow_address):
+        """
+        NoOpTxn
+        Initialize an escrow for this application
+        :return:
+        """
+        curr_escrow_address = App.globalGetEx(Int(0), self.Variables.escrow_address)
+
+        return Seq([
+            Assert(And(
+                App.globalGet(self.Variables.app_state) == self.AppState.not_initialized,
+                Global.group_size() == Int(1),
+                Txn.sender() == App.globalGet(self.Variables.creator_address),
+            )),
+            curr_escrow_address,
+            Assert(Not(curr_escrow_address.hasValue())),
+            App.globalPut(self.Variables.escrow_address, escrow_address),
+            App.globalPut(self.Variables.app_state, self.AppState.initialized),
+            Return(Int(1))
+        ])
+
+    def fund_escrow(self):
+        """
+        NoOpTxn
+        Fund an escrow for this application
+        :return:
+        """
+        return Seq([
+            Assert(And(
+                App.globalGet(self.Variables.app_state) == self.AppState.initialized,
+                Txn.sender() == App.globalGet(self.Variables.creator_address),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].receiver() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].amount() == self.Constants.escrow_min_balance,
+                Gtxn[1].sender() == Gtxn[0].sender(),
+            )),
+            App.globalPut(self.Variables.app_state, self.AppState.ready),
+            Return(Int(1))
+        ])
+
+    def cancel_delivery(self):
+        """
+        NoOpTxn
+        The creator cancel the delivery, before or after its start
+        :return:
+        """
+        app_state = App.globalGet(self.Variables.app_state)
+
+        return Seq([
+            # ready and started are the consecutive states 2 and 3
+            Assert(And(
+                app_state >= self.AppState.ready,
+                app_state <= self.AppState.started,
+                Txn.sender() == App.globalGet(self.Variables.creator_address),
+                Global.group_size() == Int(1),
+            )),
+            App.globalPut(self.Variables.app_state, self.AppState.cancelled),
+            Return(Int(1))
+        ])
+
+    def refund_participant(self):
+        """
+        NoOpTxn
+        Refund the participant given as Txn.accounts[1] of a cancelled delivery, the refund is the next transaction
+        :return:
+        """
+        refund_index = ScratchVar(TealType.uint64)
+        book_capacity = ScratchVar(TealType.uint64)
+        refund = Gtxn[refund_index.load()]
+
+        # a missing local value reads as 0
+        return Seq([
+            Assert(App.globalGet(self.Variables.app_state) == self.AppState.cancelled),
+            refund_index.store(Txn.group_index() + Int(1)),
+            book_capacity.store(App.localGet(Int(1), self.Variables.book_capacity)),
+            Assert(And(
+                book_capacity.load(),
+                refund.type_enum() == TxnType.Payment,
+                refund.receiver() == Txn.accounts[1],
+                refund.amount() == App.globalGet(self.Variables.delivery_unit_cost) * book_capacity.load(),
+                refund.sender() == App.globalGet(self.Variables.escrow_address),
+                refund.close_remainder_to() == Global.zero_address(),
+            )),
+            App.globalPut(self.Variables.delivery_capacity,
+                          App.globalGet(self.Variables.delivery_capacity) + book_capacity.load()),
+            App.localPut(Int(1), self.Variables.book_capacity, Int(0)),
+            Return(Int(1))
+        ])
+
+    def reclaim_escrow(self):
+        """
+        NoOpTxn
+        The creator close the escrow of a cancelled delivery once every participant is refunded
+        :return:
+        """
+        creator = ScratchVar(TealType.bytes)
+
+        return Seq([
+            creator.store(App.globalGet(self.Variables.creator_address)),
+            Assert(And(
+                App.globalGet(self.Variables.app_state) == self.AppState.cancelled,
+                Txn.sender() == creator.load(),
+                App.globalGet(self.Variables.delivery_capacity) == App.globalGet(self.Variables.max_capacity),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].receiver() == creator.load(),
+                Gtxn[1].close_remainder_to() == creator.load(),
+            )),
+            Return(Int(1))
+        ])
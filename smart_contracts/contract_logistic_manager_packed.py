@@ -0,0 +1,396 @@
+import algosdk
+from pyteal import *
+
+from smart_contracts import delivery_record
+from smart_contracts.contract_logistic_manager import LogisticManagerContract
+from smart_contracts.delivery_record import Record, creator, field, with_capacity, with_state
+
+
+class PackedLogisticManagerContract(LogisticManagerContract):
+    """
+    Same methods and arguments as LogisticManagerContract with a compact global state: one fixed-width record
+    (algo_helper.DELIVERY_RECORD_LAYOUT), the escrow address and the text fields under one-letter keys.
+    Dates are kept as rounds only, the date strings of the arguments are not stored
+    """
+
+    class Variables(LogisticManagerContract.Variables):
+        # Global State Keys
+        record = Bytes("r")  # Bytes, delivery_record layout
+        escrow_address = Bytes("e")  # Bytes
+        info = Bytes("i")  # Bytes, creator_name, departure_address, arrival_address
+        info_separator = Bytes("base16", "1f")
+        # Local State Keys
+        book_capacity = Bytes("b")  # Int
+
+    def load_record(self, record: ScratchVar):
+        return record.store(App.globalGet(self.Variables.record))
+
+    def put_record(self, value):
+        return App.globalPut(self.Variables.record, value)
+
+    def application_start(self):
+        """
+        Start the application, check with transaction to execute
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        method = Txn.application_args[0]
+
+        handle_noop = Cond(
+            [method == Bytes(self.AppMethods.initialize_escrow),
+             self.initialize_escrow(escrow_address=Txn.application_args[1])],
+            [method == Bytes(self.AppMethods.fund_escrow), self.fund_escrow()],
+            [method == Bytes(self.AppMethods.update_delivery), self.update_delivery()],
+            [method == Bytes(self.AppMethods.participate_delivery), self.participate_delivery()],
+            [method == Bytes(self.AppMethods.cancel_delivery_participation), self.cancel_participation()],
+            [method == Bytes(self.AppMethods.start_delivery), self.start_delivery()],
+            [method == Bytes(self.AppMethods.finish_delivery), self.finish_delivery()],
+            [method == Bytes(self.AppMethods.cancel_delivery), self.cancel_delivery()],
+            [method == Bytes(self.AppMethods.refund_participant), self.refund_participant()],
+            [method == Bytes(self.AppMethods.reclaim_escrow), self.reclaim_escrow()],
+        )
+
+        is_creator = Txn.sender() == creator(record)
+        no_participants = field(record, Record.delivery_capacity) == field(record, Record.max_capacity)
+        app_state = field(record, Record.delivery_state)
+
+        can_update = Seq([
+            self.load_record(record),
+            Return(And(is_creator, no_participants, app_state != self.AppState.started)),
+        ])
+
+        can_delete = Seq([
+            self.load_record(record),
+            Return(And(is_creator, Or(no_participants, app_state == self.AppState.finished))),
+        ])
+
+        return Cond(
+            [Txn.application_id() == Int(0), self.app_create()],
+            [Txn.on_completion() == OnComplete.OptIn, self.opt_in()],
+            [Txn.on_completion() == OnComplete.NoOp, handle_noop],
+            [Txn.on_completion() == OnComplete.UpdateApplication, can_update],
+            [Txn.on_completion() == OnComplete.DeleteApplication, can_delete],
+        )
+
+    def write_delivery(self, first_arg: int, state):
+        """
+        Store the delivery from the application args starting at first_arg, the args of LogisticManagerContract
+        :return:
+        """
+        args = [Txn.application_args[first_arg + index] for index in range(9)]
+        departure_round = ScratchVar(TealType.uint64)
+        arrival_round = ScratchVar(TealType.uint64)
+        capacity = ScratchVar(TealType.uint64)
+        separator = self.Variables.info_separator
+
+        return Seq([
+            departure_round.store(Btoi(args[4])),
+            arrival_round.store(Btoi(args[6])),
+            capacity.store(Btoi(args[8])),
+            Assert(Global.round() <= departure_round.load()),
+            Assert(departure_round.load() < arrival_round.load()),
+            Assert(capacity.load() > Int(0)),
+            self.put_record(delivery_record.new_record(
+                Txn.sender(), departure_round.load(), arrival_round.load(), Btoi(args[7]), capacity.load(), state)),
+            App.globalPut(self.Variables.info, Concat(args[0], separator, args[1], separator, args[2])),
+        ])
+
+    def app_create(self):
+        """
+        CreateAppTxn
+        Set the global_state of the app with given params
+        :return:
+        """
+        return Seq([
+            Assert(Txn.application_args.length() == Int(9)),
+            self.write_delivery(0, self.AppState.not_initialized),
+            Return(Int(1))
+        ])
+
+    def update_delivery(self):
+        """
+        NoOpTxn
+        Update the global_state of the app with given params
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+
+        return Seq([
+            Assert(Txn.application_args.length() == Int(10)),
+            self.load_record(record),
+            Assert(And(
+                Txn.sender() == creator(record),
+                field(record, Record.delivery_capacity) == field(record, Record.max_capacity),
+                field(record, Record.delivery_state) == self.AppState.ready,
+            )),
+            self.write_delivery(1, self.AppState.ready),
+            Return(Int(1))
+        ])
+
+    def initialize_escrow(self, escrow_address):
+        """
+        NoOpTxn
+        Initialize an escrow for this application
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        curr_escrow_address = App.globalGetEx(Int(0), self.Variables.escrow_address)
+
+        return Seq([
+            self.load_record(record),
+            curr_escrow_address,
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.not_initialized,
+                Not(curr_escrow_address.hasValue()),
+                Global.group_size() == Int(1),
+                Txn.sender() == creator(record),
+            )),
+            App.globalPut(self.Variables.escrow_address, escrow_address),
+            self.put_record(with_state(record, self.AppState.initialized)),
+            Return(Int(1))
+        ])
+
+    def fund_escrow(self):
+        """
+        NoOpTxn
+        Fund an escrow for this application
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+
+        return Seq([
+            self.load_record(record),
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.initialized,
+                Txn.sender() == creator(record),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].receiver() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].amount() == self.Constants.escrow_min_balance,
+                Gtxn[1].sender() == Gtxn[0].sender(),
+            )),
+            self.put_record(with_state(record, self.AppState.ready)),
+            Return(Int(1))
+        ])
+
+    def opt_in(self):
+        """
+        OptInTxn
+        Opt In a user to allow the usage of local_state
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+
+        return Seq([
+            self.load_record(record),
+            Return(And(
+                Global.group_size() == Int(1),
+                field(record, Record.delivery_state) == self.AppState.ready,
+                Txn.sender() != creator(record),
+                Global.round() <= field(record, Record.departure_date_round),
+                field(record, Record.delivery_capacity) > Int(0),
+            ))
+        ])
+
+    def participate_delivery(self):
+        """
+        NoOpTxn
+        A user want to participate the delivery
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        book_capacity = ScratchVar(TealType.uint64)
+        delivery_capacity = ScratchVar(TealType.uint64)
+        get_participant_state = App.localGetEx(Int(0), App.id(), self.Variables.book_capacity)
+
+        return Seq([
+            self.load_record(record),
+            book_capacity.store(Btoi(Txn.application_args[1])),
+            delivery_capacity.store(field(record, Record.delivery_capacity)),
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.ready,
+                Txn.sender() != creator(record),
+                delivery_capacity.load() >= book_capacity.load(),
+                Global.round() <= field(record, Record.departure_date_round),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].receiver() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].amount() == field(record, Record.delivery_unit_cost) * book_capacity.load(),
+                Gtxn[1].sender() == Gtxn[0].sender(),
+            )),
+            get_participant_state,
+            Assert(Or(Not(get_participant_state.hasValue()), get_participant_state.value() == Int(0))),
+            self.put_record(with_capacity(record, delivery_capacity.load() - book_capacity.load())),
+            App.localPut(Int(0), self.Variables.book_capacity, book_capacity.load()),
+            Return(Int(1))
+        ])
+
+    def cancel_participation(self):
+        """
+        NoOpTxn
+        A user want to cancel delivery participation
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        get_participant_state = App.localGetEx(Int(0), App.id(), self.Variables.book_capacity)
+
+        return Seq([
+            self.load_record(record),
+            get_participant_state,
+            Assert(And(
+                get_participant_state.hasValue(),
+                get_participant_state.value() != Int(0),
+                field(record, Record.delivery_state) == self.AppState.ready,
+                Txn.sender() != creator(record),
+                Global.round() <= field(record, Record.departure_date_round),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].receiver() == Gtxn[0].sender(),
+                Gtxn[1].amount() == field(record, Record.delivery_unit_cost) * get_participant_state.value(),
+                Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].close_remainder_to() == Global.zero_address(),
+            )),
+            self.put_record(with_capacity(
+                record, field(record, Record.delivery_capacity) + get_participant_state.value())),
+            App.localPut(Int(0), self.Variables.book_capacity, Int(0)),
+            Return(Int(1))
+        ])
+
+    def start_delivery(self):
+        """
+        NoOpTxn
+        The creator start the delivery
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+
+        return Seq([
+            self.load_record(record),
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.ready,
+                Txn.sender() == creator(record),
+                Global.round() >= field(record, Record.departure_date_round),
+                Global.group_size() == Int(1),
+            )),
+            self.put_record(with_state(record, self.AppState.started)),
+            Return(Int(1))
+        ])
+
+    def finish_delivery(self):
+        """
+        NoOpTxn
+        The creator finish the delivery
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        amount = (field(record, Record.max_capacity) - field(record, Record.delivery_capacity)) * \
+            field(record, Record.delivery_unit_cost)
+
+        return Seq([
+            self.load_record(record),
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.started,
+                Txn.sender() == creator(record),
+                Global.round() <= field(record, Record.arrival_date_round),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].receiver() == creator(record),
+                Gtxn[1].amount() == amount,
+                Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].close_remainder_to() == creator(record),
+            )),
+            self.put_record(with_state(record, self.AppState.finished)),
+            Return(Int(1))
+        ])
+
+    def cancel_delivery(self):
+        """
+        NoOpTxn
+        The creator cancel the delivery, before or after its start
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        app_state = field(record, Record.delivery_state)
+
+        return Seq([
+            self.load_record(record),
+            Assert(And(
+                Or(app_state == self.AppState.ready, app_state == self.AppState.started),
+                Txn.sender() == creator(record),
+                Global.group_size() == Int(1),
+            )),
+            self.put_record(with_state(record, self.AppState.cancelled)),
+            Return(Int(1))
+        ])
+
+    def refund_participant(self):
+        """
+        NoOpTxn
+        Refund the participant given as Txn.accounts[1] of a cancelled delivery, the refund is the next transaction
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        get_participant_state = App.localGetEx(Int(1), App.id(), self.Variables.book_capacity)
+        refund = Gtxn[Txn.group_index() + Int(1)]
+
+        return Seq([
+            self.load_record(record),
+            get_participant_state,
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.cancelled,
+                get_participant_state.hasValue(),
+                get_participant_state.value() != Int(0),
+                refund.type_enum() == TxnType.Payment,
+                refund.receiver() == Txn.accounts[1],
+                refund.amount() == field(record, Record.delivery_unit_cost) * get_participant_state.value(),
+                refund.sender() == App.globalGet(self.Variables.escrow_address),
+                refund.close_remainder_to() == Global.zero_address(),
+            )),
+            self.put_record(with_capacity(
+                record, field(record, Record.delivery_capacity) + get_participant_state.value())),
+            App.localPut(Int(1), self.Variables.book_capacity, Int(0)),
+            Return(Int(1))
+        ])
+
+    def reclaim_escrow(self):
+        """
+        NoOpTxn
+        The creator close the escrow of a cancelled delivery once every participant is refunded
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+
+        return Seq([
+            self.load_record(record),
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.cancelled,
+                Txn.sender() == creator(record),
+                field(record, Record.delivery_capacity) == field(record, Record.max_capacity),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].receiver() == creator(record),
+                Gtxn[1].close_remainder_to() == creator(record),
+            )),
+            Return(Int(1))
+        ])
+
+    def clear_program(self):
+        """
+        clear_state_program of the contract
+        :return:
+        """
+        return Seq(
+            Assert(ExtractUint64(App.globalGet(self.Variables.record), Int(Record.delivery_state)) ==
+                   self.AppState.finished),
+            Return(Int(1))
+        )
+
+    @property
+    def global_schema(self):
+        """
+        global_schema of the contract
+        :return:
+        """
+        return algosdk.future.transaction.StateSchema(num_uints=0,
+                                                      num_byte_slices=3)
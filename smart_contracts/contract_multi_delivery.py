@@ -0,0 +1,418 @@
+import algosdk
+from pyteal import *
+
+from smart_contracts import delivery_record
+from smart_contracts.contract_logistic_manager import LogisticManagerContract
+from smart_contracts.delivery_record import Record, creator, field, with_capacity, with_state
+
+
+class MultiDeliveryContract:
+    """
+    One application hosting many deliveries, keyed by a delivery id.
+    A delivery is a fixed-width record in the global state (layout of algo_helper.DELIVERY_RECORD_LAYOUT) and its
+    text fields, all the deliveries share the escrow of the application.
+    Only the manager (creator of the application) creates deliveries: the slots are few, another account could fill them
+    """
+
+    class Constants:
+        escrow_min_balance = Int(1000000)
+        # 3 uints and the escrow address leave 60 byte slices: a record and a text key per delivery
+        max_deliveries = 30
+
+    class Variables:
+        # Global State Keys
+        next_id = Bytes("next_id")  # Int
+        open_deliveries = Bytes("open_deliveries")  # Int
+        app_state = Bytes("app_state")  # Int
+        escrow_address = Bytes("escrow_address")  # Bytes
+        # a delivery is stored under itob(delivery_id) and its text fields under itob(delivery_id) + info_suffix
+        info_suffix = Bytes("i")
+        info_separator = Bytes("base16", "1f")
+        # Local State Keys: itob(delivery_id) -> booked capacity
+
+    class AppMethods(LogisticManagerContract.AppMethods):
+        create_delivery = "createDelivery"
+        close_delivery = "closeDelivery"
+        leave_delivery = "leaveDelivery"
+
+    AppState = LogisticManagerContract.AppState
+
+    def application_start(self):
+        """
+        Start the application, check with transaction to execute
+        :return:
+        """
+        method = Txn.application_args[0]
+        is_manager = Txn.sender() == Global.creator_address()
+        no_deliveries = App.globalGet(self.Variables.open_deliveries) == Int(0)
+
+        handle_noop = Cond(
+            [method == Bytes(self.AppMethods.participate_delivery), self.participate_delivery()],
+            [method == Bytes(self.AppMethods.cancel_delivery_participation), self.cancel_participation()],
+            [method == Bytes(self.AppMethods.start_delivery), self.start_delivery()],
+            [method == Bytes(self.AppMethods.finish_delivery), self.finish_delivery()],
+            [method == Bytes(self.AppMethods.create_delivery), self.create_delivery()],
+            [method == Bytes(self.AppMethods.update_delivery), self.update_delivery()],
+            [method == Bytes(self.AppMethods.close_delivery), self.close_delivery()],
+            [method == Bytes(self.AppMethods.leave_delivery), self.leave_delivery()],
+            [method == Bytes(self.AppMethods.initialize_escrow),
+             self.initialize_escrow(escrow_address=Txn.application_args[1])],
+            [method == Bytes(self.AppMethods.fund_escrow), self.fund_escrow()],
+        )
+
+        # the application can only change once every delivery is closed
+        can_update = And(is_manager, no_deliveries, Global.group_size() == Int(1))
+
+        return Cond(
+            [Txn.application_id() == Int(0), self.app_create()],
+            [Txn.on_completion() == OnComplete.NoOp, handle_noop],
+            # one opt in gives the local state of every delivery of the app
+            [Txn.on_completion() == OnComplete.OptIn, Return(Global.group_size() == Int(1))],
+            [Txn.on_completion() == OnComplete.UpdateApplication, Return(can_update)],
+            [Txn.on_completion() == OnComplete.DeleteApplication, Return(can_update)],
+        )
+
+    # ---- delivery records ----
+    def load_record(self, record: ScratchVar):
+        """
+        Load the record of the delivery given in the second argument, fails if it does not exist
+        :param record:
+        :return:
+        """
+        stored = App.globalGetEx(Int(0), Txn.application_args[1])
+        return Seq([
+            Assert(Len(Txn.application_args[1]) == Int(8)),
+            stored,
+            Assert(stored.hasValue()),
+            record.store(stored.value()),
+        ])
+
+    def escrow_payment(self, receiver, amount):
+        """
+        Second transaction of the group pays amount from the shared escrow, without closing or rekeying it
+        :param receiver:
+        :param amount:
+        :return:
+        """
+        return And(
+            Gtxn[1].type_enum() == TxnType.Payment,
+            Gtxn[1].sender() == App.globalGet(self.Variables.escrow_address),
+            Gtxn[1].receiver() == receiver,
+            Gtxn[1].amount() == amount,
+            Gtxn[1].close_remainder_to() == Global.zero_address(),
+            Gtxn[1].rekey_to() == Global.zero_address(),
+        )
+
+    def write_delivery(self, delivery_key, first_arg: int, creator_address, state):
+        """
+        Store a delivery from the application args starting at first_arg:
+        creator_name, departure_address, arrival_address, departure_date, departure_round, arrival_date,
+        arrival_round, unit_cost, capacity
+        :return:
+        """
+        args = [Txn.application_args[first_arg + index] for index in range(9)]
+        departure_round = ScratchVar(TealType.uint64)
+        arrival_round = ScratchVar(TealType.uint64)
+        capacity = ScratchVar(TealType.uint64)
+        separator = self.Variables.info_separator
+
+        return Seq([
+            departure_round.store(Btoi(args[4])),
+            arrival_round.store(Btoi(args[6])),
+            capacity.store(Btoi(args[8])),
+            Assert(Global.round() <= departure_round.load()),
+            Assert(departure_round.load() < arrival_round.load()),
+            Assert(capacity.load() > Int(0)),
+            App.globalPut(delivery_key, delivery_record.new_record(
+                creator_address, departure_round.load(), arrival_round.load(), Btoi(args[7]), capacity.load(), state)),
+            App.globalPut(Concat(delivery_key, self.Variables.info_suffix), Concat(
+                args[0], separator, args[1], separator, args[2], separator, args[3], separator, args[5])),
+        ])
+
+    # ---- application ----
+    def app_create(self):
+        """
+        CreateAppTxn
+        An empty host, the creator of the app manages its escrow
+        :return:
+        """
+        return Seq([
+            App.globalPut(self.Variables.next_id, Int(1)),
+            App.globalPut(self.Variables.open_deliveries, Int(0)),
+            App.globalPut(self.Variables.app_state, self.AppState.not_initialized),
+            Return(Int(1))
+        ])
+
+    def initialize_escrow(self, escrow_address):
+        """
+        NoOpTxn
+        Initialize the escrow shared by the deliveries of this application
+        :return:
+        """
+        return Seq([
+            Assert(And(
+                App.globalGet(self.Variables.app_state) == self.AppState.not_initialized,
+                Txn.sender() == Global.creator_address(),
+                Global.group_size() == Int(1),
+            )),
+            App.globalPut(self.Variables.escrow_address, escrow_address),
+            App.globalPut(self.Variables.app_state, self.AppState.initialized),
+            Return(Int(1))
+        ])
+
+    def fund_escrow(self):
+        """
+        NoOpTxn
+        Fund the escrow once for every delivery of this application
+        :return:
+        """
+        return Seq([
+            Assert(And(
+                App.globalGet(self.Variables.app_state) == self.AppState.initialized,
+                Txn.sender() == Global.creator_address(),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].receiver() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].amount() == self.Constants.escrow_min_balance,
+                Gtxn[1].sender() == Gtxn[0].sender(),
+            )),
+            App.globalPut(self.Variables.app_state, self.AppState.ready),
+            Return(Int(1))
+        ])
+
+    # ---- deliveries ----
+    def create_delivery(self):
+        """
+        NoOpTxn
+        The manager adds a delivery, ready for participations. Its id is logged
+        :return:
+        """
+        delivery_id = ScratchVar(TealType.uint64)
+        open_deliveries = App.globalGet(self.Variables.open_deliveries)
+
+        return Seq([
+            Assert(And(
+                Txn.application_args.length() == Int(10),
+                Txn.sender() == Global.creator_address(),
+                App.globalGet(self.Variables.app_state) == self.AppState.ready,
+                Global.group_size() == Int(1),
+                open_deliveries < Int(self.Constants.max_deliveries),
+            )),
+            delivery_id.store(App.globalGet(self.Variables.next_id)),
+            self.write_delivery(Itob(delivery_id.load()), 1, Txn.sender(), self.AppState.ready),
+            App.globalPut(self.Variables.next_id, delivery_id.load() + Int(1)),
+            App.globalPut(self.Variables.open_deliveries, open_deliveries + Int(1)),
+            Log(Itob(delivery_id.load())),
+            Return(Int(1))
+        ])
+
+    def update_delivery(self):
+        """
+        NoOpTxn
+        Update a delivery without participants
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+
+        return Seq([
+            Assert(Txn.application_args.length() == Int(11)),
+            self.load_record(record),
+            Assert(And(
+                Txn.sender() == creator(record),
+                field(record, Record.delivery_capacity) == field(record, Record.max_capacity),
+                field(record, Record.delivery_state) == self.AppState.ready,
+                Global.group_size() == Int(1),
+            )),
+            self.write_delivery(Txn.application_args[1], 2, Txn.sender(), self.AppState.ready),
+            Return(Int(1))
+        ])
+
+    def participate_delivery(self):
+        """
+        NoOpTxn
+        A user want to participate a delivery, paying the shared escrow
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        book_capacity = ScratchVar(TealType.uint64)
+        delivery_capacity = ScratchVar(TealType.uint64)
+        get_participant_state = App.localGetEx(Int(0), App.id(), Txn.application_args[1])
+
+        return Seq([
+            self.load_record(record),
+            book_capacity.store(Btoi(Txn.application_args[2])),
+            delivery_capacity.store(field(record, Record.delivery_capacity)),
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.ready,
+                Txn.sender() != creator(record),
+                delivery_capacity.load() >= book_capacity.load(),
+                Global.round() <= field(record, Record.departure_date_round),
+                Global.group_size() == Int(2),
+                Gtxn[1].type_enum() == TxnType.Payment,
+                Gtxn[1].receiver() == App.globalGet(self.Variables.escrow_address),
+                Gtxn[1].amount() == field(record, Record.delivery_unit_cost) * book_capacity.load(),
+                Gtxn[1].sender() == Gtxn[0].sender(),
+            )),
+            get_participant_state,
+            Assert(Or(Not(get_participant_state.hasValue()), get_participant_state.value() == Int(0))),
+            App.globalPut(Txn.application_args[1],
+                          with_capacity(record, delivery_capacity.load() - book_capacity.load())),
+            App.localPut(Int(0), Txn.application_args[1], book_capacity.load()),
+            Return(Int(1))
+        ])
+
+    def cancel_participation(self):
+        """
+        NoOpTxn
+        A user want to cancel a delivery participation, refunded by the shared escrow
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        get_participant_state = App.localGetEx(Int(0), App.id(), Txn.application_args[1])
+
+        return Seq([
+            self.load_record(record),
+            get_participant_state,
+            Assert(And(
+                get_participant_state.hasValue(),
+                get_participant_state.value() != Int(0),
+                field(record, Record.delivery_state) == self.AppState.ready,
+                Txn.sender() != creator(record),
+                Global.round() <= field(record, Record.departure_date_round),
+                Global.group_size() == Int(2),
+                self.escrow_payment(Gtxn[0].sender(),
+                                    field(record, Record.delivery_unit_cost) *
+                                    get_participant_state.value()),
+            )),
+            App.globalPut(Txn.application_args[1], with_capacity(
+                record, field(record, Record.delivery_capacity) + get_participant_state.value())),
+            # frees the local slot for another delivery
+            App.localDel(Int(0), Txn.application_args[1]),
+            Return(Int(1))
+        ])
+
+    def start_delivery(self):
+        """
+        NoOpTxn
+        The creator start a delivery
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+
+        return Seq([
+            self.load_record(record),
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.ready,
+                Txn.sender() == creator(record),
+                Global.round() >= field(record, Record.departure_date_round),
+                Global.group_size() == Int(1),
+            )),
+            App.globalPut(Txn.application_args[1], with_state(record, self.AppState.started)),
+            Return(Int(1))
+        ])
+
+    def finish_delivery(self):
+        """
+        NoOpTxn
+        The creator finish a delivery and is paid its bookings by the shared escrow
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+        amount = (field(record, Record.max_capacity) -
+                  field(record, Record.delivery_capacity)) * \
+            field(record, Record.delivery_unit_cost)
+
+        return Seq([
+            self.load_record(record),
+            Assert(And(
+                field(record, Record.delivery_state) == self.AppState.started,
+                Txn.sender() == creator(record),
+                Global.round() <= field(record, Record.arrival_date_round),
+                Global.group_size() == Int(2),
+                self.escrow_payment(creator(record), amount),
+            )),
+            App.globalPut(Txn.application_args[1], with_state(record, self.AppState.finished)),
+            Return(Int(1))
+        ])
+
+    def close_delivery(self):
+        """
+        NoOpTxn
+        The creator removes a finished delivery or a delivery without participants, its keys are freed
+        :return:
+        """
+        record = ScratchVar(TealType.bytes)
+
+        return Seq([
+            self.load_record(record),
+            Assert(And(
+                Txn.sender() == creator(record),
+                Global.group_size() == Int(1),
+                Or(
+                    field(record, Record.delivery_capacity) ==
+                    field(record, Record.max_capacity),
+                    field(record, Record.delivery_state) == self.AppState.finished,
+                ),
+            )),
+            App.globalDel(Txn.application_args[1]),
+            App.globalDel(Concat(Txn.application_args[1], self.Variables.info_suffix)),
+            App.globalPut(self.Variables.open_deliveries,
+                          App.globalGet(self.Variables.open_deliveries) - Int(1)),
+            Return(Int(1))
+        ])
+
+    def leave_delivery(self):
+        """
+        NoOpTxn
+        A participant frees the local slot of a finished or closed delivery
+        :return:
+        """
+        stored = App.globalGetEx(Int(0), Txn.application_args[1])
+        get_participant_state = App.localGetEx(Int(0), App.id(), Txn.application_args[1])
+
+        return Seq([
+            Assert(Len(Txn.application_args[1]) == Int(8)),
+            stored,
+            get_participant_state,
+            Assert(And(
+                get_participant_state.hasValue(),
+                Global.group_size() == Int(1),
+                If(stored.hasValue(),
+                   ExtractUint64(stored.value(), Int(Record.delivery_state)) == self.AppState.finished,
+                   Int(1)),
+            )),
+            App.localDel(Int(0), Txn.application_args[1]),
+            Return(Int(1))
+        ])
+
+    def approval_program(self):
+        """
+        approval_program of the contract
+        :return:
+        """
+        return self.application_start()
+
+    def clear_program(self):
+        """
+        clear_state_program of the contract
+        :return:
+        """
+        return Return(Int(1))
+
+    @property
+    def global_schema(self):
+        """
+        global_schema of the contract
+        :return:
+        """
+        return algosdk.future.transaction.StateSchema(num_uints=3,
+                                                      num_byte_slices=1 + 2 * self.Constants.max_deliveries)
+
+    @property
+    def local_schema(self):
+        """
+        local_schema of the contract, one booking per delivery for up to 16 deliveries
+        :return:
+        """
+        return algosdk.future.transaction.StateSchema(num_uints=16,
+                                                      num_byte_slices=0)
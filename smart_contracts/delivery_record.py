@@ -0,0 +1,40 @@
+from pyteal import *
+
+
+class Record:
+    """
+    Offsets in the fixed-width record of a delivery, the layout of algo_helper.DELIVERY_RECORD_LAYOUT
+    """
+    creator = 0
+    departure_date_round = 32
+    arrival_date_round = 40
+    delivery_unit_cost = 48
+    max_capacity = 56
+    delivery_state = 64
+    delivery_capacity = 72
+
+
+def new_record(creator, departure_round, arrival_round, unit_cost, capacity, state):
+    """
+    Record of a delivery without participants
+    :return:
+    """
+    return Concat(creator, Itob(departure_round), Itob(arrival_round), Itob(unit_cost), Itob(capacity), Itob(state),
+                  Itob(capacity))
+
+
+def field(record: ScratchVar, offset: int):
+    return ExtractUint64(record.load(), Int(offset))
+
+
+def creator(record: ScratchVar):
+    return Extract(record.load(), Int(Record.creator), Int(32))
+
+
+def with_state(record: ScratchVar, state):
+    return Concat(Extract(record.load(), Int(0), Int(Record.delivery_state)), Itob(state),
+                  Extract(record.load(), Int(Record.delivery_capacity), Int(8)))
+
+
+def with_capacity(record: ScratchVar, capacity):
+    return Concat(Extract(record.load(), Int(0), Int(Record.delivery_capacity)), Itob(capacity))
@@ -1,20 +1,39 @@
 from algosdk.v2client import algod
 
-from constants import Constants
+from constants import Constants, get_env
 from helpers import algo_helper
+from models.DeliveryIndex import DeliveryIndex
 from models.IndexerManager import IndexerHelper
+from utilities import utils
 
 
 def main():
+    utils.configure_logging(get_env('LOG_LEVEL') or 'INFO', json_format=get_env('LOG_FORMAT') == 'json')
     mnemonic = Constants.accounts[0].get('mnemonic')
     private_key = algo_helper.get_private_key_from_mnemonic(mnemonic)
     address = algo_helper.get_address_from_private_key(private_key)
 
     algod_client = algod.AlgodClient(Constants.algod_token, Constants.algod_address)
 
+    if get_env('INDEX_FILE'):
+        # indexer-free discovery, from the algod blocks
+        index = DeliveryIndex.from_env(algod_client)
+        index.sync()
+        ids = index.app_ids()
+        print(ids)
+        if not ids:
+            print("No delivery indexed")
+            return
+        app_info = algod_client.application_info(ids[-1])
+        print(app_info)
+        return
+
     indexer = IndexerHelper()
     ids = indexer.get_app_ids_from_transactions_note(Constants.transaction_note)
     print(ids)
+    if not ids:
+        print("No delivery found")
+        return
     app_info = indexer.get_application_from_id(ids[-1])
     print(app_info)
 
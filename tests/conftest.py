@@ -0,0 +1,67 @@
+import datetime
+
+import pytest
+from algosdk import account
+
+from helpers import algo_helper
+from models.Delivery import Delivery
+from utilities import utils
+from utilities.local_node import LocalNode
+
+
+@pytest.fixture(scope="session", autouse=True)
+def quiet_logging():
+    utils.configure_logging(quiet=True)
+
+
+@pytest.fixture
+def node():
+    """
+    Local stand-in node confirming every group immediately
+    """
+    with LocalNode() as local_node:
+        yield local_node
+
+
+@pytest.fixture
+def algod_client(node):
+    return node.algod_client()
+
+
+@pytest.fixture
+def create_delivery(algod_client):
+    """
+    Create ready deliveries: escrow initialized and funded. Programs compiled by the local node are not the ones of
+    APPROVAL_PROGRAM, so their hashes are not checked
+    :return: create(max_capacity, unit_cost, departure_minutes) -> (Delivery, creator private key)
+    """
+    # the deliveries of a test share their dates, whatever the minute they are created in
+    now = datetime.datetime.now()
+
+    def create(max_capacity=10, unit_cost=100, departure_minutes=30):
+        creator_private_key = account.generate_account()[0]
+        departure = (now + datetime.timedelta(minutes=departure_minutes)).strftime('%Y-%m-%d %H:%M')
+        arrival = (now + datetime.timedelta(minutes=departure_minutes + 90)).strftime('%Y-%m-%d %H:%M')
+        delivery = Delivery(algod_client)
+        delivery.approval_program_hash = None
+        delivery.create_app(creator_private_key, "Creator", "Chennai", "Mumbai", departure, arrival, unit_cost,
+                            max_capacity)
+        assert delivery.initialize_escrow(creator_private_key) is not False
+        assert delivery.fund_escrow(creator_private_key) is not False
+        return delivery, creator_private_key
+
+    return create
+
+
+@pytest.fixture
+def advance_to(node, algod_client):
+    """
+    Produce empty rounds up to a round of the global state of applications, e.g. "departure_date_round". Rounds are
+    estimated from the block times when the applications are created, so the latest of them is reached
+    """
+
+    def advance(app_ids, key, rounds_before=0):
+        target = max(algo_helper.read_global_state(algod_client, app_id, False, False)[0][key] for app_id in app_ids)
+        node.ledger.advance(max(0, target - rounds_before - node.ledger.last_round))
+
+    return advance
@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks import contract_diff, teal_profiler
+from helpers import teal_emulator
+
+METHODS = list(teal_profiler.scenarios())
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return teal_profiler.approval_source(teal_profiler.DEFAULT_CONTRACT)
+
+
+@pytest.fixture(scope="module")
+def optimized():
+    return teal_profiler.approval_source(contract_diff.OPTIMIZED_CONTRACT)
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_optimized_contract_matches_reference(reference, optimized, method):
+    report = contract_diff.compare(reference, optimized, methods=[method])
+    assert report["mismatches"] == []
+    # the mutations reach both the accepting and the rejecting paths of the method
+    assert 0 < report["methods"][method]["accepted"] < report["methods"][method]["cases"]
+
+
+def test_divergence_is_reported(reference):
+    accept_all = "#pragma version 5\nint 1\nreturn\n"
+    report = contract_diff.compare(reference, accept_all, methods=["participateDelivery"])
+    assert report["mismatches"]
+    assert any(mismatch["reference"] is False and mismatch["candidate"] is True
+               for mismatch in report["mismatches"])
+
+
+def test_optimized_program_is_smaller_and_cheaper_on_the_hot_calls(reference, optimized):
+    assert teal_emulator.program_size(optimized) < teal_emulator.program_size(reference)
+    reference_costs, optimized_costs = (teal_profiler.profile(source)["methods"] for source in (reference, optimized))
+    for method in ("participateDelivery", "cancelParticipation", "startDelivery", "finishDelivery",
+                   "refundParticipant"):
+        assert optimized_costs[method]["cost"] < reference_costs[method]["cost"]
@@ -0,0 +1,104 @@
+import pytest
+from algosdk import account
+from algosdk.future import transaction
+
+from models.ApplicationManager import ApplicationManager
+
+
+def book(delivery, capacities):
+    """
+    :return: private keys of the participants, one per booked capacity
+    """
+    users = [account.generate_account()[0] for _ in capacities]
+    for user, capacity in zip(users, capacities):
+        assert delivery.participate(user, "user", capacity) is not False
+    return users
+
+
+def balance(algod_client, address):
+    return algod_client.account_info(address)["amount"]
+
+
+def test_cancel_delivery_refunds_bookings_and_reclaims_escrow(algod_client, create_delivery):
+    delivery, creator_private_key = create_delivery(unit_cost=100)
+    users = book(delivery, [2, 3, 4])
+    assert delivery.cancel_participation(users[0], "user") is not False
+    creator = account.address_from_private_key(creator_private_key)
+    escrow_balance = balance(algod_client, delivery.escrow_address)
+    creator_balance = balance(algod_client, creator)
+    user_balances = [balance(algod_client, account.address_from_private_key(user)) for user in users]
+
+    report = delivery.cancel_delivery(creator_private_key, [account.address_from_private_key(user) for user in users])
+
+    assert report.done
+    assert (report.refunded, report.skipped, report.refunded_amount) == (2, 1, 100 * (3 + 4))
+    assert report.booked_capacity == 0
+    assert report.escrow_reclaimed is True
+    assert balance(algod_client, delivery.escrow_address) == 0
+    refunded = [balance(algod_client, account.address_from_private_key(user)) - before
+                for user, before in zip(users, user_balances)]
+    assert refunded == [0, 300, 400]
+    # the escrow pays the fees of the 2 refunds and of its close payment, the creator the fees of its 4 calls
+    fees = ApplicationManager.Variables.fees
+    assert balance(algod_client, creator) - creator_balance == escrow_balance - 700 - 3 * fees - 4 * fees
+
+
+def test_cancel_delivery_again_refunds_nobody(algod_client, create_delivery):
+    delivery, creator_private_key = create_delivery()
+    participants = [account.address_from_private_key(user) for user in book(delivery, [1, 2])]
+    assert delivery.cancel_delivery(creator_private_key, participants).escrow_reclaimed is True
+
+    report = delivery.cancel_delivery(creator_private_key, participants)
+
+    assert (report.refunded, report.skipped) == (0, 2)
+    assert report.escrow_reclaimed is False
+    assert delivery.reclaim_escrow(creator_private_key) is None
+
+
+def test_reclaim_escrow_is_rejected_while_capacity_is_booked(algod_client, create_delivery):
+    delivery, creator_private_key = create_delivery()
+    users = book(delivery, [2, 3])
+    report = delivery.cancel_delivery(creator_private_key, [account.address_from_private_key(users[0])])
+
+    assert report.refunded == 1
+    assert report.booked_capacity == 3
+    assert report.escrow_reclaimed is False
+    assert delivery.reclaim_escrow(creator_private_key) is False
+    assert balance(algod_client, delivery.escrow_address) > 0
+
+
+def opt_in(sender, params, app_id):
+    return transaction.ApplicationOptInTxn(sender, params, app_id)
+
+
+def clear_state(sender, params, app_id):
+    return transaction.ApplicationClearStateTxn(sender, params, app_id)
+
+
+def cancel_participation(sender, params, app_id):
+    return transaction.ApplicationNoOpTxn(sender, params, app_id, [b"cancelParticipation"])
+
+
+@pytest.mark.parametrize("call, close", [
+    (opt_in, False),
+    (opt_in, True),
+    (clear_state, False),
+    (cancel_participation, True),
+])
+def test_escrow_payment_requires_a_matching_call(algod_client, create_delivery, call, close):
+    delivery, _ = create_delivery()
+    user = book(delivery, [5])[0]
+    address = account.address_from_private_key(user)
+    escrow_balance = balance(algod_client, delivery.escrow_address)
+    params = algod_client.suggested_params()
+    call_txn = call(address, params, delivery.app_id)
+    payment_txn = transaction.PaymentTxn(delivery.escrow_address, params, address, 500,
+                                         close_remainder_to=address if close else None)
+    group_id = transaction.calculate_group_id([call_txn, payment_txn])
+    call_txn.group = payment_txn.group = group_id
+    signed = [call_txn.sign(user), transaction.LogicSigTransaction(payment_txn,
+                                                                   transaction.LogicSig(delivery.escrow_bytes))]
+
+    with pytest.raises(Exception):
+        ApplicationManager.send_group_transactions(algod_client, signed)
+    assert balance(algod_client, delivery.escrow_address) == escrow_balance
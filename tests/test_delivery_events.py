@@ -0,0 +1,34 @@
+from algosdk import account
+
+from models.DeliveryEvents import DeliveryEvents
+from models.DeliveryIndex import DeliveryEvent
+
+
+def test_events_follow_the_block_order(node, algod_client, create_delivery):
+    events = DeliveryEvents(algod_client, start_round=node.ledger.last_round + 1)
+    seen = []
+    events.subscribe(seen.append)
+    booked = []
+    events.subscribe(booked.append, kinds=[DeliveryEvent.PARTICIPATED, DeliveryEvent.CANCELLED])
+    delivery, creator_private_key = create_delivery()
+    other, _ = create_delivery()
+    user = account.generate_account()[0]
+    delivery.participate(user, "user", 4)
+    other.participate(user, "user", 2)
+    delivery.cancel_participation(user, "user")
+    delivery.participate(user, "user", 3)
+    delivery.cancel_delivery(creator_private_key, [account.address_from_private_key(user)])
+
+    events.index.sync()
+
+    assert [event.kind for event in seen if event.app_id == delivery.app_id] == [
+        DeliveryEvent.CREATED, DeliveryEvent.ESCROW_INITIALIZED, DeliveryEvent.FUNDED, DeliveryEvent.PARTICIPATED,
+        DeliveryEvent.CANCELLED, DeliveryEvent.PARTICIPATED, DeliveryEvent.DELIVERY_CANCELLED,
+        DeliveryEvent.REFUNDED]
+    assert [(event.app_id, event.kind, event.book_capacity) for event in booked] == [
+        (delivery.app_id, DeliveryEvent.PARTICIPATED, 4), (other.app_id, DeliveryEvent.PARTICIPATED, 2),
+        (delivery.app_id, DeliveryEvent.CANCELLED, 4), (delivery.app_id, DeliveryEvent.PARTICIPATED, 3)]
+    # every event carries the delivery as it was once the transaction was applied
+    assert [event.delivery["delivery_capacity"] for event in booked] == [6, 8, 10, 7]
+    rounds = [event.round for event in seen]
+    assert rounds == sorted(rounds)
@@ -0,0 +1,29 @@
+import datetime
+
+from algosdk import account
+
+from models.DeliveryFleet import DeliveryFleet
+
+
+def test_creator_operations_are_routed_to_the_owning_worker(node):
+    creator_private_key = account.generate_account()[0]
+    users = [account.generate_account()[0] for _ in range(2)]
+    now = datetime.datetime.now()
+    departure = (now + datetime.timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M')
+    arrival = (now + datetime.timedelta(minutes=120)).strftime('%Y-%m-%d %H:%M')
+
+    with DeliveryFleet(workers=2, algod_address=node.algod_address, threads_per_worker=2) as fleet:
+        created = fleet.submit("create", creator_private_key, "Creator", "Chennai", "Mumbai", departure, arrival, 100,
+                               10).result()
+        assert created.ok
+        app_id = created.result
+        # create also initializes and funds the escrow
+        results = fleet.run([("participate", app_id, user, "user", 3) for user in users])
+        assert all(result.ok for result in results)
+
+        cancelled = fleet.submit("cancel_delivery", app_id, creator_private_key,
+                                 [account.address_from_private_key(user) for user in users]).result()
+
+    assert cancelled.ok, cancelled.error
+    assert (cancelled.result.refunded, cancelled.result.refunded_amount) == (2, 600)
+    assert cancelled.result.escrow_reclaimed is True
@@ -0,0 +1,55 @@
+import pytest
+from algosdk import account
+
+from helpers import algo_helper
+from models.DeliveryIndex import DeliveryIndex
+
+
+def test_index_matches_the_chain(node, algod_client, create_delivery):
+    start_round = node.ledger.last_round + 1
+    deliveries = [create_delivery(max_capacity=20) for _ in range(3)]
+    users = [account.generate_account()[0] for _ in range(3)]
+    for delivery, _ in deliveries:
+        for capacity, user in enumerate(users, start=2):
+            delivery.participate(user, "user", capacity)
+    deliveries[0][0].cancel_participation(users[0], "user")
+    deliveries[1][0].cancel_delivery(deliveries[1][1], [account.address_from_private_key(users[1])])
+
+    index = DeliveryIndex(algod_client, start_round=start_round)
+    index.sync()
+
+    assert index.app_ids() == [delivery.app_id for delivery, _ in deliveries]
+    for delivery, _ in deliveries:
+        indexed = index.get(delivery.app_id)
+        global_state, _, _, _ = algo_helper.read_global_state(algod_client, delivery.app_id, False, False)
+        for key in ("delivery_state", "delivery_capacity", "max_capacity", "delivery_unit_cost"):
+            assert indexed[key] == global_state[key], key
+        assert indexed["escrow_address"] == delivery.escrow_address
+        for user in users:
+            address = account.address_from_private_key(user)
+            local_state = algo_helper.read_local_state(algod_client, address, delivery.app_id, show=False) or {}
+            assert index.participants(delivery.app_id, booked=False).get(address, 0) == \
+                local_state.get("book_capacity", 0)
+    assert [index.get(delivery.app_id).get("refunds", 0) for delivery, _ in deliveries] == [1, 1, 0]
+
+
+def test_first_run_requires_a_start_round(node, algod_client, create_delivery, tmp_path, monkeypatch):
+    store_path = str(tmp_path / "deliveries.json")
+    monkeypatch.setenv("INDEX_FILE", store_path)
+    monkeypatch.delenv("INDEX_START_ROUND", raising=False)
+    with pytest.raises(ValueError, match="INDEX_START_ROUND"):
+        DeliveryIndex.from_env(algod_client)
+
+    monkeypatch.setenv("INDEX_START_ROUND", str(node.ledger.last_round + 1))
+    delivery, _ = create_delivery()
+    index = DeliveryIndex.from_env(algod_client)
+    index.sync()
+    index.save()
+    assert index.app_ids() == [delivery.app_id]
+
+    # the checkpoint is used afterwards
+    monkeypatch.delenv("INDEX_START_ROUND")
+    other, _ = create_delivery()
+    index = DeliveryIndex.from_env(algod_client)
+    index.sync()
+    assert index.app_ids() == [delivery.app_id, other.app_id]
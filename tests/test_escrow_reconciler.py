@@ -0,0 +1,76 @@
+import pytest
+from algosdk import account
+
+from models.DeliveryIndex import DeliveryIndex
+from models.EscrowReconciler import CANCELLED, READY, EscrowReconciler
+
+
+@pytest.fixture
+def deliveries(node, create_delivery):
+    """
+    Ready deliveries with bookings and cancelled bookings, the last one cancelled and refunded
+    :return: start round, [(Delivery, creator private key)]
+    """
+    start_round = node.ledger.last_round + 1
+    created = [create_delivery(max_capacity=20) for _ in range(4)]
+    users = [account.generate_account()[0] for _ in range(3)]
+    for delivery, _ in created:
+        for capacity, user in enumerate(users, start=1):
+            delivery.participate(user, "user", capacity)
+        delivery.cancel_participation(users[0], "user")
+    delivery, creator_private_key = created[-1]
+    delivery.cancel_delivery(creator_private_key, [account.address_from_private_key(users[1])])
+    return start_round, created
+
+
+@pytest.fixture
+def reconcilers(node, algod_client, deliveries):
+    """
+    Reconciler reading the apps (refunds counted on the indexer) and one given a synced DeliveryIndex
+    """
+    index = DeliveryIndex(algod_client, start_round=deliveries[0])
+    index.sync()
+    return [EscrowReconciler(algod_client, indexer_client=node.indexer_client()),
+            EscrowReconciler(algod_client, index)]
+
+
+def test_refunded_bookings_are_not_discrepancies(algod_client, deliveries, reconcilers):
+    app_ids = [delivery.app_id for delivery, _ in deliveries[1]]
+    for reconciler in reconcilers:
+        report = reconciler.reconcile(app_ids)
+        assert (report.checked, report.discrepancies, report.errors) == (4, [], {})
+        assert report.within_budget
+
+
+def test_refunds_are_not_counted_without_indexer(algod_client, deliveries):
+    app_ids = [delivery.app_id for delivery, _ in deliveries[1]]
+    report = EscrowReconciler(algod_client).reconcile(app_ids)
+    # one fee short per refund
+    assert [(discrepancy["delivery_state"], discrepancy["difference"]) for discrepancy in report.discrepancies] == \
+        [(READY, -1000)] * 3 + [(CANCELLED, -2000)]
+    fee_tolerance = EscrowReconciler(algod_client, tolerance=2000).reconcile(app_ids)
+    assert fee_tolerance.discrepancies == []
+
+
+def test_tampered_escrows_are_reported(node, deliveries, reconcilers):
+    (surplus, _), (shortfall, _) = deliveries[1][:2]
+    node.ledger.fund(surplus.escrow_address, 5000)
+    # the escrow address is read from the node, not while its ledger is locked
+    shortfall_address = shortfall.escrow_address
+    with node.ledger.lock:
+        node.ledger.balances[shortfall_address] -= 70
+    app_ids = [delivery.app_id for delivery, _ in deliveries[1]]
+    for reconciler in reconcilers:
+        report = reconciler.reconcile(app_ids)
+        # differences to the booked balance, each escrow already paid the fee of one refund
+        assert [(discrepancy["app_id"], discrepancy["kind"], discrepancy["difference"])
+                for discrepancy in report.discrepancies] == [(surplus.app_id, "surplus", 5000 - 1000),
+                                                             (shortfall.app_id, "shortfall", -70 - 1000)]
+        assert report.discrepancies[0]["escrow_address"] == surplus.escrow_address
+
+
+def test_apps_not_read_within_the_budget_are_unchecked(deliveries, reconcilers):
+    app_ids = [delivery.app_id for delivery, _ in deliveries[1]]
+    report = reconcilers[0].reconcile(app_ids, budget=0)
+    assert (report.checked, sorted(report.unchecked)) == (0, sorted(app_ids))
+    assert not report.within_budget
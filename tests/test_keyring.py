@@ -0,0 +1,30 @@
+import builtins
+
+from algosdk import account, mnemonic
+
+from models.Keyring import Keyring
+
+
+def test_accounts_file_is_closed_after_a_partial_lookup(tmp_path, monkeypatch):
+    keys = [account.generate_account()[0] for _ in range(3)]
+    accounts_file = tmp_path / "accounts.csv"
+    accounts_file.write_text("name,mnemonic\n" + "".join(
+        "User{},{}\n".format(index, mnemonic.from_private_key(key)) for index, key in enumerate(keys)))
+    opened = []
+    builtin_open = builtins.open
+
+    def tracking_open(*args, **kwargs):
+        opened.append(builtin_open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(builtins, "open", tracking_open)
+    keyring = Keyring(str(accounts_file))
+    assert keyring["User0"].private_key == keys[0]
+    monkeypatch.undo()
+    # the lookup stopped at the first row, the file is closed anyway
+    assert len(opened) == 1 and opened[0].closed
+    assert len(keyring._accounts) == 1
+
+    assert keyring.by_address(account.address_from_private_key(keys[2])).name == "User2"
+    assert keyring.get("User3") is None
+    assert [keyring_account.name for keyring_account in keyring] == ["User0", "User1", "User2"]
@@ -0,0 +1,21 @@
+import argparse
+
+import pytest
+
+from benchmarks import lifecycle
+
+
+@pytest.mark.parametrize("multi", [False, True])
+def test_every_step_is_measured_without_failures(node, multi):
+    bench = lifecycle.LifecycleBenchmark(node, deliveries=2, participants=2, cancels=1, workers=2, multi=multi)
+    wall_time = bench.run()
+
+    args = argparse.Namespace(deliveries=2, participants=2, cancels=1, workers=2, block_time=0, latency=0,
+                              multi=multi)
+    report = lifecycle.build_report(bench, wall_time, 0, args)
+    assert list(report["steps"]) == lifecycle.STEPS
+    counts = {name: step["count"] for name, step in report["steps"].items()}
+    assert counts == {"create": 2, "initialize_escrow": 2, "fund_escrow": 2, "participate": 4,
+                      "cancel_participation": 2, "start_delivery": 2, "finish_delivery": 2, "close_delivery": 2}
+    assert not any(step["failures"] for step in report["steps"].values())
+    assert report["ops_per_sec"] > 0 and report["algod_calls_per_op"] > 0
@@ -0,0 +1,61 @@
+import pytest
+from algosdk import account, encoding
+from algosdk.future import transaction
+
+from helpers import teal_emulator
+from utilities.local_node import LocalLedger, _GroupView
+
+
+def evaluate(source, ledger, sender):
+    txn = {"type": "appl", "snd": encoding.decode_address(sender)}
+    context = teal_emulator.EvalContext([txn], 0, _GroupView(ledger), ledger.last_round)
+    return teal_emulator.evaluate(source, context)
+
+
+def test_comments_are_stripped_outside_string_literals():
+    program = teal_emulator.TealProgram('#pragma version 5\n'
+                                        'byte "a // b" // comment\n'
+                                        'byte "quote \\" // still a string" // "comment"\n'
+                                        'int 1 // comment\n')
+    assert [(op, immediates) for op, immediates, _ in program.instructions] == [
+        ("byte", '"a // b"'), ("byte", '"quote \\" // still a string"'), ("int", "1")]
+
+
+def test_min_balance_counts_created_and_opted_in_apps():
+    ledger = LocalLedger()
+    creator, user = account.generate_account()[1], account.generate_account()[1]
+    ledger.apps[1] = {"creator": creator, "approval": b"", "clear": b"", "global": {},
+                      "global-schema": {"nui": 2, "nbs": 1}, "local-schema": {"nui": 1, "nbs": 2}}
+    ledger.local_states[(user, 1)] = {}
+    source = "#pragma version 5\nint 0\nmin_balance\nitob\nlog\nint 1\n"
+
+    assert ledger.account_info(creator)["min-balance"] == 100000 + 100000 + 2 * 28500 + 50000
+    assert ledger.account_info(user)["min-balance"] == 100000 + 100000 + 28500 + 2 * 50000
+    for address in (creator, user):
+        result = evaluate(source, ledger, address)
+        assert result.passed
+        assert int.from_bytes(result.logs[0], "big") == ledger.account_info(address)["min-balance"]
+
+
+def test_wait_for_block_after_produces_a_single_block():
+    ledger = LocalLedger()
+    start_round = ledger.last_round
+    ledger.wait_for_block_after(start_round - 1)
+    assert ledger.last_round == start_round
+    ledger.wait_for_block_after(start_round)
+    assert ledger.last_round == start_round + 1
+    ledger.wait_for_block_after(10 ** 9)
+    assert ledger.last_round == start_round + 2
+
+
+def test_underfunded_payment_cannot_close_out(algod_client):
+    sender_key, sender = account.generate_account()
+    params = algod_client.suggested_params()
+    # the first transaction of an account funds it, the second one spends more than what is left
+    algod_client.send_transaction(transaction.PaymentTxn(sender, params, sender, 0).sign(sender_key))
+    balance = algod_client.account_info(sender)["amount"]
+    overspend = transaction.PaymentTxn(sender, params, account.generate_account()[1], balance,
+                                       close_remainder_to=sender, note=b"overspend")
+    with pytest.raises(Exception, match="overspend"):
+        algod_client.send_transaction(overspend.sign(sender_key))
+    assert algod_client.account_info(sender)["amount"] == balance
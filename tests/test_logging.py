@@ -0,0 +1,28 @@
+import io
+import json
+
+import pytest
+
+from utilities import utils
+
+
+@pytest.fixture
+def log_stream():
+    stream = io.StringIO()
+    yield stream
+    utils.configure_logging(quiet=True)
+
+
+@pytest.mark.parametrize("options", [{"quiet": True}, {"level": "WARNING"}, {"json_format": True}])
+def test_console_output_ignores_the_log_configuration(capsys, log_stream, options):
+    utils.configure_logging(stream=log_stream, **options)
+    utils.console_log("1) Create Delivery", "blue")
+    assert capsys.readouterr().out == "\033[94m1) Create Delivery\033[0m\n"
+    assert log_stream.getvalue() == ""
+
+
+def test_json_lines_carry_the_extra_fields(log_stream):
+    utils.configure_logging(json_format=True, stream=log_stream)
+    utils.get_logger("tests").info("confirmed in round %s", 12, extra={"txid": "TX", "app_id": 3})
+    entry = json.loads(log_stream.getvalue())
+    assert (entry["msg"], entry["level"], entry["txid"], entry["app_id"]) == ("confirmed in round 12", "info", "TX", 3)
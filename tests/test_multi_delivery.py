@@ -0,0 +1,100 @@
+import datetime
+
+import pytest
+from algosdk import account
+from dotenv import dotenv_values
+from pyteal import compileTeal, Mode
+
+from models.ApplicationManager import ApplicationManager
+from models.MultiDelivery import MultiDelivery
+from smart_contracts.contract_multi_delivery import MultiDeliveryContract
+
+ENV_EXAMPLE = dotenv_values(".env.example")
+
+
+def dates(minutes=30):
+    now = datetime.datetime.now()
+    return ((now + datetime.timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M'),
+            (now + datetime.timedelta(minutes=minutes + 90)).strftime('%Y-%m-%d %H:%M'))
+
+
+@pytest.fixture
+def program_env(monkeypatch, algod_client):
+    """
+    Program hashes of .env.example for single delivery apps, the multi-delivery ones as compiled by the local node
+    """
+    monkeypatch.setenv("APPROVAL_PROGRAM", ENV_EXAMPLE["APPROVAL_PROGRAM"])
+    monkeypatch.setenv("CLEAR_STATE_PROGRAM", ENV_EXAMPLE["CLEAR_STATE_PROGRAM"])
+    contract = MultiDeliveryContract()
+    for key, program in (("MULTI_APPROVAL_PROGRAM", contract.approval_program()),
+                         ("MULTI_CLEAR_STATE_PROGRAM", contract.clear_program())):
+        monkeypatch.setenv(key, algod_client.compile(compileTeal(program, mode=Mode.Application, version=5))["result"])
+
+
+def test_readme_snippet_with_the_program_hashes_set(node, algod_client, program_env):
+    manager_pk, user_pk = account.generate_account()[0], account.generate_account()[0]
+    departure, arrival = dates()
+
+    host = MultiDelivery(algod_client)
+    app_id = host.deploy(manager_pk)
+    delivery = MultiDelivery(algod_client, app_id=app_id)
+    delivery_id = delivery.create_app(manager_pk, "Name", "Chennai", "Mumbai", departure, arrival, 10, 1000)
+    assert delivery_id == 1
+    assert delivery.participate(user_pk, "user", 20) is not False
+    assert delivery.program_verifier.is_verified(app_id)
+    assert delivery.read_delivery()["delivery_capacity"] == 980
+
+
+def test_program_mismatch_is_rejected(node, algod_client, program_env, monkeypatch):
+    manager_pk, user_pk = account.generate_account()[0], account.generate_account()[0]
+    departure, arrival = dates()
+    host = MultiDelivery(algod_client)
+    host.create_app(manager_pk, "Name", "Chennai", "Mumbai", departure, arrival, 10, 1000)
+
+    monkeypatch.setenv("MULTI_APPROVAL_PROGRAM", ENV_EXAMPLE["APPROVAL_PROGRAM"])
+    delivery = MultiDelivery(algod_client, app_id=host.app_id, delivery_id=host.delivery_id)
+    assert delivery.participate(user_pk, "user", 20) is False
+    assert delivery.read_delivery()["delivery_capacity"] == 1000
+
+
+def test_deliveries_share_the_application(node, algod_client):
+    manager_pk = account.generate_account()[0]
+    users = [account.generate_account()[0] for _ in range(3)]
+    departure, arrival = dates()
+    host = MultiDelivery(algod_client)
+    app_id = host.deploy(manager_pk)
+    first, second = (MultiDelivery(algod_client, app_id=app_id) for _ in range(2))
+    assert first.create_app(manager_pk, "First", "Chennai", "Mumbai", departure, arrival, 10, 100) == 1
+    assert second.create_app(manager_pk, "Second", "Delhi", "Goa", departure, arrival, 20, 100) == 2
+
+    for user_pk in users:
+        assert first.participate(user_pk, "user", 10) is not False
+    assert second.participate(users[0], "user", 5) is not False
+    assert first.cancel_participation(users[2], "user") is not False
+    assert (first.read_delivery()["delivery_capacity"], second.read_delivery()["delivery_capacity"]) == (80, 95)
+    assert first.read_delivery()["creator_name"] == "First"
+
+    node.ledger.advance(first.read_delivery()["departure_date_round"] - node.ledger.last_round)
+    assert first.start_delivery(manager_pk) is not False
+    manager_balance = algod_client.account_info(account.address_from_private_key(manager_pk))["amount"]
+    assert first.finish_delivery(manager_pk) is not False
+    # the escrow pays the bookings and stays open for the second delivery
+    assert algod_client.account_info(account.address_from_private_key(manager_pk))["amount"] == \
+        manager_balance + 10 * 20 - ApplicationManager.Variables.fees
+    assert first.close_delivery(manager_pk, []) is not False
+    assert first.read_delivery() is None
+    assert second.read_delivery()["delivery_capacity"] == 95
+
+
+def test_only_the_manager_creates_deliveries(node, algod_client):
+    manager_pk = account.generate_account()[0]
+    departure, arrival = dates()
+    host = MultiDelivery(algod_client)
+    app_id = host.deploy(manager_pk)
+
+    delivery = MultiDelivery(algod_client, app_id=app_id)
+    assert delivery.create_app(account.generate_account()[0], "Name", "Chennai", "Mumbai", departure, arrival, 10,
+                               1000) is False
+    assert delivery.create_app(manager_pk, "Name", "Chennai", "Mumbai", departure, arrival, 10, 1000) == 1
+    state, _, _ = delivery._read_app()
+    assert state[b"open_deliveries"] == 1
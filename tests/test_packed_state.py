@@ -0,0 +1,64 @@
+from algosdk import account, encoding
+
+from helpers import algo_helper
+
+
+def raw_global_state(algod_client, app_id):
+    return algo_helper.decode_raw_state(algod_client.application_info(app_id)["params"]["global-state"])
+
+
+def raw_local_state(algod_client, private_key, app_id):
+    for local_state in algod_client.account_info(account.address_from_private_key(private_key))["apps-local-state"]:
+        if local_state["id"] == app_id:
+            return algo_helper.decode_raw_state(local_state.get("key-value", []))
+
+
+def test_unpack_delivery_state():
+    creator = b"\x01" * 32
+    record = creator + b"".join(value.to_bytes(8, "big") for value in (1030, 2230, 10, 100, 2, 80))
+    packed = {b"r": record, b"e": b"\x03" * 32, b"i": b"Creator\x1fChennai\x1fMumbai"}
+    assert algo_helper.unpack_delivery_state(packed) == {
+        b"creator": creator, b"departure_date_round": 1030, b"arrival_date_round": 2230, b"delivery_unit_cost": 10,
+        b"max_capacity": 100, b"delivery_state": 2, b"delivery_capacity": 80, b"escrow_address": b"\x03" * 32,
+        b"creator_name": b"Creator", b"departure_address": b"Chennai", b"arrival_address": b"Mumbai"}
+    assert algo_helper.unpack_delivery_state({b"b": 20}) == {b"book_capacity": 20}
+    # states of the original layout are left as they are
+    legacy = {b"delivery_state": 2, b"book_capacity": 20}
+    assert algo_helper.unpack_delivery_state(legacy) is legacy
+
+
+def test_packed_state_matches_the_original_layout(algod_client, create_delivery, advance_to, monkeypatch):
+    users = [account.generate_account()[0] for _ in range(2)]
+    legacy, _ = create_delivery(max_capacity=100, unit_cost=10)
+    monkeypatch.setenv("PACKED_STATE", "1")
+    packed, creator = create_delivery(max_capacity=100, unit_cost=10)
+    for delivery in (legacy, packed):
+        delivery.enable_preflight()
+        for user_pk in users:
+            assert delivery.participate(user_pk, "user", 20) is not False
+            assert delivery.last_preflight.ok
+        assert delivery.cancel_participation(users[1], "user") is not False
+
+    legacy_state = raw_global_state(algod_client, legacy.app_id)
+    packed_state = raw_global_state(algod_client, packed.app_id)
+    assert set(packed_state) == {b"r", b"e", b"i"}
+    unpacked = algo_helper.unpack_delivery_state(packed_state)
+    # dates are kept as rounds only
+    assert {key: value for key, value in legacy_state.items() if key not in (b"creator", b"escrow_address")
+            and not key.endswith(b"_date")} == {key: value for key, value in unpacked.items()
+                                                if key not in (b"creator", b"escrow_address")}
+    assert encoding.encode_address(unpacked[b"escrow_address"]) == packed.escrow_address
+    assert unpacked[b"delivery_capacity"] == 80
+    assert [algo_helper.unpack_delivery_state(raw_local_state(algod_client, user_pk, packed.app_id))
+            for user_pk in users] == [{b"book_capacity": 20}, {b"book_capacity": 0}]
+
+    advance_to([legacy.app_id, packed.app_id], "departure_date_round")
+    creator_address = account.address_from_private_key(creator)
+    balance = algod_client.account_info(creator_address)["amount"]
+    assert packed.start_delivery(creator) is not False
+    assert packed.finish_delivery(creator) is not False
+    assert algo_helper.unpack_delivery_state(raw_global_state(algod_client, packed.app_id))[b"delivery_state"] == \
+        packed.app_contract.AppState.finished.value
+    # the bookings and the escrow balance go to the creator
+    assert algod_client.account_info(creator_address)["amount"] > balance + 20 * 10
+    assert algod_client.account_info(packed.escrow_address)["amount"] == 0
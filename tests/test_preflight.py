@@ -0,0 +1,67 @@
+from algosdk import account
+
+from helpers import algo_helper
+from models.ApplicationManager import ApplicationManager
+from models.Preflight import Preflight
+
+
+def participant(delivery, book_capacity=2):
+    private_key = account.generate_account()[0]
+    assert delivery.participate(private_key, "user", book_capacity) is not False
+    return private_key
+
+
+def test_participation_rules(algod_client, create_delivery, advance_to):
+    delivery, creator = create_delivery(max_capacity=5)
+    delivery.enable_preflight()
+    user = participant(delivery)
+    assert delivery.last_preflight.ok and delivery.last_preflight.cost > 0
+
+    rejections = [
+        (lambda: delivery.participate(creator, "creator", 1), Preflight.CREATOR_NOT_ALLOWED),
+        (lambda: delivery.participate(account.generate_account()[0], "user", 4), Preflight.CAPACITY_EXHAUSTED),
+        (lambda: delivery.participate(user, "user", 1), Preflight.ALREADY_PARTICIPATING),
+        (lambda: delivery.start_delivery(account.generate_account()[0]), Preflight.NOT_CREATOR),
+        (lambda: delivery.start_delivery(creator), Preflight.TOO_EARLY),
+        (lambda: delivery.finish_delivery(creator), Preflight.WRONG_STATE),
+    ]
+    for operation, reason in rejections:
+        assert operation() is False
+        assert delivery.last_preflight.reason == reason, delivery.last_preflight
+    # nothing rejected was submitted
+    global_state = algo_helper.read_global_state(algod_client, delivery.app_id, False, False)[0]
+    ready = delivery.app_contract.AppState.ready.value
+    assert (global_state["delivery_state"], global_state["delivery_capacity"]) == (ready, 3)
+
+    advance_to([delivery.app_id], "departure_date_round", rounds_before=-2)
+    assert delivery.participate(account.generate_account()[0], "late", 1) is False
+    assert delivery.last_preflight.reason == Preflight.ROUND_WINDOW_PASSED
+    assert delivery.cancel_participation(user, "user") is False
+    assert delivery.last_preflight.reason == Preflight.ROUND_WINDOW_PASSED
+
+
+def test_payment_and_program_rejections(algod_client, create_delivery):
+    delivery, _ = create_delivery(unit_cost=100)
+    preflight = Preflight(algod_client)
+    user = account.generate_account()[0]
+    address = account.address_from_private_key(user)
+    ApplicationManager.send_transaction(algod_client, ApplicationManager.opt_in_app(
+        algod_client=algod_client, address=address, app_id=delivery.app_id, sign_transaction=user))
+
+    def group(method, *args, amount=200):
+        call = ApplicationManager.call_app(algod_client, address, delivery.app_id, [method, *args])
+        payment = ApplicationManager.payment(algod_client, address, delivery.escrow_address, amount)
+        return [call, payment]
+
+    capacity = (2).to_bytes(8, "big")
+    # opted in without booking
+    result = preflight.check(delivery.app_id, group(b"cancelParticipation"))
+    assert result.reason == Preflight.NOT_PARTICIPATING
+    assert preflight.check(delivery.app_id, group(b"participateDelivery", capacity)).ok
+    result = preflight.check(delivery.app_id, group(b"participateDelivery", capacity, amount=199))
+    assert (result.reason, result.method) == (Preflight.INVALID_PAYMENT, "participateDelivery")
+    result = preflight.check(delivery.app_id, group(b"participateDelivery", capacity)[:1])
+    assert result.reason == Preflight.INVALID_GROUP
+    # no rule for an unknown method, the approval program rejects it
+    result = preflight.check(delivery.app_id, group(b"unknownMethod")[:1])
+    assert result.reason == Preflight.PROGRAM_REJECTED and result.message
@@ -0,0 +1,64 @@
+import pytest
+from pyteal import Mode, compileTeal
+
+from models.Delivery import Delivery
+from models.DeliveryIndex import DeliveryIndex
+from models.ProgramVerifier import ProgramVerifier
+
+
+@pytest.fixture
+def program_hashes(algod_client):
+    """
+    Hashes of the programs as compiled by the local node
+    """
+    contract = Delivery(algod_client).app_contract
+    return [algod_client.compile(compileTeal(program, mode=Mode.Application, version=5))["result"]
+            for program in (contract.approval_program(), contract.clear_program())]
+
+
+def app_info_requests(node):
+    return node.request_counts.get("application_info", 0)
+
+
+def test_verified_apps_are_not_fetched_again(node, algod_client, create_delivery, program_hashes):
+    app_ids = [create_delivery()[0].app_id for _ in range(3)]
+    verifier = ProgramVerifier(algod_client, *program_hashes)
+
+    assert verifier.verify_many(app_ids + [999999]) == {app_ids[0]: True, app_ids[1]: True, app_ids[2]: True,
+                                                        999999: False}
+    requests = app_info_requests(node)
+    assert verifier.verify_many(app_ids) == dict.fromkeys(app_ids, True)
+    verifier.verify(app_ids[0])
+    assert app_info_requests(node) == requests
+
+
+def test_given_hashes_are_always_compared(algod_client, create_delivery, program_hashes):
+    app_id = create_delivery()[0].app_id
+    verifier = ProgramVerifier(algod_client, *program_hashes)
+    verifier.verify(app_id)
+
+    # e.g. the hashes read by an operation after another client updated the app
+    with pytest.raises(Exception, match="Approval program hash is invalid"):
+        verifier.check(app_id, program_hashes[1], program_hashes[1])
+    assert not verifier.is_verified(app_id)
+    verifier.check(app_id, *program_hashes)
+    assert verifier.is_verified(app_id)
+
+
+def test_watched_updates_invalidate_the_app(node, algod_client, create_delivery, program_hashes):
+    start_round = node.ledger.last_round + 1
+    (delivery, creator_private_key), (other, _) = create_delivery(), create_delivery()
+    verifier = ProgramVerifier(algod_client, *program_hashes)
+    index = DeliveryIndex(algod_client, start_round=start_round)
+    index.sync()
+    verifier.watch(index)
+    assert verifier.verify_many([delivery.app_id, other.app_id]) == {delivery.app_id: True, other.app_id: True}
+
+    assert delivery.update_app(creator_private_key) is not False
+    index.sync()
+
+    assert not verifier.is_verified(delivery.app_id)
+    assert verifier.is_verified(other.app_id)
+    requests = app_info_requests(node)
+    verifier.verify(delivery.app_id)
+    assert app_info_requests(node) == requests + 1
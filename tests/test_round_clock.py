@@ -0,0 +1,60 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.RoundClock import TIMESTAMP_RESOLUTION, RoundClock
+
+
+@pytest.fixture
+def clock(algod_client):
+    """
+    Clock anchored on round 1000 now, with a known block time
+    """
+    round_clock = RoundClock(algod_client, refresh_interval=3600)
+    now = time.time()
+    round_clock.anchor_round, round_clock.anchor_time = 1000, now
+    round_clock.anchored_at = round_clock.calibrated_at = now
+    round_clock.block_time, round_clock.block_time_error, round_clock.residual = 4.0, 0.01, TIMESTAMP_RESOLUTION
+    return round_clock
+
+
+def test_fit_recovers_the_block_time(clock):
+    points = [(round_num, 1000 + 4.5 * round_num) for round_num in range(0, 1000, 200)]
+    block_time, block_time_error, residual = clock._fit(points)
+    assert block_time == pytest.approx(4.5)
+    # exact timestamps still carry the one second resolution
+    assert residual == TIMESTAMP_RESOLUTION
+    sxx = sum((round_num - 400) ** 2 for round_num, _ in points)
+    assert block_time_error == pytest.approx(TIMESTAMP_RESOLUTION / sxx ** 0.5)
+
+
+def test_fit_residual_measures_the_scatter(clock):
+    points = [(0, 0), (100, 410), (200, 790), (300, 1210), (400, 1590)]
+    block_time, _, residual = clock._fit(points)
+    assert block_time == pytest.approx(3.98)
+    # intercept 4: residuals -4, 8, -10, 12, -6 over 5 - 2 degrees of freedom
+    assert residual == pytest.approx((360 / 3) ** 0.5)
+
+
+def test_to_rounds_bounds_widen_with_the_distance(clock):
+    near, far, past = clock.to_rounds([datetime.now() + timedelta(minutes=10), datetime.now() + timedelta(days=1),
+                                       datetime.now() - timedelta(minutes=10)])
+    assert near.value == pytest.approx(1000 + 600 / 4, abs=1)
+    assert far.value == pytest.approx(1000 + 86400 / 4, abs=1)
+    for estimate in (near, far):
+        assert estimate.low < estimate.value < estimate.high
+    assert far.high - far.low > near.high - near.low
+    assert (past.value, past.low, past.high) == (0, 0, 0)
+
+
+def test_to_rounds_accepts_formatted_dates(clock):
+    date = (datetime.now() + timedelta(hours=1)).replace(second=0, microsecond=0)
+    assert clock.to_rounds([date.strftime('%Y-%m-%d %H:%M')])[0].value == clock.to_round(date)
+
+
+def test_calibration_falls_back_without_history(node, algod_client):
+    node.ledger.advance(3)
+    clock = RoundClock(algod_client, default_block_time=4.5)
+    assert clock.calibrate() == 4.5
+    assert clock.anchor_round == node.ledger.last_round
@@ -0,0 +1,115 @@
+import itertools
+import json
+
+import pytest
+from algosdk import account
+from algosdk.error import AlgodHTTPError
+
+from helpers import algo_helper
+from models.TransitionScheduler import Transition, TransitionScheduler
+
+
+def run_rounds(node, scheduler, rounds):
+    for _ in range(rounds):
+        node.ledger.advance(1)
+        scheduler.on_round(node.ledger.last_round)
+
+
+def test_node_errors_do_not_drop_transitions(node, algod_client, create_delivery, advance_to, tmp_path,
+                                             monkeypatch):
+    deliveries = [create_delivery(departure_minutes=3) for _ in range(3)]
+    for delivery, _ in deliveries:
+        delivery.participate(account.generate_account()[0], "user", 2)
+    store_path = str(tmp_path / "transitions.json")
+    scheduler = TransitionScheduler(algod_client, store_path)
+    assert scheduler.schedule([(delivery.app_id, creator) for delivery, creator in deliveries]) == 3
+    pending_transaction_info = scheduler.algod_client.pending_transaction_info
+    calls = itertools.count(1)
+    failures = []
+
+    def flaky(txid, **kwargs):
+        if next(calls) % 2 == 0:
+            failures.append(txid)
+            raise AlgodHTTPError("simulated failure", 500)
+        return pending_transaction_info(txid, **kwargs)
+
+    monkeypatch.setattr(scheduler.algod_client, "pending_transaction_info", flaky)
+
+    app_ids = [delivery.app_id for delivery, _ in deliveries]
+    advance_to(app_ids, "departure_date_round")
+    run_rounds(node, scheduler, 10)
+    assert scheduler.summary()[Transition.START] == {Transition.CONFIRMED: 3}
+    # every finish transition opens finish_margin rounds before its arrival round
+    arrivals = [algo_helper.read_global_state(algod_client, app_id, False, False)[0]["arrival_date_round"]
+                for app_id in app_ids]
+    node.ledger.advance(min(arrivals) - scheduler.finish_margin - node.ledger.last_round)
+    run_rounds(node, scheduler, max(arrivals) - min(arrivals) + 5)
+
+    assert scheduler.summary() == {Transition.START: {Transition.CONFIRMED: 3},
+                                   Transition.FINISH: {Transition.CONFIRMED: 3}}
+    assert len(failures) >= 3
+    for delivery, _ in deliveries:
+        assert algod_client.account_info(delivery.escrow_address)["amount"] == 0
+
+
+def test_failed_round_is_persisted_and_retried(node, algod_client, create_delivery, advance_to, tmp_path,
+                                               monkeypatch):
+    delivery, creator = create_delivery(departure_minutes=3)
+    store_path = str(tmp_path / "transitions.json")
+    scheduler = TransitionScheduler(algod_client, store_path)
+    scheduler.schedule([(delivery.app_id, creator)])
+    advance_to([delivery.app_id], "departure_date_round")
+    run_rounds(node, scheduler, 1)
+
+    def unavailable(txid, **kwargs):
+        raise AlgodHTTPError("node unavailable", 503)
+
+    monkeypatch.setattr(scheduler.algod_client, "pending_transaction_info", unavailable)
+    run_rounds(node, scheduler, 2)
+
+    with open(store_path) as store_file:
+        stored = json.load(store_file)["transitions"]
+    assert [(item["kind"], item["status"], item["error"]) for item in stored] == [
+        (Transition.START, Transition.SUBMITTED, "node unavailable")]
+
+    # a new scheduler resumes from the store once the node answers again
+    monkeypatch.undo()
+    restarted = TransitionScheduler(algod_client, store_path)
+    run_rounds(node, restarted, 1)
+    assert restarted.summary() == {Transition.START: {Transition.CONFIRMED: 1}}
+
+
+def dropped(txid, **kwargs):
+    return {"pool-error": "", "txn": {}}
+
+
+def not_found(txid, **kwargs):
+    raise AlgodHTTPError("txn not found", 404)
+
+
+@pytest.mark.parametrize("pending_transaction_info", [dropped, not_found])
+def test_unconfirmed_submission_expires_after_its_window(node, algod_client, create_delivery, advance_to, tmp_path,
+                                                         monkeypatch, pending_transaction_info):
+    delivery, creator = create_delivery(departure_minutes=3)
+    scheduler = TransitionScheduler(algod_client, str(tmp_path / "transitions.json"))
+    scheduler.schedule([(delivery.app_id, creator)])
+    advance_to([delivery.app_id], "departure_date_round")
+    run_rounds(node, scheduler, 1)
+    start = scheduler.transitions[(delivery.app_id, Transition.START)]
+    assert start.status == Transition.SUBMITTED
+
+    monkeypatch.setattr(scheduler.algod_client, "pending_transaction_info", pending_transaction_info)
+    saves = []
+    save = scheduler.save
+    monkeypatch.setattr(scheduler, "save", lambda: saves.append(save()))
+    run_rounds(node, scheduler, 5)
+    # the same outcome every round: the store is written once
+    assert start.status == Transition.SUBMITTED
+    assert len(saves) <= 1
+
+    node.ledger.advance(start.last_round - node.ledger.last_round - 1)
+    run_rounds(node, scheduler, 1)
+    assert start.status == Transition.EXPIRED
+    assert scheduler._queue == []
+    run_rounds(node, scheduler, 3)
+    assert len(saves) <= 2
@@ -0,0 +1,846 @@
+# local stand-in for the algod and indexer endpoints used by this project
+# applications and LogicSigs are executed with helpers.teal_emulator, so the real contracts run unchanged
+# usage: python -m utilities.local_node --port 4001 --indexer-port 8980 --block-time 0 --latency 0.002
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import msgpack
+from algosdk import constants as algo_constants
+from algosdk import encoding
+
+from helpers import teal_emulator
+
+ON_COMPLETE_NAMES = ["noop", "optin", "closeout", "clear", "update", "delete"]
+ADDRESS_KEYS = {"snd", "rcv", "close", "rekey", "apat"}
+
+
+class LedgerError(Exception):
+    """
+    Raised when a transaction group is rejected by the ledger
+    """
+
+
+class _GroupView:
+    """
+    Copy-on-write view of the ledger used while a transaction group is evaluated
+    """
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.balances = {}
+        self.apps = {}
+        self.globals = {}
+        self.locals = {}
+        self.created_apps = []
+
+    # ---- read/write helpers ----
+    def balance_of(self, address: str):
+        if address not in self.balances:
+            self.balances[address] = self.ledger.balances.get(address, 0)
+        return self.balances[address]
+
+    def add_balance(self, address: str, amount: int):
+        self.balances[address] = self.balance_of(address) + amount
+
+    def app(self, app_id):
+        if app_id in self.apps:
+            return self.apps[app_id]
+        return self.ledger.apps.get(app_id)
+
+    def locals_of(self, address: str, app_id):
+        key = (address, app_id)
+        if key not in self.locals:
+            state = self.ledger.local_states.get(key)
+            self.locals[key] = dict(state) if state is not None else None
+        return self.locals[key]
+
+    # ---- interface used by teal_emulator ----
+    def global_state(self, app_id):
+        if app_id not in self.globals:
+            app = self.app(app_id)
+            if app is None:
+                return None
+            self.globals[app_id] = dict(app["global"])
+        return self.globals[app_id]
+
+    def local_state(self, address: bytes, app_id):
+        return self.locals_of(encoding.encode_address(address), app_id)
+
+    def balance(self, address: bytes):
+        return self.balance_of(encoding.encode_address(address))
+
+    def min_balance(self, address: bytes):
+        owner = encoding.encode_address(address)
+        opted_in = {app_id for account, app_id in self.ledger.local_states if account == owner}
+        for (account, app_id), state in self.locals.items():
+            if account == owner:
+                if state is None:
+                    opted_in.discard(app_id)
+                else:
+                    opted_in.add(app_id)
+        return self.ledger.account_min_balance(owner, opted_in, {**self.ledger.apps, **self.apps})
+
+    def app_creator(self, app_id):
+        return encoding.decode_address(self.app(app_id)["creator"])
+
+    def commit(self):
+        ledger = self.ledger
+        ledger.balances.update(self.balances)
+        for app_id, app in self.apps.items():
+            if app is None:
+                ledger.apps.pop(app_id, None)
+            else:
+                ledger.apps[app_id] = app
+        for app_id, state in self.globals.items():
+            if app_id in ledger.apps:
+                ledger.apps[app_id]["global"] = state
+        for key, state in self.locals.items():
+            if state is None:
+                ledger.local_states.pop(key, None)
+            else:
+                ledger.local_states[key] = state
+
+
+class LocalLedger:
+    """
+    In-memory ledger producing blocks and evaluating transaction groups
+    """
+
+    # minimum balance of an account, raised for every application it opted in to or created, by its schema
+    min_balance = 100000
+    app_min_balance = 100000
+    schema_uint_min_balance = 28500
+    schema_bytes_min_balance = 50000
+
+    def __init__(self,
+                 block_time: float = 0,
+                 initial_balance: int = 10 ** 12,
+                 start_round: int = 1000,
+                 genesis_id: str = "sandnet-v1"):
+        """
+        :param block_time: seconds between blocks, 0 produces a block as soon as a group is submitted
+        :param initial_balance: microAlgos given to an account the first time it signs a transaction
+        :param start_round:
+        :param genesis_id:
+        """
+        self.block_time = block_time
+        self.initial_balance = initial_balance
+        self.genesis_id = genesis_id
+        self.genesis_hash = base64.b64encode(hashlib.sha256(genesis_id.encode()).digest()).decode()
+
+        self.lock = threading.RLock()
+        self.new_block = threading.Condition(self.lock)
+        self.last_round = start_round
+        self.last_round_time = time.time()
+        self.blocks = {start_round: {"rnd": start_round, "ts": int(self.last_round_time), "txns": []}}
+
+        self.balances = {}
+        self.apps = {}
+        self.local_states = {}
+        self.next_app_id = 1
+        self.programs = {}
+        self.pending = {}
+        self.queue = []
+        self.confirmed = []
+
+    # ---- programs ----
+    def compile(self, source: str):
+        """
+        Produce a valid (but not executable on a real node) program for the given TEAL source.
+        The source is kept so the program can be evaluated when used.
+        :param source:
+        :return: program bytes
+        """
+        version = 1
+        match = re.search(r"#pragma version (\d+)", source)
+        if match:
+            version = int(match.group(1))
+        digest = hashlib.sha256(source.encode()).digest()
+        # pushbytes <digest>; pop; pushint 1
+        program = bytes([version]) + b"\x80\x20" + digest + b"\x48\x81\x01"
+        with self.lock:
+            self.programs[program] = source
+        return program
+
+    def account_min_balance(self, address: str, opted_in, apps: dict):
+        """
+        Minimum balance of an account, as computed by algod
+        :param address:
+        :param opted_in: ids of the applications the account opted in to
+        :param apps: app_id -> application (None once deleted)
+        :return:
+        """
+        total = self.min_balance
+        for app_id in opted_in:
+            app = apps.get(app_id)
+            total += self.app_min_balance + (self._schema_min_balance(app["local-schema"]) if app else 0)
+        for app in apps.values():
+            if app is not None and app["creator"] == address:
+                total += self.app_min_balance + self._schema_min_balance(app["global-schema"])
+        return total
+
+    def _schema_min_balance(self, schema):
+        return self.schema_uint_min_balance * schema.get("nui", 0) + \
+            self.schema_bytes_min_balance * schema.get("nbs", 0)
+
+    def source_of(self, program: bytes):
+        source = self.programs.get(program)
+        if source is None:
+            raise LedgerError("program was not compiled by this node")
+        return source
+
+    # ---- accounts ----
+    def fund(self, address: str, amount: int):
+        """
+        Credit an account
+        :param address:
+        :param amount:
+        """
+        with self.lock:
+            self.balances[address] = self.balances.get(address, 0) + amount
+
+    # ---- submission ----
+    def submit(self, raw: bytes):
+        """
+        Decode and submit a group of signed transactions
+        :param raw: concatenated msgpack encoded signed transactions
+        :return: id of the first transaction
+        """
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(raw)
+        group = list(unpacker)
+        if not group:
+            raise LedgerError("empty transaction group")
+        txids = [teal_emulator.txn_id(stxn["txn"]) for stxn in group]
+
+        with self.lock:
+            self._check_group(group, txids)
+            # evaluate against the current state to surface errors at submission like algod does
+            self._evaluate(group, txids, _GroupView(self))
+            for stxn, txid in zip(group, txids):
+                self.pending[txid] = {"txn": stxn, "confirmed-round": 0, "pool-error": ""}
+            self.queue.append((group, txids))
+            if not self.block_time:
+                self.produce_block()
+        return txids[0]
+
+    def _check_group(self, group, txids):
+        if len(group) > algo_constants.tx_group_limit:
+            raise LedgerError("group size exceeds {}".format(algo_constants.tx_group_limit))
+        if len(group) > 1:
+            # the group id covers the transactions as they were before "grp" was assigned
+            ungrouped = [{k: v for k, v in stxn["txn"].items() if k != "grp"} for stxn in group]
+            txlist = [encoding.checksum(algo_constants.txid_prefix + msgpack.packb(txn, use_bin_type=True))
+                      for txn in ungrouped]
+            group_id = encoding.checksum(algo_constants.tgid_prefix +
+                                         msgpack.packb({"txlist": txlist}, use_bin_type=True))
+            for stxn in group:
+                if stxn["txn"].get("grp") != group_id:
+                    raise LedgerError("incomplete group: transaction group id mismatch")
+        next_round = self.last_round + 1
+        for stxn, txid in zip(group, txids):
+            txn = stxn["txn"]
+            if txid in self.pending:
+                raise LedgerError("transaction already in ledger: {}".format(txid))
+            if not txn.get("fv", 0) <= next_round <= txn.get("lv", 0):
+                raise LedgerError("txn dead: round {} outside of {}--{}".format(
+                    next_round, txn.get("fv", 0), txn.get("lv", 0)))
+            if txn.get("fee", 0) < 1000:
+                raise LedgerError("transaction {} fee {} below minimum 1000".format(txid, txn.get("fee", 0)))
+
+    def _evaluate(self, group, txids, view: _GroupView):
+        txns = [stxn["txn"] for stxn in group]
+        results = []
+        for index, (stxn, txid) in enumerate(zip(group, txids)):
+            txn = txns[index]
+            sender = encoding.encode_address(txn["snd"])
+            if "lsig" in stxn:
+                program = stxn["lsig"]["l"]
+                if teal_emulator.program_address(program) != sender:
+                    raise LedgerError("transaction {}: LogicSig does not match the sender".format(txid))
+                context = teal_emulator.EvalContext(txns, index, view, self.last_round + 1,
+                                                    self.blocks[self.last_round]["ts"],
+                                                    args=stxn["lsig"].get("arg", []))
+                result = teal_emulator.evaluate(self.source_of(program), context, max_cost=20000)
+                if not result.passed:
+                    raise LedgerError("transaction {}: rejected by logic: {}".format(txid, result.error))
+            elif sender not in self.balances and sender not in view.balances:
+                # accounts signing for the first time are funded, like a dispenser would do
+                view.balances[sender] = self.initial_balance
+
+            view.add_balance(sender, -txn.get("fee", 0))
+            result = {}
+            if txn.get("type") == "pay":
+                self._apply_payment(txn, view)
+            elif txn.get("type") == "appl":
+                result = self._apply_app_call(txns, index, view)
+            else:
+                raise LedgerError("transaction type {} not supported".format(txn.get("type")))
+
+            if view.balance_of(sender) < 0 or (0 < view.balance_of(sender) < self.min_balance):
+                raise LedgerError("transaction {}: overspend (account {}, balance {})".format(
+                    txid, sender, view.balance_of(sender)))
+            results.append(result)
+        return results
+
+    def _apply_payment(self, txn, view):
+        sender = encoding.encode_address(txn["snd"])
+        amount = txn.get("amt", 0)
+        # the fee is already deducted: an underfunded sender must not close out a negative remainder
+        if view.balance_of(sender) - amount < 0:
+            raise LedgerError("overspend (account {}, balance {}, amount {})".format(
+                sender, view.balance_of(sender), amount))
+        view.add_balance(sender, -amount)
+        view.add_balance(encoding.encode_address(txn.get("rcv", teal_emulator.ZERO_ADDRESS)), amount)
+        if txn.get("close"):
+            remainder = view.balance_of(sender)
+            view.add_balance(sender, -remainder)
+            view.add_balance(encoding.encode_address(txn["close"]), remainder)
+
+    def _apply_app_call(self, txns, index, view):
+        txn = txns[index]
+        sender = encoding.encode_address(txn["snd"])
+        app_id = txn.get("apid", 0)
+        on_complete = txn.get("apan", 0)
+        result = {}
+
+        if app_id == 0:
+            app_id = self.next_app_id + len(view.created_apps)
+            view.created_apps.append(app_id)
+            view.apps[app_id] = {
+                "creator": sender,
+                "approval": txn.get("apap", b""),
+                "clear": txn.get("apsu", b""),
+                "global": {},
+                "global-schema": txn.get("apgs", {}),
+                "local-schema": txn.get("apls", {}),
+            }
+            result["application-index"] = app_id
+
+        app = view.app(app_id)
+        if app is None:
+            raise LedgerError("application {} does not exist".format(app_id))
+
+        local = view.locals_of(sender, app_id)
+        if on_complete == 1:
+            if local is not None:
+                raise LedgerError("account {} has already opted in to app {}".format(sender, app_id))
+            view.locals[(sender, app_id)] = {}
+        elif on_complete in (2, 3) and local is None:
+            raise LedgerError("account {} is not opted in to app {}".format(sender, app_id))
+
+        context = teal_emulator.EvalContext(txns, index, view, self.last_round + 1,
+                                            self.blocks[self.last_round]["ts"], app_id=app_id)
+        if on_complete == 3:
+            # the clear state program can't prevent the account from leaving the app
+            teal_emulator.evaluate(self.source_of(app["clear"]), context)
+            view.locals[(sender, app_id)] = None
+            return result
+
+        outcome = teal_emulator.evaluate(self.source_of(app["approval"]), context)
+        if not outcome.passed:
+            raise LedgerError("logic eval error: {}. Details: app={}".format(outcome.error, app_id))
+        if outcome.logs:
+            result["logs"] = [base64.b64encode(entry).decode() for entry in outcome.logs]
+        self._check_schema(view.global_state(app_id), app["global-schema"], "global")
+        if view.locals_of(sender, app_id):
+            self._check_schema(view.locals_of(sender, app_id), app["local-schema"], "local")
+
+        if on_complete == 2:
+            view.locals[(sender, app_id)] = None
+        elif on_complete == 4:
+            app = dict(app, approval=txn.get("apap", b""), clear=txn.get("apsu", b""))
+            view.apps[app_id] = app
+        elif on_complete == 5:
+            view.apps[app_id] = None
+        return result
+
+    @staticmethod
+    def _check_schema(state, schema, name):
+        num_uints = sum(1 for value in state.values() if isinstance(value, int))
+        num_bytes = len(state) - num_uints
+        if num_uints > schema.get("nui", 0) or num_bytes > schema.get("nbs", 0):
+            raise LedgerError("store {} count exceeds schema ({} uints, {} byte slices)".format(
+                name, num_uints, num_bytes))
+
+    # ---- blocks ----
+    def produce_block(self):
+        """
+        Commit the queued groups into a new block
+        """
+        with self.lock:
+            new_round = self.last_round + 1
+            block_txns = []
+            for group, txids in self.queue:
+                view = _GroupView(self)
+                try:
+                    results = self._evaluate(group, txids, view)
+                except (LedgerError, teal_emulator.TealError) as e:
+                    for txid in txids:
+                        self.pending[txid]["pool-error"] = str(e)
+                    continue
+                view.commit()
+                self.next_app_id += len(view.created_apps)
+                for stxn, txid, result in zip(group, txids, results):
+                    info = self.pending[txid]
+                    info["confirmed-round"] = new_round
+                    info.update(result)
+                    block_txn = dict(stxn)
+                    if "application-index" in result:
+                        block_txn["apid"] = result["application-index"]
+                    if "logs" in result:
+                        # apply data of the block, like algod
+                        block_txn["dt"] = {"lg": [base64.b64decode(entry) for entry in result["logs"]]}
+                    block_txns.append(block_txn)
+                    self.confirmed.append((new_round, txid, stxn, result))
+            self.queue = []
+            self.last_round = new_round
+            self.last_round_time = time.time()
+            self.blocks[new_round] = {"rnd": new_round, "ts": int(self.last_round_time), "txns": block_txns}
+            self.new_block.notify_all()
+
+    def advance(self, rounds: int = 1):
+        """
+        Produce empty blocks (or blocks with the queued groups)
+        :param rounds:
+        """
+        for _ in range(rounds):
+            self.produce_block()
+
+    def wait_for_block_after(self, round_num: int, timeout: float = 60):
+        """
+        Block until a round greater than round_num exists.
+        Without a block time a single block is produced immediately, even for a round further ahead (the caller
+        reads the status again, as after an algod timeout).
+        :param round_num:
+        :param timeout:
+        """
+        with self.lock:
+            if not self.block_time:
+                if self.last_round <= round_num:
+                    self.produce_block()
+                return
+            self.new_block.wait_for(lambda: self.last_round > round_num, timeout)
+
+    def run_block_producer(self, stop_event: threading.Event):
+        """
+        Produce a block every block_time seconds until stop_event is set
+        :param stop_event:
+        """
+        while not stop_event.wait(self.block_time):
+            self.produce_block()
+
+    # ---- json views ----
+    def status(self):
+        return {
+            "last-round": self.last_round,
+            "last-version": "future",
+            "next-version": "future",
+            "next-version-round": self.last_round + 1,
+            "next-version-supported": True,
+            "time-since-last-round": int((time.time() - self.last_round_time) * 1e9),
+            "catchup-time": 0,
+            "stopped-at-unsupported-round": False,
+        }
+
+    def suggested_params(self):
+        return {
+            "consensus-version": "future",
+            "fee": 0,
+            "genesis-hash": self.genesis_hash,
+            "genesis-id": self.genesis_id,
+            "last-round": self.last_round,
+            "min-fee": 1000,
+        }
+
+    def block(self, round_num, msgpack_format: bool = False):
+        block = self.blocks.get(round_num)
+        if block is None:
+            return None
+        if msgpack_format:
+            return msgpack.packb({"block": {"rnd": block["rnd"], "ts": block["ts"], "gen": self.genesis_id,
+                                            "gh": base64.b64decode(self.genesis_hash), "txns": block["txns"]}},
+                                 use_bin_type=True)
+        return {"block": {"rnd": block["rnd"], "ts": block["ts"], "gen": self.genesis_id, "gh": self.genesis_hash,
+                          "txns": _to_json(block["txns"])}}
+
+    def application_info(self, app_id):
+        app = self.apps.get(app_id)
+        if app is None:
+            return None
+        return {"id": app_id, "params": self._app_params(app)}
+
+    def _app_params(self, app):
+        return {
+            "creator": app["creator"],
+            "approval-program": base64.b64encode(app["approval"]).decode(),
+            "clear-state-program": base64.b64encode(app["clear"]).decode(),
+            "global-state": _state_to_json(app["global"]),
+            "global-state-schema": {"num-uint": app["global-schema"].get("nui", 0),
+                                    "num-byte-slice": app["global-schema"].get("nbs", 0)},
+            "local-state-schema": {"num-uint": app["local-schema"].get("nui", 0),
+                                   "num-byte-slice": app["local-schema"].get("nbs", 0)},
+        }
+
+    def account_info(self, address: str):
+        local_states = []
+        for (owner, app_id), state in self.local_states.items():
+            if owner == address:
+                entry = {"id": app_id, "schema": {}}
+                if state:
+                    entry["key-value"] = _state_to_json(state)
+                local_states.append(entry)
+        amount = self.balances.get(address, 0)
+        return {
+            "address": address,
+            "amount": amount,
+            "amount-without-pending-rewards": amount,
+            "min-balance": self.account_min_balance(address, [entry["id"] for entry in local_states], self.apps),
+            "pending-rewards": 0,
+            "rewards": 0,
+            "round": self.last_round,
+            "status": "Offline",
+            "apps-local-state": local_states,
+            "created-apps": [{"id": app_id, "params": self._app_params(app)}
+                             for app_id, app in self.apps.items() if app["creator"] == address],
+        }
+
+    def pending_info(self, txid):
+        info = self.pending.get(txid)
+        if info is None:
+            return None
+        output = {k: v for k, v in info.items() if k != "txn"}
+        output["txn"] = _to_json(info["txn"])
+        return output
+
+    def search_transactions(self, note_prefix: bytes = None, txn_type: str = None, application_id: int = None,
+                            min_round: int = None, max_round: int = None):
+        transactions = []
+        for round_num, txid, stxn, result in self.confirmed:
+            txn = stxn["txn"]
+            if note_prefix is not None and not txn.get("note", b"").startswith(note_prefix):
+                continue
+            if txn_type is not None and txn.get("type") != txn_type:
+                continue
+            app_id = result.get("application-index", txn.get("apid"))
+            if application_id is not None and app_id != application_id:
+                continue
+            if (min_round is not None and round_num < min_round) or (max_round is not None and round_num > max_round):
+                continue
+            transactions.append(_indexer_transaction(round_num, txid, txn, result, self.blocks[round_num]["ts"]))
+        return {"current-round": self.last_round, "transactions": transactions}
+
+    def search_applications(self, application_id: int = None):
+        apps = [{"id": app_id, "params": self._app_params(app)} for app_id, app in self.apps.items()
+                if application_id is None or app_id == application_id]
+        return {"current-round": self.last_round, "applications": apps}
+
+
+def _state_to_json(state: dict):
+    output = []
+    for key, value in state.items():
+        entry = {"key": base64.b64encode(key).decode()}
+        if isinstance(value, int):
+            entry["value"] = {"type": 2, "bytes": "", "uint": value}
+        else:
+            entry["value"] = {"type": 1, "bytes": base64.b64encode(value).decode(), "uint": 0}
+        output.append(entry)
+    return output
+
+
+def _to_json(value, key=None):
+    if isinstance(value, dict):
+        return {k: _to_json(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_json(v, key) for v in value]
+    if isinstance(value, bytes):
+        if key in ADDRESS_KEYS:
+            return encoding.encode_address(value)
+        return base64.b64encode(value).decode()
+    return value
+
+
+def _indexer_transaction(round_num, txid, txn, result, round_time):
+    output = {
+        "id": txid,
+        "confirmed-round": round_num,
+        "round-time": round_time,
+        "sender": encoding.encode_address(txn["snd"]),
+        "tx-type": txn.get("type"),
+        "fee": txn.get("fee", 0),
+        "first-valid": txn.get("fv", 0),
+        "last-valid": txn.get("lv", 0),
+        "note": base64.b64encode(txn.get("note", b"")).decode(),
+    }
+    if txn.get("grp"):
+        output["group"] = base64.b64encode(txn["grp"]).decode()
+    if txn.get("type") == "pay":
+        output["payment-transaction"] = {
+            "receiver": encoding.encode_address(txn.get("rcv", teal_emulator.ZERO_ADDRESS)),
+            "amount": txn.get("amt", 0),
+        }
+        if txn.get("close"):
+            output["payment-transaction"]["close-remainder-to"] = encoding.encode_address(txn["close"])
+    elif txn.get("type") == "appl":
+        output["application-transaction"] = {
+            "application-id": txn.get("apid", 0),
+            "on-completion": ON_COMPLETE_NAMES[txn.get("apan", 0)],
+            "application-args": [base64.b64encode(arg).decode() for arg in txn.get("apaa", [])],
+            "accounts": [encoding.encode_address(a) for a in txn.get("apat", [])],
+        }
+        if "application-index" in result:
+            output["created-application-index"] = result["application-index"]
+        if "logs" in result:
+            output["logs"] = result["logs"]
+    return output
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    routes = [
+        ("GET", re.compile(r"^/v2/transactions/params$"), "suggested_params"),
+        ("POST", re.compile(r"^/v2/teal/compile$"), "compile"),
+        ("POST", re.compile(r"^/v2/transactions$"), "send_transactions"),
+        ("GET", re.compile(r"^/v2/transactions/pending/(?P<txid>[A-Z2-7]+)$"), "pending_transaction_info"),
+        ("GET", re.compile(r"^/v2/status$"), "status"),
+        ("GET", re.compile(r"^/v2/status/wait-for-block-after/(?P<round>\d+)$"), "status_after_block"),
+        ("GET", re.compile(r"^/v2/blocks/(?P<round>\d+)$"), "block_info"),
+        ("GET", re.compile(r"^/v2/applications/(?P<app_id>\d+)$"), "application_info"),
+        ("GET", re.compile(r"^/v2/accounts/(?P<address>[A-Z2-7]+)$"), "account_info"),
+        ("GET", re.compile(r"^/v2/transactions$"), "search_transactions"),
+        ("GET", re.compile(r"^/v2/applications$"), "search_applications"),
+        ("GET", re.compile(r"^/health$"), "health"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        node = self.server.node
+        url = urlparse(self.path)
+        for route_method, pattern, endpoint in self.routes:
+            match = pattern.match(url.path)
+            if route_method == method and match:
+                break
+        else:
+            return self._reply(404, {"message": "unknown endpoint {} {}".format(method, url.path)})
+
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)) if method == "POST" else b""
+        node.request_counts[endpoint] += 1
+        node.inject_latency(endpoint)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            status, payload = getattr(self, "_" + endpoint)(node, match.groupdict(), query, body)
+        except (LedgerError, teal_emulator.TealError) as e:
+            status, payload = 400, {"message": "TransactionPool.Remember: {}".format(e)}
+        self._reply(status, payload)
+
+    def _reply(self, status, payload):
+        content_type = "application/msgpack" if isinstance(payload, bytes) else "application/json"
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # ---- algod ----
+    def _suggested_params(self, node, args, query, body):
+        with node.ledger.lock:
+            return 200, node.ledger.suggested_params()
+
+    def _compile(self, node, args, query, body):
+        program = node.ledger.compile(body.decode())
+        return 200, {"hash": teal_emulator.program_address(program), "result": base64.b64encode(program).decode()}
+
+    def _send_transactions(self, node, args, query, body):
+        return 200, {"txId": node.ledger.submit(body)}
+
+    def _pending_transaction_info(self, node, args, query, body):
+        with node.ledger.lock:
+            info = node.ledger.pending_info(args["txid"])
+        if info is None:
+            return 404, {"message": "txn does not exist"}
+        return 200, info
+
+    def _status(self, node, args, query, body):
+        with node.ledger.lock:
+            return 200, node.ledger.status()
+
+    def _status_after_block(self, node, args, query, body):
+        node.ledger.wait_for_block_after(int(args["round"]))
+        with node.ledger.lock:
+            return 200, node.ledger.status()
+
+    def _block_info(self, node, args, query, body):
+        with node.ledger.lock:
+            block = node.ledger.block(int(args["round"]), query.get("format") == "msgpack")
+        if block is None:
+            return 404, {"message": "ledger does not have entry {}".format(args["round"])}
+        return 200, block
+
+    def _application_info(self, node, args, query, body):
+        with node.ledger.lock:
+            info = node.ledger.application_info(int(args["app_id"]))
+        if info is None:
+            return 404, {"message": "application does not exist"}
+        return 200, info
+
+    def _account_info(self, node, args, query, body):
+        with node.ledger.lock:
+            return 200, node.ledger.account_info(args["address"])
+
+    def _health(self, node, args, query, body):
+        return 200, {}
+
+    # ---- indexer ----
+    def _search_transactions(self, node, args, query, body):
+        note_prefix = base64.b64decode(query["note-prefix"]) if "note-prefix" in query else None
+        with node.ledger.lock:
+            return 200, node.ledger.search_transactions(
+                note_prefix=note_prefix,
+                txn_type=query.get("tx-type"),
+                application_id=int(query["application-id"]) if "application-id" in query else None,
+                min_round=int(query["min-round"]) if "min-round" in query else None,
+                max_round=int(query["max-round"]) if "max-round" in query else None)
+
+    def _search_applications(self, node, args, query, body):
+        with node.ledger.lock:
+            return 200, node.ledger.search_applications(
+                int(query["application-id"]) if "application-id" in query else None)
+
+
+class LocalNode:
+    """
+    HTTP server exposing a LocalLedger through the algod (and optionally a separate indexer) API.
+    When no indexer port is given, the indexer endpoints are served on the algod port.
+    """
+
+    def __init__(self,
+                 host: str = "localhost",
+                 port: int = 0,
+                 indexer_port: int = None,
+                 block_time: float = 0,
+                 latency: float = 0,
+                 latency_jitter: float = 0,
+                 endpoint_latency: dict = None,
+                 ledger: LocalLedger = None):
+        """
+        :param host:
+        :param port: algod port, 0 picks a free port
+        :param indexer_port: optional dedicated indexer port
+        :param block_time: seconds between blocks, 0 confirms each group immediately
+        :param latency: seconds added to every request
+        :param latency_jitter: random extra seconds (uniform in [0, jitter]) added to every request
+        :param endpoint_latency: per endpoint latency overrides, e.g. {"account_info": 0.05}
+        :param ledger:
+        """
+        self.ledger = ledger or LocalLedger(block_time=block_time)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.endpoint_latency = endpoint_latency or {}
+        self.request_counts = Counter()
+
+        self._servers = [ThreadingHTTPServer((host, port), _Handler)]
+        if indexer_port is not None:
+            self._servers.append(ThreadingHTTPServer((host, indexer_port), _Handler))
+        for server in self._servers:
+            server.daemon_threads = True
+            server.node = self
+        self._threads = []
+        self._stop = threading.Event()
+
+    @property
+    def algod_address(self):
+        host, port = self._servers[0].server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    @property
+    def indexer_address(self):
+        host, port = self._servers[-1].server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def algod_client(self):
+        from algosdk.v2client import algod
+        return algod.AlgodClient("a" * 64, self.algod_address)
+
+    def indexer_client(self):
+        from algosdk.v2client import indexer
+        return indexer.IndexerClient("", self.indexer_address)
+
+    def inject_latency(self, endpoint):
+        delay = self.endpoint_latency.get(endpoint, self.latency)
+        if self.latency_jitter:
+            delay += random.uniform(0, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def reset_counts(self):
+        self.request_counts.clear()
+
+    def start(self):
+        """
+        Serve in background threads
+        :return:
+        """
+        for server in self._servers:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.ledger.block_time:
+            thread = threading.Thread(target=self.ledger.run_block_producer, args=(self._stop,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local algod/indexer stand-in")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=4001)
+    parser.add_argument("--indexer-port", type=int, default=None)
+    parser.add_argument("--block-time", type=float, default=0, help="seconds between blocks (0 = instant)")
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to every request")
+    parser.add_argument("--latency-jitter", type=float, default=0)
+    args = parser.parse_args()
+
+    node = LocalNode(host=args.host, port=args.port, indexer_port=args.indexer_port, block_time=args.block_time,
+                     latency=args.latency, latency_jitter=args.latency_jitter).start()
+    print("algod listening on {} / indexer on {}".format(node.algod_address, node.indexer_address))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        node.stop()
+
+
+if __name__ == "__main__":
+    main()
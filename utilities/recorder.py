@@ -0,0 +1,232 @@
+# record and replay of the algod/indexer HTTP traffic: a Recorder captures every request and response of the process
+# to a compact file (gzip of msgpack entries), a Replayer serves them back without any node, with the original or a
+# scaled (zero) latency, so the client-side CPU and allocations of a session can be compared between versions
+# usage:
+#     with Recorder("session.rec"):
+#         ... Delivery / IndexerHelper calls against a node ...
+#     with Replayer("session.rec", latency_scale=0) as replayer:
+#         ... the same calls, served from the file ...
+import functools
+import gzip
+import io
+import threading
+import time
+import urllib.error
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import msgpack
+from algosdk.v2client import algod, indexer
+
+from utilities import utils
+from utilities.rpc_metrics import ALGOD_ENDPOINTS, INDEXER_ENDPOINTS, endpoint_name
+
+log = utils.get_logger(__name__)
+
+FORMAT_VERSION = 1
+
+SERVICES = {"algod": ALGOD_ENDPOINTS, "indexer": INDEXER_ENDPOINTS}
+
+# Recorder or Replayer handling the requests of the process, None lets them through
+_session = None
+_session_lock = threading.Lock()
+_hooks_installed = False
+
+
+class ReplayError(Exception):
+    """
+    A request has no recorded response left
+    """
+    pass
+
+
+class _Response:
+    """
+    Response body read from the node or from a recording
+    """
+
+    def __init__(self, status, body):
+        self.status = status
+        self._body = io.BytesIO(body)
+
+    def read(self, *args):
+        return self._body.read(*args)
+
+    def getcode(self):
+        return self.status
+
+    def close(self):
+        pass
+
+
+def _request_parts(request):
+    url = urlsplit(request.full_url)
+    path = url.path[3:] if url.path.startswith("/v2/") else url.path
+    return request.get_method(), path, url.query, request.data or b""
+
+
+def _hooked_urlopen(service, urlopen):
+    @functools.wraps(urlopen)
+    def wrapper(request, *args, **kwargs):
+        session = _session
+        if session is None:
+            return urlopen(request, *args, **kwargs)
+        return session.handle(service, urlopen, request, *args, **kwargs)
+    return wrapper
+
+
+def _install_hooks():
+    global _hooks_installed
+    if not _hooks_installed:
+        algod.urlopen = _hooked_urlopen("algod", algod.urlopen)
+        indexer.urlopen = _hooked_urlopen("indexer", indexer.urlopen)
+        _hooks_installed = True
+
+
+class _Session:
+    def start(self):
+        global _session
+        _install_hooks()
+        with _session_lock:
+            if _session is not None:
+                raise RuntimeError("A recording or replay session is already active")
+            _session = self
+        return self
+
+    def stop(self):
+        global _session
+        with _session_lock:
+            if _session is self:
+                _session = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, service, urlopen, request, *args, **kwargs):
+        raise NotImplementedError
+
+
+# class to write every algod/indexer exchange of the process to a recording file
+class Recorder(_Session):
+    def __init__(self, path: str, metadata: dict = None, compress_level: int = 6):
+        """
+        :param path: recording file
+        :param metadata: JSON-like values saved in the header, e.g. the workload parameters
+        :param compress_level: gzip level
+        """
+        self.path = path
+        self.metadata = metadata or {}
+        self.compress_level = compress_level
+        self.entries = 0
+        self._file = None
+        self._started = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._file = gzip.open(self.path, "wb", compresslevel=self.compress_level)
+        self._started = time.perf_counter()
+        self._file.write(msgpack.packb({"version": FORMAT_VERSION, "recorded": time.time(),
+                                        "metadata": self.metadata}))
+        return super().start()
+
+    def stop(self):
+        super().stop()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        log.info("Recorded %s requests to %s", self.entries, self.path)
+
+    def handle(self, service, urlopen, request, *args, **kwargs):
+        method, path, query, data = _request_parts(request)
+        start = time.perf_counter()
+        try:
+            response = urlopen(request, *args, **kwargs)
+            status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            self._write(service, method, path, query, data, start, e.code, body)
+            raise urllib.error.HTTPError(e.url, e.code, e.msg, e.hdrs, io.BytesIO(body)) from None
+        self._write(service, method, path, query, data, start, status, body)
+        return _Response(status, body)
+
+    def _write(self, service, method, path, query, data, start, status, body):
+        elapsed = time.perf_counter() - start
+        entry = msgpack.packb((service, method, path, query, data, round(start - self._started, 6),
+                               round(elapsed, 6), status, body))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(entry)
+                self.entries += 1
+
+
+def read_recording(path: str):
+    """
+    :param path: recording file
+    :return: header, list of (service, method, path, query, data, offset, elapsed, status, body)
+    """
+    with gzip.open(path, "rb") as recording:
+        unpacker = msgpack.Unpacker(recording, raw=False)
+        header = next(unpacker)
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError("Unsupported recording version: {}".format(header.get("version")))
+        return header, [tuple(entry) for entry in unpacker]
+
+
+# class to serve the algod/indexer requests of the process from a recording: a request gets the next unused response
+# recorded for the same request, else for the same endpoint (ids, dates and signatures may differ from the recording)
+class Replayer(_Session):
+    def __init__(self, path: str, latency_scale: float = 0.0):
+        """
+        :param path: recording file
+        :param latency_scale: 1 waits the recorded latency of every response, 0 serves them immediately
+        """
+        self.latency_scale = latency_scale
+        self.header, self.entries = read_recording(path)
+        self.metadata = self.header.get("metadata", {})
+        self.served = 0
+        self.endpoint_matches = 0
+        self._used = [False] * len(self.entries)
+        self._exact = defaultdict(deque)
+        self._by_endpoint = defaultdict(deque)
+        self._lock = threading.Lock()
+        for position, (service, method, path, query, data, *_) in enumerate(self.entries):
+            self._exact[(service, method, path, query, data)].append(position)
+            self._by_endpoint[(service, endpoint_name(method, path, SERVICES[service]))].append(position)
+
+    @property
+    def remaining(self):
+        return len(self.entries) - self.served
+
+    def _take(self, queue):
+        while queue and self._used[queue[0]]:
+            queue.popleft()
+        if not queue:
+            return None
+        position = queue.popleft()
+        self._used[position] = True
+        return position
+
+    def handle(self, service, urlopen, request, *args, **kwargs):
+        method, path, query, data = _request_parts(request)
+        with self._lock:
+            position = self._take(self._exact[(service, method, path, query, data)])
+            if position is None:
+                position = self._take(self._by_endpoint[(service, endpoint_name(method, path, SERVICES[service]))])
+                if position is None:
+                    raise ReplayError("No recorded response left for {} {} {}".format(service, method, path))
+                self.endpoint_matches += 1
+            self.served += 1
+        *_, elapsed, status, body = self.entries[position]
+        if self.latency_scale:
+            time.sleep(elapsed * self.latency_scale)
+        if status >= 400:
+            raise urllib.error.HTTPError(request.full_url, status, "Recorded error", {}, io.BytesIO(body))
+        return _Response(status, body)
+
+    def stats(self):
+        return {"recorded": len(self.entries), "served": self.served, "endpoint_matches": self.endpoint_matches,
+                "remaining": self.remaining}
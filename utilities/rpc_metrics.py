@@ -0,0 +1,407 @@
+# instrumentation of algod/indexer traffic: call counts, latency histograms, payload sizes and errors,
+# per endpoint and per Delivery operation
+import functools
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+
+from algosdk.v2client import algod, indexer
+
+# histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+ALGOD_ENDPOINTS = [
+    ("GET", re.compile(r"^/transactions/params$"), "suggested_params"),
+    ("POST", re.compile(r"^/teal/compile$"), "compile"),
+    ("POST", re.compile(r"^/teal/dryrun$"), "dryrun"),
+    ("POST", re.compile(r"^/transactions$"), "send_transactions"),
+    ("GET", re.compile(r"^/transactions/pending/[^/]+$"), "pending_transaction_info"),
+    ("GET", re.compile(r"^/status$"), "status"),
+    ("GET", re.compile(r"^/status/wait-for-block-after/\d+$"), "status_after_block"),
+    ("GET", re.compile(r"^/applications/\d+$"), "application_info"),
+    ("GET", re.compile(r"^/accounts/[^/]+$"), "account_info"),
+    ("GET", re.compile(r"^/blocks/\d+$"), "block_info"),
+]
+
+INDEXER_ENDPOINTS = [
+    ("GET", re.compile(r"^/transactions$"), "search_transactions"),
+    ("GET", re.compile(r"^/applications$"), "search_applications"),
+    ("GET", re.compile(r"^/applications/\d+$"), "application_info"),
+    ("GET", re.compile(r"^/accounts$"), "accounts"),
+    ("GET", re.compile(r"^/accounts/[^/]+$"), "account_info"),
+    ("GET", re.compile(r"^/blocks/\d+$"), "block_info"),
+]
+
+_local = threading.local()
+
+
+def endpoint_name(method: str, path: str, endpoints) -> str:
+    """
+    Name of the SDK call behind a request path
+    :param method:
+    :param path:
+    :param endpoints:
+    :return:
+    """
+    for route_method, pattern, name in endpoints:
+        if route_method == method and pattern.match(path):
+            return name
+    return "{} {}".format(method, re.sub(r"/\d+", "/{id}", path))
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile
+        :param q:
+        :return:
+        """
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, hits in zip(LATENCY_BUCKETS, self.buckets):
+            seen += hits
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "mean": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50": round(self.quantile(0.5) * 1000, 3),
+            "p99": round(self.quantile(0.99) * 1000, 3),
+            "max": round(self.max * 1000, 3),
+        }
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = _Histogram()
+
+
+class _OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.latency = _Histogram()
+        self.rpc = defaultdict(int)
+
+
+class RpcMetrics:
+    """
+    Registry of algod/indexer call metrics
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.endpoints = defaultdict(_EndpointStats)
+        self.operations = defaultdict(_OperationStats)
+
+    def record_call(self, endpoint, latency, sent, received, failed):
+        operation = getattr(_local, "operation", None)
+        with self.lock:
+            stats = self.endpoints[endpoint]
+            stats.calls += 1
+            stats.errors += int(failed)
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+            stats.latency.observe(latency)
+            if operation is not None:
+                self.operations[operation].rpc[endpoint] += 1
+
+    def record_operation(self, operation, latency, failed):
+        with self.lock:
+            stats = self.operations[operation]
+            stats.calls += 1
+            stats.failures += int(failed)
+            stats.latency.observe(latency)
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.endpoints.clear()
+            self.operations.clear()
+
+    def export_state(self):
+        """
+        Raw counters and histograms, to be merged into another registry (e.g. from a worker process)
+        :return:
+        """
+        with self.lock:
+            return {
+                "endpoints": {name: (stats.calls, stats.errors, stats.bytes_sent, stats.bytes_received,
+                                     _histogram_state(stats.latency))
+                              for name, stats in self.endpoints.items()},
+                "operations": {name: (stats.calls, stats.failures, _histogram_state(stats.latency), dict(stats.rpc))
+                               for name, stats in self.operations.items()},
+            }
+
+    def merge_state(self, state):
+        """
+        Add the counters exported by another registry
+        :param state: result of export_state()
+        """
+        with self.lock:
+            for name, (calls, errors, sent, received, histogram) in state["endpoints"].items():
+                stats = self.endpoints[name]
+                stats.calls += calls
+                stats.errors += errors
+                stats.bytes_sent += sent
+                stats.bytes_received += received
+                _merge_histogram(stats.latency, histogram)
+            for name, (calls, failures, histogram, rpc) in state["operations"].items():
+                stats = self.operations[name]
+                stats.calls += calls
+                stats.failures += failures
+                _merge_histogram(stats.latency, histogram)
+                for endpoint, count in rpc.items():
+                    stats.rpc[endpoint] += count
+
+    def snapshot(self):
+        """
+        JSON serializable view of the collected metrics, latencies in milliseconds
+        :return:
+        """
+        with self.lock:
+            endpoints = {
+                name: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "bytes_sent": stats.bytes_sent,
+                    "bytes_received": stats.bytes_received,
+                    "latency_ms": stats.latency.summary(),
+                    "histogram": {_bucket_label(bound): hits
+                                  for bound, hits in zip(LATENCY_BUCKETS, stats.latency.buckets)},
+                }
+                for name, stats in self.endpoints.items()
+            }
+            operations = {
+                name: {
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                    "latency_ms": stats.latency.summary(),
+                    "rpc": dict(stats.rpc),
+                    "rpc_per_call": round(sum(stats.rpc.values()) / stats.calls, 2) if stats.calls else 0.0,
+                }
+                for name, stats in self.operations.items()
+            }
+            return {"uptime_s": round(time.time() - self.started, 3), "endpoints": endpoints,
+                    "operations": operations}
+
+    def prometheus(self):
+        """
+        Metrics in the Prometheus text exposition format
+        :return:
+        """
+        lines = []
+        with self.lock:
+            for name, stats in sorted(self.endpoints.items()):
+                labels = 'endpoint="{}"'.format(name)
+                lines.append("rpc_requests_total{{{}}} {}".format(labels, stats.calls))
+                lines.append("rpc_errors_total{{{}}} {}".format(labels, stats.errors))
+                lines.append("rpc_bytes_sent_total{{{}}} {}".format(labels, stats.bytes_sent))
+                lines.append("rpc_bytes_received_total{{{}}} {}".format(labels, stats.bytes_received))
+                cumulative = 0
+                for bound, hits in zip(LATENCY_BUCKETS, stats.latency.buckets):
+                    cumulative += hits
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append('rpc_latency_seconds_bucket{{{},le="{}"}} {}'.format(labels, le, cumulative))
+                lines.append("rpc_latency_seconds_sum{{{}}} {}".format(labels, stats.latency.total))
+                lines.append("rpc_latency_seconds_count{{{}}} {}".format(labels, stats.latency.count))
+            for name, stats in sorted(self.operations.items()):
+                lines.append('delivery_operations_total{{operation="{}"}} {}'.format(name, stats.calls))
+                lines.append('delivery_operation_failures_total{{operation="{}"}} {}'.format(name, stats.failures))
+                for endpoint, count in sorted(stats.rpc.items()):
+                    lines.append('delivery_operation_rpc_total{{operation="{}",endpoint="{}"}} {}'.format(
+                        name, endpoint, count))
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_state(histogram):
+    return histogram.buckets[:], histogram.count, histogram.total, histogram.max
+
+
+def _merge_histogram(histogram, state):
+    buckets, count, total, maximum = state
+    histogram.buckets = [a + b for a, b in zip(histogram.buckets, buckets)]
+    histogram.count += count
+    histogram.total += total
+    histogram.max = max(histogram.max, maximum)
+
+
+def _bucket_label(bound):
+    return "+Inf" if bound == float("inf") else "{}ms".format(round(bound * 1000, 1))
+
+
+# default registry
+metrics = RpcMetrics()
+
+
+class _CountingResponse:
+    """
+    Proxy of an HTTP response counting the bytes read from it
+    """
+
+    def __init__(self, response, call):
+        self._response = response
+        self._call = call
+
+    def read(self, *args):
+        data = self._response.read(*args)
+        self._call["received"] += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+def _counting_urlopen(urlopen):
+    @functools.wraps(urlopen)
+    def wrapper(request, *args, **kwargs):
+        response = urlopen(request, *args, **kwargs)
+        call = getattr(_local, "call", None)
+        if call is None:
+            return response
+        return _CountingResponse(response, call)
+    return wrapper
+
+
+_hooks_installed = False
+
+
+def _install_hooks():
+    global _hooks_installed
+    if not _hooks_installed:
+        algod.urlopen = _counting_urlopen(algod.urlopen)
+        indexer.urlopen = _counting_urlopen(indexer.urlopen)
+        _hooks_installed = True
+
+
+def instrument(client, registry: RpcMetrics = None):
+    """
+    Record every request performed by an AlgodClient or IndexerClient.
+    Calling it again on the same client has no effect.
+    :param client:
+    :param registry: defaults to the module registry
+    :return: the same client
+    """
+    if getattr(client, "_rpc_metrics", None) is not None:
+        return client
+    registry = registry or metrics
+    _install_hooks()
+
+    if isinstance(client, indexer.IndexerClient):
+        request_attr, endpoints, prefix = "indexer_request", INDEXER_ENDPOINTS, "indexer."
+    else:
+        request_attr, endpoints, prefix = "algod_request", ALGOD_ENDPOINTS, ""
+    send_request = getattr(client, request_attr)
+
+    @functools.wraps(send_request)
+    def instrumented_request(method, requrl, params=None, data=None, *args, **kwargs):
+        endpoint = prefix + endpoint_name(method, requrl, endpoints)
+        call = {"received": 0}
+        _local.call = call
+        failed = False
+        start = time.perf_counter()
+        try:
+            return send_request(method, requrl, params, data, *args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            _local.call = None
+            registry.record_call(endpoint, latency, len(data) if data else 0, call["received"], failed)
+
+    setattr(client, request_attr, instrumented_request)
+    client._rpc_metrics = registry
+    return client
+
+
+def track_operation(name: str = None, registry: RpcMetrics = None):
+    """
+    Decorator attributing the calls performed by a function to an operation.
+    Nested operations are attributed to the outermost one. A False return value counts as a failure.
+    :param name: defaults to the function name
+    :param registry: defaults to the module registry
+    """
+    def decorator(fn):
+        operation = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, "operation", None) is not None:
+                return fn(*args, **kwargs)
+            _local.operation = operation
+            failed = True
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                failed = result is False
+                return result
+            finally:
+                _local.operation = None
+                (registry or metrics).record_operation(operation, time.perf_counter() - start, failed)
+        return wrapper
+    return decorator
+
+
+def serve(port: int, host: str = "localhost", registry: RpcMetrics = None):
+    """
+    Expose the metrics on http://host:port/metrics (Prometheus) and /metrics.json in a background thread
+    :param port:
+    :param host:
+    :param registry:
+    :return: the HTTP server, call shutdown() to stop it
+    """
+    # the HTTP server is only imported when metrics are exposed
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            registry = self.server.registry
+            if self.path == "/metrics":
+                body, content_type = registry.prometheus().encode(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(registry.snapshot()).encode(), "application/json"
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry or metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
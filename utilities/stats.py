@@ -0,0 +1,35 @@
+import math
+
+
+def percentile(values, q):
+    """
+    Percentile with linear interpolation between closest ranks
+    :param values: samples (not necessarily sorted)
+    :param q: percentile in [0, 100]
+    :return:
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[int(rank)]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies):
+    """
+    Summary of a list of latencies in seconds, reported in milliseconds
+    :param latencies:
+    :return:
+    """
+    count = len(latencies)
+    return {
+        "count": count,
+        "mean_ms": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if count else 0.0,
+    }
@@ -0,0 +1,221 @@
+# span based tracing of the delivery lifecycle
+# sampled traces are appended to a file in the Chrome Trace Event format (open with ui.perfetto.dev or chrome://tracing)
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+_local = threading.local()
+
+
+class Span:
+    """
+    A timed unit of work, child spans are nested in the parent trace
+    """
+
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start", "attributes")
+
+    def __init__(self, name, trace, span_id, parent_id, attributes):
+        self.name = name
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.perf_counter()
+
+    def set(self, **attributes):
+        """
+        Attach attributes (txid, app_id, ...) to the span
+        """
+        self.attributes.update(attributes)
+
+
+class _Trace:
+    __slots__ = ("trace_id", "events", "next_span_id", "attributes", "txids")
+
+    def __init__(self):
+        self.trace_id = "{:016x}".format(random.getrandbits(64))
+        self.events = []
+        self.next_span_id = 1
+        self.attributes = {}
+        self.txids = []
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Head-sampled tracer: the sampling decision is taken on the root span and inherited by the children
+    """
+
+    def __init__(self, path: str = None, sample_rate: float = 0.0):
+        """
+        :param path: trace file, nothing is recorded without a path
+        :param sample_rate: fraction of root spans recorded
+        """
+        self.path = path
+        self.sample_rate = sample_rate if path else 0.0
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self._file = None
+        # perf_counter based timestamps expressed on the wall clock
+        self._epoch = time.time() - time.perf_counter()
+
+    def _start(self, name, attributes):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if stack:
+            parent = stack[-1]
+            if parent is None:
+                stack.append(None)
+                return None
+            trace = parent.trace
+            parent_id = parent.span_id
+        else:
+            if not self.sample_rate or random.random() >= self.sample_rate:
+                stack.append(None)
+                return None
+            trace = _Trace()
+            parent_id = None
+        span = Span(name, trace, trace.next_span_id, parent_id, attributes)
+        trace.next_span_id += 1
+        stack.append(span)
+        return span
+
+    def _end(self, span):
+        _local.stack.pop()
+        if span is None:
+            return
+        end = time.perf_counter()
+        trace = span.trace
+        # app_id set on any span is propagated to the whole trace, txids are collected on the root span
+        if "app_id" in span.attributes:
+            trace.attributes.setdefault("app_id", span.attributes["app_id"])
+        if "txid" in span.attributes and span.attributes["txid"] not in trace.txids:
+            trace.txids.append(span.attributes["txid"])
+        args = dict(span.attributes, trace_id=trace.trace_id, span_id=span.span_id)
+        if span.parent_id is not None:
+            args["parent_id"] = span.parent_id
+        trace.events.append({
+            "name": span.name,
+            "cat": "delivery",
+            "ph": "X",
+            "ts": round((self._epoch + span.start) * 1e6),
+            "dur": round((end - span.start) * 1e6),
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+        if span.parent_id is None:
+            args["txids"] = trace.txids
+            for event in trace.events:
+                for key, value in trace.attributes.items():
+                    event["args"].setdefault(key, value)
+            self._export(trace.events)
+
+    def _export(self, events):
+        with self.lock:
+            if self._file is None:
+                new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+                self._file = open(self.path, "a")
+                if new_file:
+                    # the closing bracket is optional in the JSON array format, so the file can be appended to
+                    self._file.write("[\n")
+            self._file.write("".join(json.dumps(event) + ",\n" for event in events))
+            self._file.flush()
+
+    def span(self, name, **attributes):
+        """
+        Context manager timing a block of code
+        :param name:
+        :param attributes:
+        :return:
+        """
+        return _SpanContext(self, name, attributes)
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class _SpanContext:
+    __slots__ = ("tracer", "name", "attributes", "span")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.span = self.tracer._start(self.name, self.attributes)
+        return self.span or _NOOP_SPAN
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None and exc_type is not None:
+            self.span.set(error=repr(exc))
+        self.tracer._end(self.span)
+
+
+# default tracer, disabled until configure() is called
+tracer = Tracer()
+
+
+def configure(path: str, sample_rate: float = 0.01):
+    """
+    Enable tracing to the given file
+    :param path:
+    :param sample_rate: fraction of operations traced, low enough to be left on in production
+    """
+    global tracer
+    tracer.close()
+    tracer = Tracer(path, sample_rate)
+    return tracer
+
+
+def span(name, **attributes):
+    """
+    Open a span on the default tracer
+    """
+    return tracer.span(name, **attributes)
+
+
+def annotate(**attributes):
+    """
+    Attach attributes to the current span, if it is recorded
+    """
+    stack = getattr(_local, "stack", None)
+    if stack and stack[-1] is not None:
+        stack[-1].set(**attributes)
+
+
+def traced(name: str = None):
+    """
+    Decorator recording a span for every call, app_id is taken from the instance or the keyword arguments
+    :param name: defaults to the qualified function name
+    """
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.sample_rate:
+                return fn(*args, **kwargs)
+            attributes = {}
+            app_id = kwargs.get("app_id", getattr(args[0], "app_id", None) if args else None)
+            if isinstance(app_id, int):
+                attributes["app_id"] = app_id
+            with tracer.span(span_name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,29 +1,115 @@
-import numpy as np
+import json
+import logging
+import sys
+
+# root logger of the project, modules log through children of it (see get_logger)
+logger = logging.getLogger("algo_cargo")
+
+COLORS = {
+    'red': "\033[91m",
+    'green': "\033[92m",
+    'yellow': "\033[93m",
+    'blue': "\033[94m",
+}
+LEVEL_COLORS = {
+    logging.DEBUG: "\033[0m",
+    logging.INFO: COLORS['green'],
+    logging.WARNING: COLORS['yellow'],
+    logging.ERROR: COLORS['red'],
+    logging.CRITICAL: COLORS['red'],
+}
+
+# attributes of every LogRecord, anything else was passed through `extra` and is a structured field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "color"}
+
+
+class ConsoleFormatter(logging.Formatter):
+    """
+    Colored console output, the color is taken from the `color` field or from the level
+    """
+
+    def format(self, record):
+        message = super().format(record)
+        color = COLORS.get(getattr(record, "color", None)) or LEVEL_COLORS.get(record.levelno, "\033[0m")
+        return "{}{}\033[0m".format(color, message)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the fields passed through `extra` (app_id, txid, round...)
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name: str = None):
+    """
+    Logger of a module, child of the project logger
+    :param name: usually __name__
+    :return:
+    """
+    return logger.getChild(name) if name else logger
+
+
+def configure_logging(level="INFO", json_format: bool = False, quiet: bool = False, stream=None):
+    """
+    Configure the project logger. Messages are formatted lazily, so disabled levels cost a level check only
+    :param level: logging level name or number
+    :param json_format: structured JSON lines instead of colored text
+    :param quiet: high-throughput mode, only errors are emitted
+    :param stream: defaults to stdout
+    :return:
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    logger.setLevel(logging.ERROR if quiet else level)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_format else ConsoleFormatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+
+class lazy_json:
+    """
+    Defer the JSON serialization of a log argument until the message is emitted
+    """
+    __slots__ = ("obj", "indent")
+
+    def __init__(self, obj, indent=4):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.obj, indent=self.indent)
 
 
 def console_log(message, color='red', newline=False):
     """
-    Print a colored console message
+    Print a colored console message: user-facing output (menus, prompts, state dumps), whatever the log level
     :param message:
     :param color:
     :param newline:
     """
-    nl = ''
-    if newline:
-        nl = '\n'
-    if color == 'red':
-        print("{}\033[91m{}\033[0m".format(nl, message))
-    elif color == 'green':
-        print("{}\033[92m{}\033[0m".format(nl, message))
-    elif color == 'yellow':
-        print("{}\033[93m{}\033[0m".format(nl, message))
-    elif color == 'blue':
-        print("{}\033[94m{}\033[0m".format(nl, message))
-    else:
-        print("\033[0m{}{}".format(nl, message))
+    print("{}{}{}\033[0m".format("\n" if newline else "", COLORS.get(color, "\033[0m"), message))
 
 
 def toArray(obj):
+    import numpy as np
     data = list(obj.items())
     return np.array(data)
 
@@ -33,7 +119,6 @@ def parse_response(response):
     Parse a response into json
     :param response:
     """
-    import json
     res = json.dumps(response, indent=2, sort_keys=True)
     print(res)
     return res
@@ -0,0 +1,106 @@
+# concurrent execution of workload items (CLI commands) with a throughput/latency summary
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utilities import stats
+
+
+class WorkloadResult:
+    __slots__ = ("index", "command", "ok", "latency", "result", "error")
+
+    def __init__(self, index, command, ok, latency, result=None, error=None):
+        self.index = index
+        self.command = command
+        self.ok = ok
+        self.latency = latency
+        self.result = result
+        self.error = error
+
+
+def load_workload(path: str):
+    """
+    Read a JSONL workload file, one item per line (blank lines and lines starting with # are skipped)
+    :param path:
+    :return: list of items, each a dict with at least a "command" key
+    """
+    items = []
+    with open(path) as workload_file:
+        for line_number, line in enumerate(workload_file, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError("{}:{}: invalid JSON: {}".format(path, line_number, e))
+            if not isinstance(item, dict) or "command" not in item:
+                raise ValueError("{}:{}: an item must be an object with a \"command\" key".format(path, line_number))
+            items.append(item)
+    return items
+
+
+def run_workload(items, execute, workers: int = 1, on_result=None):
+    """
+    Execute the items concurrently. execute(item) returning False or raising counts as a failure
+    :param items:
+    :param execute: function executing one item
+    :param workers: number of items executed concurrently
+    :param on_result: optional callback receiving every WorkloadResult as soon as it is available
+    :return: results in item order, wall time in seconds
+    """
+    lock = threading.Lock()
+
+    def run(indexed_item):
+        index, item = indexed_item
+        start = time.perf_counter()
+        try:
+            value = execute(item)
+            result = WorkloadResult(index, item["command"], value is not False, time.perf_counter() - start, value)
+        except Exception as e:
+            result = WorkloadResult(index, item["command"], False, time.perf_counter() - start, error=str(e))
+        if on_result is not None:
+            with lock:
+                on_result(result)
+        return result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(run, enumerate(items)))
+    return results, time.perf_counter() - start
+
+
+def summarize(results, wall_time: float):
+    """
+    Throughput and latency summary, overall and per command
+    :param results:
+    :param wall_time:
+    :return:
+    """
+    commands = {}
+    for result in results:
+        commands.setdefault(result.command, []).append(result)
+    return {
+        "items": len(results),
+        "failures": sum(1 for result in results if not result.ok),
+        "wall_time_s": round(wall_time, 3),
+        "items_per_sec": round(len(results) / wall_time, 2) if wall_time else 0.0,
+        "latency": stats.summarize([result.latency for result in results]),
+        "commands": {
+            command: dict(stats.summarize([result.latency for result in command_results]),
+                          failures=sum(1 for result in command_results if not result.ok))
+            for command, command_results in commands.items()
+        },
+    }
+
+
+def print_summary(summary):
+    print("{} items in {}s -> {} items/s, {} failed".format(summary["items"], summary["wall_time_s"],
+                                                          summary["items_per_sec"], summary["failures"]))
+    print("{:<14}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}".format("command", "count", "p50 ms", "p99 ms", "mean ms",
+                                                             "max ms", "failed"))
+    for command, summary_row in summary["commands"].items():
+        print("{:<14}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}".format(
+            command, summary_row["count"], summary_row["p50_ms"], summary_row["p99_ms"], summary_row["mean_ms"],
+            summary_row["max_ms"], summary_row["failures"]))